@@ -0,0 +1,1188 @@
+import contextlib
+import copy
+import fnmatch
+import json
+import math
+import re
+import sqlite3
+import threading
+import uuid
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional, Union
+
+import elasticsearch
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig, ObjectApiResponse
+
+# Same as the edge_ngram_filter that push-to-index sets on the indices.
+EDGE_NGRAM_MIN = 2
+EDGE_NGRAM_MAX = 20
+
+DEFAULT_SEARCH_SIZE = 10
+DEFAULT_SUGGEST_SIZE = 5
+
+# Kana and ideographs are split in single characters by the standard tokenizer, like Elasticsearch does.
+CJK_CHARACTERS = "぀-ゟ㐀-䶿一-鿿豈-﫿"
+TOKEN_RE = re.compile(r"[{0}]|[^\W{0}]+".format(CJK_CHARACTERS))
+
+NUMERIC_TYPES = ("long", "integer", "short", "byte", "float", "double", "half_float", "scaled_float")
+
+Term = Union[str, int, float, bool]
+Scores = dict[str, float]
+
+
+def api_error(error_class: type[elasticsearch.ApiError], status: int, error_type: str, reason: str) -> Exception:
+    """Same errors the Elasticsearch client raises, so callers handle both backends the same way."""
+    meta = ApiResponseMeta(
+        status=status, http_version="1.1", headers=HttpHeaders(), duration=0.0, node=NodeConfig("http", "localhost", 0)
+    )
+    body = {"error": {"root_cause": [{"type": error_type, "reason": reason}], "type": error_type, "reason": reason}}
+    return error_class(message=error_type, meta=meta, body=body)
+
+
+def api_response(body: Any) -> ObjectApiResponse:
+    meta = ApiResponseMeta(
+        status=200, http_version="1.1", headers=HttpHeaders(), duration=0.0, node=NodeConfig("http", "localhost", 0)
+    )
+    return ObjectApiResponse(body=body, meta=meta)
+
+
+def bad_request(reason: str) -> Exception:
+    return api_error(elasticsearch.BadRequestError, 400, "parsing_exception", reason)
+
+
+def standard_tokens(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def analyze(analyzer: str, text: str) -> list[str]:
+    tokens = standard_tokens(text)
+    if analyzer == "edge_ngram_analyzer":
+        return [token[:size] for token in tokens for size in range(EDGE_NGRAM_MIN, min(len(token), EDGE_NGRAM_MAX) + 1)]
+    return tokens
+
+
+def auto_fuzziness(fuzziness: Any, term: str) -> int:
+    if fuzziness in (None, ""):
+        return 0
+    if isinstance(fuzziness, str) and fuzziness.upper().startswith("AUTO"):
+        if len(term) < 3:
+            return 0
+        return 1 if len(term) < 6 else 2
+    return min(int(fuzziness), 2)
+
+
+def edit_distance(first: str, second: str, maximum: int) -> int:
+    """Levenshtein distance counting transpositions as one edit. Stops at maximum + 1."""
+    if abs(len(first) - len(second)) > maximum:
+        return maximum + 1
+    previous_row: list[int] = []
+    row = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        before_previous_row, previous_row, row = previous_row, row, [i] + [0] * len(second)
+        for j, second_char in enumerate(second, start=1):
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + (first_char != second_char))
+            if i > 1 and j > 1 and first_char == second[j - 2] and first[i - 2] == second_char:
+                row[j] = min(row[j], before_previous_row[j - 2] + 1)
+        if min(row) > maximum:
+            return maximum + 1
+    return row[-1]
+
+
+def path_values(value: Any, parts: list[str]) -> list[Any]:
+    if isinstance(value, list):
+        return [x for item in value for x in path_values(item, parts)]
+    if not parts:
+        return [] if value is None else [value]
+    if isinstance(value, dict):
+        return path_values(value.get(parts[0]), parts[1:])
+    return []
+
+
+def leaf_values(value: Any, path: str = "") -> Iterator[tuple[str, Any]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from leaf_values(item, "{}.{}".format(path, key) if path else key)
+    elif isinstance(value, list):
+        for item in value:
+            yield from leaf_values(item, path)
+    elif value is not None:
+        yield path, value
+
+
+def merge_documents(document: dict[str, Any], changes: dict[str, Any]) -> dict[str, Any]:
+    merged = dict(document)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_documents(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def dynamic_mapping(value: Any) -> dict[str, Any]:
+    """Field mapping for values of fields missing from the index mapping, the same Elasticsearch would add."""
+    if isinstance(value, bool):
+        return {"type": "boolean"}
+    if isinstance(value, int):
+        return {"type": "long"}
+    if isinstance(value, float):
+        return {"type": "float"}
+    return {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+
+
+def glob_escape(text: str) -> str:
+    return "".join("[{}]".format(x) if x in "*?[]" else x for x in text)
+
+
+def as_list(value: Any) -> list[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def single_item(query: dict[str, Any], name: str) -> tuple[str, Any]:
+    items = [(key, value) for key, value in query.items() if key != "boost"]
+    if len(items) != 1:
+        raise bad_request("[{}] query malformed, expected a single field".format(name))
+    return items[0]
+
+
+class QueryStringParser:
+    """Parses the query_string syntax used in the search pages and match expressions: terms, "phrases", field:value,
+    field:(groups), wildcards, fuzzy terms~, AND/OR/NOT, && || !, + and - and parentheses. Occurrences follow the rules
+    of the Lucene classic query parser. Ranges, regular expressions and proximity searches are not supported.
+    The result is a query in the Elasticsearch query DSL, with the leaves built by the index, that knows the field
+    types."""
+
+    def __init__(self, index: "EmbeddedIndex", query: str, fields: list[str], default_operator: str) -> None:
+        self.index = index
+        self.fields = fields
+        self.default_operator = default_operator.lower()
+        self.tokens = self.tokenize(query)
+        self.position = 0
+
+    def parse(self) -> dict[str, Any]:
+        query = self.parse_clauses(self.fields)
+        if self.position < len(self.tokens):
+            raise bad_request("Cannot parse query: unexpected [{}]".format(self.tokens[self.position][1]))
+        return query
+
+    @staticmethod
+    def tokenize(query: str) -> list[tuple[str, Any]]:
+        tokens: list[tuple[str, Any]] = []
+        i = 0
+        length = len(query)
+        while i < length:
+            char = query[i]
+            if char.isspace():
+                i += 1
+            elif char in "()":
+                tokens.append((char, char))
+                i += 1
+            elif query.startswith("&&", i) or query.startswith("||", i):
+                tokens.append(("AND" if char == "&" else "OR", query[i : i + 2]))
+                i += 2
+            elif char in "+-!":
+                tokens.append(("NOT" if char == "!" else char, char))
+                i += 1
+            elif char == '"':
+                phrase = []
+                i += 1
+                while i < length and query[i] != '"':
+                    if query[i] == "\\" and i + 1 < length:
+                        i += 1
+                    phrase.append(query[i])
+                    i += 1
+                if i >= length:
+                    raise bad_request("Cannot parse query: unterminated phrase")
+                i += 1
+                i, _ = QueryStringParser.read_suffix(query, i)
+                tokens.append(("PHRASE", "".join(phrase)))
+            else:
+                text: list[str] = []
+                pattern: list[str] = []
+                field = None
+                has_wildcard = False
+                while i < length and not query[i].isspace() and query[i] not in '()"~^':
+                    if query[i] == "\\" and i + 1 < length:
+                        text.append(query[i + 1])
+                        pattern.append(glob_escape(query[i + 1]))
+                        i += 2
+                    elif query[i] == ":" and field is None:
+                        field = "".join(text)
+                        text, pattern = [], []
+                        i += 1
+                    else:
+                        has_wildcard = has_wildcard or query[i] in "*?"
+                        text.append(query[i])
+                        pattern.append(query[i] if query[i] in "*?" else glob_escape(query[i]))
+                        i += 1
+                i, fuzzy = QueryStringParser.read_suffix(query, i)
+                word = "".join(text)
+                if field is not None and not word:
+                    if i < length and query[i] in '("':
+                        tokens.append(("FIELD", field))
+                    else:
+                        raise bad_request("Cannot parse query: missing value for field [{}]".format(field))
+                elif field is None and word in ("AND", "OR", "NOT"):
+                    tokens.append((word, word))
+                elif word:
+                    tokens.append(("TERM", (field, word, "".join(pattern) if has_wildcard else None, fuzzy)))
+        return tokens
+
+    @staticmethod
+    def read_suffix(query: str, i: int) -> tuple[int, Optional[str]]:
+        """Skips the ~ and ^ suffixes of a term or phrase. Returns the fuzziness given with ~ for terms."""
+        fuzzy = None
+        while i < len(query) and query[i] in "~^":
+            operator = query[i]
+            i += 1
+            start = i
+            while i < len(query) and (query[i].isdigit() or query[i] == "."):
+                i += 1
+            if operator == "~":
+                fuzzy = query[start:i] or "AUTO"
+        return i, fuzzy
+
+    def peek(self) -> Optional[str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def parse_clauses(self, fields: list[str]) -> dict[str, Any]:
+        # Each clause is [occur, query], occur being must, should or must_not.
+        clauses: list[list[Any]] = []
+        while self.peek() not in (None, ")"):
+            conjunction = None
+            if self.peek() in ("AND", "OR"):
+                conjunction = self.tokens[self.position][0]
+                self.position += 1
+            modifier = None
+            if self.peek() in ("+", "-", "NOT"):
+                modifier = self.tokens[self.position][0]
+                self.position += 1
+            query = self.parse_clause(fields)
+            self.add_clause(clauses, conjunction, modifier, query)
+        if not clauses:
+            raise bad_request("Cannot parse query: empty expression")
+        if len(clauses) == 1 and clauses[0][0] != "must_not":
+            return clauses[0][1]
+        bool_query: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        for occur, query in clauses:
+            bool_query[occur].append(query)
+        if not bool_query["must"] and not bool_query["should"]:
+            bool_query["must"].append({"match_all": {}})
+        return {"bool": dict(bool_query)}
+
+    def add_clause(
+        self, clauses: list[list[Any]], conjunction: Optional[str], modifier: Optional[str], query: dict[str, Any]
+    ) -> None:
+        if clauses and conjunction == "AND" and clauses[-1][0] != "must_not":
+            clauses[-1][0] = "must"
+        if clauses and self.default_operator == "and" and conjunction == "OR" and clauses[-1][0] != "must_not":
+            clauses[-1][0] = "should"
+        prohibited = modifier in ("-", "NOT")
+        if self.default_operator == "or":
+            required = modifier == "+" or (conjunction == "AND" and not prohibited)
+        else:
+            required = not prohibited and conjunction != "OR"
+        clauses.append(["must_not" if prohibited else "must" if required else "should", query])
+
+    def parse_clause(self, fields: list[str]) -> dict[str, Any]:
+        kind = self.peek()
+        if kind is None:
+            raise bad_request("Cannot parse query: expression ends with an operator")
+        value = self.tokens[self.position][1]
+        self.position += 1
+        if kind == "FIELD":
+            fields = [value]
+            kind = self.peek()
+            if kind is None:
+                raise bad_request("Cannot parse query: missing value for field [{}]".format(value))
+            value = self.tokens[self.position][1]
+            self.position += 1
+        if kind == "(":
+            query = self.parse_clauses(fields)
+            if self.peek() != ")":
+                raise bad_request("Cannot parse query: missing closing parenthesis")
+            self.position += 1
+            return query
+        if kind == "PHRASE":
+            return self.index.multi_field_query(fields, value, phrase=True, default_operator=self.default_operator)
+        if kind == "TERM":
+            field, text, pattern, fuzzy = value
+            return self.index.multi_field_query(
+                [field] if field else fields,
+                text,
+                pattern=pattern,
+                fuzziness=fuzzy,
+                default_operator=self.default_operator,
+            )
+        raise bad_request("Cannot parse query: unexpected [{}]".format(value))
+
+
+class EmbeddedIndex:
+    """In-memory inverted index of the documents of one index.
+
+    For each field there's a posting list of the documents for each of its terms. Text fields are split in terms by
+    their analyzer, keyword, numeric and boolean fields have their values as terms. Documents are kept as they were
+    indexed, and are returned as the source of the hits.
+    """
+
+    def __init__(self, name: str, mapping: dict[str, Any], generation: int) -> None:
+        self.name = name
+        self.generation = generation
+        # Sequence of the last change applied.
+        self.sequence = 0
+        self.fields: dict[str, dict[str, Any]] = {}
+        # Path of the values in the source of subfields, like title.keyword.
+        self.source_paths: dict[str, str] = {}
+        self.add_mapping(mapping.get("properties", {}), "")
+        self.documents: dict[str, dict[str, Any]] = {}
+        self.postings: dict[str, dict[Term, set[str]]] = defaultdict(lambda: defaultdict(set))
+        # Words of each text field, for phrase suggestions.
+        self.words: dict[str, Counter[str]] = defaultdict(Counter)
+
+    def add_mapping(self, properties: dict[str, Any], prefix: str) -> None:
+        for name, config in properties.items():
+            path = prefix + name
+            if "properties" in config:
+                self.add_mapping(config["properties"], path + ".")
+                continue
+            self.fields[path] = config
+            for subfield_name, subfield_config in config.get("fields", {}).items():
+                self.fields["{}.{}".format(path, subfield_name)] = subfield_config
+                self.source_paths["{}.{}".format(path, subfield_name)] = path
+
+    def field_type(self, field: str) -> Optional[str]:
+        config = self.fields.get(field)
+        return config.get("type", "object") if config else None
+
+    # Indexing.
+
+    def document_terms(self, source: dict[str, Any]) -> Iterator[tuple[str, Term]]:
+        for path, value in leaf_values(source):
+            if path.endswith(".input") and self.field_type(path[: -len(".input")]) == "completion":
+                path = path[: -len(".input")]
+            if path not in self.fields:
+                self.fields[path] = dynamic_mapping(value)
+                for subfield_name in self.fields[path].get("fields", {}):
+                    self.source_paths["{}.{}".format(path, subfield_name)] = path
+            yield from self.value_terms(path, self.fields[path], value)
+
+    def value_terms(self, field: str, config: dict[str, Any], value: Any) -> Iterator[tuple[str, Term]]:
+        field_type = config.get("type", "object")
+        if config.get("index", True) and field_type != "object":
+            if field_type == "text":
+                for term in analyze(config.get("analyzer", "standard"), str(value)):
+                    yield field, term
+            elif field_type == "completion":
+                yield field, str(value).lower()
+            elif field_type == "boolean":
+                yield field, bool(value)
+            elif field_type in NUMERIC_TYPES and isinstance(value, (int, float)):
+                yield field, value
+            elif len(str(value)) <= config.get("ignore_above", len(str(value))):
+                yield field, str(value)
+        for subfield_name, subfield_config in config.get("fields", {}).items():
+            yield from self.value_terms("{}.{}".format(field, subfield_name), subfield_config, value)
+
+    def add(self, doc_id: str, source: dict[str, Any]) -> None:
+        self.documents[doc_id] = source
+        for field, term in self.document_terms(source):
+            self.postings[field][term].add(doc_id)
+        for field in self.text_fields():
+            for value in self.values(source, field):
+                self.words[field].update(standard_tokens(str(value)))
+
+    def remove(self, doc_id: str) -> None:
+        source = self.documents.pop(doc_id, None)
+        if source is None:
+            return
+        for field, term in self.document_terms(source):
+            documents = self.postings[field].get(term)
+            if documents is not None:
+                documents.discard(doc_id)
+                if not documents:
+                    del self.postings[field][term]
+        for field in self.text_fields():
+            for value in self.values(source, field):
+                for word in standard_tokens(str(value)):
+                    self.words[field][word] -= 1
+                    if self.words[field][word] <= 0:
+                        del self.words[field][word]
+
+    def text_fields(self) -> list[str]:
+        return [field for field, config in self.fields.items() if config.get("type") == "text" and config.get("index", True)]
+
+    def values(self, source: dict[str, Any], field: str) -> list[Any]:
+        values = path_values(source, self.source_paths.get(field, field).split("."))
+        if self.field_type(field) == "completion":
+            values = [x for value in values for x in (as_list(value.get("input")) if isinstance(value, dict) else [value])]
+        return values
+
+    # Queries. Each returns the score of the documents it matches.
+
+    def idf(self, document_count: int) -> float:
+        return math.log(1 + (len(self.documents) - document_count + 0.5) / (document_count + 0.5))
+
+    def term_key(self, field: str, value: Any) -> Optional[Term]:
+        field_type = self.field_type(field)
+        if isinstance(value, str) and field_type == "boolean":
+            return value.lower() == "true"
+        if field_type in NUMERIC_TYPES and not isinstance(value, bool):
+            try:
+                return float(value) if "float" in field_type or field_type == "double" else int(value)
+            except (TypeError, ValueError):
+                return None
+        if field_type == "completion":
+            return str(value).lower()
+        if isinstance(value, (str, bool, int, float)):
+            return value
+        return str(value)
+
+    def term_scores(self, field: str, terms: Iterable[Term], boost: float = 1.0) -> Scores:
+        scores: Scores = defaultdict(float)
+        postings = self.postings.get(field, {})
+        for term in terms:
+            documents = postings.get(term, ())
+            idf = self.idf(len(documents))
+            for doc_id in documents:
+                scores[doc_id] += boost * idf
+        return dict(scores)
+
+    def expand_term(self, field: str, term: str, fuzziness: int) -> list[Term]:
+        postings = self.postings.get(field, {})
+        if not fuzziness:
+            return [term] if term in postings else []
+        return [
+            candidate
+            for candidate in postings
+            if isinstance(candidate, str) and edit_distance(candidate, term, fuzziness) <= fuzziness
+        ]
+
+    def pattern_terms(self, field: str, pattern: str) -> list[Term]:
+        return [
+            term for term in self.postings.get(field, {}) if isinstance(term, str) and fnmatch.fnmatchcase(term, pattern)
+        ]
+
+    def search_analyzer(self, field: str) -> str:
+        config = self.fields.get(field, {})
+        return config.get("search_analyzer", config.get("analyzer", "standard"))
+
+    def all_documents(self, score: float = 1.0) -> Scores:
+        return {doc_id: score for doc_id in self.documents}
+
+    def evaluate(self, query: Optional[dict[str, Any]]) -> Scores:
+        if not query:
+            return self.all_documents()
+        if len(query) != 1:
+            raise bad_request("Expected a single query type, got {}".format(", ".join(query)))
+        query_type, params = next(iter(query.items()))
+        method = getattr(self, "query_{}".format(query_type), None)
+        if method is None:
+            raise bad_request("Unknown query [{}]".format(query_type))
+        return method(params)
+
+    def query_match_all(self, params: dict[str, Any]) -> Scores:
+        return self.all_documents(params.get("boost", 1.0))
+
+    def query_match_none(self, params: dict[str, Any]) -> Scores:
+        return {}
+
+    def query_bool(self, params: dict[str, Any]) -> Scores:
+        result: Optional[Scores] = None
+        for clause in as_list(params.get("must")):
+            scores = self.evaluate(clause)
+            result = scores if result is None else {x: result[x] + scores[x] for x in result if x in scores}
+        for clause in as_list(params.get("filter")):
+            scores = self.evaluate(clause)
+            result = {x: 0.0 for x in scores} if result is None else {x: y for x, y in result.items() if x in scores}
+        should = [self.evaluate(clause) for clause in as_list(params.get("should"))]
+        if should:
+            minimum = int(params.get("minimum_should_match", 0 if result is not None else 1))
+            matches: Counter[str] = Counter()
+            should_scores: Scores = defaultdict(float)
+            for scores in should:
+                for doc_id, score in scores.items():
+                    matches[doc_id] += 1
+                    should_scores[doc_id] += score
+            if result is None:
+                result = {x: 0.0 for x in should_scores}
+            result = {x: y + should_scores.get(x, 0.0) for x, y in result.items() if matches[x] >= minimum}
+        elif result is None:
+            result = self.all_documents()
+        for clause in as_list(params.get("must_not")):
+            excluded = self.evaluate(clause)
+            result = {x: y for x, y in result.items() if x not in excluded}
+        boost = params.get("boost", 1.0)
+        return {x: y * boost for x, y in result.items()}
+
+    def query_dis_max(self, params: dict[str, Any]) -> Scores:
+        result: Scores = {}
+        for clause in params.get("queries", []):
+            for doc_id, score in self.evaluate(clause).items():
+                result[doc_id] = max(score, result.get(doc_id, 0.0))
+        return result
+
+    def query_ids(self, params: dict[str, Any]) -> Scores:
+        return {str(x): params.get("boost", 1.0) for x in params.get("values", []) if str(x) in self.documents}
+
+    def query_term(self, params: dict[str, Any]) -> Scores:
+        field, value = single_item(params, "term")
+        boost = 1.0
+        if isinstance(value, dict):
+            boost = value.get("boost", 1.0)
+            value = value.get("value")
+        if field == "_id":
+            return self.query_ids({"values": [value], "boost": boost})
+        term = self.term_key(field, value)
+        return {} if term is None else self.term_scores(field, [term], boost)
+
+    def query_terms(self, params: dict[str, Any]) -> Scores:
+        field, values = single_item(params, "terms")
+        if field == "_id":
+            return self.query_ids({"values": values})
+        terms = [x for x in (self.term_key(field, value) for value in values) if x is not None]
+        return self.term_scores(field, terms, params.get("boost", 1.0))
+
+    def query_prefix(self, params: dict[str, Any]) -> Scores:
+        field, value = single_item(params, "prefix")
+        if isinstance(value, dict):
+            value = value.get("value", "")
+        return self.term_scores(field, self.pattern_terms(field, "{}*".format(glob_escape(str(value)))))
+
+    def query_wildcard(self, params: dict[str, Any]) -> Scores:
+        field, value = single_item(params, "wildcard")
+        if isinstance(value, dict):
+            value = value.get("value", value.get("wildcard", ""))
+        return self.term_scores(field, self.pattern_terms(field, str(value)))
+
+    def query_exists(self, params: dict[str, Any]) -> Scores:
+        field = params["field"]
+        return {doc_id: 1.0 for doc_id, source in self.documents.items() if self.values(source, field)}
+
+    def query_match(self, params: dict[str, Any]) -> Scores:
+        field, value = single_item(params, "match")
+        if not isinstance(value, dict):
+            value = {"query": value}
+        text = str(value.get("query", ""))
+        if self.field_type(field) != "text":
+            term = self.term_key(field, text)
+            return {} if term is None else self.term_scores(field, [term], value.get("boost", 1.0))
+        tokens = analyze(self.search_analyzer(field), text)
+        if not tokens:
+            return {}
+        token_scores = [
+            self.term_scores(field, self.expand_term(field, token, auto_fuzziness(value.get("fuzziness"), token)))
+            for token in tokens
+        ]
+        if value.get("operator", "or").lower() == "and":
+            result = token_scores[0]
+            for scores in token_scores[1:]:
+                result = {x: y + scores[x] for x, y in result.items() if x in scores}
+        else:
+            result = defaultdict(float)
+            for scores in token_scores:
+                for doc_id, score in scores.items():
+                    result[doc_id] += score
+        boost = value.get("boost", 1.0)
+        return {x: y * boost for x, y in result.items()}
+
+    def query_match_phrase(self, params: dict[str, Any]) -> Scores:
+        field, value = single_item(params, "match_phrase")
+        text = str(value.get("query", "") if isinstance(value, dict) else value)
+        if self.field_type(field) != "text":
+            term = self.term_key(field, text)
+            return {} if term is None else self.term_scores(field, [term])
+        tokens = standard_tokens(text)
+        if not tokens:
+            return {}
+        scores = self.query_match({field: {"query": text, "operator": "and"}})
+        result = {}
+        for doc_id, score in scores.items():
+            for value_text in self.values(self.documents[doc_id], field):
+                value_tokens = standard_tokens(str(value_text))
+                if any(
+                    value_tokens[i : i + len(tokens)] == tokens for i in range(len(value_tokens) - len(tokens) + 1)
+                ):
+                    result[doc_id] = score
+                    break
+        return result
+
+    def query_query_string(self, params: dict[str, Any]) -> Scores:
+        fields = params.get("fields") or [params.get("default_field", "*")]
+        resolved_fields = []
+        for field in fields:
+            field = field.split("^")[0]
+            resolved_fields += [x for x in self.fields if fnmatch.fnmatchcase(x, field)] if "*" in field else [field]
+        parser = QueryStringParser(
+            self, str(params.get("query", "")), resolved_fields, params.get("default_operator", "or")
+        )
+        return self.evaluate(parser.parse())
+
+    def multi_field_query(
+        self,
+        fields: list[str],
+        text: str,
+        phrase: bool = False,
+        pattern: Optional[str] = None,
+        fuzziness: Optional[str] = None,
+        default_operator: str = "or",
+    ) -> dict[str, Any]:
+        """Query for a term or phrase of a query string, matching any of the fields."""
+        queries: list[dict[str, Any]] = []
+        for field in fields:
+            is_text = self.field_type(field) == "text"
+            if pattern is not None:
+                queries.append({"wildcard": {field: {"value": pattern.lower() if is_text else pattern}}})
+            elif phrase:
+                queries.append({"match_phrase": {field: text}})
+            elif is_text:
+                queries.append({"match": {field: {"query": text, "operator": default_operator, "fuzziness": fuzziness}}})
+            else:
+                queries.append({"term": {field: text}})
+        if len(queries) == 1:
+            return queries[0]
+        return {"dis_max": {"queries": queries}}
+
+    # Search requests.
+
+    def search(self, body: dict[str, Any]) -> dict[str, Any]:
+        scores = self.evaluate(body.get("query"))
+        doc_ids = self.sorted_ids(scores, body.get("sort"))
+        start = int(body.get("from", 0))
+        size = int(body.get("size", DEFAULT_SEARCH_SIZE))
+        hits = [
+            {
+                "_index": self.name,
+                "_id": doc_id,
+                "_score": scores[doc_id],
+                "_source": self.filter_source(self.documents[doc_id], body.get("_source", True)),
+            }
+            for doc_id in doc_ids[start : start + size]
+        ]
+        response: dict[str, Any] = {
+            "took": 0,
+            "timed_out": False,
+            "hits": {
+                "total": {"value": len(scores), "relation": "eq"},
+                "max_score": max(scores.values()) if scores else None,
+                "hits": hits,
+            },
+        }
+        aggregations = body.get("aggs", body.get("aggregations"))
+        if aggregations:
+            response["aggregations"] = {
+                name: self.aggregate(name, aggregation, doc_ids) for name, aggregation in aggregations.items()
+            }
+        if body.get("suggest"):
+            response["suggest"] = self.suggest(body["suggest"])
+        return response
+
+    def sorted_ids(self, scores: Scores, sort: Any) -> list[str]:
+        doc_ids = list(scores)
+        sort_fields: list[tuple[str, bool]] = []
+        for item in as_list(sort):
+            if isinstance(item, str):
+                field, order = (item[1:], "desc") if item.startswith("-") else (item, "desc" if item == "_score" else "asc")
+            else:
+                field, options = next(iter(item.items()))
+                order = options.get("order", "asc") if isinstance(options, dict) else options
+            sort_fields.append((field, order == "desc"))
+        if not sort_fields:
+            sort_fields = [("_score", True)]
+        # Stable sorts from the last key to the first. Documents without a value go last in both orders.
+        for field, descending in reversed(sort_fields):
+            if field == "_doc":
+                continue
+            if field == "_score":
+                doc_ids.sort(key=lambda x: scores[x], reverse=descending)
+                continue
+            keys: dict[str, tuple[Any, ...]] = {}
+            for doc_id in doc_ids:
+                values = [self.term_key(field, x) for x in self.values(self.documents[doc_id], field)]
+                present = [x for x in values if x is not None]
+                if present:
+                    keys[doc_id] = (int(descending), max(present) if descending else min(present))
+                else:
+                    keys[doc_id] = (int(not descending),)
+            doc_ids.sort(key=lambda x: keys[x], reverse=descending)
+        return doc_ids
+
+    @staticmethod
+    def filter_source(source: dict[str, Any], source_filter: Any) -> Optional[dict[str, Any]]:
+        """Copy of the fields of the source requested, responses are modified by callers."""
+        if source_filter is True or source_filter is None:
+            return copy.deepcopy(source)
+        if source_filter is False:
+            return None
+        if isinstance(source_filter, dict):
+            includes = as_list(source_filter.get("includes", source_filter.get("include")))
+            excludes = as_list(source_filter.get("excludes", source_filter.get("exclude")))
+        else:
+            includes = as_list(source_filter)
+            excludes = []
+        return {
+            key: copy.deepcopy(value)
+            for key, value in source.items()
+            if (not includes or any(fnmatch.fnmatchcase(key, x) for x in includes))
+            and not any(fnmatch.fnmatchcase(key, x) for x in excludes)
+        }
+
+    def aggregate(self, name: str, aggregation: dict[str, Any], doc_ids: list[str]) -> dict[str, Any]:
+        aggregation_type, params = next((x, y) for x, y in aggregation.items() if x not in ("meta", "aggs"))
+        field = params.get("field", "")
+        if aggregation_type == "terms":
+            counts: Counter[Any] = Counter()
+            for doc_id in doc_ids:
+                counts.update(set(self.values(self.documents[doc_id], field)))
+            size = int(params.get("size", 10))
+            buckets = sorted(counts.items(), key=lambda x: (-x[1], str(x[0])))
+            return {
+                "doc_count_error_upper_bound": 0,
+                "sum_other_doc_count": sum(count for _, count in buckets[size:]),
+                "buckets": [self.bucket(key, count) for key, count in buckets[:size]],
+            }
+        values = [
+            x
+            for doc_id in doc_ids
+            for x in self.values(self.documents[doc_id], field)
+            if isinstance(x, (int, float)) and not isinstance(x, bool)
+        ]
+        if aggregation_type == "avg":
+            return {"value": sum(values) / len(values) if values else None}
+        if aggregation_type == "sum":
+            return {"value": float(sum(values))}
+        if aggregation_type == "max":
+            return {"value": float(max(values)) if values else None}
+        if aggregation_type == "min":
+            return {"value": float(min(values)) if values else None}
+        if aggregation_type == "value_count":
+            return {"value": len(values)}
+        raise bad_request("Unknown aggregation type [{}] in [{}]".format(aggregation_type, name))
+
+    @staticmethod
+    def bucket(key: Any, count: int) -> dict[str, Any]:
+        if isinstance(key, bool):
+            return {"key": int(key), "key_as_string": str(key).lower(), "doc_count": count}
+        return {"key": key, "doc_count": count}
+
+    def suggest(self, suggesters: dict[str, Any]) -> dict[str, list[dict[str, Any]]]:
+        global_text = suggesters.get("text", "")
+        result = {}
+        for name, params in suggesters.items():
+            if name == "text":
+                continue
+            text = str(params.get("text", params.get("prefix", global_text)))
+            if "completion" in params:
+                options = self.completion_options(
+                    params["completion"]["field"], text, int(params["completion"].get("size", DEFAULT_SUGGEST_SIZE))
+                )
+            elif "phrase" in params:
+                options = self.phrase_options(
+                    params["phrase"]["field"], text, int(params["phrase"].get("size", DEFAULT_SUGGEST_SIZE))
+                )
+            else:
+                raise bad_request("Unknown suggester in [{}]".format(name))
+            result[name] = [{"text": text, "offset": 0, "length": len(text), "options": options}]
+        return result
+
+    def completion_options(self, field: str, prefix: str, size: int) -> list[dict[str, Any]]:
+        options = []
+        seen = set()
+        lowered = prefix.lower()
+        for term in sorted(x for x in self.postings.get(field, {}) if isinstance(x, str) and x.startswith(lowered)):
+            for doc_id in sorted(self.postings[field][term]):
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                source = self.documents[doc_id]
+                text = next((str(x) for x in self.values(source, field) if str(x).lower() == term), term)
+                options.append(
+                    {"text": text, "_index": self.name, "_id": doc_id, "_score": 1.0, "_source": copy.deepcopy(source)}
+                )
+                if len(options) >= size:
+                    return options
+        return options
+
+    def phrase_options(self, field: str, text: str, size: int) -> list[dict[str, Any]]:
+        """Phrases with the words that are not in the field corrected, and the last one completed by prefix."""
+        words = self.words.get(field, Counter())
+        tokens = standard_tokens(text)
+        if not tokens or not words:
+            return []
+        total = sum(words.values())
+
+        def corrections(token: str) -> list[str]:
+            distance = auto_fuzziness("AUTO", token)
+            candidates = [x for x in words if distance and edit_distance(x, token, distance) <= distance]
+            return sorted(candidates, key=lambda x: (-words[x], x))
+
+        fixed = [token if token in words else next(iter(corrections(token)), token) for token in tokens[:-1]]
+        last = tokens[-1]
+        candidates = sorted((x for x in words if x.startswith(last)), key=lambda x: (-words[x], x))
+        candidates += [x for x in corrections(last) if x not in candidates]
+        return [{"text": " ".join(fixed + [x]), "score": words[x] / total} for x in candidates[:size]]
+
+
+class EmbeddedIndicesClient:
+    """The methods of Elasticsearch.indices used by this project."""
+
+    def __init__(self, client: "EmbeddedSearchClient") -> None:
+        self.client = client
+
+    def exists(self, index: Union[str, list[str]], **kwargs: Any) -> bool:
+        names = as_list(index)
+        with self.client.connection() as connection:
+            found = connection.execute(
+                "SELECT COUNT(*) FROM search_index WHERE name IN ({})".format(",".join("?" * len(names))), names
+            ).fetchone()[0]
+        return bool(names) and found == len(names)
+
+    def create(
+        self,
+        index: str,
+        mappings: Optional[dict[str, Any]] = None,
+        settings: Optional[dict[str, Any]] = None,
+        body: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> ObjectApiResponse:
+        if body:
+            mappings = mappings or body.get("mappings")
+            settings = settings or body.get("settings")
+        with self.client.write() as connection:
+            if self.client.index_exists(connection, index):
+                raise api_error(
+                    elasticsearch.BadRequestError,
+                    400,
+                    "resource_already_exists_exception",
+                    "index [{}] already exists".format(index),
+                )
+            self.client.create_index(connection, index, mappings or {}, settings or {})
+        return api_response({"acknowledged": True, "index": index})
+
+    def delete(self, index: str, **kwargs: Any) -> ObjectApiResponse:
+        with self.client.write() as connection:
+            if not self.client.index_exists(connection, index):
+                raise self.client.index_not_found(index)
+            connection.execute("DELETE FROM search_document WHERE index_name = ?", (index,))
+            connection.execute("DELETE FROM search_index WHERE name = ?", (index,))
+        return api_response({"acknowledged": True})
+
+    def put_mapping(
+        self, index: str, body: Optional[dict[str, Any]] = None, properties: Optional[dict[str, Any]] = None, **kwargs: Any
+    ) -> ObjectApiResponse:
+        new_properties = properties or (body or {}).get("properties", {})
+        with self.client.write() as connection:
+            row = connection.execute("SELECT mapping FROM search_index WHERE name = ?", (index,)).fetchone()
+            if row is None:
+                raise self.client.index_not_found(index)
+            mapping = json.loads(row[0])
+            mapping["properties"] = merge_documents(mapping.get("properties", {}), new_properties)
+            # Changes the generation, so the in-memory indices are built again with the new field types.
+            connection.execute(
+                "UPDATE search_index SET mapping = ?, generation = ? WHERE name = ?",
+                (json.dumps(mapping), self.client.next_sequence(connection), index),
+            )
+        return api_response({"acknowledged": True})
+
+    def put_settings(
+        self,
+        index: Optional[str] = None,
+        body: Optional[dict[str, Any]] = None,
+        settings: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> ObjectApiResponse:
+        # Analyzers are fixed and the result window is limited by the views, so settings are only validated.
+        if index is not None and not self.exists(index=index):
+            raise self.client.index_not_found(index)
+        return api_response({"acknowledged": True})
+
+    def get_mapping(self, index: str, **kwargs: Any) -> ObjectApiResponse:
+        with self.client.connection() as connection:
+            row = connection.execute("SELECT mapping FROM search_index WHERE name = ?", (index,)).fetchone()
+        if row is None:
+            raise self.client.index_not_found(index)
+        return api_response({index: {"mappings": json.loads(row[0])}})
+
+    def open(self, index: str, **kwargs: Any) -> ObjectApiResponse:
+        return self.put_settings(index=index)
+
+    def close(self, index: str, **kwargs: Any) -> ObjectApiResponse:
+        return self.put_settings(index=index)
+
+    def refresh(self, index: Optional[str] = None, **kwargs: Any) -> ObjectApiResponse:
+        return self.put_settings(index=index)
+
+
+class EmbeddedSearchClient:
+    """Search backend that runs in the process, with the methods of the Elasticsearch client used by this project.
+
+    Documents are stored in a SQLite database, that every process uses. Each change to a document gets a number from
+    a sequence. Searches are answered from an EmbeddedIndex per index kept in memory, that applies the changes with a
+    higher number than the last one it has before each request, so changes are visible right away, as if every
+    request used refresh=True. Search, count and suggest requests take the body built by elasticsearch.dsl.
+    """
+
+    def __init__(self, location: str) -> None:
+        self.uri = False
+        # Kept open so an in-memory database lives as long as the client.
+        self.keep_alive: Optional[sqlite3.Connection] = None
+        if location == ":memory:":
+            location = "file:embedded_search_{}?mode=memory&cache=shared".format(uuid.uuid4().hex)
+            self.uri = True
+        self.location = location
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.loaded_indices: dict[str, EmbeddedIndex] = {}
+        self.indices = EmbeddedIndicesClient(self)
+        if self.uri:
+            self.keep_alive = self.new_connection()
+        with self.write() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_index "
+                "(name TEXT PRIMARY KEY, generation INTEGER NOT NULL, mapping TEXT NOT NULL, settings TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS search_document "
+                "(index_name TEXT NOT NULL, id TEXT NOT NULL, source TEXT, sequence INTEGER NOT NULL, "
+                "PRIMARY KEY (index_name, id))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS search_document_sequence ON search_document (index_name, sequence)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS search_sequence (value INTEGER NOT NULL)")
+            connection.execute(
+                "INSERT INTO search_sequence SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM search_sequence)"
+            )
+
+    def new_connection(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.location, uri=self.uri, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = self.new_connection()
+        yield self.local.connection
+
+    @contextlib.contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        with self.connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    @staticmethod
+    def next_sequence(connection: sqlite3.Connection) -> int:
+        connection.execute("UPDATE search_sequence SET value = value + 1")
+        return connection.execute("SELECT value FROM search_sequence").fetchone()[0]
+
+    @staticmethod
+    def index_exists(connection: sqlite3.Connection, index: str) -> bool:
+        return connection.execute("SELECT 1 FROM search_index WHERE name = ?", (index,)).fetchone() is not None
+
+    def create_index(
+        self, connection: sqlite3.Connection, index: str, mappings: dict[str, Any], settings: dict[str, Any]
+    ) -> None:
+        connection.execute(
+            "INSERT INTO search_index (name, generation, mapping, settings) VALUES (?, ?, ?, ?)",
+            (index, self.next_sequence(connection), json.dumps(mappings), json.dumps(settings)),
+        )
+
+    @staticmethod
+    def index_not_found(index: str) -> Exception:
+        return api_error(elasticsearch.NotFoundError, 404, "index_not_found_exception", "no such index [{}]".format(index))
+
+    @staticmethod
+    def document_not_found(index: str, doc_id: str) -> Exception:
+        return api_error(
+            elasticsearch.NotFoundError, 404, "document_missing_exception", "[{}]: document missing".format(doc_id)
+        )
+
+    # Documents.
+
+    def stored_source(self, connection: sqlite3.Connection, index: str, doc_id: str) -> Optional[dict[str, Any]]:
+        row = connection.execute(
+            "SELECT source FROM search_document WHERE index_name = ? AND id = ?", (index, doc_id)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def store(
+        self, connection: sqlite3.Connection, index: str, doc_id: str, source: Optional[dict[str, Any]]
+    ) -> None:
+        """Saves a document, or deletes it when source is None. Indices are created as needed, like Elasticsearch does
+        by default."""
+        if source is not None and not self.index_exists(connection, index):
+            self.create_index(connection, index, {}, {})
+        # Deleted documents are kept without source, so processes that had them learn they were deleted.
+        connection.execute(
+            "INSERT OR REPLACE INTO search_document (index_name, id, source, sequence) VALUES (?, ?, ?, ?)",
+            (index, doc_id, json.dumps(source, default=str) if source is not None else None, self.next_sequence(connection)),
+        )
+
+    def apply_action(self, connection: sqlite3.Connection, action: str, index: str, doc_id: str, **params: Any) -> str:
+        existing = self.stored_source(connection, index, doc_id)
+        if action == "create" and existing is not None:
+            raise api_error(
+                elasticsearch.ConflictError,
+                409,
+                "version_conflict_engine_exception",
+                "[{}]: version conflict, document already exists".format(doc_id),
+            )
+        if action in ("index", "create"):
+            self.store(connection, index, doc_id, params["document"])
+        elif action == "update":
+            if existing is not None:
+                self.store(connection, index, doc_id, merge_documents(existing, params.get("doc") or {}))
+            elif params.get("doc_as_upsert") and params.get("doc") is not None:
+                self.store(connection, index, doc_id, params["doc"])
+            elif params.get("upsert") is not None:
+                self.store(connection, index, doc_id, params["upsert"])
+            else:
+                raise self.document_not_found(index, doc_id)
+        elif action == "delete":
+            if existing is None:
+                raise self.document_not_found(index, doc_id)
+            self.store(connection, index, doc_id, None)
+        else:
+            raise bad_request("Unknown action [{}]".format(action))
+        if action == "delete":
+            return "deleted"
+        return "updated" if existing is not None else "created"
+
+    def document_response(self, action: str, index: str, doc_id: Any, **params: Any) -> ObjectApiResponse:
+        doc_id = str(doc_id) if doc_id is not None else uuid.uuid4().hex
+        with self.write() as connection:
+            result = self.apply_action(connection, action, index, doc_id, **params)
+        return api_response({"_index": index, "_id": doc_id, "result": result})
+
+    def index(self, index: str, document: dict[str, Any], id: Any = None, **kwargs: Any) -> ObjectApiResponse:
+        return self.document_response("index", index, id, document=document)
+
+    def create(self, index: str, id: Any, document: dict[str, Any], **kwargs: Any) -> ObjectApiResponse:
+        return self.document_response("create", index, id, document=document)
+
+    def update(
+        self,
+        index: str,
+        id: Any,
+        doc: Optional[dict[str, Any]] = None,
+        doc_as_upsert: bool = False,
+        upsert: Optional[dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> ObjectApiResponse:
+        return self.document_response("update", index, id, doc=doc, doc_as_upsert=doc_as_upsert, upsert=upsert)
+
+    def delete(self, index: str, id: Any, **kwargs: Any) -> ObjectApiResponse:
+        return self.document_response("delete", index, id)
+
+    def get(self, index: str, id: Any, **kwargs: Any) -> ObjectApiResponse:
+        with self.connection() as connection:
+            source = self.stored_source(connection, index, str(id))
+        if source is None:
+            raise self.document_not_found(index, str(id))
+        return api_response({"_index": index, "_id": str(id), "found": True, "_source": source})
+
+    def bulk_actions(self, actions: Iterable[dict[str, Any]]) -> tuple[int, list[dict[str, Any]]]:
+        """Runs the actions given to elasticsearch.helpers.bulk in a single transaction. Returns the number of
+        actions that succeeded and the errors of the rest, like bulk with raise_on_error=False."""
+        successes = 0
+        errors = []
+        with self.write() as connection:
+            for action in actions:
+                action = dict(action)
+                op_type = action.pop("_op_type", "index")
+                index = action.pop("_index")
+                doc_id = action.pop("_id", None)
+                doc_id = str(doc_id) if doc_id is not None else uuid.uuid4().hex
+                document = action.pop("_source", action)
+                try:
+                    if op_type == "update":
+                        self.apply_action(connection, op_type, index, doc_id, **document)
+                    else:
+                        self.apply_action(connection, op_type, index, doc_id, document=document)
+                    successes += 1
+                except elasticsearch.ApiError as e:
+                    errors.append({op_type: {"_index": index, "_id": doc_id, "status": e.status_code, "error": e.body}})
+        return successes, errors
+
+    def options(self, **kwargs: Any) -> "EmbeddedSearchClient":
+        return self
+
+    # Searches.
+
+    def loaded_index(self, index: Union[str, list[str]]) -> EmbeddedIndex:
+        """The in-memory index, with every stored change applied. Must be called with the lock held."""
+        # elasticsearch.dsl always sends a list of indices, only searches on one are supported.
+        if isinstance(index, list):
+            if len(index) != 1:
+                raise bad_request("Searches must use a single index")
+            index = index[0]
+        with self.connection() as connection:
+            row = connection.execute("SELECT generation, mapping FROM search_index WHERE name = ?", (index,)).fetchone()
+            if row is None:
+                self.loaded_indices.pop(index, None)
+                raise self.index_not_found(index)
+            generation, mapping = row
+            loaded = self.loaded_indices.get(index)
+            if loaded is None or loaded.generation != generation:
+                loaded = EmbeddedIndex(index, json.loads(mapping), generation)
+                self.loaded_indices[index] = loaded
+            changes = connection.execute(
+                "SELECT id, source, sequence FROM search_document WHERE index_name = ? AND sequence > ? "
+                "ORDER BY sequence",
+                (index, loaded.sequence),
+            )
+            for doc_id, source, sequence in changes:
+                loaded.remove(doc_id)
+                if source is not None:
+                    loaded.add(doc_id, json.loads(source))
+                loaded.sequence = sequence
+        return loaded
+
+    def search(self, index: Union[str, list[str]], body: Optional[dict[str, Any]] = None, **kwargs: Any) -> ObjectApiResponse:
+        request = dict(body or {})
+        for key in ("query", "aggs", "aggregations", "sort", "size", "suggest", "_source"):
+            if kwargs.get(key) is not None:
+                request[key] = kwargs[key]
+        if kwargs.get("from_") is not None:
+            request["from"] = kwargs["from_"]
+        with self.lock:
+            return api_response(self.loaded_index(index).search(request))
+
+    def count(
+        self, index: Union[str, list[str]], query: Optional[dict[str, Any]] = None, body: Optional[dict[str, Any]] = None, **kwargs: Any
+    ) -> ObjectApiResponse:
+        if query is None and body:
+            query = body.get("query")
+        with self.lock:
+            return api_response({"count": len(self.loaded_index(index).evaluate(query))})
+
+    def close(self) -> None:
+        if getattr(self.local, "connection", None) is not None:
+            self.local.connection.close()
+            self.local.connection = None
+        if self.keep_alive is not None:
+            self.keep_alive.close()
+            self.keep_alive = None
+
+
+def bulk(client: Any, actions: Iterable[dict[str, Any]], **kwargs: Any) -> tuple[int, Any]:
+    """elasticsearch.helpers.bulk for either backend."""
+    if isinstance(client, EmbeddedSearchClient):
+        return client.bulk_actions(actions)
+    from elasticsearch.helpers import bulk as elasticsearch_bulk
+
+    return elasticsearch_bulk(client=client, actions=actions, **kwargs)
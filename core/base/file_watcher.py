@@ -0,0 +1,132 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+from collections.abc import Iterable
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# From sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event: int wd, uint32_t mask, uint32_t cookie, uint32_t len, char name[len]
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileChangeWatcher:
+    """Tracks which files, from a set of tracked files, changed between calls to changed_files.
+
+    On Linux it uses inotify watches on the files' directories, so only files that were written to, created,
+    moved or deleted are reported. Newly tracked files are reported once. Where inotify is not available,
+    or a directory can't be watched yet (it doesn't exist), the affected files are reported on every call.
+    """
+
+    def __init__(self) -> None:
+        self.fd = -1
+        self.libc: Optional[ctypes.CDLL] = None
+        self.watches: dict[str, int] = {}
+        self.directories: dict[int, str] = {}
+        self.tracked: set[str] = set()
+        self.pending: set[str] = set()
+
+        if sys.platform.startswith("linux"):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            except (OSError, AttributeError):
+                fd = -1
+            if fd >= 0:
+                self.libc = libc
+                self.fd = fd
+            else:
+                logger.warning("Could not initialize inotify, every tracked file will be checked each time.")
+
+    @property
+    def uses_notifications(self) -> bool:
+        return self.fd >= 0
+
+    def set_tracked(self, paths: Iterable[str]) -> None:
+        tracked = {os.path.abspath(x) for x in paths}
+        self.pending.update(tracked - self.tracked)
+        self.pending.intersection_update(tracked)
+        self.tracked = tracked
+
+        if not self.libc:
+            return
+
+        directories = {os.path.dirname(x) for x in tracked}
+        for directory in directories.difference(self.watches):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self.watches[directory] = wd
+                self.directories[wd] = directory
+                # Changes before the watch was added were not seen.
+                self.pending.update(x for x in tracked if os.path.dirname(x) == directory)
+        for directory in set(self.watches).difference(directories):
+            wd = self.watches.pop(directory)
+            self.directories.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def changed_files(self) -> set[str]:
+        """Absolute paths of the tracked files that could have changed since the previous call."""
+        if not self.uses_notifications:
+            return set(self.tracked)
+
+        changed = self.pending
+        self.pending = set()
+        changed.update(x for x in self.tracked if os.path.dirname(x) not in self.watches)
+
+        notified = self.read_events()
+        if notified is None:
+            return set(self.tracked)
+        changed.update(notified)
+
+        return changed & self.tracked
+
+    def read_events(self) -> Optional[set[str]]:
+        """Paths from the queued events, None if events were lost and everything must be checked."""
+        paths: set[str] = set()
+        lost_events = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    lost_events = True
+                elif mask & IN_IGNORED:
+                    # The directory was removed, it's watched again if it's recreated.
+                    directory = self.directories.pop(wd, None)
+                    if directory is not None:
+                        self.watches.pop(directory, None)
+                elif name and wd in self.directories:
+                    paths.add(os.path.join(self.directories[wd], os.fsdecode(name)))
+        if lost_events:
+            return None
+        return paths
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.libc = None
+        self.watches = {}
+        self.directories = {}
@@ -0,0 +1,281 @@
+import io
+import struct
+import typing
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image as PImage
+
+# Bytes read at most from the start of a file when looking for the header of a format. JPEG metadata segments
+# and the AVIF meta box can be larger than the initial read, but they are read only up to this limit.
+MAX_HEADER_BYTES = 256 * 1024
+
+# Same modes that Pillow reports for each PNG (bit depth, color type)
+PNG_MODES = {
+    (1, 0): "1",
+    (2, 0): "L",
+    (4, 0): "L",
+    (8, 0): "L",
+    (16, 0): "I;16",
+    (8, 2): "RGB",
+    (16, 2): "RGB",
+    (1, 3): "P",
+    (2, 3): "P",
+    (4, 3): "P",
+    (8, 3): "P",
+    (8, 4): "LA",
+    (16, 4): "LA",
+    (8, 6): "RGBA",
+    (16, 6): "RGBA",
+}
+
+JPEG_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+
+# SOF markers, every marker from 0xC0 to 0xCF except DHT, JPG and DAC
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field: TEM, RST0-7, SOI and EOI
+JPEG_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xDA))
+JPEG_SOS = 0xDA
+
+AVIF_BRANDS = (b"avif", b"avis", b"mif1", b"msf1")
+AVIF_ALPHA_URNS = (b"urn:mpeg:mpegB:cicp:systems:auxiliary:alpha", b"urn:mpeg:hevc:2015:auxid:1")
+
+
+@dataclass
+class ImageHeader:
+    width: int
+    height: int
+    format: str
+    mode: str
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+
+class HeaderReader:
+    """Reads a file object sequentially, keeping count of the bytes read."""
+
+    def __init__(self, fp: typing.IO[bytes]) -> None:
+        self.fp = fp
+        self.bytes_read = 0
+
+    def read(self, size: int) -> bytes:
+        if size <= 0:
+            return b""
+        if self.bytes_read + size > MAX_HEADER_BYTES:
+            raise EOFError
+        data = self.fp.read(size)
+        self.bytes_read += len(data)
+        if len(data) < size:
+            raise EOFError
+        return data
+
+
+def probe_png(reader: HeaderReader, prefix: bytes) -> Optional[ImageHeader]:
+    data = prefix + reader.read(26 - len(prefix))
+    if data[12:16] != b"IHDR":
+        return None
+    width, height, bit_depth, color_type = struct.unpack(">IIBB", data[16:26])
+    mode = PNG_MODES.get((bit_depth, color_type))
+    if mode is None or not width or not height:
+        return None
+    return ImageHeader(width, height, "PNG", mode)
+
+
+def probe_jpeg(reader: HeaderReader, prefix: bytes) -> Optional[ImageHeader]:
+    pending = prefix[2:]
+
+    def read(size: int) -> bytes:
+        nonlocal pending
+        if len(pending) < size:
+            pending += reader.read(size - len(pending))
+        data, pending = pending[:size], pending[size:]
+        return data
+
+    while True:
+        if read(1) != b"\xff":
+            return None
+        marker = read(1)[0]
+        while marker == 0xFF:
+            marker = read(1)[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker == JPEG_SOS:
+            return None
+        length = struct.unpack(">H", read(2))[0]
+        if length < 2:
+            return None
+        if marker in JPEG_SOF_MARKERS:
+            _, height, width, components = struct.unpack(">BHHB", read(6))
+            mode = JPEG_MODES.get(components)
+            if mode is None or not width or not height:
+                return None
+            return ImageHeader(width, height, "JPEG", mode)
+        segment = read(length - 2)
+        # Pillow opens JPEG files with a multi picture index as MPO.
+        if marker == 0xE2 and segment.startswith(b"MPF\x00"):
+            return None
+
+
+def probe_gif(reader: HeaderReader, prefix: bytes) -> Optional[ImageHeader]:
+    width, height, flags = struct.unpack("<HHB", prefix[6:11])
+    # Without a global palette, or with a grayscale one, the mode Pillow uses depends on the frames.
+    if not flags & 0x80 or not width or not height:
+        return None
+    palette_size = 3 << ((flags & 7) + 1)
+    palette = prefix[13:] + reader.read(palette_size - len(prefix[13:]))
+    if all(i == palette[i * 3] == palette[i * 3 + 1] == palette[i * 3 + 2] for i in range(len(palette) // 3)):
+        return None
+    return ImageHeader(width, height, "GIF", "P")
+
+
+def probe_webp(reader: HeaderReader, prefix: bytes) -> Optional[ImageHeader]:
+    data = prefix + reader.read(30 - len(prefix))
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        if data[23:26] != b"\x9d\x01\x2a":
+            return None
+        width, height = struct.unpack("<HH", data[26:30])
+        width, height, has_alpha = width & 0x3FFF, height & 0x3FFF, False
+    elif chunk == b"VP8L":
+        if data[20] != 0x2F:
+            return None
+        bits = int.from_bytes(data[21:25], "little")
+        width, height, has_alpha = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, bool(bits >> 28 & 1)
+    elif chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        has_alpha = bool(data[20] & 0x10)
+    else:
+        return None
+    if not width or not height:
+        return None
+    return ImageHeader(width, height, "WEBP", "RGBA" if has_alpha else "RGB")
+
+
+def iter_boxes(data: bytes) -> typing.Iterator[tuple[bytes, bytes]]:
+    offset = 0
+    while offset + 8 <= len(data):
+        size, box_type = struct.unpack(">I4s", data[offset : offset + 8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[offset + 8 : offset + 16])[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header_size or offset + size > len(data):
+            return
+        yield box_type, data[offset + header_size : offset + size]
+        offset += size
+
+
+def probe_avif(reader: HeaderReader, prefix: bytes) -> Optional[ImageHeader]:
+    data = prefix
+    # The ftyp box is followed by the meta box, with the properties of the primary item.
+    while True:
+        if len(data) < 8:
+            data += reader.read(8 - len(data))
+        size, box_type = struct.unpack(">I4s", data[:8])
+        if size < 8:
+            return None
+        if len(data) < size:
+            data += reader.read(size - len(data))
+        box, data = data[:size], data[size:]
+        if box_type == b"meta":
+            break
+        if box_type not in (b"ftyp", b"free", b"skip"):
+            return None
+
+    # meta is a full box, with version and flags before the boxes it contains.
+    boxes = dict(iter_boxes(box[12:]))
+    if b"pitm" not in boxes or b"iprp" not in boxes:
+        return None
+    pitm = boxes[b"pitm"]
+    primary_id = struct.unpack(">H", pitm[4:6])[0] if pitm[0] == 0 else struct.unpack(">I", pitm[4:8])[0]
+
+    properties: list[tuple[bytes, bytes]] = []
+    associations: dict[int, list[int]] = {}
+    for box_type, content in iter_boxes(boxes[b"iprp"]):
+        if box_type == b"ipco":
+            properties.extend(iter_boxes(content))
+        elif box_type == b"ipma":
+            associations.update(parse_ipma(content))
+
+    primary_properties = [properties[x - 1] for x in associations.get(primary_id, []) if 0 < x <= len(properties)]
+    sizes = [struct.unpack(">II", content[4:12]) for box_type, content in primary_properties if box_type == b"ispe"]
+    if not sizes or not sizes[0][0] or not sizes[0][1]:
+        return None
+    has_alpha = any(
+        box_type == b"auxC" and content[4:].split(b"\x00")[0] in AVIF_ALPHA_URNS for box_type, content in properties
+    )
+    return ImageHeader(sizes[0][0], sizes[0][1], "AVIF", "RGBA" if has_alpha else "RGB")
+
+
+def parse_ipma(content: bytes) -> dict[int, list[int]]:
+    version, flags = content[0], int.from_bytes(content[1:4], "big")
+    entry_count = struct.unpack(">I", content[4:8])[0]
+    offset = 8
+    associations: dict[int, list[int]] = {}
+    for _ in range(entry_count):
+        if version < 1:
+            item_id = struct.unpack(">H", content[offset : offset + 2])[0]
+            offset += 2
+        else:
+            item_id = struct.unpack(">I", content[offset : offset + 4])[0]
+            offset += 4
+        association_count = content[offset]
+        offset += 1
+        indexes = []
+        for _ in range(association_count):
+            if flags & 1:
+                indexes.append(struct.unpack(">H", content[offset : offset + 2])[0] & 0x7FFF)
+                offset += 2
+            else:
+                indexes.append(content[offset] & 0x7F)
+                offset += 1
+        associations[item_id] = indexes
+    return associations
+
+
+def probe_image_header(fp: typing.IO[bytes]) -> Optional[ImageHeader]:
+    """Reads the dimensions, format and mode from the header of a JPEG, PNG, GIF, WebP or AVIF image, without
+    decoding it. Values are the same that Pillow would report when opening the file. Returns None if the format is
+    not recognized or the header can't be parsed, the file position is left where reading stopped."""
+    reader = HeaderReader(fp)
+    try:
+        prefix = reader.read(16)
+        if prefix.startswith(b"\x89PNG\r\n\x1a\n"):
+            return probe_png(reader, prefix)
+        elif prefix.startswith(b"\xff\xd8"):
+            return probe_jpeg(reader, prefix)
+        elif prefix[:6] in (b"GIF87a", b"GIF89a"):
+            return probe_gif(reader, prefix)
+        elif prefix[:4] == b"RIFF" and prefix[8:12] == b"WEBP":
+            return probe_webp(reader, prefix)
+        elif prefix[4:8] == b"ftyp" and prefix[8:12] in AVIF_BRANDS:
+            return probe_avif(reader, prefix)
+    except (EOFError, struct.error, IndexError):
+        pass
+    return None
+
+
+def read_image_header(fp: typing.IO[bytes] | str) -> ImageHeader:
+    """Like probe_image_header, from the start of the file, using Pillow for files the probe can't handle.
+    Raises PIL.UnidentifiedImageError if the image can't be read."""
+    if isinstance(fp, str):
+        with open(fp, "rb") as image_file:
+            return read_image_header(image_file)
+
+    try:
+        fp.seek(0)
+    except (AttributeError, io.UnsupportedOperation):
+        # Same as Pillow does with streams that can't seek.
+        fp = io.BytesIO(fp.read())
+    header = probe_image_header(fp)
+    if header is not None:
+        return header
+    fp.seek(0)
+
+    with PImage.open(fp) as im:
+        return ImageHeader(im.size[0], im.size[1], im.format or "", im.mode)
@@ -1,11 +1,16 @@
+import copy
 import os
 import re
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import time
-from typing import Optional
+from typing import Optional, Any
 import typing
 
+from django.db import connections
+
 from core.base.comparison import get_gallery_closer_title_from_gallery_values, get_list_closer_gallery_titles_from_dict
 from core.base.setup_utilities import GeneralUtils
 from core.base.types import GalleryData, DataDict
@@ -17,6 +22,72 @@ if typing.TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+class ProviderRateLimiter:
+    """Spaces out the requests to each provider. Shared by every matcher and thread: each call reserves the next
+    free slot for its provider, so concurrent matchers for the same provider wait in turn."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.next_slot: dict[str, float] = {}
+
+    def wait(self, provider: str, interval: float, cancelled: Optional[threading.Event] = None) -> bool:
+        """Waits for the provider slot, the next one starts interval seconds later. False if cancelled meanwhile."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(provider, now))
+            self.next_slot[provider] = slot + interval
+        delay = slot - now
+        if delay > 0:
+            if cancelled:
+                return not cancelled.wait(delay)
+            time.sleep(delay)
+        return True
+
+    def postpone(self, provider: str, interval: float) -> None:
+        """The next request to the provider waits at least interval seconds from now."""
+        with self.lock:
+            self.next_slot[provider] = max(self.next_slot.get(provider, 0), time.monotonic() + interval)
+
+
+class SearchResultCache:
+    """Search results by matcher and search title, reused by files with the same search title until they expire."""
+
+    max_entries = 5000
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[str, str], tuple[float, Any]] = {}
+
+    def get(self, key: tuple[str, str]) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            return copy.deepcopy(entry[1])
+
+    def set(self, key: tuple[str, str], value: Any, timeout: float) -> None:
+        if timeout <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if len(self.entries) >= self.max_entries:
+                self.entries = {k: v for k, v in self.entries.items() if v[0] >= now}
+                if len(self.entries) >= self.max_entries:
+                    self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = (now + timeout, copy.deepcopy(value))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries = {}
+
+
+provider_rate_limiter = ProviderRateLimiter()
+search_result_cache = SearchResultCache()
+
+
 class Meta(type):
     name = ""
     provider = ""
@@ -52,6 +123,8 @@ class Matcher(metaclass=Meta):
         self.return_code: int = 0
         self.gallery_links: list[str] = []
         self.match_values: Optional[GalleryData] = None
+        # Set by MatcherPipeline when a higher priority matcher already matched.
+        self.cancelled: Optional[threading.Event] = None
 
     def __str__(self) -> str:
         return "{}_{}".format(self.provider, self.name)
@@ -60,10 +133,8 @@ class Matcher(metaclass=Meta):
 
         title_to_search = self.format_to_search_title(file_path)
 
-        if self.search_method(title_to_search):
-            if self.time_to_wait_after_compare > 0:
-                time.sleep(self.time_to_wait_after_compare)
-            galleries_data = self.get_metadata_after_matching()
+        galleries_data = self.search_and_fetch(title_to_search)
+        if galleries_data is not None:
             if not galleries_data:
                 return 0
             galleries_data = [
@@ -97,10 +168,8 @@ class Matcher(metaclass=Meta):
 
         logger.info("For matcher: {}, searching using title: {}.".format(str(self), title_to_search))
 
-        if self.search_method(title_to_search):
-            if self.time_to_wait_after_compare > 0:
-                time.sleep(self.time_to_wait_after_compare)
-            galleries_data = self.get_metadata_after_matching()
+        galleries_data = self.search_and_fetch(title_to_search)
+        if galleries_data is not None:
             if not galleries_data:
                 return results
             galleries_data = [
@@ -117,6 +186,50 @@ class Matcher(metaclass=Meta):
     def get_metadata_after_matching(self) -> Optional[list[GalleryData]]:
         return self.parser.fetch_multiple_gallery_data(self.gallery_links)
 
+    def wait_for_provider(self, interval: Optional[float] = None) -> bool:
+        """Waits for this provider's turn, the next request to it waits interval seconds, the provider's wait_timer
+        by default. False if cancelled."""
+        if interval is None:
+            interval = self.own_settings.wait_timer
+        return provider_rate_limiter.wait(self.provider, interval, self.cancelled)
+
+    def wait_for_search(self) -> bool:
+        """Waits for this provider's turn to search, the request after the search waits at least
+        time_to_wait_after_compare seconds. False if cancelled."""
+        return self.wait_for_provider(max(self.own_settings.wait_timer, self.time_to_wait_after_compare))
+
+    def search_and_fetch(self, title_to_search: str) -> Optional[list[GalleryData]]:
+        """search_method followed by get_metadata_after_matching, None if the search found nothing.
+
+        Title searches are memoised by matcher and search title for settings.matcher_cache_timeout seconds, files
+        with the same search title don't make any request.
+        """
+        cache_key = (str(self), title_to_search)
+        use_cache = self.type == "title"
+        if use_cache:
+            cached = search_result_cache.get(cache_key)
+            if cached is not None:
+                self.found_by, self.gallery_links, galleries_data = cached
+                return galleries_data
+
+        # Every request to the provider waits its wait_timer after the previous one, and the metadata request at
+        # least time_to_wait_after_compare seconds after the search.
+        if not self.wait_for_search():
+            return None
+        if not self.search_method(title_to_search):
+            provider_rate_limiter.postpone(self.provider, self.own_settings.wait_timer)
+            galleries_data = None
+        elif not self.wait_for_provider():
+            return None
+        else:
+            galleries_data = self.get_metadata_after_matching() or []
+
+        if use_cache:
+            search_result_cache.set(
+                cache_key, (self.found_by, self.gallery_links, galleries_data), self.settings.matcher_cache_timeout
+            )
+        return galleries_data
+
     def format_match_values(self) -> Optional[DataDict]:
         raise NotImplementedError
 
@@ -164,8 +277,8 @@ class Matcher(metaclass=Meta):
         elif not check_exists:
             self.settings.gallery_model.objects.add_from_values(gallery_data)
 
-    def start_match(self, file_path: str, crc32: str) -> bool:
-
+    def find_match(self, file_path: str, crc32: str) -> bool:
+        """Looks for a match without writing it to the database, see save_match."""
         self.file_path = file_path
         # self.file_title = self.get_title_from_path(file_path)
         self.crc32 = crc32
@@ -174,15 +287,99 @@ class Matcher(metaclass=Meta):
 
         self.return_code = self.get_closer_match(file_path)
 
-        if self.return_code == 0:
-            return False
+        return self.return_code != 0
 
+    def save_match(self) -> None:
         if self.match_values:
             self.update_gallery_db(self.match_values)
 
         self.update_archive()
+
+    def start_match(self, file_path: str, crc32: str) -> bool:
+
+        if not self.find_match(file_path, crc32):
+            return False
+
+        self.save_match()
         return True
 
     @staticmethod
     def get_title_from_path(path: str) -> str:
         return re.sub("[_]", " ", os.path.splitext(os.path.basename(path))[0])
+
+
+class MatcherPipeline:
+    """Runs the matchers for a file concurrently, the result is the same as trying them in priority order.
+
+    Providers are rate limited by ProviderRateLimiter, so matchers for different providers run at the same time and
+    the ones for the same provider take turns. When a matcher matches, the lower priority matchers are cancelled,
+    and the match is saved once every higher priority matcher failed.
+    """
+
+    def __init__(self, settings: "Settings", matchers: typing.Sequence[Matcher]) -> None:
+        self.settings = settings
+        self.matchers = list(matchers)
+
+    @staticmethod
+    def run_matcher(matcher: Matcher, file_path: str, crc32: str) -> bool:
+        try:
+            if matcher.cancelled and matcher.cancelled.is_set():
+                return False
+            logger.info("Matching with: {}".format(matcher))
+            return matcher.find_match(file_path, crc32)
+        finally:
+            connections.close_all()
+
+    def find_match(self, file_path: str, crc32: str) -> Optional[Matcher]:
+        """The highest priority matcher that matched the file, with its match saved. None if no matcher matched."""
+        if not self.matchers:
+            return None
+
+        if not self.settings.parallel_matchers or len(self.matchers) == 1:
+            for matcher in self.matchers:
+                logger.info("Matching with: {}".format(matcher))
+                if matcher.find_match(file_path, crc32):
+                    matcher.save_match()
+                    return matcher
+            return None
+
+        cancel_events = [threading.Event() for _ in self.matchers]
+        for matcher, cancel_event in zip(self.matchers, cancel_events):
+            matcher.cancelled = cancel_event
+
+        results: dict[int, bool] = {}
+        winner: Optional[Matcher] = None
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.matchers), thread_name_prefix="matcher") as executor:
+                futures = {
+                    executor.submit(self.run_matcher, matcher, file_path, crc32): i
+                    for i, matcher in enumerate(self.matchers)
+                }
+                pending = set(futures)
+                while pending and winner is None:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = futures[future]
+                        try:
+                            results[i] = future.result()
+                        except Exception:
+                            logger.exception("Error while matching with: {}".format(self.matchers[i]))
+                            results[i] = False
+                        if results[i]:
+                            for cancel_event in cancel_events[i + 1 :]:
+                                cancel_event.set()
+                    for i, matcher in enumerate(self.matchers):
+                        if i not in results:
+                            break
+                        if results[i]:
+                            winner = matcher
+                            break
+                for cancel_event in cancel_events:
+                    cancel_event.set()
+        finally:
+            for matcher in self.matchers:
+                matcher.cancelled = None
+
+        if winner is not None:
+            winner.save_match()
+        return winner
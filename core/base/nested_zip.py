@@ -0,0 +1,240 @@
+import io
+import lzma
+import shutil
+import struct
+import tempfile
+import typing
+import zipfile
+import zlib
+from typing import Optional, Union
+
+# Nested archives that are compressed are decompressed once, to a temporary file that stays in memory up to this size.
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+# Local file header of a zip member, without the file name and extra field that follow it.
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Errors raised reading the data of a member with an unsupported or corrupt compression, a bad zip like BadZipFile.
+MEMBER_READ_ERRORS = (NotImplementedError, lzma.LZMAError, zlib.error)
+
+
+def is_encrypted(info: zipfile.ZipInfo) -> bool:
+    return bool(info.flag_bits & 0x1)
+
+
+def check_not_encrypted(info: zipfile.ZipInfo) -> None:
+    """Raises BadZipFile for encrypted members, that ZipFile can't read without a password."""
+    if is_encrypted(info):
+        raise zipfile.BadZipFile("File {!r} is encrypted".format(info.filename))
+
+
+class FileSlice(io.RawIOBase):
+    """Read only view of a range of bytes of a file object. It seeks the file object before each read, so it can share
+    it with other slices and with the ZipFile that owns it."""
+
+    def __init__(self, fp: typing.IO[bytes], start: int, size: int) -> None:
+        super().__init__()
+        self.fp = fp
+        self.start = start
+        self.size = size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError("Invalid whence: {}".format(whence))
+        if position < 0:
+            raise ValueError("Negative seek position: {}".format(position))
+        self.position = position
+        return position
+
+    def readinto(self, buffer: typing.Any) -> int:
+        size = min(len(buffer), self.size - self.position)
+        if size <= 0:
+            return 0
+        self.fp.seek(self.start + self.position)
+        data = self.fp.read(size)
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class NestedZipReader:
+    """Opens the members of a zip file, and of the zip files inside it, as listed by get_images_from_zip.
+
+    Each nested zip file is opened once and kept open until the reader is closed. If it's stored without compression,
+    its members are read in place from the outer file, otherwise it's decompressed once to a temporary file. Reading
+    every page of an archive reads each nested zip file once, instead of once per page.
+    """
+
+    def __init__(self, zip_file: Union[str, zipfile.ZipFile]) -> None:
+        if isinstance(zip_file, zipfile.ZipFile):
+            self.zip = zip_file
+            self.owns_zip = False
+        else:
+            self.zip = zipfile.ZipFile(zip_file, "r")
+            self.owns_zip = True
+        self.nested_zips: dict[str, zipfile.ZipFile] = {}
+        self.temporary_files: list[typing.IO[bytes]] = []
+
+    def __enter__(self) -> "NestedZipReader":
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.close()
+
+    def zip_for(self, nested_zip_name: Optional[str]) -> zipfile.ZipFile:
+        if nested_zip_name is None:
+            return self.zip
+        if nested_zip_name not in self.nested_zips:
+            info = self.zip.getinfo(nested_zip_name)
+            check_not_encrypted(info)
+            nested_file: Optional[typing.IO[bytes]] = typing.cast(Optional[typing.IO[bytes]], self.stored_member(info))
+            if nested_file is None:
+                nested_file = typing.cast(typing.IO[bytes], tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE))
+                self.temporary_files.append(nested_file)
+                try:
+                    with self.zip.open(info) as member_file:
+                        shutil.copyfileobj(member_file, nested_file)
+                except MEMBER_READ_ERRORS as e:
+                    raise zipfile.BadZipFile("Bad data for file {!r}: {}".format(info.filename, e)) from e
+                nested_file.seek(0)
+            self.nested_zips[nested_zip_name] = zipfile.ZipFile(nested_file, "r")
+        return self.nested_zips[nested_zip_name]
+
+    def stored_member(self, info: zipfile.ZipInfo) -> Optional[FileSlice]:
+        """The data of a member stored without compression, as a slice of the outer file."""
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+        return raw_member_data(self.zip, info)
+
+    def open(self, member_name: str, nested_zip_name: Optional[str] = None) -> typing.IO[bytes]:
+        source = self.zip_for(nested_zip_name)
+        info = source.getinfo(member_name)
+        check_not_encrypted(info)
+        return source.open(info)
+
+    def getinfo(self, member_name: str, nested_zip_name: Optional[str] = None) -> zipfile.ZipInfo:
+        return self.zip_for(nested_zip_name).getinfo(member_name)
+
+    def extract(self, member_name: str, nested_zip_name: Optional[str], path: str) -> str:
+        source = self.zip_for(nested_zip_name)
+        info = source.getinfo(member_name)
+        check_not_encrypted(info)
+        return source.extract(info, path=path)
+
+    def copy(self, member_name: str, nested_zip_name: Optional[str], target: zipfile.ZipFile, arcname: str) -> None:
+        """Copies a member with copy_member. Members that can't be read, encrypted or with an unsupported or corrupt
+        compression, raise BadZipFile."""
+        source = self.zip_for(nested_zip_name)
+        info = source.getinfo(member_name)
+        check_not_encrypted(info)
+        try:
+            copy_member(source, info, target, arcname)
+        except MEMBER_READ_ERRORS as e:
+            raise zipfile.BadZipFile("Bad data for file {!r}: {}".format(member_name, e)) from e
+
+    def close(self) -> None:
+        for nested_zip in self.nested_zips.values():
+            nested_zip.close()
+        self.nested_zips = {}
+        for temporary_file in self.temporary_files:
+            temporary_file.close()
+        self.temporary_files = []
+        if self.owns_zip:
+            self.zip.close()
+
+
+def raw_member_data(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo) -> Optional[FileSlice]:
+    """The data of a member as it's written in the zip file, still compressed, as a slice of it. None for encrypted
+    members."""
+    if is_encrypted(info) or zip_file.fp is None:
+        return None
+    fp = zip_file.fp
+    fp.seek(info.header_offset)
+    header = fp.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size or not header.startswith(LOCAL_HEADER_SIGNATURE):
+        return None
+    # The header ends with the lengths of the file name and the extra field, that come before the data.
+    filename_length, extra_length = LOCAL_HEADER.unpack(header)[-2:]
+    data_offset = info.header_offset + LOCAL_HEADER.size + filename_length + extra_length
+    return FileSlice(fp, data_offset, info.compress_size)
+
+
+# Internals of ZipFile used to write a member without compressing it. When a Python version doesn't have them, members
+# are recompressed instead.
+RAW_COPY_ATTRIBUTES = ("_lock", "_writing", "_writecheck", "_didModify", "start_dir", "_seekable")
+
+
+def copy_member(source: zipfile.ZipFile, info: zipfile.ZipInfo, target: zipfile.ZipFile, arcname: str) -> None:
+    """Adds a member of a zip file to another one that is being written, copying its compressed data as it is instead of
+    decompressing and compressing it again. The data is checked against the CRC of the member while it's copied,
+    raising BadZipFile if it doesn't match. Members that are encrypted or use a compression other than deflate are
+    recompressed with the same method, as are all members if ZipFile doesn't have the internals needed to copy them."""
+    new_info = zipfile.ZipInfo(arcname, date_time=info.date_time)
+    new_info.compress_type = info.compress_type
+    new_info.external_attr = info.external_attr
+    new_info.create_system = info.create_system
+
+    data = raw_member_data(source, info)
+    target_fp = target.fp
+    if (
+        data is None
+        or target_fp is None
+        or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+        or not all(hasattr(target, x) for x in RAW_COPY_ATTRIBUTES)
+        or not target._seekable  # type: ignore[attr-defined]
+    ):
+        with source.open(info) as source_file, target.open(new_info, "w") as target_file:
+            shutil.copyfileobj(source_file, target_file, COPY_CHUNK_SIZE)
+        return
+
+    new_info.CRC = info.CRC
+    new_info.file_size = info.file_size
+    new_info.compress_size = info.compress_size
+    zip64 = info.file_size > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT
+    # Only used to check the CRC, the decompressed data is discarded.
+    decompressor = zlib.decompressobj(-15) if info.compress_type == zipfile.ZIP_DEFLATED else None
+    crc = 0
+
+    # The same steps as ZipFile.open in write mode, with the sizes and CRC known in advance.
+    with target._lock:  # type: ignore[attr-defined]
+        if target._writing:  # type: ignore[attr-defined]
+            raise ValueError("Can't write to the ZIP file while there is another write handle open on it.")
+        target_fp.seek(target.start_dir)
+        new_info.header_offset = target_fp.tell()
+        target._writecheck(new_info)  # type: ignore[attr-defined]
+        target._didModify = True  # type: ignore[attr-defined]
+        target_fp.write(new_info.FileHeader(zip64))
+        while chunk := data.read(COPY_CHUNK_SIZE):
+            if decompressor is None:
+                crc = zlib.crc32(chunk, crc)
+            else:
+                uncompressed = decompressor.decompress(chunk, COPY_CHUNK_SIZE)
+                while uncompressed:
+                    crc = zlib.crc32(uncompressed, crc)
+                    uncompressed = decompressor.decompress(decompressor.unconsumed_tail, COPY_CHUNK_SIZE)
+            target_fp.write(chunk)
+        if crc != info.CRC:
+            # Not added to the directory, and overwritten by the next member.
+            raise zipfile.BadZipFile("Bad CRC-32 for file {!r}".format(info.filename))
+        target.start_dir = target_fp.tell()
+        target.filelist.append(new_info)
+        target.NameToInfo[new_info.filename] = new_info
@@ -25,7 +25,7 @@ from viewer.signals import wanted_gallery_found
 if typing.TYPE_CHECKING:
     from core.downloaders.handlers import BaseDownloader
     from core.base.setup import Settings, ProvidersDict
-    from viewer.models import Gallery, WantedGallery, Archive
+    from viewer.models import Gallery, WantedGallery, Archive, TagResolver
     from core.base.types import ProviderSettings
     T_ProviderSettings = typing.TypeVar("T_ProviderSettings", bound=ProviderSettings)
 else:
@@ -56,14 +56,25 @@ class BaseParser(typing.Generic[T_ProviderSettings]):
         self.settings = settings
         self.own_settings: T_ProviderSettings = settings.providers[self.name]
         self.general_utils = setup_utilities.GeneralUtils(self.settings)
-        self.downloaders: list[tuple["BaseDownloader", int]] = self.settings.provider_context.get_downloaders(
-            self.settings, self.general_utils, filter_provider=self.name
-        )
+        self._downloaders: Optional[list[tuple["BaseDownloader", int]]] = None
         self.last_used_downloader: Optional["BaseDownloader"] = None
         self.time_taken_wanted: float = 0
         self.archive_callback: Optional[Callable[[Optional["Archive"], Optional[str], str], None]] = None
         self.gallery_callback: Optional[Callable[[Optional["Gallery"], Optional[str], str], None]] = None
 
+    # Downloaders are only created when the parser needs them, most parser instances are used just to filter URLs.
+    @property
+    def downloaders(self) -> list[tuple["BaseDownloader", int]]:
+        if self._downloaders is None:
+            self._downloaders = self.settings.provider_context.get_downloaders(
+                self.settings, self.general_utils, filter_provider=self.name
+            )
+        return self._downloaders
+
+    @downloaders.setter
+    def downloaders(self, value: list[tuple["BaseDownloader", int]]) -> None:
+        self._downloaders = value
+
     # We need this dispatcher because some provider have multiple ways of getting data (single, multiple),
     # or some have priorities (json fetch, crawl gallery page).
     # Each provider should set in this method how it needs to call everything, and could even check against a setting
@@ -454,6 +465,11 @@ class BaseParser(typing.Generic[T_ProviderSettings]):
                 downloaders_msg += " ({}, {})".format(downloader[0], downloader[1])
             logger.info(downloaders_msg)
 
+        # Tags from the whole list are read in one query, instead of once for each gallery saved by the downloaders.
+        tag_resolver = None
+        if self.settings.gallery_model:
+            tag_resolver = self.settings.gallery_model.objects.warm_tag_resolver(gallery_data_list)
+
         for i, gallery in enumerate(gallery_data_list, start=1):
             if (
                 self.last_used_downloader is not None
@@ -471,10 +487,14 @@ class BaseParser(typing.Generic[T_ProviderSettings]):
             logger.info("Working with gallery {} of {}".format(i, gallery_count))
             if self.settings.add_as_public:
                 gallery.public = True
-            self.work_gallery_data(gallery, gallery_wanted_lists, force_provider)
+            self.work_gallery_data(gallery, gallery_wanted_lists, force_provider, tag_resolver=tag_resolver)
 
     def work_gallery_data(
-        self, gallery: GalleryData, gallery_wanted_lists: dict[str, list["WantedGallery"]], force_provider: bool = False
+        self,
+        gallery: GalleryData,
+        gallery_wanted_lists: dict[str, list["WantedGallery"]],
+        force_provider: bool = False,
+        tag_resolver: Optional["TagResolver"] = None,
     ) -> None:
 
         if not self.settings.found_gallery_model:
@@ -523,7 +543,9 @@ class BaseParser(typing.Generic[T_ProviderSettings]):
                 logger.info("Link: {} detected as non-current, it will be added as deleted.".format(gallery.link))
 
         for cnt, downloader in enumerate(to_use_downloaders):
-            downloader[0].init_download(copy.deepcopy(gallery), wanted_gallery_list=gallery_wanted_lists[gallery.gid])
+            downloader[0].init_download(
+                copy.deepcopy(gallery), wanted_gallery_list=gallery_wanted_lists[gallery.gid], tag_resolver=tag_resolver
+            )
 
             if downloader[0].return_code == 1:
 
@@ -757,6 +779,9 @@ class InternalParser(BaseParser):
                     logger.info(discard_message)
                     found_galleries.add(found_gallery.gid)
 
+        galleries_to_save: list[GalleryData] = []
+        original_thumbnail_urls: dict[tuple[str, str], Optional[str]] = {}
+
         for count, gallery_data in enumerate(total_galleries_filtered):
 
             if gallery_data.gid in found_galleries:
@@ -790,14 +815,17 @@ class InternalParser(BaseParser):
             )
 
             if gallery_data.thumbnail:
-                original_thumbnail_url = gallery_data.thumbnail_url
+                original_thumbnail_urls[(gallery_data.gid, gallery_data.provider)] = gallery_data.thumbnail_url
 
                 gallery_data.thumbnail_url = gallery_data.thumbnail
 
-                gallery_instance = self.settings.gallery_model.objects.update_or_create_from_values(gallery_data)
+            galleries_to_save.append(gallery_data)
 
-                gallery_instance.thumbnail_url = original_thumbnail_url
+        for gallery_instance in self.settings.gallery_model.objects.bulk_update_or_create_from_values(
+            galleries_to_save
+        ):
+            gallery_key = (gallery_instance.gid, gallery_instance.provider)
+            if gallery_key in original_thumbnail_urls:
+                gallery_instance.thumbnail_url = original_thumbnail_urls[gallery_key]
 
                 gallery_instance.save()
-            else:
-                self.settings.gallery_model.objects.update_or_create_from_values(gallery_data)
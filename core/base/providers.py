@@ -1,7 +1,10 @@
 import importlib
 import inspect
 import logging
-from collections.abc import Callable
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
 from operator import itemgetter
 from types import ModuleType
 from typing import Optional, Union
@@ -63,6 +66,69 @@ def _get_provider_submodule(module_name: str, submodule_name: str) -> Optional[M
     return None
 
 
+class UrlRouter:
+    """Precompiled URL to parser dispatch table.
+
+    Parsers are kept in the same priority order used by get_parsers, and each URL is assigned to the first one that
+    accepts it, same as calling filter_accepted_urls on each parser in turn and removing what was accepted.
+    Parsers that use the default substring filter are folded into a single pattern, where each alternative is a named
+    group with the parser position, so a scan of the URL gives the best matching parser. Parsers that override
+    filter_accepted_urls are only asked for the URLs that didn't get a better parser from the pattern.
+    The parser instances are shared between requests, so they must only be used for read-only calls
+    (filter_accepted_urls, id_from_url, get_feed_urls), never to crawl.
+    """
+
+    def __init__(self, parsers: list["BaseParser"]) -> None:
+        self.parsers = parsers
+        self.parsers_by_name: dict[str, "BaseParser"] = {}
+        self.custom_filter_positions: list[int] = []
+        groups = []
+        for position, parser in enumerate(parsers):
+            self.parsers_by_name.setdefault(parser.name, parser)
+            if type(parser).filter_accepted_urls is not BaseParser.filter_accepted_urls:
+                self.custom_filter_positions.append(position)
+                continue
+            words = [re.escape(word) for word in parser.accepted_urls if word]
+            if words:
+                groups.append("(?P<p{}>{})".format(position, "|".join(words)))
+        if groups:
+            self.pattern: Optional[re.Pattern] = re.compile("|".join(groups))
+        else:
+            self.pattern = None
+
+    def pattern_position(self, url: str) -> int:
+        best = len(self.parsers)
+        if self.pattern:
+            # Alternatives at the same offset are tried in parser order, so restarting the search one character after
+            # each match start visits every offset where any parser matches, with its best parser.
+            match = self.pattern.search(url)
+            while match and best > 0:
+                if match.lastgroup:
+                    best = min(best, int(match.lastgroup[1:]))
+                match = self.pattern.search(url, match.start() + 1)
+        return best
+
+    def match(self, url: str) -> Optional["BaseParser"]:
+        routed = self.route((url,))
+        if routed:
+            return routed[0][0]
+        return None
+
+    def route(self, urls: Iterable[str]) -> list[tuple["BaseParser", list[str]]]:
+        best_positions = {url: self.pattern_position(url) for url in urls}
+        # Custom filters are called once per parser, with the URLs that don't have a better parser already.
+        for position in self.custom_filter_positions:
+            candidates = [url for url, best in best_positions.items() if best > position]
+            if candidates:
+                for url in self.parsers[position].filter_accepted_urls(candidates):
+                    best_positions[url] = position
+        routed: dict[int, list[str]] = {}
+        for url, best in best_positions.items():
+            if best < len(self.parsers):
+                routed.setdefault(best, []).append(url)
+        return [(self.parsers[position], routed[position]) for position in sorted(routed)]
+
+
 # We should only create one ProviderContext over the program lifetime,
 # to avoid having to search the file system every time it's created.
 # This is why this should be outside Settings
@@ -77,6 +143,11 @@ class ProviderContext:
     constants: list[tuple[str, ModuleType]] = []
     names: list[str] = []
 
+    # Routers (and their parser instances) are built once per Settings config generation.
+    url_routers: "OrderedDict[tuple[int, tuple[str, ...]], UrlRouter]" = OrderedDict()
+    url_routers_lock = threading.Lock()
+    max_url_routers = 8
+
     def register_providers(self, module_name_list: list[str]) -> None:
         for module_name in module_name_list:
             self.register_provider(module_name)
@@ -119,6 +190,8 @@ class ProviderContext:
         if inspect.isclass(obj):
             if obj.name and not obj.ignore:
                 self.parsers.append(obj)
+                with self.url_routers_lock:
+                    self.url_routers.clear()
 
     def register_matcher(self, obj: type["Matcher"]) -> None:
         if inspect.isclass(obj):
@@ -172,6 +245,27 @@ class ProviderContext:
 
         return parsers_list
 
+    def get_url_router(self, settings: "setup.Settings", filter_names: Optional[list[str]] = None) -> UrlRouter:
+        key = (settings.config_generation, tuple(filter_names) if filter_names else ())
+        with self.url_routers_lock:
+            router = self.url_routers.get(key)
+            if router is not None:
+                self.url_routers.move_to_end(key)
+                return router
+        router = UrlRouter(self.get_parsers(settings, filter_names=filter_names))
+        if not settings.config_generation:
+            return router
+        with self.url_routers_lock:
+            self.url_routers[key] = router
+            while len(self.url_routers) > self.max_url_routers:
+                self.url_routers.popitem(last=False)
+        return router
+
+    def get_shared_parsers(self, settings: "setup.Settings") -> list["BaseParser"]:
+        # Same order as get_parsers, but the instances are reused for the current config generation.
+        # Only for read-only calls, crawling must use new instances from get_parsers.
+        return self.get_url_router(settings).parsers
+
     def get_parsers_classes(self, filter_name: Optional[str] = None) -> list[type["BaseParser"]]:
         parsers_list = list()
         for parser in self.parsers:
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import itertools
 from copy import deepcopy
 
 import yaml
@@ -84,6 +85,7 @@ class GlobalInfo:
         ("web_queue", "Queue that processes gallery links, one at a time", "queue"),
         ("webcrawler", "Processes gallery links, can coexist with web_queue", "processor"),
         ("foldercrawler", "Processes galleries on the filesystem", "processor"),
+        ("scheduler_loop", "Dispatches the scheduled workers when they are due", "queue"),
         ("download_progress_checker", "Checks for progress on downloads", "processor"),
         ("post_downloader", "Transfers archives downloaded with other programs (torrent, hath)", "scheduler"),
         ("auto_wanted", "Parses providers for new galleries to create wanted galleries entries", "scheduler"),
@@ -160,7 +162,7 @@ class GalleryDLSettings:
 
 
 class CloningImageToolSettings:
-    __slots__ = ["enable", "name", "executable_path", "description", "file_filters", "extra_arguments"]
+    __slots__ = ["enable", "name", "executable_path", "description", "file_filters", "extra_arguments", "max_workers"]
 
     def __init__(self) -> None:
         self.enable: bool = False
@@ -169,6 +171,7 @@ class CloningImageToolSettings:
         self.description: str = ""
         self.file_filters: list[str] = []
         self.extra_arguments: list[str] = []
+        self.max_workers: int = 4
 
 
 class MailSettings:
@@ -198,11 +201,16 @@ class ElasticSearchSettings:
         "match_index_name",
         "only_index_public",
         "timeout",
+        "backend",
+        "location",
     ]
 
     def __init__(self) -> None:
         self.enable: bool = False
         self.enable_match: bool = False
+        # elasticsearch or embedded.
+        self.backend: str = "elasticsearch"
+        self.location: str = ""
         self.url: str = "http://127.0.0.1:9200/"
         self.max_result_window: int = 10000
         self.auto_refresh: bool = False
@@ -214,6 +222,30 @@ class ElasticSearchSettings:
         self.timeout: int = 20
 
 
+class CacheSettings:
+    __slots__ = ["enable", "backend", "location", "timeout", "max_entries"]
+
+    def __init__(self) -> None:
+        self.enable: bool = True
+        # locmem or file.
+        self.backend: str = "locmem"
+        self.location: str = ""
+        self.timeout: int = 300
+        self.max_entries: int = 2000
+
+
+class TokenSettings:
+    __slots__ = ["cache_size", "cache_seconds", "rate_limit", "count_flush_seconds"]
+
+    def __init__(self) -> None:
+        # Validated long-lived tokens kept in memory by each process.
+        self.cache_size: int = 1000
+        self.cache_seconds: int = 60
+        # Requests per minute for tokens without their own limit, 0 for no limit.
+        self.rate_limit: int = 0
+        self.count_flush_seconds: int = 60
+
+
 class WebServerSettings:
     __slots__ = [
         "bind_address",
@@ -224,6 +256,8 @@ class WebServerSettings:
         "write_access_log",
         "log_to_screen",
         "socket_file",
+        "stream_files",
+        "transfer_slots",
     ]
 
     def __init__(self) -> None:
@@ -235,6 +269,9 @@ class WebServerSettings:
         self.ssl_private_key: str = ""
         self.write_access_log: bool = False
         self.log_to_screen: bool = True
+        # Serve archives and thumbnails from Django when not behind a proxy, instead of redirecting to the media URL.
+        self.stream_files: bool = True
+        self.transfer_slots: int = 16
 
 
 class UrlSettings:
@@ -287,6 +324,8 @@ class Settings:
     wanted_gallery_model: Optional["typing.Type[WantedGallery]"] = None
     archive_manage_entry_model: Optional["typing.Type[ArchiveManageEntry]"] = None
     download_event_model: Optional["typing.Type[DownloadEvent]"] = None
+    # Each parsed config gets a new generation, used as the key for caches built from it.
+    config_generations = itertools.count(1)
 
     def __init__(
         self,
@@ -326,6 +365,7 @@ class Settings:
         self.STATIC_ROOT: str = ""
         self.django_secret_key: str = ""
         self.django_debug_mode: bool = False
+        self.django_query_budget_headers: bool = False
         self.download_handler: str = "local"
         self.temp_directory_path: Optional[str] = None
         # More specific, if not set, will use 'download_handler'
@@ -343,6 +383,10 @@ class Settings:
 
         self.elasticsearch = ElasticSearchSettings()
 
+        self.cache = CacheSettings()
+
+        self.tokens = TokenSettings()
+
         self.gallery_dl = GalleryDLSettings()
 
         self.monitored_links = MonitoredLinksSettings()
@@ -354,6 +398,7 @@ class Settings:
         self.timed_downloader_startup = False
         self.timed_downloader_cycle_timer: float = 5
         self.parallel_post_downloaders = 4
+        self.scheduler_workers = 4
         self.cherrypy_auto_restart = False
         self.add_as_public = False
 
@@ -409,9 +454,14 @@ class Settings:
 
         self.wait_timer = 6
         self.timeout_timer = 25
+        # Seconds that matcher search results are reused for the same search title.
+        self.matcher_cache_timeout = 600
+        # Run the matchers for a file at the same time, each provider keeps its own wait timer.
+        self.parallel_matchers = True
 
         self.fatal = 0
         self.default_dir = ""
+        self.config_generation = 0
 
         if load_from_disk:
             self.load_config_from_file(default_dir=default_dir)
@@ -420,6 +470,13 @@ class Settings:
             self.dict_to_settings(self.config)
             self.load_from_environment()
 
+    def copy_from_config(self) -> "Settings":
+        # Same as Settings(load_from_config=self.config), but the copy keeps this config generation, so the URL router
+        # and the shared parsers built for it are reused instead of being built again for every request.
+        new_settings = Settings(load_from_config=self.config)
+        new_settings.config_generation = self.config_generation
+        return new_settings
+
     def create_missing_directories(self):
         if self.archive_dl_folder:
             if not os.path.exists(os.path.join(self.MEDIA_ROOT, self.archive_dl_folder)):
@@ -641,6 +698,8 @@ class Settings:
                 self.django_secret_key = config["general"]["django_secret_key"]
             if "django_debug_mode" in config["general"]:
                 self.django_debug_mode = config["general"]["django_debug_mode"]
+            if "django_query_budget_headers" in config["general"]:
+                self.django_query_budget_headers = config["general"]["django_query_budget_headers"]
             if "download_handler" in config["general"]:
                 self.download_handler = config["general"]["download_handler"]
             if "download_handler_torrent" in config["general"]:
@@ -655,6 +714,10 @@ class Settings:
                 self.temp_directory_path = config["general"]["temp_directory_path"]
             if "wait_timer" in config["general"]:
                 self.wait_timer = config["general"]["wait_timer"]
+            if "matcher_cache_timeout" in config["general"]:
+                self.matcher_cache_timeout = config["general"]["matcher_cache_timeout"]
+            if "parallel_matchers" in config["general"]:
+                self.parallel_matchers = config["general"]["parallel_matchers"]
             if "timed_downloader_startup" in config["general"]:
                 self.timed_downloader_startup = config["general"]["timed_downloader_startup"]
             if "download_progress_checker_startup" in config["general"]:
@@ -665,6 +728,8 @@ class Settings:
                 self.timed_downloader_cycle_timer = config["general"]["timed_downloader_cycle_timer"]
             if "parallel_post_downloaders" in config["general"]:
                 self.parallel_post_downloaders = config["general"]["parallel_post_downloaders"]
+            if "scheduler_workers" in config["general"]:
+                self.scheduler_workers = config["general"]["scheduler_workers"]
             if "cherrypy_auto_restart" in config["general"]:
                 self.cherrypy_auto_restart = config["general"]["cherrypy_auto_restart"]
             if "discard_tags" in config["general"]:
@@ -719,6 +784,8 @@ class Settings:
                 self.cloning_image_tool.file_filters = config["cloning_image_tool"]["file_filters"]
             if "extra_arguments" in config["cloning_image_tool"]:
                 self.cloning_image_tool.extra_arguments = config["cloning_image_tool"]["extra_arguments"]
+            if "max_workers" in config["cloning_image_tool"]:
+                self.cloning_image_tool.max_workers = config["cloning_image_tool"]["max_workers"]
 
         if "experimental" in config and config["experimental"] is not None:
             self.experimental.update(config["experimental"])
@@ -795,6 +862,30 @@ class Settings:
                 self.elasticsearch.only_index_public = config["elasticsearch"]["only_index_public"]
             if "timeout" in config["elasticsearch"]:
                 self.elasticsearch.timeout = config["elasticsearch"]["timeout"]
+            if "backend" in config["elasticsearch"]:
+                self.elasticsearch.backend = config["elasticsearch"]["backend"]
+            if "location" in config["elasticsearch"]:
+                self.elasticsearch.location = config["elasticsearch"]["location"]
+        if "cache" in config:
+            if "enable" in config["cache"]:
+                self.cache.enable = config["cache"]["enable"]
+            if "backend" in config["cache"]:
+                self.cache.backend = config["cache"]["backend"]
+            if "location" in config["cache"]:
+                self.cache.location = config["cache"]["location"]
+            if "timeout" in config["cache"]:
+                self.cache.timeout = config["cache"]["timeout"]
+            if "max_entries" in config["cache"]:
+                self.cache.max_entries = config["cache"]["max_entries"]
+        if "tokens" in config:
+            if "cache_size" in config["tokens"]:
+                self.tokens.cache_size = config["tokens"]["cache_size"]
+            if "cache_seconds" in config["tokens"]:
+                self.tokens.cache_seconds = config["tokens"]["cache_seconds"]
+            if "rate_limit" in config["tokens"]:
+                self.tokens.rate_limit = config["tokens"]["rate_limit"]
+            if "count_flush_seconds" in config["tokens"]:
+                self.tokens.count_flush_seconds = config["tokens"]["count_flush_seconds"]
         if "gallery_dl" in config:
             if "executable_name" in config["gallery_dl"]:
                 self.gallery_dl.executable_name = config["gallery_dl"]["executable_name"]
@@ -870,6 +961,10 @@ class Settings:
                 self.webserver.write_access_log = config["webserver"]["write_access_log"]
             if "log_to_screen" in config["webserver"]:
                 self.webserver.log_to_screen = config["webserver"]["log_to_screen"]
+            if "stream_files" in config["webserver"]:
+                self.webserver.stream_files = config["webserver"]["stream_files"]
+            if "transfer_slots" in config["webserver"]:
+                self.webserver.transfer_slots = config["webserver"]["transfer_slots"]
         if "urls" in config:
             if "media_url" in config["urls"]:
                 self.urls.media_url = config["urls"]["media_url"]
@@ -925,3 +1020,5 @@ class Settings:
         for matcher, priority in self.provider_context.get_matchers_name_priority(self):
             if matcher not in self.matchers:
                 self.matchers[matcher] = -1
+
+        self.config_generation = next(self.config_generations)
@@ -78,16 +78,23 @@ class GeneralUtils:
             return base64.encodebytes(r.content).decode("utf-8")
 
 
+def get_running_worker_names() -> set[str]:
+    """Names of the running threads, and of the scheduled workers, that share the scheduler loop threads."""
+    from core.workers.schedulers import scheduler_loop
+
+    return {thread.name for thread in threading.enumerate()} | scheduler_loop.active_names()
+
+
 def get_thread_status() -> list[tuple[tuple[str, str, str], bool]]:
     info_list = []
     thread_names = set()
 
-    thread_list = threading.enumerate()
+    running_names = get_running_worker_names()
     for thread_info in setup.GlobalInfo.worker_threads:
-        info_list.append((thread_info, any([thread_info[0] == thread.name for thread in thread_list])))
+        info_list.append((thread_info, thread_info[0] in running_names))
         thread_names.add(thread_info[0])
 
-    for thread_data in thread_list:
+    for thread_data in threading.enumerate():
         if thread_data.name not in thread_names:
             info_list.append(((thread_data.name, "None", "other"), thread_data.is_alive()))
 
@@ -95,21 +102,15 @@ def get_thread_status() -> list[tuple[tuple[str, str, str], bool]]:
 
 
 def get_thread_status_bool() -> dict[str, bool]:
-    info_dict = {}
-
-    thread_list = threading.enumerate()
-    for thread_info in setup.GlobalInfo.worker_threads:
-        if any([thread_info[0] == thread.name for thread in thread_list]):
-            info_dict[thread_info[0]] = True
-        else:
-            info_dict[thread_info[0]] = False
-
-    return info_dict
+    running_names = get_running_worker_names()
+    return {thread_info[0]: thread_info[0] in running_names for thread_info in setup.GlobalInfo.worker_threads}
 
 
 def check_for_running_threads() -> bool:
-    thread_list = threading.enumerate()
-    for thread_name in setup.GlobalInfo.worker_threads:
-        if any([thread_name[0] == thread.name for thread in thread_list]):
-            return True
-    return False
+    running_names = get_running_worker_names()
+    # The scheduler loop itself keeps running, waiting for workers to be started again.
+    return any(
+        thread_info[0] in running_names
+        for thread_info in setup.GlobalInfo.worker_threads
+        if thread_info[0] != "scheduler_loop"
+    )
@@ -1,9 +1,10 @@
-import statistics
 from dataclasses import dataclass, field
 from datetime import datetime
 import typing
 from typing import Optional, Union, Any
 
+import numpy as np
+
 if typing.TYPE_CHECKING:
     from core.base.setup import Settings
 
@@ -203,6 +204,8 @@ class ArchiveGenericFile:
 
 @dataclass
 class ArchiveStatisticsCalculator:
+    """Per page values of an Archive, one column per attribute. The statistics are computed with array operations
+    over each column, ignoring the pages that have no value for it."""
     filesize: list[int] = field(default_factory=list)
     height: list[int] = field(default_factory=list)
     width: list[int] = field(default_factory=list)
@@ -210,6 +213,10 @@ class ArchiveStatisticsCalculator:
     is_horizontal: list[bool] = field(default_factory=list)
     file_type: list[str] = field(default_factory=list)
 
+    @classmethod
+    def from_columns(cls, **columns: typing.Iterable[typing.Any]) -> "ArchiveStatisticsCalculator":
+        return cls(**{attr: [x for x in values if x is not None] for attr, values in columns.items()})
+
     def set_values(
         self,
         filesize: int | None,
@@ -232,34 +239,33 @@ class ArchiveStatisticsCalculator:
         if file_type is not None:
             self.file_type.append(file_type)
 
-    def mean(self, attr: str) -> float | None:
+    def column(self, attr: str) -> np.ndarray:
         if hasattr(self, attr):
-            value = getattr(self, attr)
-            if len(value) < 1:
-                return None
-            return statistics.mean(value)
+            return np.asarray(getattr(self, attr))
         raise TypeError("Invalid attribute")
 
+    def mean(self, attr: str) -> float | None:
+        value = self.column(attr)
+        if value.size < 1:
+            return None
+        return float(value.mean())
+
     def mode(self, attr: str) -> typing.Any:
-        if hasattr(self, attr):
-            value = getattr(self, attr)
-            if len(value) < 1:
-                return None
-            return statistics.mode(value)
-        raise TypeError("Invalid attribute")
+        value = self.column(attr)
+        if value.size < 1:
+            return None
+        # Same as statistics.mode: on ties, the value that appears first.
+        _, first_positions, counts = np.unique(value, return_index=True, return_counts=True)
+        return value[first_positions[counts == counts.max()].min()].item()
 
     def stddev(self, attr: str) -> typing.Any:
-        if hasattr(self, attr):
-            value = getattr(self, attr)
-            if len(value) < 1:
-                return None
-            return statistics.pstdev(value)
-        raise TypeError("Invalid attribute")
+        value = self.column(attr)
+        if value.size < 1:
+            return None
+        return float(value.std())
 
     def eq_to_value(self, attr: str, compare: typing.Any) -> typing.Any:
-        if hasattr(self, attr):
-            value = getattr(self, attr)
-            if len(value) < 1:
-                return None
-            return len([x for x in value if x == compare])/len(value)
-        raise TypeError("Invalid attribute")
\ No newline at end of file
+        value = self.column(attr)
+        if value.size < 1:
+            return None
+        return np.count_nonzero(value == compare) / value.size
\ No newline at end of file
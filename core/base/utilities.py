@@ -2,6 +2,7 @@ import hashlib
 import heapq
 import html.entities
 import logging
+import lzma
 import os
 import re
 import shutil
@@ -15,15 +16,16 @@ from datetime import timedelta, datetime, timezone
 from difflib import SequenceMatcher
 from functools import wraps
 from itertools import tee, islice, chain
-from tempfile import mkdtemp
 from typing import Union, Optional, Any
 
 from ratelimit import limits, RateLimitException
 
+from core.base.nested_zip import MEMBER_READ_ERRORS, check_not_encrypted, is_encrypted
 from core.base.types import GalleryData, ArchiveGenericFile
 
 import rarfile
 import py7zr
+from py7zr.io import Py7zIO, WriterFactory
 
 import requests
 
@@ -39,7 +41,14 @@ WAYBACK_API_URL = "https://web.archive.org/cdx/search/cdx"
 
 ZIP_CONTAINER_REGEX = re.compile(r"(\.zip|\.cbz)$", re.IGNORECASE)
 IMAGES_REGEX = re.compile(r"(\.jpeg|\.jpg|\.png|\.gif|\.webp)$", re.IGNORECASE)
+COMPRESSED_FILES_REGEX = re.compile(
+    r"(\.jpeg|\.jpg|\.png|\.gif|\.webp|\.avif|\.jxl|\.zip|\.cbz|\.rar|\.cbr|\.7z|\.mp4|\.webm|\.mkv)$", re.IGNORECASE
+)
+STREAM_CHUNK_SIZE = 1024 * 1024
 ZIP_CONTAINER_EXTENSIONS = [".zip", ".cbz"]
+# Errors reading a zip or its members that mean it's a bad zip. Encrypted members are checked before opening them,
+# reading them raises a generic RuntimeError.
+BAD_ZIP_ERRORS = (zipfile.BadZipFile, *MEMBER_READ_ERRORS)
 
 REPLACE_CHARS = (
     ("\\", "＼"),
@@ -186,28 +195,44 @@ def get_images_from_zip(current_zip: zipfile.ZipFile) -> list[tuple[str, Optiona
         if IMAGES_REGEX.search(current_file):
             nested_files.append((current_file, None, current_file))
         elif ZIP_CONTAINER_REGEX.search(current_file):
-            with current_zip.open(current_file) as current_nested_zip_file:
-                try:
+            try:
+                check_not_encrypted(current_zip.getinfo(current_file))
+                with current_zip.open(current_file) as current_nested_zip_file:
                     nested_zip = zipfile.ZipFile(current_nested_zip_file, "r")
-                except zipfile.BadZipFile:
-                    continue
-                nested_filtered_files = list(
-                    filter(accept_images_only, sorted(nested_zip.namelist(), key=zfill_to_four))
-                )
-                found_files = [
-                    (x, current_file, "{}_{}".format(os.path.splitext(current_file)[0], x))
-                    for x in nested_filtered_files
-                ]
-                nested_files.extend(found_files)
-                nested_zip.close()
+                    nested_filtered_files = list(
+                        filter(accept_images_only, sorted(nested_zip.namelist(), key=zfill_to_four))
+                    )
+                    found_files = [
+                        (x, current_file, "{}_{}".format(os.path.splitext(current_file)[0], x))
+                        for x in nested_filtered_files
+                    ]
+                    nested_files.extend(found_files)
+                    nested_zip.close()
+            except BAD_ZIP_ERRORS:
+                continue
 
     return nested_files
 
 
+def first_bad_zip_member(current_zip: zipfile.ZipFile) -> Optional[str]:
+    """Like ZipFile.testzip, but encrypted members and members with corrupt compressed data are also returned as the
+    bad file, instead of raising."""
+    for zip_info in current_zip.infolist():
+        if is_encrypted(zip_info):
+            return zip_info.filename
+        try:
+            with current_zip.open(zip_info) as zip_member:
+                while zip_member.read(STREAM_CHUNK_SIZE):
+                    pass
+        except BAD_ZIP_ERRORS:
+            return zip_info.filename
+    return None
+
+
 def filecount_in_zip(filepath: str) -> int:
     try:
         my_zip = zipfile.ZipFile(filepath, "r")
-    except zipfile.BadZipFile:
+    except BAD_ZIP_ERRORS:
         return 0
 
     total_count = 0
@@ -218,14 +243,15 @@ def filecount_in_zip(filepath: str) -> int:
         if IMAGES_REGEX.search(current_file):
             total_count += 1
         elif ZIP_CONTAINER_REGEX.search(current_file):
-            with my_zip.open(current_file) as current_nested_zip_file:
-                try:
+            try:
+                check_not_encrypted(my_zip.getinfo(current_file))
+                with my_zip.open(current_file) as current_nested_zip_file:
                     nested_zip = zipfile.ZipFile(current_nested_zip_file, "r")
-                except zipfile.BadZipFile:
-                    continue
-                nested_files = list(filter(accept_images_only, nested_zip.namelist()))
-                total_count += len(nested_files)
-                nested_zip.close()
+                    nested_files = list(filter(accept_images_only, nested_zip.namelist()))
+                    total_count += len(nested_files)
+                    nested_zip.close()
+            except BAD_ZIP_ERRORS:
+                continue
 
     my_zip.close()
 
@@ -235,7 +261,7 @@ def filecount_in_zip(filepath: str) -> int:
 def get_zip_filesize(filepath: str) -> int:
     try:
         my_zip = zipfile.ZipFile(filepath, "r")
-    except zipfile.BadZipFile:
+    except BAD_ZIP_ERRORS:
         return -1
 
     total_size = 0
@@ -246,73 +272,160 @@ def get_zip_filesize(filepath: str) -> int:
         if IMAGES_REGEX.search(current_file_info.filename):
             total_size += int(current_file_info.file_size)
         elif ZIP_CONTAINER_REGEX.search(current_file_info.filename):
-            with my_zip.open(current_file_info.filename) as current_nested_zip_file:
-                try:
+            try:
+                check_not_encrypted(current_file_info)
+                with my_zip.open(current_file_info.filename) as current_nested_zip_file:
                     nested_zip = zipfile.ZipFile(current_nested_zip_file, "r")
-                except zipfile.BadZipFile:
-                    continue
-                nested_files = list(
-                    filter(accept_images_only_info, sorted(nested_zip.infolist(), key=lambda x: x.filename))
-                )
-                total_size += sum([x.file_size for x in nested_files])
-                nested_zip.close()
+                    nested_files = list(
+                        filter(accept_images_only_info, sorted(nested_zip.infolist(), key=lambda x: x.filename))
+                    )
+                    total_size += sum([x.file_size for x in nested_files])
+                    nested_zip.close()
+            except BAD_ZIP_ERRORS:
+                continue
 
     my_zip.close()
 
     return total_size
 
 
-def convert_rar_to_zip(filepath: str, temp_path: typing.Optional[str] = None) -> int:
-    try:
-        file_name = os.path.splitext(filepath)[0]
-        temp_rar_file = file_name + ".tar"
-        os.rename(filepath, temp_rar_file)
-        my_rar = rarfile.RarFile(temp_rar_file, "r")
+def new_zip_member_info(arcname: str, date_time: Optional[tuple[int, ...]], file_size: int) -> zipfile.ZipInfo:
+    if not date_time or date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    zip_info = zipfile.ZipInfo(arcname, date_time=date_time[:6])  # type: ignore[arg-type]
+    # Deflating images or other archives again doesn't reduce the size, it only costs CPU time.
+    if COMPRESSED_FILES_REGEX.search(arcname):
+        zip_info.compress_type = zipfile.ZIP_STORED
+    else:
+        zip_info.compress_type = zipfile.ZIP_DEFLATED
+    # Known sizes let zipfile decide if zip64 headers are needed before streaming.
+    zip_info.file_size = file_size
+    return zip_info
 
-    except (rarfile.BadRarFile, rarfile.NotRarFile):
-        return -1
 
-    new_zipfile = zipfile.ZipFile(filepath, "w")
-    dirpath = mkdtemp(dir=temp_path)
+class ZipMemberWriter(Py7zIO):
+    """Receives decompressed 7z data and writes it directly into an open zip member."""
 
-    filtered_files = list(filter(discard_zipfile_extra_files, sorted(my_rar.namelist())))
-    for filename in filtered_files:
-        my_rar.extract(filename, path=dirpath)
-        new_zipfile.write(os.path.join(dirpath, filename.replace("\\", "/")), arcname=os.path.basename(filename))
+    def __init__(self, zip_member: typing.IO[bytes]) -> None:
+        self.zip_member = zip_member
+        self.written = 0
 
-    my_rar.close()
-    new_zipfile.close()
+    def write(self, s: Union[bytes, bytearray]) -> int:
+        self.zip_member.write(s)
+        self.written += len(s)
+        return len(s)
 
-    os.remove(temp_rar_file)
-    shutil.rmtree(dirpath, ignore_errors=True)
-    return 0
+    def read(self, size: Optional[int] = None) -> bytes:
+        return b""
 
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return 0
 
-def convert_7z_to_zip(filepath: str, temp_path: typing.Optional[str] = None) -> int:
+    def flush(self) -> None:
+        pass
+
+    def size(self) -> int:
+        return self.written
+
+
+class ZipMemberWriterFactory(WriterFactory):
+    """py7zr decompresses sequentially when reading from a file object, each new member closes the previous one."""
+
+    def __init__(self, new_zipfile: zipfile.ZipFile, members_info: dict[str, tuple[Optional[tuple[int, ...]], int]]):
+        self.new_zipfile = new_zipfile
+        self.members_info = members_info
+        self.current_member: Optional[typing.IO[bytes]] = None
+
+    def create(self, filename: str) -> Py7zIO:
+        self.close_current_member()
+        arcname = os.path.basename(filename)
+        date_time, file_size = self.members_info.get(arcname, (None, 0))
+        self.current_member = self.new_zipfile.open(new_zip_member_info(arcname, date_time, file_size), "w")
+        return ZipMemberWriter(self.current_member)
+
+    def close_current_member(self) -> None:
+        if self.current_member is not None:
+            self.current_member.close()
+            self.current_member = None
+
+
+# temp_path is kept for compatibility, members are streamed without extracting them to disk.
+def convert_rar_to_zip(filepath: str, temp_path: typing.Optional[str] = None) -> int:
+    file_name = os.path.splitext(filepath)[0]
+    temp_rar_file = file_name + ".tar"
+    os.rename(filepath, temp_rar_file)
     try:
-        file_name = os.path.splitext(filepath)[0]
-        temp_7z_file = file_name + ".t7z"
-        os.rename(filepath, temp_7z_file)
-        my_7z = py7zr.SevenZipFile(temp_7z_file, "r")
+        my_rar = rarfile.RarFile(temp_rar_file, "r")
+    except rarfile.Error:
+        os.rename(temp_rar_file, filepath)
+        return -1
 
-    except py7zr.Bad7zFile:
+    try:
+        with zipfile.ZipFile(filepath, "w") as new_zipfile:
+            for rar_info in sorted(my_rar.infolist(), key=lambda x: x.filename):
+                if rar_info.is_dir() or not discard_zipfile_extra_files(rar_info.filename):
+                    continue
+                zip_info = new_zip_member_info(
+                    os.path.basename(rar_info.filename), rar_info.date_time, rar_info.file_size
+                )
+                # rarfile checks the member CRC when the stream is fully read.
+                with my_rar.open(rar_info) as rar_member, new_zipfile.open(zip_info, "w") as zip_member:
+                    shutil.copyfileobj(rar_member, zip_member, STREAM_CHUNK_SIZE)
+    except (rarfile.Error, OSError) as e:
+        logger.error("Could not convert rar file: {} to zip: {}".format(temp_rar_file, e))
+        my_rar.close()
+        os.remove(filepath)
+        os.rename(temp_rar_file, filepath)
         return -1
 
-    new_zipfile = zipfile.ZipFile(filepath, "w")
-    dirpath = mkdtemp(dir=temp_path)
+    my_rar.close()
+    os.remove(temp_rar_file)
+    return 0
 
-    filtered_files = list(filter(discard_zipfile_extra_files, sorted(my_7z.getnames())))
 
-    my_7z.extract(targets=filtered_files, path=dirpath)
+# temp_path is kept for compatibility, members are streamed without extracting them to disk.
+def convert_7z_to_zip(filepath: str, temp_path: typing.Optional[str] = None) -> int:
+    file_name = os.path.splitext(filepath)[0]
+    temp_7z_file = file_name + ".t7z"
+    os.rename(filepath, temp_7z_file)
 
-    for filename in filtered_files:
-        new_zipfile.write(os.path.join(dirpath, filename.replace("\\", "/")), arcname=os.path.basename(filename))
+    with open(temp_7z_file, "rb") as fp_7z:
+        try:
+            # Opening from a file object disables py7zr's parallel decompression, members arrive one at a time.
+            my_7z = py7zr.SevenZipFile(fp_7z, "r")
+        except (py7zr.Bad7zFile, py7zr.exceptions.PasswordRequired, lzma.LZMAError):
+            fp_7z.close()
+            os.rename(temp_7z_file, filepath)
+            return -1
+
+        members_info: dict[str, tuple[Optional[tuple[int, ...]], int]] = {
+            os.path.basename(x.filename): (
+                x.creationtime.timetuple()[:6] if x.creationtime else None,
+                x.uncompressed,
+            )
+            for x in my_7z.list()
+            if not x.is_directory
+        }
+        filtered_files = list(filter(discard_zipfile_extra_files, sorted(my_7z.getnames())))
 
-    my_7z.close()
-    new_zipfile.close()
+        try:
+            with zipfile.ZipFile(filepath, "w") as new_zipfile:
+                writer_factory = ZipMemberWriterFactory(new_zipfile, members_info)
+                try:
+                    my_7z.extract(targets=filtered_files, factory=writer_factory)
+                finally:
+                    writer_factory.close_current_member()
+        except (py7zr.exceptions.ArchiveError, py7zr.exceptions.PasswordRequired, lzma.LZMAError, OSError) as e:
+            logger.error("Could not convert 7z file: {} to zip: {}".format(temp_7z_file, e))
+            my_7z.close()
+            fp_7z.close()
+            os.remove(filepath)
+            os.rename(temp_7z_file, filepath)
+            return -1
+
+        my_7z.close()
 
     os.remove(temp_7z_file)
-    shutil.rmtree(dirpath, ignore_errors=True)
     return 0
 
 
@@ -329,6 +442,8 @@ def check_and_convert_to_zip(filepath: str, temp_path: typing.Optional[str] = No
         return "rar", 2
     except rarfile.NotRarFile:
         pass
+    except rarfile.Error:
+        return "rar", 1
     try:
         py7zr.SevenZipFile(filepath, "r")
         convert_7z_to_zip(filepath, temp_path)
@@ -336,6 +451,8 @@ def check_and_convert_to_zip(filepath: str, temp_path: typing.Optional[str] = No
     except py7zr.exceptions.Bad7zFile as e:
         if str(e) != "not a 7z file":
             return "unknown", 1
+    except (py7zr.exceptions.PasswordRequired, lzma.LZMAError):
+        return "7z", 1
     return "unknown", 1
     # zipfile.BadZipFile: File is not a zip file
     # rarfile.NotRarFile: Not a RAR file
@@ -347,7 +464,7 @@ def get_zip_fileinfo(
 ) -> tuple[int, int, Optional[list[ArchiveGenericFile]]]:
     try:
         my_zip = zipfile.ZipFile(filepath, "r")
-    except zipfile.BadZipFile:
+    except BAD_ZIP_ERRORS:
         return -1, -1, None
 
     total_size = 0
@@ -365,17 +482,18 @@ def get_zip_fileinfo(
             total_size += int(current_file_info.file_size)
             total_count += 1
         elif ZIP_CONTAINER_REGEX.search(current_file_info.filename):
-            with my_zip.open(current_file_info.filename) as current_nested_zip_file:
-                try:
+            try:
+                check_not_encrypted(current_file_info)
+                with my_zip.open(current_file_info.filename) as current_nested_zip_file:
                     nested_zip = zipfile.ZipFile(current_nested_zip_file, "r")
-                except zipfile.BadZipFile:
-                    continue
-                nested_files = list(
-                    filter(accept_images_only_info, sorted(nested_zip.infolist(), key=lambda x: x.filename))
-                )
-                total_count += len(nested_files)
-                total_size += sum([x.file_size for x in nested_files])
-                nested_zip.close()
+                    nested_files = list(
+                        filter(accept_images_only_info, sorted(nested_zip.infolist(), key=lambda x: x.filename))
+                    )
+                    total_count += len(nested_files)
+                    total_size += sum([x.file_size for x in nested_files])
+                    nested_zip.close()
+            except BAD_ZIP_ERRORS:
+                continue
         elif other_file_data is not None and not current_file_info.is_dir():
             file_generic_data = ArchiveGenericFile(
                 file_name=current_file_info.filename, file_size=int(current_file_info.file_size), position=index
@@ -390,7 +508,7 @@ def get_zip_fileinfo(
 def get_zip_fileinfo_for_gallery(filepath: str) -> tuple[int, int]:
     try:
         my_zip = zipfile.ZipFile(filepath, "r")
-    except zipfile.BadZipFile:
+    except BAD_ZIP_ERRORS:
         return -1, -1
 
     total_size = 0
@@ -403,17 +521,18 @@ def get_zip_fileinfo_for_gallery(filepath: str) -> tuple[int, int]:
             total_size += int(current_file_info.file_size)
             total_count += 1
         elif ZIP_CONTAINER_REGEX.search(current_file_info.filename):
-            with my_zip.open(current_file_info.filename) as current_nested_zip_file:
-                try:
+            try:
+                check_not_encrypted(current_file_info)
+                with my_zip.open(current_file_info.filename) as current_nested_zip_file:
                     nested_zip = zipfile.ZipFile(current_nested_zip_file, "r")
-                except zipfile.BadZipFile:
-                    continue
-                nested_files = list(
-                    filter(accept_images_only_info, sorted(nested_zip.infolist(), key=lambda x: x.filename))
-                )
-                total_count += len(nested_files)
-                total_size += sum([x.file_size for x in nested_files])
-                nested_zip.close()
+                    nested_files = list(
+                        filter(accept_images_only_info, sorted(nested_zip.infolist(), key=lambda x: x.filename))
+                    )
+                    total_count += len(nested_files)
+                    total_size += sum([x.file_size for x in nested_files])
+                    nested_zip.close()
+            except BAD_ZIP_ERRORS:
+                continue
 
     my_zip.close()
 
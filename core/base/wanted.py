@@ -0,0 +1,83 @@
+import typing
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Optional
+
+from viewer.models import Attribute, Provider, WantedGallery
+
+if typing.TYPE_CHECKING:
+    from viewer.models import AttributeManager
+
+
+class WantedCursor:
+    """High-water mark for an auto wanted query, listing its items from newest to oldest.
+
+    Stores the id of the newest item seen in the last complete run as the provider Attribute
+    wanted_cursor_<query_name>, so that the next run stops walking pages when it reaches it. The mark is only moved
+    forward when the run calls save, after having processed everything up to it, so a run that is interrupted is
+    repeated from the same point. Calling hold keeps the mark where it is for the current run, when some item
+    couldn't be processed and must be retried.
+    """
+
+    def __init__(self, attrs: "AttributeManager", provider: Provider, query_name: str, enabled: bool = True) -> None:
+        self.attrs = attrs
+        self.provider = provider
+        self.attribute_name = "wanted_cursor_{}".format(query_name)
+        # When disabled, for listings that aren't sorted by date or to process everything, it's not used nor moved.
+        self.enabled = enabled
+        last_seen = attrs.fetch_value(self.attribute_name) if enabled else None
+        self.last_seen: Optional[str] = last_seen if isinstance(last_seen, str) and last_seen else None
+        self.newest: Optional[str] = None
+        self.reached = False
+        self.held = False
+
+    def unseen(self, ids: list[str]) -> list[str]:
+        """The ids from a page that are newer than the mark. Pages must be passed in order."""
+        if self.newest is None and ids:
+            self.newest = ids[0]
+        if self.last_seen is not None and self.last_seen in ids:
+            self.reached = True
+            return ids[: ids.index(self.last_seen)]
+        return ids
+
+    def hold(self) -> None:
+        self.held = True
+
+    def save(self) -> None:
+        if not self.enabled or self.held or self.newest is None or self.newest == self.last_seen:
+            return
+        Attribute.objects.update_or_create(
+            provider=self.provider,
+            name=self.attribute_name,
+            defaults={"data_type": Attribute.TYPE_TEXT, "value_text": self.newest},
+        )
+        self.last_seen = self.newest
+
+
+class WantedGalleryLookup:
+    """Existing WantedGallery entries for the titles of a page, keyed by title and search title, fetched in a single
+    query. Entries created while processing the page must be added, for later items with the same title.
+
+    Keys that aren't found are looked up again in the database before returning nothing, since with a case or accent
+    insensitive collation it matches rows that don't have the exact key.
+    """
+
+    def __init__(self, title_field: str, titles: Iterable[Optional[str]]) -> None:
+        self.title_field = title_field
+        self.wanted_galleries: dict[tuple[str, str], list[WantedGallery]] = defaultdict(list)
+        titles = {x for x in titles if x}
+        if titles:
+            for wanted_gallery in WantedGallery.objects.filter(**{"{}__in".format(title_field): titles}):
+                self.add(wanted_gallery)
+
+    def get(self, title: str, search_title: str) -> list[WantedGallery]:
+        key = (title, search_title)
+        if key not in self.wanted_galleries:
+            self.wanted_galleries[key] = list(
+                WantedGallery.objects.filter(**{self.title_field: title}, search_title=search_title)
+            )
+        return self.wanted_galleries[key]
+
+    def add(self, wanted_gallery: WantedGallery) -> None:
+        key = (getattr(wanted_gallery, self.title_field), wanted_gallery.search_title)
+        self.wanted_galleries[key].append(wanted_gallery)
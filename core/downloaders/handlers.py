@@ -19,7 +19,7 @@ from core.base.types import GalleryData, TorrentClient, DataDict
 
 if typing.TYPE_CHECKING:
     from core.base.setup import Settings
-    from viewer.models import Gallery, Archive, WantedGallery, DownloadEvent
+    from viewer.models import Gallery, Archive, WantedGallery, DownloadEvent, TagResolver
     from core.base.types import ProviderSettings
     T_ProviderSettings = typing.TypeVar("T_ProviderSettings", bound=ProviderSettings)
 else:
@@ -58,6 +58,7 @@ class BaseDownloader(typing.Generic[T_ProviderSettings], metaclass=Meta):
         self.gallery: Optional[GalleryData] = None
         self.download_id: Optional[str] = None
         self.download_event: Optional["DownloadEvent"] = None
+        self.tag_resolver: Optional["TagResolver"] = None
 
     def __str__(self) -> str:
         return "{}_{}".format(self.provider, self.type)
@@ -87,7 +88,9 @@ class BaseDownloader(typing.Generic[T_ProviderSettings], metaclass=Meta):
             self.original_gallery.status = gallery_model.StatusChoices.NO_METADATA
         if self.settings.gallery_reason:
             self.original_gallery.reason = self.settings.gallery_reason
-        self.gallery_db_entry = gallery_model.objects.update_or_create_from_values(self.original_gallery)
+        self.gallery_db_entry = gallery_model.objects.update_or_create_from_values(
+            self.original_gallery, tag_resolver=self.tag_resolver
+        )
         if self.gallery_db_entry:
             # TODO: Investigate why we need a new update_index here to push to ES index.
             self.gallery_db_entry.update_index()
@@ -209,10 +212,16 @@ class BaseDownloader(typing.Generic[T_ProviderSettings], metaclass=Meta):
         return download_event
         # result, torrent_id
 
-    def init_download(self, gallery: GalleryData, wanted_gallery_list: Optional[list["WantedGallery"]] = None) -> None:
+    def init_download(
+        self,
+        gallery: GalleryData,
+        wanted_gallery_list: Optional[list["WantedGallery"]] = None,
+        tag_resolver: Optional["TagResolver"] = None,
+    ) -> None:
 
         self.original_gallery = copy.deepcopy(gallery)
         self.gallery = gallery
+        self.tag_resolver = tag_resolver
 
         self.original_gallery.dl_type = self.type
         self.start_download()
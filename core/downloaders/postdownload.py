@@ -10,7 +10,7 @@ from dataclasses import dataclass
 from ftplib import FTP_TLS
 from tempfile import mkdtemp
 from typing import Any, Optional, TypeVar
-from zipfile import ZipFile, BadZipFile
+from zipfile import ZipFile
 
 import django.utils.timezone as django_tz
 import threading
@@ -20,7 +20,13 @@ from django.template.defaultfilters import filesizeformat
 import re
 
 from core.base.setup import Settings
-from core.base.utilities import convert_rar_to_zip, replace_illegal_name, convert_7z_to_zip
+from core.base.utilities import (
+    BAD_ZIP_ERRORS,
+    convert_rar_to_zip,
+    first_bad_zip_member,
+    replace_illegal_name,
+    convert_7z_to_zip,
+)
 from core.providers.panda.parsers import Parser as PandaParser
 from core.workers.schedulers import BaseScheduler
 from viewer.models import Archive, ArchiveManageEntry
@@ -62,9 +68,9 @@ class PostDownloader(object):
             return_error = None
             try:
                 my_zip = ZipFile(archive.zipped.path, "r")
-                return_error = my_zip.testzip()
+                return_error = first_bad_zip_member(my_zip)
                 my_zip.close()
-            except (BadZipFile, NotImplementedError):
+            except BAD_ZIP_ERRORS:
                 except_at_open = True
             if except_at_open or return_error:
                 if archive.source_type and "panda" in archive.source_type:
@@ -74,7 +80,7 @@ class PostDownloader(object):
                     )
                     archive.save()
                     if self.web_queue and archive.gallery:
-                        temp_settings = Settings(load_from_config=self.settings.config)
+                        temp_settings = self.settings.copy_from_config()
                         temp_settings.allow_downloaders_only(["panda_archive"], True, True, True)
                         if archive.reason:
                             temp_settings.archive_reason = archive.reason
@@ -130,7 +136,7 @@ class PostDownloader(object):
                         "downloading again from panda_archive.".format(archive)
                     )
                     if self.web_queue:
-                        temp_settings = Settings(load_from_config=self.settings.config)
+                        temp_settings = self.settings.copy_from_config()
                         temp_settings.allow_downloaders_only(["panda_archive"], True, True, True)
                         if archive.reason:
                             temp_settings.archive_reason = archive.reason
@@ -167,7 +173,7 @@ class PostDownloader(object):
                                 )
                                 archive.save()
                                 if self.web_queue and archive.gallery:
-                                    temp_settings = Settings(load_from_config=self.settings.config)
+                                    temp_settings = self.settings.copy_from_config()
                                     temp_settings.allow_downloaders_only(["panda_archive"], True, True, True)
                                     if archive.reason:
                                         temp_settings.archive_reason = archive.reason
@@ -780,45 +786,39 @@ class TimedPostDownloader(BaseScheduler):
     def timer_to_seconds(timer: float) -> float:
         return timer * 60
 
-    def job(self) -> None:
-        while not self.stop.is_set():
-            seconds_to_wait = self.wait_until_next_run()
-            if self.stop.wait(timeout=seconds_to_wait):
-                self.post_downloader = {}
-                return
-
-            found_archives = Archive.objects.filter_by_dl_remote()
-            if found_archives:
+    def run(self) -> None:
+        found_archives = Archive.objects.filter_by_dl_remote()
+        if found_archives:
 
-                logger.info(
-                    "Looking for missing files downloaded by hath ({:d}) and torrent ({:d}).".format(
-                        len([x for x in found_archives if "hath" in x.match_type]),
-                        len([x for x in found_archives if "torrent" in x.match_type]),
-                    )
+            logger.info(
+                "Looking for missing files downloaded by hath ({:d}) and torrent ({:d}).".format(
+                    len([x for x in found_archives if "hath" in x.match_type]),
+                    len([x for x in found_archives if "torrent" in x.match_type]),
                 )
-                for archive in found_archives:
-                    self.post_queue.put(archive)
-                thread_array = []
-
-                for x in range(1, self.parallel_post_downloaders + 1):
-                    post_downloader = PostDownloader(self.settings, web_queue=self.web_queue)
-                    self.post_downloader[x] = post_downloader
-                    post_download_thread = threading.Thread(
-                        name="{}-{}".format(self.thread_name, x),
-                        target=self.start_post_downloader,
-                        args=(post_downloader,),
-                    )
-                    post_download_thread.daemon = True
-                    post_download_thread.start()
-                    thread_array.append(post_download_thread)
+            )
+            for archive in found_archives:
+                self.post_queue.put(archive)
+            thread_array = []
+
+            for x in range(1, self.parallel_post_downloaders + 1):
+                post_downloader = PostDownloader(self.settings, web_queue=self.web_queue)
+                self.post_downloader[x] = post_downloader
+                post_download_thread = threading.Thread(
+                    name="{}-{}".format(self.thread_name, x),
+                    target=self.start_post_downloader,
+                    args=(post_downloader,),
+                )
+                post_download_thread.daemon = True
+                post_download_thread.start()
+                thread_array.append(post_download_thread)
 
-                for thread in thread_array:
-                    thread.join()
+            for thread in thread_array:
+                thread.join()
 
-                self.post_downloader = {}
-                logger.info("All downloader threads finished.")
+            self.post_downloader = {}
+            logger.info("All downloader threads finished.")
 
-            self.update_last_run(django_tz.now())
+        self.update_last_run(django_tz.now())
 
     def start_post_downloader(self, post_downloader: PostDownloader) -> None:
         while True:
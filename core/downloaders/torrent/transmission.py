@@ -94,7 +94,7 @@ class Transmission(TorrentClient):
             return []
 
         torrent_ids: list[int | str] = [int(x[0]) for x in download_list]
-        torrents = self.trans.get_torrents(torrent_ids, timeout=25)
+        torrents = self.trans.get_torrents(torrent_ids, arguments=["id", "percentDone"], timeout=25)
 
         torrent_progress = {x.id: x.progress for x in torrents}
 
@@ -6,13 +6,13 @@ import re
 import time
 import argparse
 from typing import Union, NoReturn
-from zipfile import BadZipFile
 from zipfile import ZipFile
 
 from core.base.comparison import get_closer_gallery_title_from_list
 from core.base.setup import Settings
+from core.base.matchers import MatcherPipeline
 from core.base.types import DataDict
-from core.base.utilities import calc_crc32, get_zip_fileinfo, replace_illegal_name
+from core.base.utilities import BAD_ZIP_ERRORS, calc_crc32, first_bad_zip_member, get_zip_fileinfo, replace_illegal_name
 
 from viewer.models import Archive, Gallery
 
@@ -445,6 +445,7 @@ class FolderCrawler(object):
             matchers_list = self.settings.provider_context.get_matchers(self.settings)
             for matcher in matchers_list:
                 logger.info("Using matcher {} with a priority of {}".format(matcher[0].name, matcher[1]))
+            matcher_pipeline = MatcherPipeline(self.settings, [x[0] for x in matchers_list])
 
             for cnt, filepath in enumerate(files):
 
@@ -477,9 +478,9 @@ class FolderCrawler(object):
                     return_error = None
                     try:
                         my_zip = ZipFile(os.path.join(self.settings.MEDIA_ROOT, filepath), "r")
-                        return_error = my_zip.testzip()
+                        return_error = first_bad_zip_member(my_zip)
                         my_zip.close()
-                    except (BadZipFile, NotImplementedError):
+                    except BAD_ZIP_ERRORS:
                         except_at_open = True
                     if except_at_open or return_error:
                         logger.warning("File check on zipfile failed on file: {}, marking as corrupt.".format(filepath))
@@ -554,22 +555,13 @@ class FolderCrawler(object):
                 match_link = ""
                 match_count = 0
 
-                for i, matcher in enumerate(matchers_list):
-                    if i > 0:
-                        current_provider = matchers_list[i][0].provider
-                        # wait always in current_provider, independently of last used provider
-                        if current_provider in self.settings.providers:
-                            time.sleep(self.settings.providers[current_provider].wait_timer)
-                        else:
-                            time.sleep(self.settings.wait_timer)
-                    logger.info("Matching with: {}".format(matcher[0]))
-                    if matcher[0].start_match(filepath, crc32):
-                        match_type = matcher[0].found_by
-                        match_title = matcher[0].match_title or ""
-                        match_link = matcher[0].match_link or ""
-                        match_count = matcher[0].match_count
-                        match_result = True
-                        break
+                matched_by = matcher_pipeline.find_match(filepath, crc32)
+                if matched_by:
+                    match_type = matched_by.found_by
+                    match_title = matched_by.match_title or ""
+                    match_link = matched_by.match_link or ""
+                    match_count = matched_by.match_count
+                    match_result = True
 
                 end_time = time.perf_counter()
 
@@ -1,6 +1,5 @@
 import logging
 import os
-import time
 from datetime import datetime, timezone
 from typing import Optional
 from urllib.parse import urljoin
@@ -35,9 +34,10 @@ class BaseExactMatcher(Matcher):
 
         title_to_search = self.format_to_search_title(file_path)
 
+        # The search returns the gallery data, it's the only request.
+        if not self.wait_for_search():
+            return 0
         if self.search_method(title_to_search):
-            if self.time_to_wait_after_compare > 0:
-                time.sleep(self.time_to_wait_after_compare)
             galleries_data = self.values_array
             self.values_array = []
             if not galleries_data:
@@ -67,9 +67,9 @@ class BaseExactMatcher(Matcher):
         self.values_array = []
         results: list[MatchesValues] = []
 
+        if not self.wait_for_search():
+            return results
         if self.search_method(self.format_to_search_title(zip_path)):
-            if self.time_to_wait_after_compare > 0:
-                time.sleep(self.time_to_wait_after_compare)
             galleries_data = self.values_array
             self.values_array = []
             if galleries_data:
@@ -8,6 +8,7 @@ from bs4 import BeautifulSoup
 
 from core.base.types import DataDict
 from core.base.utilities import request_with_retries, format_title_to_wanted_search, construct_request_dict
+from core.base.wanted import WantedCursor, WantedGalleryLookup
 from viewer.models import Gallery, WantedGallery, Provider, Artist
 from . import constants
 
@@ -39,6 +40,17 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
 
     parser = settings.provider_context.get_parsers(settings, filter_name=constants.provider_name)[0]
 
+    # If the amount of galleries present in database is equal to what we get from the page,
+    # we assume we already processed everything. You can force to process everything by using:
+    force_process, force_created = attrs.get_or_create(
+        provider=provider,
+        name="force_process",
+        data_type="bool",
+        defaults={
+            "value_bool": False,
+        },
+    )
+
     rounds = 0
 
     # Values that can be set:
@@ -49,6 +61,9 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
     # link_attribute_get_text: Boolean to specify if it should get the text inside a tag. (True, False)
     for query_name, query_values in queries.items():
 
+        cursor = WantedCursor(attrs, provider, query_name, enabled=not force_process.value)
+        wanted_reason = attrs.fetch_value("wanted_reason_{}".format(query_name))
+
         while True:
 
             rounds += 1
@@ -146,34 +161,27 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
                 break
 
             # Listen to what the server says
+            gallery_gids = cursor.unseen(gallery_gids)
 
-            used = Gallery.objects.filter(gid__in=gallery_gids, provider=constants.provider_name)
-
-            # If the amount of galleries present in database is equal to what we get from the page,
-            # we assume we already processed everything. You can force to process everything by using:
-            force_process, force_created = attrs.get_or_create(
-                provider=provider,
-                name="force_process",
-                data_type="bool",
-                defaults={
-                    "value_bool": False,
-                },
+            used_gids = set(
+                Gallery.objects.filter(gid__in=gallery_gids, provider=constants.provider_name).values_list(
+                    "gid", flat=True
+                )
             )
 
             logger.info(
-                "Page has {} galleries, from which {} are already present in the database.".format(
-                    len(gallery_gids), used.count()
+                "Page has {} new galleries, from which {} are already present in the database.".format(
+                    len(gallery_gids), len(used_gids)
                 )
             )
 
-            if not force_process.value and used.count() == len(gallery_gids):
+            if not force_process.value and len(used_gids) == len(gallery_gids):
                 logger.info(
                     "Got to page {}, it has already been processed entirely, stopping".format(query_values["page"])
                 )
+                cursor.save()
                 break
 
-            used_gids = used.values_list("gid", flat=True)
-
             for gallery_gid in gallery_gids:
                 if gallery_gid not in used_gids:
                     gallery_link = urllib.parse.urljoin(constants.main_url, "/" + gallery_gid)
@@ -190,12 +198,17 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
                 )
                 break
 
+            if len(api_galleries) < len(gallery_links):
+                # The ones missing are fetched again on the next run.
+                cursor.hold()
+
+            wanted_lookup = WantedGalleryLookup("title", [x.title for x in api_galleries])
+
             for gallery_data in api_galleries:
                 if gallery_data.gid not in used_gids:
                     if not gallery_data.dl_type:
                         gallery_data.dl_type = "auto_wanted"
                     gallery_data.reason = "backup"
-                    wanted_reason = attrs.fetch_value("wanted_reason_{}".format(query_name))
                     if isinstance(wanted_reason, str):
                         gallery_data.reason = wanted_reason or "backup"
                     gallery = Gallery.objects.add_from_values(gallery_data)
@@ -211,9 +224,7 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
 
                     search_title = format_title_to_wanted_search(gallery.title)
 
-                    wanted_galleries: typing.Iterable[WantedGallery] = WantedGallery.objects.filter(
-                        title=gallery.title, search_title=search_title
-                    )
+                    wanted_galleries: typing.Iterable[WantedGallery] = wanted_lookup.get(gallery.title, search_title)
 
                     if not wanted_galleries:
 
@@ -289,6 +300,7 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
                             )
                         )
 
+                        wanted_lookup.add(wanted_gallery)
                         wanted_galleries = [wanted_gallery]
 
                     for wanted_gallery in wanted_galleries:
@@ -305,6 +317,15 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
 
             # galleries.extend(api_galleries)
 
+            if cursor.reached:
+                logger.info(
+                    "Got to page {}, and reached the newest gallery from the previous run, stopping".format(
+                        query_values["page"]
+                    )
+                )
+                cursor.save()
+                break
+
             # API returns 25 max results per query, so if we get 24 or less, means there's no more pages.
             # API Manual says 25, but we get 50 results normally!
             if len(api_galleries) < 1:
@@ -312,6 +333,7 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
                     "Got to page {}, and we got less than 1 gallery, "
                     "meaning there is no more pages, stopping".format(query_values["page"])
                 )
+                cursor.save()
                 break
 
             query_values["page"] += 1
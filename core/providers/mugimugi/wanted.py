@@ -7,6 +7,7 @@ import django.utils.timezone as django_tz
 
 from core.base.types import DataDict
 from core.base.utilities import request_with_retries, format_title_to_wanted_search, construct_request_dict
+from core.base.wanted import WantedCursor, WantedGalleryLookup
 from core.providers.mugimugi.utilities import convert_api_response_text_to_gallery_dicts
 from viewer.models import Gallery, WantedGallery, Provider, Artist
 from . import constants
@@ -50,8 +51,32 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
     for query_name, slist_params in queries_slist_params.items():
         queries[query_name].update({"slist": "|".join(slist_params)})
 
+    provider, provider_created = Provider.objects.get_or_create(
+        slug=constants.provider_name, defaults={"name": constants.provider_name}
+    )
+
+    # If the amount of galleries present in database is equal to what we get from the page,
+    # we assume we already processed everything. You can force to process everything by using:
+    force_process, force_created = attrs.get_or_create(
+        provider=provider,
+        name="force_process",
+        data_type="bool",
+        defaults={
+            "value_bool": False,
+        },
+    )
+
     for query_name, query_values in queries.items():
 
+        # Results are newest first only with the default order, otherwise every page must be checked.
+        cursor = WantedCursor(
+            attrs,
+            provider,
+            query_name,
+            enabled=not force_process.value and query_values["order"] == "added" and query_values["flow"] == "DESC",
+        )
+        wanted_reason = attrs.fetch_value("wanted_reason_{}".format(query_name))
+
         while True:
             # Read the values from the newly created Provider Model,
             # that should be created like this (extracted from from):
@@ -126,10 +151,6 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
 
             link = "{}/api/{}/?{}".format(constants.main_page, own_settings.api_key, new_query)
 
-            provider, provider_created = Provider.objects.get_or_create(
-                slug=constants.provider_name, defaults={"name": constants.provider_name}
-            )
-
             remaining_queries, int_created = attrs.get_or_create(
                 provider=provider,
                 name="remaining_queries",
@@ -203,40 +224,37 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
             remaining_queries.value = api_galleries[0].queries
             remaining_queries.save()
 
-            used = Gallery.objects.filter(gid__in=[x.gid for x in api_galleries], provider=constants.provider_name)
+            page_galleries_count = len(api_galleries)
+            unseen_gids = set(cursor.unseen([x.gid for x in api_galleries]))
+            api_galleries = [x for x in api_galleries if x.gid in unseen_gids]
 
-            # If the amount of galleries present in database is equal to what we get from the page,
-            # we assume we already processed everything. You can force to process everything by using:
-            force_process, force_created = attrs.get_or_create(
-                provider=provider,
-                name="force_process",
-                data_type="bool",
-                defaults={
-                    "value_bool": False,
-                },
+            used_gids = set(
+                Gallery.objects.filter(gid__in=unseen_gids, provider=constants.provider_name).values_list(
+                    "gid", flat=True
+                )
             )
 
             logger.info(
-                "For provider {}: Page has {} galleries, from which {} are already present in the database.".format(
-                    constants.provider_name, len(api_galleries), used.count()
+                "For provider {}: Page has {} new galleries, from which {} are already present in the database.".format(
+                    constants.provider_name, len(api_galleries), len(used_gids)
                 )
             )
 
-            if not force_process.value and used.count() == len(api_galleries):
+            if not force_process.value and len(used_gids) == len(api_galleries):
                 logger.info(
                     "For provider {}: Got to page {}, it has already been processed entirely, stopping".format(
                         constants.provider_name, query_values["page"]
                     )
                 )
+                cursor.save()
                 break
 
-            used_gids = used.values_list("gid", flat=True)
+            wanted_lookup = WantedGalleryLookup("title_jpn", [x.title_jpn for x in api_galleries])
 
             for gallery_data in api_galleries:
                 if gallery_data.gid not in used_gids:
                     if not gallery_data.dl_type:
                         gallery_data.dl_type = "auto_wanted"
-                    wanted_reason = attrs.fetch_value("wanted_reason_{}".format(query_name))
                     if isinstance(wanted_reason, str):
                         gallery_data.reason = wanted_reason or "backup"
                     gallery = Gallery.objects.add_from_values(gallery_data)
@@ -252,8 +270,8 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
 
                     search_title = format_title_to_wanted_search(gallery.title_jpn)
 
-                    wanted_galleries: typing.Iterable[WantedGallery] = WantedGallery.objects.filter(
-                        title_jpn=gallery.title_jpn, search_title=search_title
+                    wanted_galleries: typing.Iterable[WantedGallery] = wanted_lookup.get(
+                        gallery.title_jpn, search_title
                     )
 
                     if not wanted_galleries:
@@ -324,6 +342,7 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
                             )
                         )
 
+                        wanted_lookup.add(wanted_gallery)
                         wanted_galleries = [wanted_gallery]
 
                     for wanted_gallery in wanted_galleries:
@@ -340,13 +359,23 @@ def wanted_generator(settings: "Settings", attrs: "AttributeManager"):
 
             # galleries.extend(api_galleries)
 
+            if cursor.reached:
+                logger.info(
+                    "Got to page {}, and reached the newest gallery from the previous run, stopping".format(
+                        query_values["page"]
+                    )
+                )
+                cursor.save()
+                break
+
             # API returns 25 max results per query, so if we get 24 or less, means there's no more pages.
             # API Manual says 25, but we get 50 results normally!
-            if len(api_galleries) < 50:
+            if page_galleries_count < 50:
                 logger.info(
                     "Got to page {}, and we got less than 50 galleries, "
                     "meaning there is no more pages, stopping".format(query_values["page"])
                 )
+                cursor.save()
                 break
 
             query_values["page"] += 1
@@ -4,11 +4,12 @@ import zipfile
 from typing import Optional
 
 import requests
-import time
 
 from core.base.matchers import Matcher
+from core.base.nested_zip import NestedZipReader
 from core.base.types import MatchesValues, DataDict
 from core.base.utilities import (
+    BAD_ZIP_ERRORS,
     sha1_from_file_object,
     clean_title,
     construct_request_dict,
@@ -44,19 +45,16 @@ class ImageMatcher(Matcher):
         self.values_array = []
         results: list[MatchesValues] = []
 
-        if self.search_method(self.format_to_search_title(zip_path)):
-            if self.time_to_wait_after_compare > 0:
-                time.sleep(self.time_to_wait_after_compare)
-            galleries_data = self.get_metadata_after_matching()
+        galleries_data = self.search_and_fetch(self.format_to_search_title(zip_path))
+        if galleries_data:
+            galleries_data = [
+                x for x in galleries_data if not self.general_utils.discard_by_gallery_data(x.tags, x.uploader, gallery_data=x)[0]
+            ]
+            # We don't call get_list_closer_gallery_titles_from_dict
+            # because we assume that a image match is correct already
             if galleries_data:
-                galleries_data = [
-                    x for x in galleries_data if not self.general_utils.discard_by_gallery_data(x.tags, x.uploader, gallery_data=x)[0]
-                ]
-                # We don't call get_list_closer_gallery_titles_from_dict
-                # because we assume that a image match is correct already
-                if galleries_data:
-                    self.values_array = galleries_data
-                    results = [(gallery.title or gallery.title_jpn or "", gallery, 1) for gallery in galleries_data]
+                self.values_array = galleries_data
+                results = [(gallery.title or gallery.title_jpn or "", gallery, 1) for gallery in galleries_data]
         return results
 
     def format_match_values(self) -> Optional[DataDict]:
@@ -86,7 +84,7 @@ class ImageMatcher(Matcher):
 
         try:
             my_zip = zipfile.ZipFile(zip_path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
+        except BAD_ZIP_ERRORS:
             self.gallery_links = []
             return False
 
@@ -98,14 +96,13 @@ class ImageMatcher(Matcher):
 
         first_file = filtered_files[0]
 
-        if first_file[1] is None:
-            with my_zip.open(first_file[0]) as current_img:
+        try:
+            with NestedZipReader(my_zip) as reader, reader.open(first_file[0], first_file[1]) as current_img:
                 first_file_sha1 = sha1_from_file_object(current_img)
-        else:
-            with my_zip.open(first_file[1]) as current_zip:
-                with zipfile.ZipFile(current_zip) as my_nested_zip:
-                    with my_nested_zip.open(first_file[0]) as current_img:
-                        first_file_sha1 = sha1_from_file_object(current_img)
+        except BAD_ZIP_ERRORS:
+            my_zip.close()
+            self.gallery_links = []
+            return False
 
         payload = {
             "f_shash": first_file_sha1,
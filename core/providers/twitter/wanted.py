@@ -84,31 +84,40 @@ def wanted_generator(settings: "Settings", attrs: QuerySet):
 
         yield "Parsing of {} tweets starting...".format(len(current_tweets))
 
+        # Tweets already stored were processed on a previous run.
+        existing_ids = set(
+            TweetPost.objects.filter(tweet_id__in=[x["id"] for x in current_tweets]).values_list("tweet_id", flat=True)
+        )
+
+        new_tweet_posts: dict[int, TweetPost] = {}
+
         for tweet in current_tweets:
 
+            if tweet["id"] in existing_ids or tweet["id"] in new_tweet_posts:
+                continue
+
             cover_url = None
             if "media" in tweet["entities"]:
                 for media in tweet["entities"]["media"]:
                     cover_url = media["media_url"]
 
-            tweet_obj, tweet_created = TweetPost.objects.get_or_create(
+            new_tweet_posts[tweet["id"]] = TweetPost(
                 tweet_id=tweet["id"],
-                defaults={
-                    "text": tweet["text"],
-                    "user": handle_name,
-                    "posted_date": datetime.strptime(tweet["created_at"], "%a %b %d %H:%M:%S %z %Y"),
-                    "media_url": cover_url,
-                },
+                text=tweet["text"],
+                user=handle_name,
+                posted_date=datetime.strptime(tweet["created_at"], "%a %b %d %H:%M:%S %z %Y"),
+                media_url=cover_url,
             )
 
-            if not tweet_created:
-                continue
-
-            if handle_name in HANDLES_MODULES:
+        if handle_name in HANDLES_MODULES:
+            for tweet_obj in new_tweet_posts.values():
                 yield from HANDLES_MODULES[handle_name].match_tweet_with_wanted_galleries(
                     tweet_obj, settings, own_settings
                 )
 
+        # Stored once processed, so tweets are processed again on the next run if processing stopped partway.
+        TweetPost.objects.bulk_create(new_tweet_posts.values())
+
     if not all([getattr(own_settings, x) for x in CREDENTIALS]):
         logger.error("Cannot work with Twitter unless all credentials are set.")
         return
@@ -8,6 +8,7 @@ from bs4 import BeautifulSoup
 
 from core.base.types import DataDict
 from core.base.utilities import request_with_retries, format_title_to_wanted_search, construct_request_dict
+from core.base.wanted import WantedCursor, WantedGalleryLookup
 from viewer.models import WantedGallery, Provider, Artist, ProcessedLinks
 from . import constants, utilities
 from .utilities import get_on_sale_date_from_soup, PRODUCT_ID_MATCHER, parse_product_page
@@ -123,8 +124,6 @@ def process_feed_page(attrs, own_settings, provider, query_name, request_dict, s
             )
         )
         return
-    # Listen to what the server says
-    used = ProcessedLinks.objects.filter(source_id__in=gallery_gids, provider=provider)
     # If the amount of galleries present in database is equal to what we get from the page,
     # we assume we already processed everything. You can force to process everything by using:
     force_process, force_created = attrs.get_or_create(
@@ -135,38 +134,27 @@ def process_feed_page(attrs, own_settings, provider, query_name, request_dict, s
             "value_bool": False,
         },
     )
+    cursor = WantedCursor(attrs, provider, query_name, enabled=not force_process.value)
+    # The feed has no pages, the whole feed is processed in one go.
+    unseen_gids = set(cursor.unseen(gallery_gids))
+    feed_galleries_data = [x for x in feed_galleries_data if x["uid"] in unseen_gids]
+    # Listen to what the server says
+    used_gids = set(
+        ProcessedLinks.objects.filter(source_id__in=unseen_gids, provider=provider).values_list("source_id", flat=True)
+    )
     logger.info(
-        "Page has {} galleries, from which {} are already present in the database.".format(
-            len(gallery_gids), used.count()
+        "Page has {} new galleries, from which {} are already present in the database.".format(
+            len(unseen_gids), len(used_gids)
         )
     )
-    if not force_process.value and used.count() == len(gallery_gids):
+    if not force_process.value and len(used_gids) == len(unseen_gids):
         logger.info("Page {} has already been processed entirely, stopping".format(full_url))
+        cursor.save()
         return
-    used_gids = used.values_list("source_id", flat=True)
+    if not force_process.value:
+        feed_galleries_data = [x for x in feed_galleries_data if x["uid"] not in used_gids]
+    wanted_lookup = WantedGalleryLookup("title", [x["title"] for x in feed_galleries_data])
     for gallery_index, gallery_data in enumerate(feed_galleries_data):
-        if gallery_data["uid"] in used_gids and not force_process.value:
-            continue
-
-        processed_link, link_created = ProcessedLinks.objects.get_or_create(
-            provider=provider,
-            source_id=gallery_data["uid"],
-            defaults={
-                "url": gallery_data["link"],
-                "link_date": gallery_data["pubDate"],
-                "content": gallery_data["content"],
-                "title": gallery_data["title"],
-            },
-        )
-
-        if not link_created and not not force_process.value:
-            logger.error(
-                "For provider {}: Got to url: {}, was created before it was processed.".format(
-                    constants.provider_name, gallery_data["link"]
-                )
-            )
-            continue
-
         if not gallery_data["title"]:
             logger.error(
                 "For provider {}: Got to url: {}, the title was empty.".format(
@@ -203,7 +191,9 @@ def process_feed_page(attrs, own_settings, provider, query_name, request_dict, s
 
             on_sale_date = get_on_sale_date_from_soup(soup)
 
-        wanted_galleries = get_or_create_wanted_galleries_from_gallery_data(attrs, gallery_data, query_name)
+        wanted_galleries = get_or_create_wanted_galleries_from_gallery_data(
+            attrs, gallery_data, query_name, wanted_lookup
+        )
 
         for wanted_gallery in wanted_galleries:
 
@@ -219,6 +209,24 @@ def process_feed_page(attrs, own_settings, provider, query_name, request_dict, s
                 if on_sale_date:
                     wanted_gallery.calculate_nearest_release_date()
 
+    # Links are marked as processed for the whole feed at once, and the cursor moved, after processing them.
+    ProcessedLinks.objects.bulk_create(
+        [
+            ProcessedLinks(
+                provider=provider,
+                source_id=gallery_data["uid"],
+                url=gallery_data["link"],
+                link_date=gallery_data["pubDate"],
+                content=gallery_data["content"],
+                title=gallery_data["title"],
+            )
+            for gallery_data in feed_galleries_data
+            if gallery_data["uid"] not in used_gids
+        ],
+        ignore_conflicts=True,
+    )
+    cursor.save()
+
 
 def process_products_page(attrs, own_settings, provider, query_name, request_dict, subpath):
     stop_page = attrs.fetch_value("stop_page_{}".format(query_name))
@@ -236,8 +244,10 @@ def process_products_page(attrs, own_settings, provider, query_name, request_dic
         },
     )
 
+    cursor = WantedCursor(attrs, provider, query_name, enabled=not force_process.value)
+
     total_galleries_data = []
-    total_used_ids = []
+    total_used_ids = set()
     total_galleries_to_process = 0
 
     logger.info("Force stopping at page: {}".format(stop_page))
@@ -261,6 +271,7 @@ def process_products_page(attrs, own_settings, provider, query_name, request_dic
             logger.error(
                 "For provider {}: URL: {}, did not give a response, stopping".format(constants.provider_name, link)
             )
+            cursor.hold()
             break
 
         products_galleries_data = []
@@ -289,36 +300,48 @@ def process_products_page(attrs, own_settings, provider, query_name, request_dic
                                 }
                             )
         products_galleries_data = [x for x in products_galleries_data if x["uid"] is not None]
-        gallery_gids = [x["uid"] for x in products_galleries_data]
         n_containers = len(products_galleries_data)
-        if not gallery_gids:
+        if not products_galleries_data:
             logger.error(
                 "For provider {}: Got to url: {}, but could not parse the response into galleries, stopping. Number of gallery containers found: {}.".format(
                     constants.provider_name, link, n_containers
                 )
             )
+            cursor.hold()
             break
+        gallery_gids = cursor.unseen([x["uid"] for x in products_galleries_data])
+        products_galleries_data = [x for x in products_galleries_data if x["uid"] in gallery_gids]
         # Listen to what the server says
-        used = ProcessedLinks.objects.filter(source_id__in=gallery_gids, provider=provider)
+        used_gids = set(
+            ProcessedLinks.objects.filter(source_id__in=gallery_gids, provider=provider).values_list(
+                "source_id", flat=True
+            )
+        )
         # If the amount of galleries present in database is equal to what we get from the page,
         # we assume we already processed everything. You can force to process everything by using:
 
         logger.info(
-            "Page {} has {} galleries, from which {} are already present in the database.".format(
-                link, len(gallery_gids), used.count()
+            "Page {} has {} new galleries, from which {} are already present in the database.".format(
+                link, len(gallery_gids), len(used_gids)
             )
         )
-        total_galleries_to_process += len(gallery_gids) - used.count()
-        if not force_process.value and used.count() == len(gallery_gids):
+        total_galleries_to_process += len(gallery_gids) - len(used_gids)
+        if not force_process.value and len(used_gids) == len(gallery_gids):
             logger.info("Page {} has already been processed entirely, stopping".format(link))
             break
-        used_gids = used.values_list("source_id", flat=True)
 
         total_galleries_data.extend(products_galleries_data)
-        total_used_ids.extend(used_gids)
+        total_used_ids.update(used_gids)
+
+        if cursor.reached:
+            logger.info("Page {} has the newest gallery from the previous run, stopping".format(link))
+            break
 
     logger.info("Total galleries to process: {}".format(total_galleries_to_process))
 
+    # Links are marked as processed after their page is parsed, and saved together at the end.
+    processed_links = {}
+
     for gallery_index, gallery_data in enumerate(total_galleries_data):
         if gallery_data["uid"] in total_used_ids and not force_process.value:
             continue
@@ -338,6 +361,7 @@ def process_products_page(attrs, own_settings, provider, query_name, request_dic
                     constants.provider_name, gallery_data["link"]
                 )
             )
+            cursor.hold()
             continue
         else:
             gallery_product_data = parse_product_page(response.text)
@@ -347,20 +371,12 @@ def process_products_page(attrs, own_settings, provider, query_name, request_dic
                         constants.provider_name, gallery_data["link"]
                     )
                 )
+                cursor.hold()
                 continue
 
-        processed_link, link_created = ProcessedLinks.objects.get_or_create(
-            provider=provider,
-            source_id=gallery_product_data["uid"],
-            defaults={
-                "url": gallery_product_data["link"],
-                "link_date": gallery_product_data["pub_date"],
-                "content": gallery_product_data["content"],
-                "title": gallery_product_data["title"],
-            },
-        )
-
-        if not link_created and not force_process.value:
+        if gallery_product_data["uid"] in processed_links or (
+            gallery_product_data["uid"] in total_used_ids and not force_process.value
+        ):
             logger.error(
                 "For provider {}: Got to url: {}, was created before it was processed.".format(
                     constants.provider_name, gallery_product_data["link"]
@@ -368,6 +384,15 @@ def process_products_page(attrs, own_settings, provider, query_name, request_dic
             )
             continue
 
+        processed_links[gallery_product_data["uid"]] = ProcessedLinks(
+            provider=provider,
+            source_id=gallery_product_data["uid"],
+            url=gallery_product_data["link"],
+            link_date=gallery_product_data["pub_date"],
+            content=gallery_product_data["content"],
+            title=gallery_product_data["title"],
+        )
+
         if not gallery_product_data["title"]:
             logger.error(
                 "For provider {}: Got to url: {}, the title was empty.".format(
@@ -392,10 +417,16 @@ def process_products_page(attrs, own_settings, provider, query_name, request_dic
                 if gallery_product_data["on_sale_date"]:
                     wanted_gallery.calculate_nearest_release_date()
 
+    ProcessedLinks.objects.bulk_create(processed_links.values(), ignore_conflicts=True)
+    cursor.save()
 
-def get_or_create_wanted_galleries_from_gallery_data(attrs, gallery_data, query_name):
+
+def get_or_create_wanted_galleries_from_gallery_data(attrs, gallery_data, query_name, wanted_lookup=None):
     search_title = format_title_to_wanted_search(gallery_data["title"])
-    wanted_galleries = WantedGallery.objects.filter(title=gallery_data["title"], search_title=search_title)
+    if wanted_lookup is not None:
+        wanted_galleries = wanted_lookup.get(gallery_data["title"], search_title)
+    else:
+        wanted_galleries = WantedGallery.objects.filter(title=gallery_data["title"], search_title=search_title)
 
     if not wanted_galleries:
 
@@ -473,6 +504,8 @@ def get_or_create_wanted_galleries_from_gallery_data(attrs, gallery_data, query_
             )
         )
 
+        if wanted_lookup is not None:
+            wanted_lookup.add(wanted_gallery)
         wanted_galleries = [wanted_gallery]
     else:
         logger.info(
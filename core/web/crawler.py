@@ -13,7 +13,7 @@ from django.db.models import QuerySet, Q
 
 from core.downloaders.postdownload import PostDownloader
 from core.base.parsers import InternalParser
-from viewer.models import Gallery, WantedGallery, Archive
+from viewer.models import Gallery, WantedGallery, Archive, TagResolver
 
 if typing.TYPE_CHECKING:
     from core.base.setup import Settings
@@ -370,17 +370,10 @@ class WebCrawler(object):
         if args.include_providers:
             provider_filter_list.extend(args.include_providers)
 
-        parsers = current_settings.provider_context.get_parsers(current_settings, filter_names=provider_filter_list)
-
-        if archive_callback or gallery_callback:
-            for parser in parsers:
-                if archive_callback:
-                    parser.archive_callback = archive_callback
-                if gallery_callback:
-                    parser.gallery_callback = gallery_callback
+        router = current_settings.provider_context.get_url_router(current_settings, filter_names=provider_filter_list)
 
         if args.crawl_from_feed:
-            for parser in parsers:
+            for parser in router.parsers:
                 if parser.feed_urls_implemented():
                     args.url.extend(parser.get_feed_urls())
 
@@ -418,28 +411,30 @@ class WebCrawler(object):
         # when the provider queue is free.
         provider_threads = []
 
-        for parser in parsers:
-            urls = parser.filter_accepted_urls(list(to_use_urls))
-            if urls:
-                to_use_urls = to_use_urls.difference(set(urls))
-                logger.info(
-                    "Crawling {} links from provider {}. Wanted galleries to check: {}".format(
-                        len(urls), parser.name, wanted_filters.count() if wanted_filters else 0
-                    )
-                )
-                provider_thread = threading.Thread(
-                    name="provider_{}_thread".format(parser.name),
-                    target=parser.crawl_urls_caller,
-                    args=(urls,),
-                    kwargs={
-                        "wanted_filters": wanted_filters,
-                        "wanted_only": args.wanted_only,
-                        "preselected_wanted_matches": preselected_wanted_matches,
-                    },
+        for routed_parser, urls in router.route(to_use_urls):
+            parser = type(routed_parser)(current_settings)
+            if archive_callback:
+                parser.archive_callback = archive_callback
+            if gallery_callback:
+                parser.gallery_callback = gallery_callback
+            logger.info(
+                "Crawling {} links from provider {}. Wanted galleries to check: {}".format(
+                    len(urls), parser.name, wanted_filters.count() if wanted_filters else 0
                 )
-                provider_thread.daemon = True
-                provider_thread.start()
-                provider_threads.append(provider_thread)
+            )
+            provider_thread = threading.Thread(
+                name="provider_{}_thread".format(parser.name),
+                target=parser.crawl_urls_caller,
+                args=(urls,),
+                kwargs={
+                    "wanted_filters": wanted_filters,
+                    "wanted_only": args.wanted_only,
+                    "preselected_wanted_matches": preselected_wanted_matches,
+                },
+            )
+            provider_thread.daemon = True
+            provider_thread.start()
+            provider_threads.append(provider_thread)
 
         for provider_thread in provider_threads:
             provider_thread.join()
@@ -460,14 +455,7 @@ class WebCrawler(object):
         else:
             current_settings = self.settings
 
-        parsers = current_settings.provider_context.get_parsers(current_settings)
-
-        if archive_callback or gallery_callback:
-            for parser in parsers:
-                if archive_callback:
-                    parser.archive_callback = archive_callback
-                if gallery_callback:
-                    parser.gallery_callback = gallery_callback
+        router = current_settings.provider_context.get_url_router(current_settings)
 
         if len(arg_line) == 0:
             logger.info("No urls to crawl, Web Crawler done.")
@@ -486,20 +474,22 @@ class WebCrawler(object):
         # when the provider queue is free.
         provider_threads = []
 
-        for parser in parsers:
-            urls = parser.filter_accepted_urls(list(to_use_urls))
-            if urls:
-                to_use_urls = to_use_urls.difference(set(urls))
-                logger.info("Crawling {} links from provider {}.".format(len(urls), parser.name))
-                provider_thread = threading.Thread(
-                    name="provider_{}_thread".format(parser.name),
-                    target=parser.crawl_urls_caller,
-                    args=(urls,),
-                    kwargs={"wanted_filters": wanted_filters, "wanted_only": False},
-                )
-                provider_thread.daemon = True
-                provider_thread.start()
-                provider_threads.append(provider_thread)
+        for routed_parser, urls in router.route(to_use_urls):
+            parser = type(routed_parser)(current_settings)
+            if archive_callback:
+                parser.archive_callback = archive_callback
+            if gallery_callback:
+                parser.gallery_callback = gallery_callback
+            logger.info("Crawling {} links from provider {}.".format(len(urls), parser.name))
+            provider_thread = threading.Thread(
+                name="provider_{}_thread".format(parser.name),
+                target=parser.crawl_urls_caller,
+                args=(urls,),
+                kwargs={"wanted_filters": wanted_filters, "wanted_only": False},
+            )
+            provider_thread.daemon = True
+            provider_thread.start()
+            provider_threads.append(provider_thread)
 
         for provider_thread in provider_threads:
             provider_thread.join()
@@ -521,14 +511,15 @@ class WebCrawler(object):
             gallery_links = [gallery.get_link() for gallery in galleries]
 
             parsers = current_settings.provider_context.get_parsers(current_settings)
+            tag_resolver = TagResolver()
 
             for parser in parsers:
                 urls = parser.filter_accepted_urls(gallery_links)
                 galleries_data = parser.fetch_multiple_gallery_data(urls)
                 if galleries_data:
-                    for gallery_data in galleries_data:
-
-                        single_gallery = Gallery.objects.update_or_create_from_values(gallery_data)
+                    for single_gallery in Gallery.objects.bulk_update_or_create_from_values(
+                        galleries_data, tag_resolver=tag_resolver
+                    ):
                         for archive in single_gallery.archive_set.all():
                             archive.set_titles_from_gallery(archive.gallery)
                             archive.set_tags_from_gallery(archive.gallery)
@@ -550,15 +541,15 @@ class WebCrawler(object):
             gallery_links = [gallery.get_link() for gallery in galleries]
 
             parsers = current_settings.provider_context.get_parsers(current_settings)
+            tag_resolver = TagResolver()
 
             for parser in parsers:
                 urls = parser.filter_accepted_urls(gallery_links)
                 galleries_data = parser.fetch_multiple_gallery_data(urls)
                 if galleries_data:
-                    for gallery_data in galleries_data:
-
-                        gallery = self.settings.gallery_model.objects.update_or_create_from_values(gallery_data)
-
+                    for gallery in self.settings.gallery_model.objects.bulk_update_or_create_from_values(
+                        galleries_data, tag_resolver=tag_resolver
+                    ):
                         for archive in gallery.archive_set.all():
                             archive.set_titles_from_gallery(archive.gallery)
                             archive.set_tags_from_gallery(archive.gallery)
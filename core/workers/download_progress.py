@@ -1,11 +1,13 @@
 import logging
 import os
-from itertools import groupby
+from collections import defaultdict
+from typing import Optional
 
 import django.utils.timezone as django_tz
-from django.db import close_old_connections
 
+from core.base.file_watcher import FileChangeWatcher
 from core.base.setup import Settings
+from core.base.types import TorrentClient
 from core.downloaders.postdownload import PostDownloader
 from core.downloaders.torrent import get_torrent_client
 from core.workers.schedulers import BaseScheduler
@@ -14,16 +16,27 @@ from viewer.models import DownloadEvent
 logger = logging.getLogger(__name__)
 
 
-def mark_completed_and_failed_for_indirect_downloads(download_events):
+def mark_completed_and_failed_for_indirect_downloads(download_events: list[DownloadEvent]) -> list[DownloadEvent]:
+    """Returns the events that were modified, to be saved by the caller."""
     events_completed = [x for x in download_events if x.archive and x.archive.crc32]
     # If there's no archive, we assume it was deleted and considered a failed download for indirect methods
     events_failed = [x for x in download_events if not x.archive or x.archive.is_recycled()]
     for download_event in events_completed:
         download_event.finish_download()
-        download_event.save()
     for download_event in events_failed:
         download_event.set_as_failed()
-        download_event.save()
+    return events_completed + events_failed
+
+
+def set_download_progress(download_event: DownloadEvent, download_progress: float) -> bool:
+    """Returns True if the event changed."""
+    if download_progress >= 100:
+        download_event.finish_download()
+        return True
+    if download_event.progress == download_progress:
+        return False
+    download_event.progress = download_progress
+    return True
 
 
 class DownloadProgressChecker(BaseScheduler):
@@ -32,69 +45,109 @@ class DownloadProgressChecker(BaseScheduler):
     TORRENT_METHODS = ["torrent", "torrent_api"]
     HATH_METHODS = ["hath"]
     ARCHIVE_METHODS = ["archive", "archive_js", "gallerydl"]
+    UPDATED_FIELDS = ["progress", "failed", "completed", "completed_date"]
 
     def __init__(self, settings: Settings, web_queue=None, timer=1, pk=None):
         super().__init__(settings, web_queue, timer, pk)
+        # The client keeps its session between checks, it's recreated when the config changes or a request fails.
+        self.torrent_client: Optional[TorrentClient] = None
+        self.torrent_client_generation = -1
+        self.file_watcher = FileChangeWatcher()
 
     @staticmethod
     def timer_to_seconds(timer: float) -> float:
         return timer
 
-    def job(self) -> None:
-        while not self.stop.is_set():
-
-            seconds_to_wait = self.wait_until_next_run()
-            if self.stop.wait(timeout=seconds_to_wait):
-                return
-
-            close_old_connections()
-
-            download_events_all = DownloadEvent.objects.in_progress().select_related("archive")
-
-            for download_method, download_events_iter in groupby(
-                download_events_all.order_by("download_id"), lambda x: x.method
-            ):
-                download_events = list(download_events_iter)
-                if download_method in self.TORRENT_METHODS:
-                    mark_completed_and_failed_for_indirect_downloads(download_events)
-                    events_to_check = [(x.download_id, x) for x in download_events if not x.completed]
-                    if events_to_check:
-                        client = get_torrent_client(self.settings.torrent)
-                        if client:
-                            client.connect()
-                            download_progresses = client.get_download_progress(events_to_check)
-                            for download_event, download_progress in download_progresses:
-                                download_event.progress = download_progress
-                                if download_progress >= 100:
-                                    download_event.finish_download()
-                                download_event.save()
-                elif download_method in self.HATH_METHODS:
-                    mark_completed_and_failed_for_indirect_downloads(download_events)
-                    archives_to_check = [(x.archive, x) for x in download_events if x.archive and not x.completed]
-                    if archives_to_check:
-                        post_downloader = PostDownloader(self.settings)
-                        post_download_progresses = post_downloader.check_download_progress_archives(archives_to_check)
-                        for download_event, download_progress in post_download_progresses.items():
-                            download_event.progress = download_progress * 100
-                            if download_event.progress >= 100:
-                                download_event.finish_download()
-                            download_event.save()
-                elif download_method in self.ARCHIVE_METHODS:
-                    for download_event in download_events:
-                        if download_event.archive:
-                            download_event.finish_download()
-                            download_event.save()
-                        elif (
-                            download_event.total_size > 0
-                            and download_event.download_id
-                            and os.path.isfile(download_event.download_id)
-                        ):
-                            file_stats = os.stat(download_event.download_id)
-                            filesize = file_stats.st_size
-                            download_progress = 100 * filesize / download_event.total_size
-                            download_event.progress = download_progress
-                            if download_progress >= 100:
-                                download_event.finish_download()
-                            download_event.save()
-
-            self.update_last_run(django_tz.now())
+    def run(self) -> None:
+        self.check_download_events()
+
+        self.update_last_run(django_tz.now())
+
+    def check_download_events(self) -> list[DownloadEvent]:
+        """Checks the progress of every download in progress, saving the ones that changed in bulk."""
+        events_per_method: dict[str, list[DownloadEvent]] = defaultdict(list)
+        for download_event in DownloadEvent.objects.in_progress().select_related("archive"):
+            events_per_method[download_event.method].append(download_event)
+
+        torrent_events = [x for method in self.TORRENT_METHODS for x in events_per_method[method]]
+        hath_events = [x for method in self.HATH_METHODS for x in events_per_method[method]]
+        archive_events = [x for method in self.ARCHIVE_METHODS for x in events_per_method[method]]
+
+        changed_events = self.check_torrent_events(torrent_events)
+        changed_events.extend(self.check_hath_events(hath_events))
+        changed_events.extend(self.check_archive_events(archive_events))
+
+        if changed_events:
+            DownloadEvent.objects.bulk_update(changed_events, self.UPDATED_FIELDS, batch_size=500)
+        return changed_events
+
+    def get_torrent_client(self) -> Optional[TorrentClient]:
+        if self.torrent_client is not None and self.torrent_client_generation == self.settings.config_generation:
+            return self.torrent_client
+        self.torrent_client = None
+        client = get_torrent_client(self.settings.torrent)
+        if client is None or not client.connect():
+            return None
+        self.torrent_client = client
+        self.torrent_client_generation = self.settings.config_generation
+        return client
+
+    def check_torrent_events(self, download_events: list[DownloadEvent]) -> list[DownloadEvent]:
+        changed_events = mark_completed_and_failed_for_indirect_downloads(download_events)
+        events_to_check = [(x.download_id, x) for x in download_events if not x.completed and x.download_id]
+        if not events_to_check:
+            return changed_events
+
+        client = self.get_torrent_client()
+        if not client:
+            return changed_events
+        try:
+            # A single request for every tracked torrent.
+            download_progresses = client.get_download_progress(events_to_check)
+        except Exception:
+            logger.exception("Error getting the download progress from the torrent client, reconnecting next time.")
+            self.torrent_client = None
+            return changed_events
+        if not download_progresses:
+            # Failed requests return nothing, the session could have expired.
+            self.torrent_client = None
+
+        for download_event, download_progress in download_progresses:
+            if set_download_progress(download_event, download_progress):
+                changed_events.append(download_event)
+        return changed_events
+
+    def check_hath_events(self, download_events: list[DownloadEvent]) -> list[DownloadEvent]:
+        changed_events = mark_completed_and_failed_for_indirect_downloads(download_events)
+        archives_to_check = [(x.archive, x) for x in download_events if x.archive and not x.completed]
+        if not archives_to_check:
+            return changed_events
+
+        post_downloader = PostDownloader(self.settings)
+        post_download_progresses = post_downloader.check_download_progress_archives(archives_to_check)
+        for download_event, download_progress in post_download_progresses.items():
+            if set_download_progress(download_event, download_progress * 100):
+                changed_events.append(download_event)
+        return changed_events
+
+    def check_archive_events(self, download_events: list[DownloadEvent]) -> list[DownloadEvent]:
+        changed_events = []
+        events_per_file: dict[str, list[DownloadEvent]] = defaultdict(list)
+        for download_event in download_events:
+            if download_event.archive:
+                download_event.finish_download()
+                changed_events.append(download_event)
+            elif download_event.total_size > 0 and download_event.download_id:
+                events_per_file[os.path.abspath(download_event.download_id)].append(download_event)
+
+        # Only the files that were written to since the last check are read.
+        self.file_watcher.set_tracked(events_per_file)
+        for file_path in self.file_watcher.changed_files():
+            try:
+                filesize = os.stat(file_path).st_size
+            except OSError:
+                continue
+            for download_event in events_per_file[file_path]:
+                if set_download_progress(download_event, 100 * filesize / download_event.total_size):
+                    changed_events.append(download_event)
+        return changed_events
@@ -72,8 +72,11 @@ class WorkerContext:
         from core.workers.auto_wanted import TimedAutoWanted
         from core.workers.link_monitor import LinkMonitor
         from core.workers.webqueue import WebQueue
+        from core.workers.schedulers import scheduler_loop
         from viewer.models import Scheduler, MonitoredLink
 
+        scheduler_loop.max_workers = crawler_settings.scheduler_workers
+
         self.web_queue = WebQueue(crawler_settings)
         self.timed_downloader = TimedPostDownloader(
             crawler_settings,
@@ -1,11 +1,16 @@
+import heapq
+import itertools
 import threading
 import logging
 
 import datetime
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 import django.utils.timezone as django_tz
+from django.db import close_old_connections
 
 from core.base.setup import Settings
 from viewer.models import Scheduler
@@ -13,6 +18,103 @@ from viewer.models import Scheduler
 logger = logging.getLogger(__name__)
 
 
+class SchedulerLoop:
+    """Runs every periodic job from a single dispatcher thread.
+
+    Started jobs are kept in a heap ordered by the time of their next run. The dispatcher sleeps until the first one
+    is due and hands it to a bounded pool of worker threads, so the number of threads doesn't depend on the number
+    of jobs. A job is scheduled again when its run finishes. Runs never overlap: a job that is forced to run while
+    it's still running is counted in overlapped_runs and runs again right after the current run ends.
+    """
+
+    thread_name = "scheduler_loop"
+
+    def __init__(self, max_workers: int = 4) -> None:
+        self.max_workers = max_workers
+        self.condition = threading.Condition()
+        # Entries are (due time, sequence, job), due times from time.monotonic.
+        self.queue: list[tuple[float, int, "BaseScheduler"]] = []
+        self.sequence = itertools.count()
+        # Sequence of the valid entry for each scheduled job. Entries of unscheduled or rescheduled jobs stay in the
+        # heap and are discarded when they reach the top.
+        self.scheduled: dict["BaseScheduler", int] = {}
+        self.executing: set["BaseScheduler"] = set()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.dispatcher: Optional[threading.Thread] = None
+
+    def schedule(self, job: "BaseScheduler", delay: float) -> None:
+        with self.condition:
+            sequence = next(self.sequence)
+            self.scheduled[job] = sequence
+            heapq.heappush(self.queue, (time.monotonic() + delay, sequence, job))
+            if self.dispatcher is None or not self.dispatcher.is_alive():
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="{}_worker".format(self.thread_name)
+                )
+                self.dispatcher = threading.Thread(name=self.thread_name, target=self.dispatch)
+                self.dispatcher.daemon = True
+                self.dispatcher.start()
+            self.condition.notify()
+
+    def unschedule(self, job: "BaseScheduler") -> None:
+        with self.condition:
+            self.scheduled.pop(job, None)
+            self.condition.notify()
+
+    def is_scheduled(self, job: "BaseScheduler") -> bool:
+        return job in self.scheduled
+
+    def is_executing(self, job: "BaseScheduler") -> bool:
+        return job in self.executing
+
+    def active_names(self) -> set[str]:
+        """Names of the jobs that are scheduled or running."""
+        with self.condition:
+            return {x.thread_name for x in itertools.chain(self.scheduled, self.executing)}
+
+    def dispatch(self) -> None:
+        with self.condition:
+            while True:
+                while self.queue and self.scheduled.get(self.queue[0][2]) != self.queue[0][1]:
+                    heapq.heappop(self.queue)
+                if not self.queue:
+                    self.condition.wait()
+                    continue
+                due, _, job = self.queue[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(timeout=delay)
+                    continue
+                heapq.heappop(self.queue)
+                del self.scheduled[job]
+                if job in self.executing:
+                    job.overlapped_runs += 1
+                    job.force_run_once = True
+                    continue
+                self.executing.add(job)
+                job.last_jitter = -delay
+                assert self.executor is not None
+                self.executor.submit(self.execute, job)
+
+    def execute(self, job: "BaseScheduler") -> None:
+        started = time.monotonic()
+        try:
+            close_old_connections()
+            job.run()
+        except BaseException:
+            logger.critical(traceback.format_exc())
+        finally:
+            close_old_connections()
+            job.last_duration = time.monotonic() - started
+            with self.condition:
+                self.executing.discard(job)
+                if not job.stop.is_set() and job not in self.scheduled:
+                    self.schedule(job, job.wait_until_next_run())
+
+
+scheduler_loop = SchedulerLoop()
+
+
 class BaseScheduler(object):
 
     thread_name = "task"
@@ -23,10 +125,15 @@ class BaseScheduler(object):
         self.web_queue = web_queue
         self.original_timer = timer
         self.timer = self.timer_to_seconds(timer)
-        self.job_thread: Optional[threading.Thread] = None
         self.last_run: Optional[datetime.datetime] = None
         self.force_run_once: bool = False
         self.pk = pk
+        self.loop = scheduler_loop
+        # Seconds between the time a run was due and the time it started, and duration of the last run.
+        self.last_jitter: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        # Runs that were due while the previous one hadn't finished, delayed until it did.
+        self.overlapped_runs = 0
 
     @staticmethod
     def timer_to_seconds(timer: float) -> float:
@@ -47,19 +154,11 @@ class BaseScheduler(object):
         return seconds_until
 
     def update_last_run(self, last_run: datetime.datetime) -> None:
-        schedule = Scheduler.objects.get(pk=self.pk)
-        if schedule:
-            schedule.last_run = last_run
-            schedule.save()
+        Scheduler.objects.filter(pk=self.pk).update(last_run=last_run)
         self.last_run = last_run
 
-    def job_container(self) -> None:
-        try:
-            self.job()
-        except BaseException:
-            logger.critical(traceback.format_exc())
-
-    def job(self) -> None:
+    def run(self) -> None:
+        """A single run of the job, called by the scheduler loop when it's due."""
         raise NotImplementedError
 
     def start_running(self, timer=None) -> None:
@@ -67,26 +166,32 @@ class BaseScheduler(object):
         if self.is_running():
             return
 
-        schedule = Scheduler.objects.get(pk=self.pk)
+        schedule = Scheduler.objects.filter(pk=self.pk).first()
         if schedule:
             self.last_run = schedule.last_run
 
         if timer:
             self.timer = self.timer_to_seconds(timer)
-        self.stop.clear()
-        self.job_thread = threading.Thread(name=self.thread_name, target=self.job_container)
-        self.job_thread.daemon = True
-        self.job_thread.start()
+        with self.loop.condition:
+            self.stop.clear()
+            # If it's still finishing a run after being stopped, it's scheduled again when that run ends.
+            if not self.loop.is_executing(self):
+                self.loop.schedule(self, self.wait_until_next_run())
+
+    def run_now(self, timer=None) -> None:
+        """Runs the job as soon as possible, starting it if it was stopped."""
+        if self.is_running():
+            if timer:
+                self.timer = self.timer_to_seconds(timer)
+            self.loop.schedule(self, 0)
+        else:
+            self.force_run_once = True
+            self.start_running(timer=timer)
 
     def is_running(self) -> bool:
-
-        thread_list = threading.enumerate()
-        for thread in thread_list:
-            if thread.name == self.thread_name:
-                return True
-
-        return False
+        return self.loop.is_scheduled(self) or (self.loop.is_executing(self) and not self.stop.is_set())
 
     def stop_running(self) -> None:
 
         self.stop.set()
+        self.loop.unschedule(self)
@@ -180,8 +180,15 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "viewer.middleware.NonHtmlDebugToolbarMiddleware",
+    "viewer.middleware.QueryBudgetMiddleware",
+    "viewer.middleware.TokenRateLimitMiddleware",
 ]
 
+# Budgets declared on views with viewer.utils.query_budget fail the request while testing, and are logged otherwise.
+QUERY_BUDGET_ENFORCE = TESTING
+# Adds the query count, duplicate queries and times of each request as response headers.
+QUERY_BUDGET_HEADERS = crawler_settings.django_query_budget_headers
+
 STATICFILES_FINDERS = [
     "django.contrib.staticfiles.finders.FileSystemFinder",
     "django.contrib.staticfiles.finders.AppDirectoriesFinder",
@@ -356,16 +363,45 @@ if crawler_settings.mail_logging.enable:
     LOGGING["loggers"]["core"]["handlers"].append("mail_admins_urgent")
     LOGGING["loggers"]["django"]["handlers"].append("mail_admins")
 
+# Cache
+if crawler_settings.cache.backend == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": crawler_settings.cache.location or os.path.join(crawler_settings.default_dir, "cache"),
+            "TIMEOUT": crawler_settings.cache.timeout,
+            "OPTIONS": {"MAX_ENTRIES": crawler_settings.cache.max_entries},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "pandabackup",
+            "TIMEOUT": crawler_settings.cache.timeout,
+            "OPTIONS": {"MAX_ENTRIES": crawler_settings.cache.max_entries},
+        }
+    }
+
+# Tests build and tear down data without going through the cache invalidation, so it's disabled there.
+CACHE_PUBLIC_VIEWS: bool = crawler_settings.cache.enable and not TESTING
+
 if crawler_settings.elasticsearch.enable or crawler_settings.elasticsearch.enable_match:
-    from elasticsearch import Elasticsearch
-
-    ES_CLIENT: Optional[Elasticsearch] = Elasticsearch(
-        [crawler_settings.elasticsearch.url], request_timeout=crawler_settings.elasticsearch.timeout
-    )
-    if crawler_settings.elasticsearch.enable:
-        ES_ENABLED = True
-    if crawler_settings.elasticsearch.enable_match:
-        ES_MATCH_ENABLED = True
+    if crawler_settings.elasticsearch.backend == "embedded":
+        from core.base.embedded_search import EmbeddedSearchClient
+
+        ES_CLIENT: Optional[Any] = EmbeddedSearchClient(
+            crawler_settings.elasticsearch.location
+            or os.path.join(crawler_settings.default_dir, "search.sqlite3")
+        )
+    else:
+        from elasticsearch import Elasticsearch
+
+        ES_CLIENT = Elasticsearch(
+            [crawler_settings.elasticsearch.url], request_timeout=crawler_settings.elasticsearch.timeout
+        )
+    ES_ENABLED = crawler_settings.elasticsearch.enable
+    ES_MATCH_ENABLED = crawler_settings.elasticsearch.enable_match
 else:
     ES_CLIENT = None
     ES_ENABLED = False
@@ -38,6 +38,7 @@ from viewer.views.complete import (
     GalleryProviderJSONAutocomplete,
     GalleryMatchGroupAutocomplete,
 )
+from viewer.utils.cache import cache_response
 
 admin.autodiscover()
 
@@ -48,7 +49,7 @@ urlpatterns: list[Union[URLPattern, URLResolver]] = [
 urlpatterns += [
     re_path(
         r"^" + settings.MAIN_URL + r"archive-autocomplete/$",
-        ArchiveAutocomplete.as_view(),
+        cache_response("autocomplete")(ArchiveAutocomplete.as_view()),
         name="archive-autocomplete",
     ),
     re_path(
@@ -78,7 +79,7 @@ urlpatterns += [
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"gallery-autocomplete/$",
-        GalleryAutocomplete.as_view(),
+        cache_response("autocomplete")(GalleryAutocomplete.as_view()),
         name="gallery-autocomplete",
     ),
     re_path(
@@ -93,12 +94,12 @@ urlpatterns += [
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"tag-autocomplete/$",
-        TagAutocomplete.as_view(),
+        cache_response("autocomplete")(TagAutocomplete.as_view()),
         name="tag-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"tag-json-autocomplete/$",
-        TagAutocompleteJson.as_view(),
+        cache_response("autocomplete")(TagAutocompleteJson.as_view()),
         name="tag-json-autocomplete",
     ),
     re_path(
@@ -128,12 +129,12 @@ urlpatterns += [
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"source-autocomplete/$",
-        SourceAutocomplete.as_view(),
+        cache_response("autocomplete")(SourceAutocomplete.as_view()),
         name="source-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"provider-autocomplete/$",
-        ProviderAutocomplete.as_view(),
+        cache_response("autocomplete")(ProviderAutocomplete.as_view()),
         name="provider-autocomplete",
     ),
     re_path(
@@ -143,17 +144,17 @@ urlpatterns += [
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"reason-autocomplete/$",
-        ReasonAutocomplete.as_view(),
+        cache_response("autocomplete")(ReasonAutocomplete.as_view()),
         name="reason-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"uploader-autocomplete/$",
-        UploaderAutocomplete.as_view(),
+        cache_response("autocomplete")(UploaderAutocomplete.as_view()),
         name="uploader-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"category-autocomplete/$",
-        CategoryAutocomplete.as_view(),
+        cache_response("autocomplete")(CategoryAutocomplete.as_view()),
         name="category-autocomplete",
     ),
     re_path(
@@ -164,32 +165,32 @@ urlpatterns += [
     # Gallery
     re_path(
         r"^" + settings.MAIN_URL + r"gallery-provider-autocomplete/$",
-        GalleryProviderAutocomplete.as_view(),
+        cache_response("autocomplete")(GalleryProviderAutocomplete.as_view()),
         name="gallery-provider-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"gallery-category-autocomplete/$",
-        GalleryCategoryAutocomplete.as_view(),
+        cache_response("autocomplete")(GalleryCategoryAutocomplete.as_view()),
         name="gallery-category-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"gallery-uploader-autocomplete/$",
-        GalleryUploaderAutocomplete.as_view(),
+        cache_response("autocomplete")(GalleryUploaderAutocomplete.as_view()),
         name="gallery-uploader-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"gallery-reason-autocomplete/$",
-        GalleryReasonAutocomplete.as_view(),
+        cache_response("autocomplete")(GalleryReasonAutocomplete.as_view()),
         name="gallery-reason-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"gallery-category-json-autocomplete/$",
-        GalleryCategoryJSONAutocomplete.as_view(),
+        cache_response("autocomplete")(GalleryCategoryJSONAutocomplete.as_view()),
         name="gallery-category-json-autocomplete",
     ),
     re_path(
         r"^" + settings.MAIN_URL + r"gallery-provider-json-autocomplete/$",
-        GalleryProviderJSONAutocomplete.as_view(),
+        cache_response("autocomplete")(GalleryProviderJSONAutocomplete.as_view()),
         name="gallery-provider-json-autocomplete",
     ),
     # Other
@@ -54,6 +54,7 @@ from django.contrib.admin.helpers import ActionForm
 from django import forms
 
 from core.base.setup import Settings
+from viewer.utils.side_effects import coalesced_side_effects
 from viewer.utils.types import AuthenticatedHttpRequest
 
 
@@ -93,8 +94,9 @@ class ArchiveAdmin(SimpleHistoryAdmin):
 
     def make_public(self, request: HttpRequest, queryset: ArchiveQuerySet) -> None:
         rows_updated = queryset.count()
-        for archive in queryset:
-            archive.set_public()
+        with coalesced_side_effects():
+            for archive in queryset:
+                archive.set_public()
         if rows_updated == 1:
             message_bit = "1 archive was"
         else:
@@ -211,7 +213,7 @@ class TagAdmin(admin.ModelAdmin):
     def recall_api_gallery(self, request: HttpRequest, queryset: TagQuerySet) -> None:
         galleries = Gallery.objects.filter(tags__in=queryset)
         for gallery in galleries:
-            current_settings = Settings(load_from_config=crawler_settings.config)
+            current_settings = crawler_settings.copy_from_config()
 
             if current_settings.workers.web_queue and gallery.provider:
                 current_settings.set_update_metadata_options(providers=(gallery.provider,))
@@ -801,7 +803,8 @@ class EventLogAdmin(admin.ModelAdmin):
 class UserLongLivedTokenAdmin(admin.ModelAdmin):
 
     raw_id_fields = ["user"]
-    list_display = ["user", "name", "create_date", "expire_date"]
+    list_display = ["user", "name", "create_date", "expire_date", "rate_limit", "request_count", "last_used"]
+    readonly_fields = ["request_count", "last_used"]
     list_filter = ["create_date", "expire_date"]
     search_fields = ["user__username", "user__email"]
 
@@ -958,12 +961,12 @@ class GalleryMatchGroupAdmin(admin.ModelAdmin):
     list_display = ["id", "title", "create_date"]
 
     inlines = (GalleryMatchGroupEntryInline,)
-    actions = ["process_group"]
+    actions = ["process_group", "merge_groups"]
 
     def process_group(self, request: HttpRequest, queryset: "QuerySet[GalleryMatchGroup]") -> None:
         rows_updated = queryset.count()
         for group in queryset:
-            group.process_group()
+            group.process_group(user=request.user)
         if rows_updated == 1:
             message_bit = "1 gallery match group was"
         else:
@@ -972,6 +975,16 @@ class GalleryMatchGroupAdmin(admin.ModelAdmin):
 
     process_group.short_description = "Process selected gallery match groups"  # type: ignore
 
+    def merge_groups(self, request: HttpRequest, queryset: "QuerySet[GalleryMatchGroup]") -> None:
+        groups = list(queryset.order_by("pk"))
+        if len(groups) < 2:
+            self.message_user(request, "At least 2 gallery match groups must be selected to merge.")
+            return
+        groups[0].merge_groups(groups[1:], user=request.user)
+        self.message_user(request, "%s gallery match groups were merged into: %s" % (len(groups), groups[0]))
+
+    merge_groups.short_description = "Merge selected gallery match groups into the oldest one"  # type: ignore
+
 
 class GalleryMatchGroupEntryAdmin(admin.ModelAdmin):
     search_fields = ["gallery__title"]
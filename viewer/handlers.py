@@ -3,15 +3,28 @@ import typing
 from urllib.parse import urljoin
 
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.core.mail import BadHeaderError
 from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.html import urlize, linebreaks
 
-from viewer.models import Gallery, Archive, users_with_perm, WantedGallery, ArchiveGroupEntry
-from viewer.signals import wanted_gallery_found
+from viewer.models import (
+    Gallery,
+    Archive,
+    users_with_perm,
+    WantedGallery,
+    ArchiveGroupEntry,
+    Tag,
+    TextNgram,
+    UserLongLivedToken,
+)
+from viewer.signals import wanted_gallery_found, galleries_bulk_saved, archives_bulk_saved
+from viewer.utils.cache import bump_generation
 from viewer.utils.functions import send_mass_html_mail
+from viewer.utils.requests import token_cache
 
 logger = logging.getLogger(__name__)
 crawler_settings = settings.CRAWLER_SETTINGS
@@ -84,3 +97,64 @@ def wanted_gallery_found_handler(sender: typing.Any, **kwargs: typing.Any) -> No
         send_mass_html_mail(datatuples, fail_silently=True)
     except BadHeaderError:
         logger.error("Failed sending emails: Invalid header found.")
+
+
+@receiver(post_save, sender=Archive)
+@receiver(post_delete, sender=Archive)
+@receiver(m2m_changed, sender=Archive.tags.through)
+@receiver(archives_bulk_saved, sender=Archive)
+def archive_cache_generation_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    bump_generation("archive")
+
+
+@receiver(post_save, sender=Gallery)
+@receiver(post_delete, sender=Gallery)
+@receiver(m2m_changed, sender=Gallery.tags.through)
+@receiver(galleries_bulk_saved, sender=Gallery)
+def gallery_cache_generation_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    bump_generation("gallery")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_cache_generation_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    bump_generation("tag")
+
+
+@receiver(post_save, sender=Archive)
+@receiver(post_save, sender=Gallery)
+@receiver(post_save, sender=Tag)
+def text_ngram_save_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    if kwargs.get("raw"):
+        return
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and update_fields.isdisjoint(
+        TextNgram.INDEXED_FIELDS[TextNgram.kind_for_model(sender)]
+    ):
+        return
+    TextNgram.objects.index_objects([kwargs["instance"]])
+
+
+@receiver(galleries_bulk_saved, sender=Gallery)
+@receiver(archives_bulk_saved, sender=Archive)
+def text_ngram_bulk_save_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    TextNgram.objects.index_objects(kwargs["galleries"] if "galleries" in kwargs else kwargs["archives"])
+
+
+@receiver(post_delete, sender=Archive)
+@receiver(post_delete, sender=Gallery)
+@receiver(post_delete, sender=Tag)
+def text_ngram_delete_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    TextNgram.objects.remove_objects(sender, [kwargs["instance"].pk])
+
+
+@receiver(post_save, sender=UserLongLivedToken)
+@receiver(post_delete, sender=UserLongLivedToken)
+def long_lived_token_cache_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    token_cache.invalidate(token_ids={kwargs["instance"].pk})
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def token_user_cache_handler(sender: typing.Any, **kwargs: typing.Any) -> None:
+    token_cache.invalidate(user_id=kwargs["instance"].pk)
@@ -3,7 +3,7 @@ import time
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
-from viewer.models import Archive
+from viewer.models import Archive, ArchiveStatistics
 
 crawler_settings = settings.CRAWLER_SETTINGS
 
@@ -26,6 +26,22 @@ class Command(BaseCommand):
             help=("Run the SHA1 and Data process for Archive Images. "),
         )
 
+        parser.add_argument(
+            "-stats",
+            "--statistics",
+            required=False,
+            action="store_true",
+            help=("Update the Archive Images data and statistics reading only the image headers, without hashing. "),
+        )
+
+        parser.add_argument(
+            "-stored",
+            "--stored_statistics",
+            required=False,
+            action="store_true",
+            help=("Recalculate the Archive statistics from the stored Image data, without reading the files. "),
+        )
+
     def handle(self, *args, **options):
         start = time.perf_counter()
 
@@ -53,6 +69,24 @@ class Command(BaseCommand):
                 )
                 archive.calculate_sha1_and_data_for_images()
 
+        if options["statistics"] and archives:
+            self.stdout.write(
+                "Update image headers and statistics for {} Archives".format(
+                    archives.count(),
+                )
+            )
+            for archive in archives:
+                if not archive.update_image_data_from_headers():
+                    self.stdout.write("Could not read Archive ID: {}".format(archive.pk))
+
+        if options["stored_statistics"] and archives:
+            self.stdout.write(
+                "Recalculate statistics for {} Archives".format(
+                    archives.count(),
+                )
+            )
+            ArchiveStatistics.objects.update_for_archives(archives.values_list("pk", flat=True))
+
         end = time.perf_counter()
 
         self.stdout.write(
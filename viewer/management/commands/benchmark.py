@@ -0,0 +1,504 @@
+import cProfile
+import functools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import typing
+import zipfile
+from collections.abc import Callable
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional, TypeVar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image as PImage, ImageDraw
+
+from core.base.setup import Settings
+from core.base.utilities import get_images_from_zip, get_zip_fileinfo
+from core.workers.webqueue import WebQueue
+from viewer.models import Archive, DownloadEvent, Gallery, Tag, WantedGallery
+from viewer.services import CompareObjectsService
+
+crawler_settings = settings.CRAWLER_SETTINGS
+
+T = TypeVar("T")
+
+CASES = (
+    "zip_scan",
+    "image_set",
+    "thumbnails",
+    "phash",
+    "image_data",
+    "similarity_marks",
+    "wanted_matching",
+    "queries",
+    "webqueue",
+)
+
+TAG_SCOPES = ("artist", "group", "parody", "character", "female", "male", "language", "other")
+
+BENCHMARK_FOLDER = "galleries/benchmark"
+
+# Listing, filter and API requests done by the queries case: (name, url name, query parameters).
+QUERY_CASES: tuple[tuple[str, str, dict[str, str]], ...] = (
+    ("archive_search", "viewer:archive-search", {}),
+    ("archive_search_title", "viewer:archive-search", {"title": "benchmark", "view": "list"}),
+    ("archive_search_tags", "viewer:archive-search", {"tags": "artist:benchmark-artist-1", "view": "list"}),
+    ("gallery_list", "viewer:gallery-list", {}),
+    ("gallery_list_filtered", "viewer:gallery-list", {"title": "benchmark", "category": "Manga"}),
+    ("api_archive_filter", "viewer:api", {"qa": "", "title": "benchmark"}),
+    ("api_gallery_search", "viewer:api", {"gs": "", "title": "benchmark"}),
+)
+
+
+class QuietRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot paths against a synthetic corpus of archives, galleries and tags. "
+        "Database changes are rolled back. Results are written as JSON, and can be compared to a previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-c",
+            "--cases",
+            required=False,
+            action="store",
+            nargs="+",
+            choices=CASES,
+            default=list(CASES),
+            help="Cases to run. Default: all.",
+        )
+        parser.add_argument(
+            "-a", "--archives", required=False, action="store", type=int, default=20, help="Archives to generate."
+        )
+        parser.add_argument(
+            "-i", "--images", required=False, action="store", type=int, default=10, help="Images per archive."
+        )
+        parser.add_argument(
+            "-t", "--tags", required=False, action="store", type=int, default=100, help="Tags to generate."
+        )
+        parser.add_argument(
+            "-w", "--wanted", required=False, action="store", type=int, default=50, help="WantedGallery to generate."
+        )
+        parser.add_argument(
+            "-r", "--repeat", required=False, action="store", type=int, default=5, help="Requests per query case."
+        )
+        parser.add_argument(
+            "-q",
+            "--queue-items",
+            required=False,
+            action="store",
+            type=int,
+            default=10,
+            help="Links to queue on the WebQueue case.",
+        )
+        parser.add_argument("-s", "--seed", required=False, action="store", type=int, default=0, help="Random seed.")
+        parser.add_argument(
+            "-o", "--output", required=False, action="store", help="Write the results to this JSON file."
+        )
+        parser.add_argument(
+            "-b", "--baseline", required=False, action="store", help="Compare against the results of a previous run."
+        )
+        parser.add_argument(
+            "--tolerance",
+            required=False,
+            action="store",
+            type=float,
+            default=0.25,
+            help="Allowed slowdown against the baseline, as a fraction of the baseline time. Default: 0.25.",
+        )
+        parser.add_argument(
+            "-p", "--profile", required=False, action="store", help="Write cProfile stats for each case to this folder."
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        self.options = options
+        self.cases: list[str] = options["cases"]
+        self.random = random.Random(options["seed"])
+        self.results: dict[str, dict[str, Any]] = {}
+
+        if options["profile"]:
+            os.makedirs(options["profile"], exist_ok=True)
+
+        media_root = tempfile.mkdtemp(prefix="panda-benchmark-")
+
+        try:
+            # Cached responses would hide the queries, and the synthetic objects must not reach the index.
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                CACHE_PUBLIC_VIEWS=False,
+                ES_AUTOREFRESH=False,
+                ES_AUTOREFRESH_GALLERY=False,
+            ):
+                zip_paths = self.create_zip_files(media_root)
+
+                if "zip_scan" in self.cases:
+                    self.measure("zip_scan", functools.partial(self.scan_zip_files, zip_paths), len(zip_paths))
+
+                if "phash" in self.cases:
+                    self.measure(
+                        "phash",
+                        functools.partial(self.hash_zip_files, zip_paths),
+                        len(zip_paths) * options["images"],
+                    )
+
+                with transaction.atomic():
+                    self.run_database_cases(zip_paths)
+                    transaction.set_rollback(True)
+
+                # The queue worker runs on its own thread and connection, so it can't be inside the transaction.
+                if "webqueue" in self.cases:
+                    self.run_webqueue_case(media_root, zip_paths)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = {
+            "revision": self.get_revision(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "parameters": {
+                key: options[key] for key in ("archives", "images", "tags", "wanted", "repeat", "queue_items", "seed")
+            },
+            "results": self.results,
+        }
+
+        for name, result in self.results.items():
+            self.stdout.write(
+                "{:<32} {:>9.4f}s total {:>9.4f}s/item {:>6} queries".format(
+                    name, result["seconds"], result["seconds_per_item"], result["queries"]
+                )
+            )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf8") as output_file:
+                json.dump(report, output_file, indent=2, sort_keys=True)
+
+        regressions = []
+        if options["baseline"]:
+            with open(options["baseline"], "r", encoding="utf8") as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare_results(baseline["results"], self.results, options["tolerance"])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+
+        end = time.perf_counter()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Time taken (seconds, minutes): {0:.2f}, {1:.2f}".format(end - start, (end - start) / 60)
+            )
+        )
+
+        if regressions:
+            raise CommandError("{} regressions against the baseline.".format(len(regressions)))
+
+    def measure(self, name: str, func: Callable[[], Any], items: int) -> None:
+        profiler = cProfile.Profile() if self.options["profile"] else None
+
+        with CaptureQueriesContext(connection) as queries:
+            if profiler:
+                profiler.enable()
+            start = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+
+        if profiler:
+            profiler.dump_stats(os.path.join(self.options["profile"], "{}.prof".format(name)))
+
+        self.results[name] = {
+            "items": items,
+            "seconds": seconds,
+            "seconds_per_item": seconds / items if items else 0.0,
+            "queries": len(queries),
+        }
+
+    def create_image(self, seed: str) -> bytes:
+        image_random = random.Random(seed)
+        width, height = image_random.randint(600, 900), image_random.randint(900, 1300)
+        im = PImage.new("RGB", (width, height), tuple(image_random.randint(0, 255) for _ in range(3)))
+        draw = ImageDraw.Draw(im)
+        for _ in range(12):
+            x, y = image_random.randint(0, width), image_random.randint(0, height)
+            draw.rectangle(
+                (x, y, x + image_random.randint(20, width // 2), y + image_random.randint(20, height // 2)),
+                fill=tuple(image_random.randint(0, 255) for _ in range(3)),
+            )
+        with tempfile.SpooledTemporaryFile() as image_file:
+            im.save(image_file, "JPEG", quality=85)
+            image_file.seek(0)
+            return image_file.read()
+
+    def create_zip_files(self, media_root: str) -> list[str]:
+        os.makedirs(os.path.join(media_root, BENCHMARK_FOLDER), exist_ok=True)
+        zip_paths = []
+        for archive_number in range(self.options["archives"]):
+            zip_path = os.path.join(media_root, BENCHMARK_FOLDER, "benchmark_{:04d}.zip".format(archive_number))
+            with zipfile.ZipFile(zip_path, "w") as new_zip:
+                for image_number in range(self.options["images"]):
+                    # Every pair of archives shares its images, so there's something to mark as similar.
+                    image_seed = "{}-{}-{}".format(self.options["seed"], archive_number // 2, image_number)
+                    new_zip.writestr("{:03d}.jpg".format(image_number + 1), self.create_image(image_seed))
+            zip_paths.append(zip_path)
+        return zip_paths
+
+    @staticmethod
+    def scan_zip_files(zip_paths: list[str]) -> None:
+        for zip_path in zip_paths:
+            get_zip_fileinfo(zip_path, get_extra_data=True)
+            with zipfile.ZipFile(zip_path, "r") as my_zip:
+                get_images_from_zip(my_zip)
+
+    @staticmethod
+    def hash_zip_files(zip_paths: list[str]) -> None:
+        for zip_path in zip_paths:
+            with zipfile.ZipFile(zip_path, "r") as my_zip:
+                members = [(x[0], x[1]) for x in get_images_from_zip(my_zip)]
+            CompareObjectsService.calculate_phash_for_zip_members((zip_path, members))
+
+    def create_corpus(self, zip_paths: list[str]) -> tuple[list[Archive], list[Gallery]]:
+        tags = [
+            Tag.objects.create(
+                scope=TAG_SCOPES[count % len(TAG_SCOPES)],
+                name="benchmark-{}-{}".format(TAG_SCOPES[count % len(TAG_SCOPES)], count // len(TAG_SCOPES)),
+            )
+            for count in range(self.options["tags"])
+        ]
+
+        galleries = []
+        archives = []
+        for count, zip_path in enumerate(zip_paths):
+            gallery = Gallery(
+                gid="benchmark-{}".format(count),
+                provider="benchmark",
+                title="[Benchmark Group {}] Benchmark Title {}".format(count % 7, count),
+                title_jpn="ベンチマーク {}".format(count),
+                category=self.random.choice(("Manga", "Doujinshi", "Artist CG")),
+                filecount=self.options["images"],
+                filesize=os.path.getsize(zip_path),
+                public=True,
+            )
+            gallery.simple_save()
+            gallery.tags.set(self.random.sample(tags, min(len(tags), 15)))
+            galleries.append(gallery)
+
+            archive = Archive(
+                title=gallery.title,
+                title_jpn=gallery.title_jpn,
+                zipped=os.path.relpath(zip_path, settings.MEDIA_ROOT),
+                gallery=gallery,
+                filecount=self.options["images"],
+                filesize=os.path.getsize(zip_path),
+                public=True,
+                user=None,
+            )
+            # Skips the processing done by save, each step is timed by its own case.
+            archive.simple_save()
+            archive.set_tags_from_gallery(gallery)
+            archives.append(archive)
+
+        return archives, galleries
+
+    def create_wanted_galleries(self, galleries: list[Gallery]) -> None:
+        for count in range(self.options["wanted"]):
+            gallery = galleries[count % len(galleries)] if galleries else None
+            if count % 3 == 0:
+                search_title = "Benchmark Title {}".format(count)
+                regexp = False
+            elif count % 3 == 1 and gallery:
+                search_title = gallery.title or ""
+                regexp = False
+            else:
+                search_title = r"Benchmark Group \d+\] .*{}$".format(count)
+                regexp = True
+            WantedGallery.objects.create(
+                title="Benchmark wanted {}".format(count),
+                search_title=search_title,
+                regexp_search_title=regexp,
+                should_search=True,
+                keep_searching=True,
+                wanted_page_count_lower=0,
+                wanted_page_count_upper=self.options["images"] * 2,
+            )
+
+    def run_database_cases(self, zip_paths: list[str]) -> None:
+        archives, galleries = self.create_corpus(zip_paths)
+        images = len(archives) * self.options["images"]
+
+        needs_image_set = {"image_set", "image_data", "similarity_marks"}.intersection(self.cases)
+
+        if needs_image_set:
+            self.measure("image_set", for_each(archives, lambda x: x.generate_image_set(force=True)), images)
+        if "thumbnails" in self.cases:
+            self.measure("thumbnails", for_each(archives, lambda x: x.generate_thumbnails()), len(archives))
+        if {"image_data", "similarity_marks"}.intersection(self.cases):
+            auto_phash_images = crawler_settings.auto_phash_images
+            crawler_settings.auto_phash_images = True
+            try:
+                self.measure(
+                    "image_data",
+                    for_each(
+                        archives, lambda x: x.calculate_sha1_and_data_for_images(process_archive_statistics=False)
+                    ),
+                    images,
+                )
+            finally:
+                crawler_settings.auto_phash_images = auto_phash_images
+        if "similarity_marks" in self.cases:
+            self.measure(
+                "similarity_marks", for_each(archives, lambda x: x.create_phash_similarity_mark()), len(archives)
+            )
+
+        if "wanted_matching" in self.cases:
+            self.create_wanted_galleries(galleries)
+            self.measure(
+                "wanted_matching",
+                for_each(galleries, lambda x: x.match_against_wanted_galleries(skip_already_found=False)),
+                len(galleries),
+            )
+
+        if "queries" in self.cases:
+            client = Client()
+            with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ["testserver"]):
+                for name, url_name, parameters in QUERY_CASES:
+                    self.measure(
+                        "queries_{}".format(name),
+                        functools.partial(self.request_view, client, reverse(url_name), parameters),
+                        self.options["repeat"],
+                    )
+            for name, _, _ in QUERY_CASES:
+                # Query count per request, so it doesn't depend on --repeat.
+                result = self.results["queries_{}".format(name)]
+                result["queries"] //= self.options["repeat"] or 1
+
+    def request_view(self, client: Client, url: str, parameters: dict[str, str]) -> None:
+        for _ in range(self.options["repeat"]):
+            response = client.get(url, parameters)
+            if response.status_code != 200:
+                raise CommandError("Got status {} from {}".format(response.status_code, url))
+
+    def run_webqueue_case(self, media_root: str, zip_paths: list[str]) -> None:
+        source_folder = os.path.join(media_root, "source")
+        os.makedirs(source_folder, exist_ok=True)
+        file_names = []
+        for count in range(self.options["queue_items"]):
+            file_name = "queued_{:04d}.zip".format(count)
+            shutil.copy(zip_paths[count % len(zip_paths)], os.path.join(source_folder, file_name))
+            file_names.append(file_name)
+
+        # Local stand-in for a provider, the generic downloader gets the archives from it.
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietRequestHandler, directory=source_folder))
+        server_thread = threading.Thread(name="benchmark_http", target=server.serve_forever, daemon=True)
+        server_thread.start()
+
+        urls = ["http://127.0.0.1:{}/{}".format(server.server_address[1], x) for x in file_names]
+
+        config = dict(crawler_settings.config)
+        config["locations"] = dict(config.get("locations", {}))
+        config["locations"]["media_root"] = media_root
+        config["locations"]["archive_dl_folder"] = "galleries/benchmark_downloads"
+        current_settings = Settings(load_from_config=config)
+        current_settings.allow_downloaders_only(["generic_archive"], True, True, True)
+        current_settings.wait_timer = 0
+        current_settings.archive_user = User.objects.create_user(
+            "benchmark-{}".format(time.time_ns()), password=None, is_active=False
+        )
+        os.makedirs(os.path.join(media_root, current_settings.archive_dl_folder), exist_ok=True)
+
+        created_archives: list[Archive] = []
+        created_galleries: list[Gallery] = []
+
+        def archive_callback(x: Optional[Archive], crawled_url: Optional[str], result: str) -> None:
+            if x:
+                created_archives.append(x)
+
+        def gallery_callback(x: Optional[Gallery], crawled_url: Optional[str], result: str) -> None:
+            if x:
+                created_galleries.append(x)
+
+        web_queue = WebQueue(current_settings)
+        web_queue.thread_name = "benchmark_web_queue"
+
+        def run_queue() -> None:
+            for url in urls:
+                web_queue.enqueue_args_list(
+                    [url],
+                    override_options=current_settings,
+                    archive_callback=archive_callback,
+                    gallery_callback=gallery_callback,
+                    use_argparser=False,
+                )
+            while web_queue.is_running() or web_queue.queue_size():
+                time.sleep(0.01)
+
+        try:
+            self.measure("webqueue", run_queue, len(urls))
+        finally:
+            server.shutdown()
+            server.server_close()
+            # Not covered by the rolled back transaction.
+            for archive in created_archives:
+                archive.delete()
+            for gallery in created_galleries:
+                gallery.delete()
+            DownloadEvent.objects.filter(name__in=urls).delete()
+            current_settings.archive_user.delete()
+
+        self.results["webqueue"]["archives_created"] = len(created_archives)
+
+    @staticmethod
+    def get_revision() -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+
+def for_each(objects: list[T], func: Callable[[T], Any]) -> Callable[[], None]:
+    def run() -> None:
+        for x in objects:
+            func(x)
+
+    return run
+
+
+def compare_results(
+    baseline: dict[str, dict[str, Any]], current: dict[str, dict[str, Any]], tolerance: float
+) -> list[str]:
+    """Cases slower than the baseline by more than tolerance, or that do more queries."""
+    regressions = []
+    for name, result in current.items():
+        previous: typing.Optional[dict[str, Any]] = baseline.get(name)
+        if not previous:
+            continue
+        if result["queries"] > previous["queries"]:
+            regressions.append("{}: {} queries, baseline had {}".format(name, result["queries"], previous["queries"]))
+        if previous["seconds_per_item"] and result["seconds_per_item"] > previous["seconds_per_item"] * (1 + tolerance):
+            regressions.append(
+                "{}: {:.4f}s per item, baseline had {:.4f}s".format(
+                    name, result["seconds_per_item"], previous["seconds_per_item"]
+                )
+            )
+    return regressions
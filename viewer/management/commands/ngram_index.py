@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from viewer.models import Archive, Gallery, Tag, TextNgram
+
+INDEXED_MODELS = {"archive": Archive, "gallery": Gallery, "tag": Tag}
+
+
+class Command(BaseCommand):
+    help = "Rebuild the n-gram index used by title and tag searches, for rows changed outside of model saves."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-m",
+            "--models",
+            nargs="+",
+            choices=sorted(INDEXED_MODELS),
+            default=sorted(INDEXED_MODELS),
+            help="Models to reindex. Defaults to all of them.",
+        )
+        parser.add_argument(
+            "-bs",
+            "--batch_size",
+            type=int,
+            default=2000,
+            help="Rows read per query.",
+        )
+
+    def handle(self, *args, **options):
+        for model_name in options["models"]:
+            self.stdout.write("Rebuilding n-gram index for: {}".format(model_name))
+            TextNgram.objects.rebuild(INDEXED_MODELS[model_name], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -15,13 +15,16 @@ class Command(BaseCommand):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        from elasticsearch import Elasticsearch
+        if settings.ES_CLIENT:
+            self.es_client = settings.ES_CLIENT
+        else:
+            from elasticsearch import Elasticsearch
 
-        # TODO: Timeout as option.
-        self.es_client = Elasticsearch(
-            [crawler_settings.elasticsearch.url],
-            request_timeout=crawler_settings.elasticsearch.timeout,
-        )
+            # TODO: Timeout as option.
+            self.es_client = Elasticsearch(
+                [crawler_settings.elasticsearch.url],
+                request_timeout=crawler_settings.elasticsearch.timeout,
+            )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -89,9 +92,7 @@ class Command(BaseCommand):
 
     def recreate_match_index_model(self):
 
-        from elasticsearch.client import IndicesClient
-
-        indices_client = IndicesClient(client=self.es_client)
+        indices_client = self.es_client.indices
         index_name = crawler_settings.elasticsearch.match_index_name
         if indices_client.exists(index=index_name):
             indices_client.delete(index=index_name)
@@ -122,9 +123,7 @@ class Command(BaseCommand):
 
     def recreate_index_model(self, model: Union[type[Gallery], type[Archive]]):
 
-        from elasticsearch.client import IndicesClient
-
-        indices_client = IndicesClient(client=self.es_client)
+        indices_client = self.es_client.indices
         index_name = model._meta.es_index_name  # type: ignore
         if indices_client.exists(index=index_name):
             indices_client.delete(index=index_name)
@@ -154,7 +153,7 @@ class Command(BaseCommand):
 
     def push_db_to_index_model(self, model: Union[type[Gallery], type[Archive]], bulk_size: int = 0):
 
-        from elasticsearch.helpers import bulk
+        from core.base.embedded_search import bulk
 
         if settings.ES_ONLY_INDEX_PUBLIC:
             query = model.objects.filter(public=True).prefetch_related("tags").order_by("-pk")
@@ -1,7 +1,14 @@
 import json
+import logging
 
+from django.conf import settings
 from django.http import HttpResponse
 
+from viewer.utils.query_budget import QueryBudgetExceeded, QueryRecorder
+from viewer.utils.requests import TokenRateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
 
 class NonHtmlDebugToolbarMiddleware:
     def __init__(self, get_response):
@@ -19,3 +26,73 @@ class NonHtmlDebugToolbarMiddleware:
                 response = HttpResponse("<html><body><pre>{}</pre></body></html>".format(response.content))
 
         return response
+
+
+class QueryBudgetMiddleware:
+    """Records the queries, duplicate queries and time of each request, and checks them against the budget declared
+    on the view with viewer.utils.query_budget.query_budget. Exceeding it raises QueryBudgetExceeded when
+    QUERY_BUDGET_ENFORCE is set (tests), and is logged otherwise. With QUERY_BUDGET_HEADERS, the numbers are added
+    to the response headers. Queries are only recorded for views with a budget for the request method, or when the
+    headers are enabled, from the moment the view is resolved. Content produced while streaming a response is not
+    counted."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_recorder = None
+        try:
+            response = self.get_response(request)
+        finally:
+            recorder = request.query_recorder
+            if recorder is not None:
+                recorder.__exit__(None, None, None)
+        if recorder is None:
+            return response
+        stats = recorder.stats
+
+        if getattr(settings, "QUERY_BUDGET_HEADERS", False):
+            response["X-Query-Count"] = str(stats.queries)
+            response["X-Query-Duplicates"] = str(stats.duplicates)
+            response["X-Query-Time"] = "{:.4f}".format(stats.query_seconds)
+            response["X-Request-Time"] = "{:.4f}".format(stats.seconds)
+
+        budget = request.query_budget
+        if budget is not None and request.method in budget.methods:
+            violations = budget.violations(stats)
+            if violations:
+                message = "Query budget exceeded for {} ({}): {}. Most repeated: {}".format(
+                    request.query_budget_view, request.path, ", ".join(violations), recorder.most_repeated()
+                )
+                if getattr(settings, "QUERY_BUDGET_ENFORCE", False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = getattr(view_func, "query_budget", None)
+        request.query_budget_view = getattr(view_func, "__qualname__", str(view_func))
+        has_budget = request.query_budget is not None and request.method in request.query_budget.methods
+        if request.query_recorder is None and (has_budget or getattr(settings, "QUERY_BUDGET_HEADERS", False)):
+            request.query_recorder = QueryRecorder().__enter__()
+        return None
+
+
+class TokenRateLimitMiddleware:
+    """Answers requests made with a long-lived token that is over its rate limit with a 429 response."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, TokenRateLimitExceeded):
+            return None
+        response = HttpResponse(
+            json.dumps({"result": "Rate limit exceeded"}), status=429, content_type="application/json; charset=utf-8"
+        )
+        response["Retry-After"] = str(exception.retry_after)
+        return response
@@ -0,0 +1,63 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:42
+
+import itertools
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Frozen copy of viewer.utils.ngrams.text_ngrams as of this migration, so later changes to it don't change what
+# this migration fills.
+def text_ngrams(texts):
+    ngrams = set()
+    for text in texts:
+        if not text:
+            continue
+        decomposed = unicodedata.normalize('NFKD', text)
+        without_marks = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+        normalised = ''.join(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c for c in without_marks)
+        for word in normalised.split():
+            ngrams.update(word[i:i + 3] for i in range(len(word) - 3 + 1))
+    return ngrams
+
+
+def fill_text_ngrams(apps, schema_editor):
+    TextNgram = apps.get_model('viewer', 'TextNgram')
+    sources = (
+        (1, apps.get_model('viewer', 'Archive'), ('title', 'title_jpn')),
+        (2, apps.get_model('viewer', 'Gallery'), ('title', 'title_jpn')),
+        (3, apps.get_model('viewer', 'Tag'), ('name',)),
+    )
+    for kind, model, fields in sources:
+        rows = model.objects.order_by('pk').values_list('pk', *fields).iterator(chunk_size=2000)
+        while rows_chunk := list(itertools.islice(rows, 2000)):
+            TextNgram.objects.bulk_create(
+                [
+                    TextNgram(kind=kind, object_id=row[0], ngram=ngram)
+                    for row in rows_chunk for ngram in text_ngrams(row[1:])
+                ],
+                batch_size=5000,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0208_alter_downloadevent_total_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextNgram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Archive title'), (2, 'Gallery title'), (3, 'Tag name')])),
+                ('object_id', models.PositiveIntegerField()),
+                ('ngram', models.CharField(max_length=3)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'ngram', 'object_id'], name='textngram_kind_ngram_object'), models.Index(fields=['kind', 'object_id'], name='textngram_kind_object')],
+            },
+        ),
+        migrations.RunPython(fill_text_ngrams, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0209_textngram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveHashProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('algorithm', models.CharField(max_length=50)),
+                ('crc32', models.CharField(blank=True, max_length=10, verbose_name='CRC32')),
+                ('hashes', models.JSONField(default=dict)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hash_profiles', to='viewer.archive')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('archive', 'algorithm'), name='unique_archive_hash_profile')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewer', '0210_archivehashprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userlonglivedtoken',
+            name='last_used',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userlonglivedtoken',
+            name='rate_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Requests per minute, empty to use the configured default, 0 for no limit.', null=True),
+        ),
+        migrations.AddField(
+            model_name='userlonglivedtoken',
+            name='request_count',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -7,12 +7,11 @@ import os
 import re
 import shutil
 import subprocess
-import time
 import typing
 import uuid
 import zipfile
 from collections import Counter, defaultdict
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone, date
 from operator import itemgetter
 
@@ -43,10 +42,10 @@ from PIL import Image as PImage
 from PIL import ImageFile
 import django.db.models.options as options
 from django.urls import reverse
-from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser, User
 from django.core.files import File
 from django.db import models, transaction
-from django.db.models import Q, F, Count, QuerySet
+from django.db.models import Q, F, Count, QuerySet, Max, Min
 import django.utils.timezone as django_tz
 from django.db.models import Lookup
 from django.utils.translation import gettext_lazy as _
@@ -57,7 +56,9 @@ from core.base.comparison import get_list_closer_text_from_list
 from core.base.image_ops import img_to_thumbnail
 from core.base.tag_logic import ArchiveTagsComparer
 from core.base.utilities import (
+    BAD_ZIP_ERRORS,
     calc_crc32,
+    first_bad_zip_member,
     get_zip_filesize,
     get_zip_fileinfo,
     sha1_from_file_object,
@@ -69,13 +70,19 @@ from core.base.utilities import (
     available_filename,
     file_matches_any_filter,
     hamming_distance,
+    chunks,
 )
+from core.base.nested_zip import NestedZipReader
+from core.base.image_probe import read_image_header
 from core.base.types import GalleryData, DataDict, ArchiveGenericFile, ArchiveStatisticsCalculator
 from core.base.utilities import get_dict_allowed_fields, replace_illegal_name
 from viewer.services import CompareObjectsService
 from viewer.utils import image_processing
 from viewer.utils.elasticsearch import add_gallery_data_to_match_index, match_expression_to_wanted_index, \
     remove_gallery_from_match_index
+from viewer.signals import galleries_bulk_saved, archives_bulk_saved
+from viewer.utils.ngrams import NGRAM_SIZE, pattern_ngrams, substring_ngrams, text_ngrams
+from viewer.utils.side_effects import current_unit
 from viewer.utils.tags import sort_tags, sort_tags_str
 
 if typing.TYPE_CHECKING:
@@ -157,6 +164,64 @@ class TagManager(models.Manager["Tag"]):
         return self.get_queryset().first_artist_tag(**kwargs)
 
 
+class TagResolver:
+    """Maps tag strings ("scope:name" or "name") to Tag ids, remembering the ones already resolved.
+
+    Tags that don't exist are created in bulk, so resolving the tags of a group of galleries takes a few queries
+    instead of a get_or_create per tag. An instance can be reused between batches of the same crawl.
+    """
+
+    def __init__(self) -> None:
+        self.tag_ids: dict[tuple[str, str], int] = {}
+
+    @staticmethod
+    def split_tag(tag: str) -> tuple[str, str]:
+        scope_name = tag.split(":", maxsplit=1)
+        if len(scope_name) > 1:
+            return scope_name[0], scope_name[1]
+        return "", tag
+
+    def load(self, scope_names: typing.Collection[tuple[str, str]]) -> None:
+        scopes = {x[0] for x in scope_names}
+        names = sorted({x[1] for x in scope_names})
+        for names_chunk in chunks(names, 900):
+            for scope, name, tag_id in Tag.objects.filter(scope__in=scopes, name__in=names_chunk).values_list(
+                "scope", "name", "pk"
+            ):
+                if (scope, name) in scope_names:
+                    self.tag_ids[(scope, name)] = tag_id
+
+    def warm(self, tags: typing.Iterable[str]) -> None:
+        """Loads the ids of the tags that already exist, without creating the missing ones."""
+        missing = {self.split_tag(tag) for tag in tags if tag != ""}.difference(self.tag_ids)
+        if missing:
+            self.load(missing)
+
+    def resolve(self, tags: typing.Iterable[str]) -> list[int]:
+        """Ids for the given tags in their original order, without duplicates. Empty strings are skipped."""
+        scope_names = list(dict.fromkeys(self.split_tag(tag) for tag in tags if tag != ""))
+
+        missing = {x for x in scope_names if x not in self.tag_ids}
+        if missing:
+            self.load(missing)
+            missing.difference_update(self.tag_ids)
+        if missing:
+            # Ignoring conflicts covers tags created concurrently by another crawler, they are read back below.
+            Tag.objects.bulk_create([Tag(scope=scope, name=name) for scope, name in missing], ignore_conflicts=True)
+            self.load(missing)
+            new_tag_texts = {self.tag_ids[x]: [x[1]] for x in missing if x in self.tag_ids}
+            # Tags the database considers equal to an existing one (case or accent insensitive collations) are not
+            # inserted nor read back with their exact value, get_or_create matches them with the database collation.
+            for scope, name in sorted(missing.difference(self.tag_ids)):
+                tag, created = Tag.objects.get_or_create(scope=scope, name=name)
+                self.tag_ids[(scope, name)] = tag.pk
+                if created:
+                    new_tag_texts[tag.pk] = [name]
+            TextNgram.objects.index_texts(TextNgram.KindChoices.TAG, new_tag_texts)
+
+        return list(dict.fromkeys(self.tag_ids[x] for x in scope_names))
+
+
 class GalleryQuerySet(models.QuerySet):
     def several_archives(self) -> QuerySet:
         return (
@@ -359,231 +424,313 @@ class GalleryManager(models.Manager["Gallery"]):
     def filter_first(self, **kwargs: typing.Any) -> Optional["Gallery"]:
         return self.filter(**kwargs).first()
 
-    def update_by_gid_provider(self, gallery_data: GalleryData) -> bool:
+    # GalleryData fields with the gid of another gallery from the same provider, and the field they are stored in.
+    relation_gid_fields = (
+        ("gallery_container_gid", "gallery_container"),
+        ("magazine_gid", "magazine"),
+        ("parent_gallery_gid", "parent_gallery"),
+        ("first_gallery_gid", "first_gallery"),
+    )
+
+    def filter_by_gid_provider_pairs(
+        self, gid_providers: typing.Iterable[tuple[str, str]]
+    ) -> dict[tuple[str, str], "Gallery"]:
+        """Galleries for each (gid, provider) pair, in one query. For repeated galleries, keeps the first one."""
+        gids_by_provider: dict[str, set[str]] = defaultdict(set)
+        for gid, provider in gid_providers:
+            gids_by_provider[provider].add(gid)
+
+        if not gids_by_provider:
+            return {}
+
+        q_objects = Q()
+        for provider, gids in gids_by_provider.items():
+            q_objects |= Q(provider=provider, gid__in=gids)
+
+        found: dict[tuple[str, str], "Gallery"] = {}
+        for gallery in self.filter(q_objects).order_by("pk"):
+            found.setdefault((gallery.gid, gallery.provider), gallery)
+        return found
+
+    @staticmethod
+    def warm_tag_resolver(gallery_data_list: typing.Iterable[GalleryData]) -> TagResolver:
+        tag_resolver = TagResolver()
+        tag_resolver.warm(tag for gallery_data in gallery_data_list for tag in gallery_data.tags or [])
+        return tag_resolver
+
+    def _values_with_relations(
+        self, gallery_data: GalleryData, related: Optional[dict[tuple[str, str], "Gallery"]] = None
+    ) -> DataDict:
+        values = get_dict_allowed_fields(gallery_data)
+        if related is None:
+            related = self.filter_by_gid_provider_pairs(
+                (values[gid_field], gallery_data.provider)
+                for gid_field, _ in self.relation_gid_fields
+                if gid_field in values
+            )
+        for gid_field, field in self.relation_gid_fields:
+            if gid_field in values:
+                related_gallery = related.get((values.pop(gid_field), gallery_data.provider))
+                if related_gallery:
+                    values[field] = related_gallery
+        return values
+
+    @staticmethod
+    def _save_provider_data(galleries_data: typing.Iterable[tuple["Gallery", GalleryData]]) -> None:
+        # Same as an update_or_create for each (gallery, name), reading all the existing rows in one query.
+        galleries_data = [x for x in galleries_data if x[1].extra_provider_data]
+        if not galleries_data:
+            return
+
+        existing_data = {
+            (x.gallery_id, x.name): x
+            for x in GalleryProviderData.objects.filter(gallery__in=[gallery for gallery, _ in galleries_data])
+        }
+
+        to_create = []
+        to_update = {}
+        for gallery, gallery_data in galleries_data:
+            for data_name, data_type, data_value in gallery_data.extra_provider_data or []:
+                obj = existing_data.get((gallery.pk, data_name))
+                if obj is None:
+                    obj = GalleryProviderData(gallery=gallery, name=data_name)
+                    existing_data[(gallery.pk, data_name)] = obj
+                    to_create.append(obj)
+                elif obj.pk:
+                    to_update[obj.pk] = obj
+                obj.data_type = data_type
+                obj.value = data_value
+                # Same validation as save, the unique and foreign key checks would be a query per row.
+                obj.full_clean(exclude=["gallery"], validate_unique=False, validate_constraints=False)
+
+        if to_create:
+            GalleryProviderData.objects.bulk_create(to_create)
+        if to_update:
+            GalleryProviderData.objects.bulk_update(
+                list(to_update.values()), ["data_type"] + ["value_{}".format(x) for x in GalleryProviderData.DATA_TYPES]
+            )
+
+    def _link_contained_galleries(self, gallery: "Gallery", gallery_data: GalleryData) -> None:
+        if gallery_data.magazine_chapters_gids:
+            chapters = self.filter(gid__in=gallery_data.magazine_chapters_gids, provider=gallery.provider)
+            chapters.update(magazine=gallery.pk)
+
+        if gallery_data.gallery_contains_gids:
+            contained = self.filter(gid__in=gallery_data.gallery_contains_gids, provider=gallery.provider)
+            contained.update(gallery_container=gallery.pk)
+
+    def update_by_gid_provider(self, gallery_data: GalleryData, tag_resolver: Optional[TagResolver] = None) -> bool:
         gallery = self.filter(gid=gallery_data.gid, provider=gallery_data.provider).first()
         if gallery:
             with transaction.atomic():
                 if gallery_data.tags is not None:
-                    new_tags = []
-                    for tag in gallery_data.tags:
-                        if tag == "":
-                            continue
-                        scope_name = tag.split(":", maxsplit=1)
-                        if len(scope_name) > 1:
-                            tag_object, _ = Tag.objects.get_or_create(scope=scope_name[0], name=scope_name[1])
-                        else:
-                            scope = ""
-                            tag_object, _ = Tag.objects.get_or_create(name=tag, scope=scope)
-
-                        new_tags.append(tag_object)
-                    gallery.tags.set(new_tags)
-                values = get_dict_allowed_fields(gallery_data)
-                if "gallery_container_gid" in values:
-                    gallery_container = Gallery.objects.filter(
-                        gid=values["gallery_container_gid"], provider=gallery_data.provider
-                    ).first()
-                    if gallery_container:
-                        values["gallery_container"] = gallery_container
-                    del values["gallery_container_gid"]
-                if "magazine_gid" in values:
-                    magazine = Gallery.objects.filter(
-                        gid=values["magazine_gid"], provider=gallery_data.provider
-                    ).first()
-                    if magazine:
-                        values["magazine"] = magazine
-                    del values["magazine_gid"]
-                if "parent_gallery_gid" in values:
-                    gallery_parent = Gallery.objects.filter(
-                        gid=values["parent_gallery_gid"], provider=gallery_data.provider
-                    ).first()
-                    if gallery_parent:
-                        values["parent_gallery"] = gallery_parent
-                    del values["parent_gallery_gid"]
-                if "first_gallery_gid" in values:
-                    gallery_first = Gallery.objects.filter(
-                        gid=values["first_gallery_gid"], provider=gallery_data.provider
-                    ).first()
-                    if gallery_first:
-                        values["first_gallery"] = gallery_first
-                    del values["first_gallery_gid"]
+                    gallery.tags.set((tag_resolver or TagResolver()).resolve(gallery_data.tags))
+                values = self._values_with_relations(gallery_data)
                 for key, value in values.items():
                     setattr(gallery, key, value)
                 gallery.save()
 
-                if gallery_data.extra_provider_data:
-                    for gallery_provider_data in gallery_data.extra_provider_data:
-                        data_name, data_type, data_value = gallery_provider_data
-                        obj, _ = GalleryProviderData.objects.update_or_create(
-                            gallery=gallery, name=data_name, defaults={"data_type": data_type}
-                        )
-                        obj.data_type = data_type
-                        obj.value = data_value
-                        obj.save()
-
-                if gallery_data.magazine_chapters_gids:
-                    chapters = Gallery.objects.filter(
-                        gid__in=gallery_data.magazine_chapters_gids, provider=gallery_data.provider
-                    )
-                    chapters.update(magazine=gallery.pk)
-
-                if gallery_data.gallery_contains_gids:
-                    contained = Gallery.objects.filter(
-                        gid__in=gallery_data.gallery_contains_gids, provider=gallery_data.provider
-                    )
-                    contained.update(gallery_container=gallery.pk)
+                self._save_provider_data([(gallery, gallery_data)])
+                self._link_contained_galleries(gallery, gallery_data)
 
                 return True
         else:
             return False
 
-    @staticmethod
-    def add_from_values(gallery_data: GalleryData) -> "Gallery":
-        tags = gallery_data.tags
-
-        values = get_dict_allowed_fields(gallery_data)
-        if "gallery_container_gid" in values:
-            gallery_container = Gallery.objects.filter(
-                gid=values["gallery_container_gid"], provider=values["provider"]
-            ).first()
-            if gallery_container:
-                values["gallery_container"] = gallery_container
-            del values["gallery_container_gid"]
-        if "magazine_gid" in values:
-            magazine = Gallery.objects.filter(gid=values["magazine_gid"], provider=values["provider"]).first()
-            if magazine:
-                values["magazine"] = magazine
-            del values["magazine_gid"]
-        if "parent_gallery_gid" in values:
-            gallery_parent = Gallery.objects.filter(
-                gid=values["parent_gallery_gid"], provider=values["provider"]
-            ).first()
-            if gallery_parent:
-                values["parent_gallery"] = gallery_parent
-            del values["parent_gallery_gid"]
-        if "first_gallery_gid" in values:
-            gallery_first = Gallery.objects.filter(gid=values["first_gallery_gid"], provider=values["provider"]).first()
-            if gallery_first:
-                values["first_gallery"] = gallery_first
-            del values["first_gallery_gid"]
+    def add_from_values(self, gallery_data: GalleryData, tag_resolver: Optional[TagResolver] = None) -> "Gallery":
+        values = self._values_with_relations(gallery_data)
 
         with transaction.atomic():
             gallery = Gallery(**values)
             gallery.save()
 
-            if gallery_data.extra_provider_data:
-                for gallery_provider_data in gallery_data.extra_provider_data:
-                    data_name, data_type, data_value = gallery_provider_data
-                    obj, _ = GalleryProviderData.objects.update_or_create(
-                        gallery=gallery, name=data_name, defaults={"data_type": data_type}
-                    )
-                    obj.data_type = data_type
-                    obj.value = data_value
-                    obj.save()
+            self._save_provider_data([(gallery, gallery_data)])
+            self._link_contained_galleries(gallery, gallery_data)
 
-            if gallery_data.magazine_chapters_gids:
-                chapters = Gallery.objects.filter(
-                    gid__in=gallery_data.magazine_chapters_gids, provider=values["provider"]
-                )
-                chapters.update(magazine=gallery.pk)
+            if gallery_data.tags:
+                gallery.tags.set((tag_resolver or TagResolver()).resolve(gallery_data.tags))
 
-            if gallery_data.gallery_contains_gids:
-                contained = Gallery.objects.filter(
-                    gid__in=gallery_data.gallery_contains_gids, provider=values["provider"]
-                )
-                contained.update(gallery_container=gallery.pk)
+        return gallery
 
-            if tags:
-                new_tags = []
-                for tag in tags:
-                    if tag == "":
-                        continue
-                    scope_name = tag.split(":", maxsplit=1)
-                    if len(scope_name) > 1:
-                        tag_object, _ = Tag.objects.get_or_create(scope=scope_name[0], name=scope_name[1])
-                    else:
-                        scope = ""
-                        tag_object, _ = Tag.objects.get_or_create(name=tag, scope=scope)
+    def update_or_create_from_values(
+        self, gallery_data: GalleryData, tag_resolver: Optional[TagResolver] = None
+    ) -> "Gallery":
+        values = self._values_with_relations(gallery_data)
+
+        with transaction.atomic():
+            gallery, _ = self.update_or_create(defaults=values, gid=values["gid"], provider=values["provider"])
 
-                    new_tags.append(tag_object)
+            self._save_provider_data([(gallery, gallery_data)])
+            self._link_contained_galleries(gallery, gallery_data)
 
-                gallery.tags.set(new_tags)
+            if gallery_data.tags:
+                gallery.tags.set((tag_resolver or TagResolver()).resolve(gallery_data.tags))
 
         return gallery
 
-    def update_or_create_from_values(self, gallery_data: GalleryData) -> "Gallery":
-        tags = gallery_data.tags
+    def bulk_update_or_create_from_values(
+        self, gallery_data_list: typing.Sequence[GalleryData], tag_resolver: Optional[TagResolver] = None
+    ) -> list["Gallery"]:
+        """Same as calling update_or_create_from_values for each GalleryData, in a number of queries that doesn't
+        depend on how many galleries or tags there are (except for magazine chapters and contained galleries).
 
-        values = get_dict_allowed_fields(gallery_data)
-        if "gallery_container_gid" in values:
-            gallery_container = Gallery.objects.filter(
-                gid=values["gallery_container_gid"], provider=values["provider"]
-            ).first()
-            if gallery_container:
-                values["gallery_container"] = gallery_container
-            del values["gallery_container_gid"]
-
-        if "magazine_gid" in values:
-            magazine = Gallery.objects.filter(gid=values["magazine_gid"], provider=values["provider"]).first()
-            if magazine:
-                values["magazine"] = magazine
-            del values["magazine_gid"]
-
-        if "parent_gallery_gid" in values:
-            gallery_parent = Gallery.objects.filter(
-                gid=values["parent_gallery_gid"], provider=values["provider"]
-            ).first()
-            if gallery_parent:
-                values["parent_gallery"] = gallery_parent
-            del values["parent_gallery_gid"]
-        if "first_gallery_gid" in values:
-            gallery_first = Gallery.objects.filter(gid=values["first_gallery_gid"], provider=values["provider"]).first()
-            if gallery_first:
-                values["first_gallery"] = gallery_first
-            del values["first_gallery_gid"]
+        Galleries and tag links are written in bulk, with one history record per gallery. Galleries are returned in
+        the same order as gallery_data_list.
+        """
+        if not gallery_data_list:
+            return []
+
+        tag_resolver = tag_resolver or TagResolver()
+
+        # Later entries for the same gallery replace earlier ones, like successive calls would.
+        data_by_key: dict[tuple[str, str], GalleryData] = {}
+        for gallery_data in gallery_data_list:
+            data_by_key[(gallery_data.gid, gallery_data.provider)] = gallery_data
+
+        related_keys = {
+            (getattr(gallery_data, gid_field), gallery_data.provider)
+            for gallery_data in data_by_key.values()
+            for gid_field, _ in self.relation_gid_fields
+            if getattr(gallery_data, gid_field, None) is not None
+        }
 
         with transaction.atomic():
-            gallery, _ = self.update_or_create(defaults=values, gid=values["gid"], provider=values["provider"])
+            # Resolving every tag at once creates all the missing ones in a single insert.
+            tag_resolver.resolve(tag for gallery_data in data_by_key.values() for tag in gallery_data.tags or [])
+            tag_ids = {
+                key: tag_resolver.resolve(gallery_data.tags)
+                for key, gallery_data in data_by_key.items()
+                if gallery_data.tags
+            }
 
-            if gallery_data.extra_provider_data:
-                for gallery_provider_data in gallery_data.extra_provider_data:
-                    data_name, data_type, data_value = gallery_provider_data
-                    obj, _ = GalleryProviderData.objects.update_or_create(
-                        gallery=gallery, name=data_name, defaults={"data_type": data_type}
+            found = self.filter_by_gid_provider_pairs(set(data_by_key) | related_keys)
+
+            galleries: dict[tuple[str, str], "Gallery"] = {}
+            new_galleries = []
+            # Existing galleries whose thumbnail has to be downloaded again from a new url.
+            changed_thumbnails = set()
+            updated_fields = {"last_modified"}
+            now = django_tz.now()
+
+            for key, gallery_data in data_by_key.items():
+                # Relations to galleries created in this batch are set after they are created.
+                values = self._values_with_relations(gallery_data, related=found)
+                gallery = found.get(key)
+                if gallery is None:
+                    gallery = Gallery(**values)
+                    new_galleries.append(gallery)
+                else:
+                    if values.get("thumbnail_url") and values["thumbnail_url"] != gallery.thumbnail_url:
+                        changed_thumbnails.add(key)
+                    for field, value in values.items():
+                        setattr(gallery, field, value)
+                    gallery.last_modified = now
+                    updated_fields.update(values)
+                galleries[key] = gallery
+
+            updated_galleries = [x for x in galleries.values() if x.pk]
+
+            if new_galleries:
+                self.bulk_create(new_galleries)
+                if new_galleries[0].pk is None:
+                    # Backends that don't return the ids from a bulk insert.
+                    created = self.filter_by_gid_provider_pairs((x.gid, x.provider) for x in new_galleries)
+                    for gallery in new_galleries:
+                        gallery.pk = created[(gallery.gid, gallery.provider)].pk
+
+                late_relations = set()
+                for key, gallery_data in data_by_key.items():
+                    for gid_field, field in self.relation_gid_fields:
+                        related_key = (getattr(gallery_data, gid_field, None), gallery_data.provider)
+                        if related_key not in found and related_key in galleries:
+                            setattr(galleries[key], field, galleries[related_key])
+                            late_relations.add(field)
+                if late_relations:
+                    self.bulk_update(new_galleries, sorted(late_relations))
+                    updated_fields.update(late_relations)
+
+            if updated_galleries:
+                self.bulk_update(updated_galleries, sorted(updated_fields))
+
+            through_model = Gallery.tags.through
+            if tag_ids:
+                tagged_ids = {galleries[key].pk: ids for key, ids in tag_ids.items()}
+                current_links: dict[int, dict[int, int]] = defaultdict(dict)
+                for link_id, gallery_id, tag_id in through_model._default_manager.filter(
+                    gallery_id__in=tagged_ids.keys()
+                ).values_list("pk", "gallery_id", "tag_id"):
+                    current_links[gallery_id][tag_id] = link_id
+
+                links_to_remove: list[int] = []
+                links_to_add: list[models.Model] = []
+                for gallery_id, ids in tagged_ids.items():
+                    links_to_remove.extend(
+                        link_id for tag_id, link_id in current_links[gallery_id].items() if tag_id not in ids
+                    )
+                    links_to_add.extend(
+                        through_model(gallery_id=gallery_id, tag_id=tag_id)
+                        for tag_id in ids
+                        if tag_id not in current_links[gallery_id]
                     )
-                    obj.data_type = data_type
-                    obj.value = data_value
-                    obj.save()
 
-            if gallery_data.magazine_chapters_gids:
-                chapters = Gallery.objects.filter(
-                    gid__in=gallery_data.magazine_chapters_gids, provider=values["provider"]
-                )
-                chapters.update(magazine=gallery.pk)
+                if links_to_remove:
+                    through_model._default_manager.filter(pk__in=links_to_remove).delete()
+                if links_to_add:
+                    through_model._default_manager.bulk_create(links_to_add)
 
-            if gallery_data.gallery_contains_gids:
-                contained = Gallery.objects.filter(
-                    gid__in=gallery_data.gallery_contains_gids, provider=values["provider"]
-                )
-                contained.update(gallery_container=gallery.pk)
+            self._save_provider_data((galleries[key], gallery_data) for key, gallery_data in data_by_key.items())
 
-            if tags:
-                new_tags = []
+            for key, gallery_data in data_by_key.items():
+                self._link_contained_galleries(galleries[key], gallery_data)
 
-                for tag in tags:
-                    if tag == "":
-                        continue
-                    scope_name = tag.split(":", maxsplit=1)
-                    if len(scope_name) > 1:
-                        tag_object, _ = Tag.objects.get_or_create(scope=scope_name[0], name=scope_name[1])
-                    else:
-                        scope = ""
-                        tag_object, _ = Tag.objects.get_or_create(name=tag, scope=scope)
+            self._bulk_history_create(new_galleries, updated_galleries)
 
-                    new_tags.append(tag_object)
+        for key, gallery in galleries.items():
+            gallery.update_index()
+            # Done by Gallery.save for single galleries, after the transaction so downloads don't hold it open.
+            gallery.fetch_thumbnail(force_redownload=key in changed_thumbnails)
 
-                gallery.tags.set(new_tags)
+        galleries_bulk_saved.send(sender=self.model, galleries=list(galleries.values()))
 
-        return gallery
+        return [galleries[(x.gid, x.provider)] for x in gallery_data_list]
+
+    def _bulk_history_create(self, new_galleries: list["Gallery"], updated_galleries: list["Gallery"]) -> None:
+        # One history record per gallery, including the tags it has after the changes.
+        history_records: list[typing.Any] = []
+        for galleries, update in ((new_galleries, False), (updated_galleries, True)):
+            if galleries:
+                history_records.extend(self.model.history.bulk_history_create(galleries, update=update) or [])
+
+        if not history_records or history_records[0].pk is None:
+            return
+
+        m2m_history_model = HistoricalRecords.m2m_models[self.model._meta.get_field("tags")]
+        history_by_gallery = {x.id: x for x in history_records}
+        m2m_history_model._default_manager.bulk_create(
+            [
+                m2m_history_model(history=history_by_gallery[gallery_id], id=link_id, gallery_id=gallery_id, tag_id=tag_id)
+                for link_id, gallery_id, tag_id in Gallery.tags.through._default_manager.filter(
+                    gallery_id__in=history_by_gallery.keys()
+                ).values_list("pk", "gallery_id", "tag_id")
+            ]
+        )
+
+    @staticmethod
+    def bulk_update_index(galleries: typing.Sequence["Gallery"]) -> None:
+        """Same as Gallery.update_index, in one bulk request."""
+        if not settings.ES_CLIENT or not settings.ES_AUTOREFRESH_GALLERY:
+            return
+        from core.base.embedded_search import bulk
+
+        actions = []
+        for gallery in galleries:
+            if settings.ES_ONLY_INDEX_PUBLIC and not gallery.public:
+                continue
+            payload = gallery.es_repr()
+            payload.update(_op_type="index", _index=gallery._meta.es_index_name)  # type: ignore
+            actions.append(payload)
+        if actions:
+            bulk(client=settings.ES_CLIENT, actions=actions, refresh=True, raise_on_error=False, request_timeout=30)
 
     # This method is mainly used to update own fields, no related fields need to be checked
     def update_by_dl_type(self, values: DataDict, gallery_id: str, dl_type: str) -> typing.Optional["Gallery"]:
@@ -669,6 +816,116 @@ class ArchiveManager(models.Manager["Archive"]):
 
         return archive
 
+    def move_to_gallery(
+        self, archives: QuerySet, gallery_id: int, user: Optional[typing.Union[User, AnonymousUser]] = None
+    ) -> list["Archive"]:
+        """Sets the gallery of the archives in a single update, instead of saving each one.
+
+        Like Archive.save, the titles and tags of the archives are taken from the gallery, unless they are frozen, and
+        the archives that take its title lose their possible matches. The save side effects are done in bulk too: one
+        batch of history records by user, one reindex request and the archives_bulk_saved signal. Returns the
+        archives that were moved, as they are after the move.
+        """
+        with transaction.atomic():
+            moved_pks = list(archives.exclude(gallery_id=gallery_id).values_list("pk", flat=True))
+            if not moved_pks:
+                return []
+            gallery = Gallery.objects.get(pk=gallery_id)
+            gallery_tag_ids = list(gallery.tags.values_list("pk", flat=True))
+
+            frozen_titles: set[int] = set()
+            frozen_tags: set[int] = set()
+            for pks_chunk in chunks(moved_pks, 900):
+                for archive_id, freeze_titles, freeze_tags in ArchiveOption.objects.filter(
+                    archive_id__in=pks_chunk
+                ).values_list("archive_id", "freeze_titles", "freeze_tags"):
+                    if freeze_titles:
+                        frozen_titles.add(archive_id)
+                    if freeze_tags:
+                        frozen_tags.add(archive_id)
+
+            title_values = {}
+            if gallery.title:
+                title_values["title"] = gallery.title
+            if gallery.title_jpn:
+                title_values["title_jpn"] = gallery.title_jpn
+
+            for pks_chunk in chunks(moved_pks, 900):
+                self.filter(pk__in=pks_chunk).update(gallery_id=gallery_id)
+                titles_chunk = [x for x in pks_chunk if x not in frozen_titles]
+                if titles_chunk and title_values:
+                    self.filter(pk__in=titles_chunk).update(**title_values)
+                if titles_chunk and gallery.title:
+                    ArchiveMatches.objects.filter(archive_id__in=titles_chunk).delete()
+                tags_chunk = [x for x in pks_chunk if x not in frozen_tags]
+                if tags_chunk and gallery_tag_ids:
+                    self.set_tags_in_bulk(tags_chunk, gallery_tag_ids)
+
+            moved: list[Archive] = []
+            for pks_chunk in chunks(moved_pks, 900):
+                moved.extend(self.filter(pk__in=pks_chunk).select_related("gallery").prefetch_related("tags"))
+            Archive.history.bulk_history_create(
+                moved, update=True, default_user=user if user is not None and user.is_authenticated else None
+            )
+        self.bulk_update_index(moved)
+        archives_bulk_saved.send(sender=self.model, archives=moved)
+        return moved
+
+    @staticmethod
+    def set_tags_in_bulk(archive_ids: typing.Sequence[int], tag_ids: typing.Sequence[int]) -> None:
+        """Same as Archive.set_tags_from_gallery for each archive: the tags are replaced, keeping the custom ones."""
+        ArchiveTag.objects.filter(archive_id__in=archive_ids).exclude(origin=ArchiveTag.ORIGIN_USER).exclude(
+            tag_id__in=tag_ids
+        ).delete()
+        existing = set(
+            ArchiveTag.objects.filter(archive_id__in=archive_ids, tag_id__in=tag_ids).values_list(
+                "archive_id", "tag_id"
+            )
+        )
+        ArchiveTag.objects.bulk_create(
+            [
+                ArchiveTag(archive_id=archive_id, tag_id=tag_id)
+                for archive_id in archive_ids
+                for tag_id in tag_ids
+                if (archive_id, tag_id) not in existing
+            ]
+        )
+
+    @staticmethod
+    def bulk_update_index(archives: typing.Sequence["Archive"]) -> None:
+        """Same as the index update in Archive.simple_save, in one bulk request."""
+        if not settings.ES_CLIENT or not settings.ES_AUTOREFRESH:
+            return
+        from core.base.embedded_search import bulk
+
+        actions = []
+        for archive in archives:
+            if settings.ES_ONLY_INDEX_PUBLIC and not archive.public:
+                continue
+            payload = archive.es_repr()
+            payload.update(_op_type="index", _index=archive._meta.es_index_name)  # type: ignore
+            actions.append(payload)
+        if actions:
+            bulk(client=settings.ES_CLIENT, actions=actions, refresh=True, raise_on_error=False, request_timeout=30)
+
+    @staticmethod
+    def bulk_history_created(archives: typing.Sequence["Archive"]) -> None:
+        Archive.history.bulk_history_create(archives)
+
+    @staticmethod
+    def bulk_history_changed(archives: typing.Sequence["Archive"]) -> None:
+        Archive.history.bulk_history_create(archives, update=True)
+
+    @staticmethod
+    def bulk_update_images_from_file(archives: typing.Sequence["Archive"]) -> None:
+        for archive in archives:
+            archive.update_images_from_file()
+
+    @staticmethod
+    def bulk_create_marks(archives: typing.Sequence["Archive"]) -> None:
+        for archive in archives:
+            archive.create_mark_if_parent_gallery()
+
     def add_or_update_from_values(self, values: DataDict, **kwargs: typing.Any) -> "Archive":
 
         archive, _ = self.update_or_create(defaults=values, **kwargs)
@@ -705,6 +962,113 @@ class Tag(models.Model):
             return self.name
 
 
+class TextNgramManager(models.Manager["TextNgram"]):
+    def index_texts(self, kind: int, texts_by_id: typing.Mapping[int, typing.Iterable[Optional[str]]]) -> None:
+        """Updates the n-grams of the given objects, only writing the ones that changed."""
+        wanted = {object_id: text_ngrams(texts) for object_id, texts in texts_by_id.items()}
+
+        current: dict[int, set[str]] = defaultdict(set)
+        for ids_chunk in chunks(list(wanted), 900):
+            for object_id, ngram in self.filter(kind=kind, object_id__in=ids_chunk).values_list("object_id", "ngram"):
+                current[object_id].add(ngram)
+
+        to_create: list["TextNgram"] = []
+        for object_id, ngrams in wanted.items():
+            removed = current[object_id] - ngrams
+            if removed:
+                self.filter(kind=kind, object_id=object_id, ngram__in=removed).delete()
+            to_create.extend(
+                TextNgram(kind=kind, object_id=object_id, ngram=ngram) for ngram in ngrams - current[object_id]
+            )
+        self.bulk_create(to_create, batch_size=5000)
+
+    def index_objects(self, objects: typing.Iterable[models.Model]) -> None:
+        objects_by_kind: dict[int, dict[int, list[Optional[str]]]] = defaultdict(dict)
+        for obj in objects:
+            kind = TextNgram.kind_for_model(type(obj))
+            objects_by_kind[kind][obj.pk] = [getattr(obj, field) for field in TextNgram.INDEXED_FIELDS[kind]]
+        for kind, texts_by_id in objects_by_kind.items():
+            self.index_texts(kind, texts_by_id)
+
+    def remove_objects(self, model: type[models.Model], object_ids: typing.Iterable[int]) -> None:
+        self.filter(kind=TextNgram.kind_for_model(model), object_id__in=list(object_ids)).delete()
+
+    def rebuild(self, model: type[models.Model], batch_size: int = 2000) -> None:
+        """Brings the index for a model up to date, for rows changed with update() or outside Django."""
+        kind = TextNgram.kind_for_model(model)
+        self.filter(kind=kind).exclude(object_id__in=model._default_manager.values("pk")).delete()
+        rows = model._default_manager.order_by("pk").values_list("pk", *TextNgram.INDEXED_FIELDS[kind])
+        rows_iterator = rows.iterator(chunk_size=batch_size)
+        while rows_chunk := list(itertools.islice(rows_iterator, batch_size)):
+            self.index_texts(kind, {row[0]: row[1:] for row in rows_chunk})
+
+    def matching_ids(self, kind: int, ngrams: typing.Collection[str]) -> QuerySet:
+        """Ids of the objects containing all the n-grams, to be used as a pk__in subquery."""
+        return (
+            self.filter(kind=kind, ngram__in=ngrams)
+            .values("object_id")
+            .annotate(matched=Count("ngram", distinct=True))
+            .filter(matched=len(ngrams))
+            .values("object_id")
+        )
+
+    def title_search(self, queryset: QuerySet, pattern: str) -> QuerySet:
+        """Same results as filtering title or title_jpn by the SpacedSearch pattern, with the index narrowing the
+        rows that the LIKE is evaluated on."""
+        results = queryset.filter(Q(title__ss=pattern) | Q(title_jpn__ss=pattern))
+        ngrams = pattern_ngrams(pattern)
+        if ngrams:
+            results = results.filter(pk__in=self.matching_ids(TextNgram.kind_for_model(queryset.model), ngrams))
+        return results
+
+    def tag_name_contains(self, name: str, relation: str = "tags") -> Q:
+        """Q for relation__name__contains, with the index narrowing the tags that are compared."""
+        query = Q(**{"{}__name__contains".format(relation): name})
+        ngrams = substring_ngrams(name)
+        if ngrams:
+            query &= Q(**{"{}__in".format(relation): self.matching_ids(TextNgram.KindChoices.TAG, ngrams)})
+        return query
+
+
+class TextNgram(models.Model):
+    """N-gram index over titles and tag names. Substring searches only have to compare the rows that contain every
+    n-gram of the searched words, instead of scanning the whole table. Kept up to date by signal handlers."""
+
+    class KindChoices(models.IntegerChoices):
+        ARCHIVE = 1, _("Archive title")
+        GALLERY = 2, _("Gallery title")
+        TAG = 3, _("Tag name")
+
+    INDEXED_FIELDS: dict[int, tuple[str, ...]] = {
+        KindChoices.ARCHIVE: ("title", "title_jpn"),
+        KindChoices.GALLERY: ("title", "title_jpn"),
+        KindChoices.TAG: ("name",),
+    }
+
+    kind = models.PositiveSmallIntegerField(choices=KindChoices.choices)
+    object_id = models.PositiveIntegerField()
+    ngram = models.CharField(max_length=NGRAM_SIZE)
+
+    objects = TextNgramManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "ngram", "object_id"], name="textngram_kind_ngram_object"),
+            models.Index(fields=["kind", "object_id"], name="textngram_kind_object"),
+        ]
+
+    @classmethod
+    def kind_for_model(cls, model: type[models.Model]) -> int:
+        return {
+            "archive": cls.KindChoices.ARCHIVE,
+            "gallery": cls.KindChoices.GALLERY,
+            "tag": cls.KindChoices.TAG,
+        }[model._meta.model_name or ""]
+
+    def __str__(self) -> str:
+        return "{}: {}".format(self.object_id, self.ngram)
+
+
 def gallery_thumb_path_handler(instance: "Gallery", filename: str) -> str:
     return "images/gallery_thumbs/{id}/{file}".format(id=instance.id, file=filename)
 
@@ -1135,7 +1499,10 @@ class Gallery(models.Model):
     def save(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         is_new = self.pk
         super(Gallery, self).save(*args, **kwargs)
-        if settings.ES_CLIENT and settings.ES_AUTOREFRESH_GALLERY:
+        unit = current_unit()
+        if unit is not None:
+            unit.add("gallery_index", self, Gallery.objects.bulk_update_index)
+        elif settings.ES_CLIENT and settings.ES_AUTOREFRESH_GALLERY:
             if (settings.ES_ONLY_INDEX_PUBLIC and self.public) or not settings.ES_ONLY_INDEX_PUBLIC:
                 payload = self.es_repr()
                 del payload["_id"]
@@ -1396,28 +1763,31 @@ class Gallery(models.Model):
                 Q(wait_for_time__isnull=True) | Q(wait_for_time__lte=django_tz.now() - self.posted)
             )
 
+        # Fetched once, instead of for each check of each WantedGallery.
+        gallery_tags = set(self.tag_list())
+
         for wanted_filter in filtered_wanted:
             # if wanted_filter.wanted_providers.count():
             #     if not wanted_filter.wanted_providers.filter(slug=self.provider).first():
             #         continue
             accepted = True
             if bool(wanted_filter.wanted_tags.all()):
-                if not set(wanted_filter.wanted_tags_list()).issubset(set(self.tag_list())):
+                if not set(wanted_filter.wanted_tags_list()).issubset(gallery_tags):
                     accepted = False
                 # Review based on 'accept if none' scope.
                 if not accepted and wanted_filter.wanted_tags_accept_if_none_scope:
-                    missing_tags = set(wanted_filter.wanted_tags_list()).difference(set(self.tag_list()))
+                    missing_tags = set(wanted_filter.wanted_tags_list()).difference(gallery_tags)
                     # If all the missing tags start with the parameter,
                     # and no other tag is in gallery with this parameter, mark as accepted
                     scope_formatted = wanted_filter.wanted_tags_accept_if_none_scope + ":"
                     if all(x.startswith(scope_formatted) for x in missing_tags) and not any(
-                        x.startswith(scope_formatted) for x in self.tag_list()
+                        x.startswith(scope_formatted) for x in gallery_tags
                     ):
                         accepted = True
                 # Do not accept galleries that have more than 1 tag in the same wanted tag scope.
                 if accepted & wanted_filter.wanted_tags_exclusive_scope:
-                    accepted_tags = set(wanted_filter.wanted_tags_list()).intersection(set(self.tag_list()))
-                    gallery_tags_scopes = [x.split(":", maxsplit=1)[0] for x in self.tag_list() if len(x) > 1]
+                    accepted_tags = set(wanted_filter.wanted_tags_list()).intersection(gallery_tags)
+                    gallery_tags_scopes = [x.split(":", maxsplit=1)[0] for x in gallery_tags if len(x) > 1]
                     wanted_gallery_tags_scopes = [x.split(":", maxsplit=1)[0] for x in accepted_tags if len(x) > 1]
                     scope_count: dict[str, int] = defaultdict(int)
                     for scope_name in gallery_tags_scopes:
@@ -1437,7 +1807,7 @@ class Gallery(models.Model):
                 continue
 
             if bool(wanted_filter.unwanted_tags.all()):
-                if any(item in self.tag_list() for item in wanted_filter.unwanted_tags_list()):
+                if any(item in gallery_tags for item in wanted_filter.unwanted_tags_list()):
                     continue
 
             if wanted_filter.match_expression:
@@ -2044,6 +2414,7 @@ class Archive(models.Model):
         self.zipped.delete(save=False)
         if not preserve_image_data:
             self.image_set.all().delete()
+            ArchiveStatistics.objects.update_for_archives([self.pk])
         self.extracted = False
         if create_mark:
             manager_entry, _ = ArchiveManageEntry.objects.update_or_create(
@@ -2069,6 +2440,7 @@ class Archive(models.Model):
                 img.thumbnail.delete(save=False)
         self.thumbnail.delete(save=False)
         self.image_set.all().delete()
+        ArchiveStatistics.objects.update_for_archives([self.pk])
         self.extracted = False
         self.simple_save()
 
@@ -2088,10 +2460,7 @@ class Archive(models.Model):
 
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
-            return None, "Bad original zip file"
-
-        if my_zip.testzip():
+        except BAD_ZIP_ERRORS:
             return None, "Bad original zip file"
 
         filtered_files = get_images_from_zip(my_zip)
@@ -2106,35 +2475,33 @@ class Archive(models.Model):
 
         new_file_path = os.path.join(settings.MEDIA_ROOT, new_file_name)
 
-        new_zipfile = zipfile.ZipFile(new_file_path, "w")
-
-        for count, sha1 in enumerate(sha1s, start=1):
+        # Descending, so the first image with each SHA1 value is the one kept.
+        archive_positions = dict(images.order_by("-pk").values_list("sha1", "archive_position"))
 
-            try:
-                current_image = images.filter(sha1=sha1).first()
-            except Image.DoesNotExist:
+        for sha1 in sha1s:
+            if sha1 not in archive_positions:
                 return None, "Image from SHA1 value: {} does not exist".format(sha1)
 
-            if current_image is None:
-                return None, "Image from SHA1 value: {} does not exist".format(sha1)
+        reader = NestedZipReader(my_zip)
 
-            archive_position = current_image.archive_position
-            current_file_tuple = filtered_files[archive_position - 1]
-            if current_file_tuple[1] is None:
-                with my_zip.open(current_file_tuple[0]) as current_zip_img:
+        # Pages are copied without recompressing them.
+        try:
+            with zipfile.ZipFile(new_file_path, "w") as new_zipfile:
+                for count, sha1 in enumerate(sha1s, start=1):
+                    current_file_tuple = filtered_files[archive_positions[sha1] - 1]
                     current_basename = os.path.basename(current_file_tuple[0])
-                    new_zipfile.writestr("{}_{}".format(str(count).zfill(4), current_basename), current_zip_img.read())
-            else:
-                with my_zip.open(current_file_tuple[1]) as current_zip:
-                    with zipfile.ZipFile(current_zip) as my_nested_zip:
-                        with my_nested_zip.open(current_file_tuple[0]) as current_zip_img:
-                            current_basename = os.path.basename(current_file_tuple[0])
-                            new_zipfile.writestr(
-                                "{}_{}".format(str(count).zfill(4), current_basename), current_zip_img.read()
-                            )
-
-        new_zipfile.close()
-        my_zip.close()
+                    reader.copy(
+                        current_file_tuple[0],
+                        current_file_tuple[1],
+                        new_zipfile,
+                        "{}_{}".format(str(count).zfill(4), current_basename),
+                    )
+        except zipfile.BadZipFile:
+            os.remove(new_file_path)
+            return None, "Bad original zip file"
+        finally:
+            reader.close()
+            my_zip.close()
 
         new_archive = self
 
@@ -2157,6 +2524,51 @@ class Archive(models.Model):
 
         return new_archive, ""
 
+    @staticmethod
+    def run_image_tool_on_pages(
+        reader: NestedZipReader,
+        image_tool: "CloningImageToolSettings",
+        pages: list[tuple[int, tuple[str, Optional[str], str], str]],
+        dir_path: str,
+    ) -> tuple[dict[int, str], str]:
+        """Extracts the pages that match the filters of the tool and runs it on them, with up to max_workers runs at
+        the same time. Returns the modified file of each page by its count, or an error message."""
+        commands: dict[int, tuple[str, str]] = {}
+        for count, current_file_tuple, _ in pages:
+            if not file_matches_any_filter(current_file_tuple[0], image_tool.file_filters):
+                continue
+            extracted_file = os.path.join(
+                dir_path, "file_{}{}".format(count, os.path.splitext(current_file_tuple[0])[1])
+            )
+            mod_file = os.path.join(dir_path, "mod_file_{}.tmp".format(count))
+            with (
+                reader.open(current_file_tuple[0], current_file_tuple[1]) as current_img,
+                open(extracted_file, "wb") as current_new_img,
+            ):
+                shutil.copyfileobj(current_img, current_new_img)
+            commands[count] = (image_tool.executable_path.format(input=extracted_file, output=mod_file), mod_file)
+
+        def run_command(final_command: str) -> subprocess.CompletedProcess:
+            return subprocess.run(
+                final_command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                shell=True,
+            )
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, image_tool.max_workers)) as executor:
+                process_results = list(executor.map(run_command, [x[0] for x in commands.values()]))
+        except FileNotFoundError:
+            return {}, "The following command could not run: {}".format(image_tool.name)
+
+        for process_result in process_results:
+            if process_result.returncode != 0:
+                return {}, "An error was captured when running {}: {}".format(image_tool.name, process_result.stderr)
+
+        return {count: mod_file for count, (_, mod_file) in commands.items()}, ""
+
     def clone_archive_plus(
         self, sha1s: Optional[list[str]] = None, image_tool: Optional["CloningImageToolSettings"] = None
     ) -> "tuple[Optional[Archive], str]":
@@ -2176,10 +2588,7 @@ class Archive(models.Model):
 
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
-            return None, "Bad original zip file"
-
-        if my_zip.testzip():
+        except BAD_ZIP_ERRORS:
             return None, "Bad original zip file"
 
         filtered_files = get_images_from_zip(my_zip)
@@ -2190,113 +2599,59 @@ class Archive(models.Model):
         if not self.zipped.name:
             return None, "Original file is not set"
 
-        new_file_name = available_filename(settings.MEDIA_ROOT, self.zipped.name)
-
-        new_file_path = os.path.join(settings.MEDIA_ROOT, new_file_name)
-
-        new_zipfile = zipfile.ZipFile(new_file_path, "w")
-        dir_path = mkdtemp(dir=settings.CRAWLER_SETTINGS.temp_directory_path)
+        # Pages with the same content share a SHA1 value, each occurrence of it takes the next one of them.
+        archive_positions: dict[Optional[str], list[int]] = defaultdict(list)
+        for image_sha1, archive_position in images.order_by("-archive_position").values_list("sha1", "archive_position"):
+            archive_positions[image_sha1].append(archive_position)
 
+        pages: list[tuple[int, tuple[str, Optional[str], str], str]] = []
         for count, sha1 in enumerate(local_sha1s, start=1):
-
-            try:
-                current_image = images.get(sha1=sha1)
-            except Image.DoesNotExist:
-                shutil.rmtree(dir_path, ignore_errors=True)
+            if sha1 not in archive_positions:
                 return None, "Image from SHA1 value: {} does not exist".format(sha1)
+            if not archive_positions[sha1]:
+                return None, "Image from SHA1 value: {} is used more times than it's in the archive".format(sha1)
 
-            archive_position = current_image.archive_position
-            current_file_tuple = filtered_files[archive_position - 1]
-            if current_file_tuple[1] is None:
-                my_zip.extract(current_file_tuple[0], path=dir_path)
-
-                extracted_file = os.path.join(dir_path, current_file_tuple[0].replace("\\", "/"))
+            current_file_tuple = filtered_files[archive_positions[sha1].pop() - 1]
+            current_basename = os.path.basename(current_file_tuple[0])
 
-                if image_tool and file_matches_any_filter(current_file_tuple[0], image_tool.file_filters):
-                    mod_file = os.path.join(dir_path, "mod_file_{}.tmp".format(count))
-
-                    final_command = image_tool.executable_path.format(input=extracted_file, output=mod_file)
-
-                    try:
-                        process_result = subprocess.run(
-                            final_command,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            universal_newlines=True,
-                            shell=True,
-                        )
-                    except FileNotFoundError:
-                        shutil.rmtree(dir_path, ignore_errors=True)
-                        return None, "The following command could not run: {}".format(image_tool.name)
-
-                    if process_result.returncode != 0:
-                        shutil.rmtree(dir_path, ignore_errors=True)
-                        return None, "An error was captured when running {}: {}".format(
-                            image_tool.name, process_result.stderr
-                        )
-                    out_file = mod_file
-                else:
-                    out_file = extracted_file
-
-                current_basename = os.path.basename(current_file_tuple[0])
-
-                if sha1s:
-                    out_name = "{}_{}".format(str(count).zfill(4), current_basename)
-                else:
-                    out_name = current_basename
-
-                new_zipfile.write(
-                    out_file,
-                    arcname=out_name,
-                )
+            if sha1s:
+                out_name = "{}_{}".format(str(count).zfill(4), current_basename)
             else:
-                with my_zip.open(current_file_tuple[1]) as current_zip:
-                    with zipfile.ZipFile(current_zip) as my_nested_zip:
-                        my_nested_zip.extract(current_file_tuple[0], path=dir_path)
-
-                        extracted_file = os.path.join(dir_path, current_file_tuple[0].replace("\\", "/"))
+                out_name = current_basename
+            pages.append((count, current_file_tuple, out_name))
 
-                        if image_tool and file_matches_any_filter(current_file_tuple[0], image_tool.file_filters):
-                            mod_file = os.path.join(dir_path, "mod_file_{}.tmp".format(count))
-
-                            final_command = image_tool.executable_path.format(input=extracted_file, output=mod_file)
+        new_file_name = available_filename(settings.MEDIA_ROOT, self.zipped.name)
 
-                            try:
-                                process_result = subprocess.run(
-                                    final_command,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    universal_newlines=True,
-                                    shell=True,
-                                )
-                            except FileNotFoundError:
-                                shutil.rmtree(dir_path, ignore_errors=True)
-                                return None, "The following command could not run: {}".format(image_tool.name)
-
-                            if process_result.returncode != 0:
-                                shutil.rmtree(dir_path, ignore_errors=True)
-                                return None, "An error was captured when running {}: {}".format(
-                                    image_tool.name, process_result.stderr
-                                )
-                            out_file = mod_file
-                        else:
-                            out_file = extracted_file
+        new_file_path = os.path.join(settings.MEDIA_ROOT, new_file_name)
 
-                        current_basename = os.path.basename(current_file_tuple[0])
+        new_zipfile = zipfile.ZipFile(new_file_path, "w")
+        dir_path = mkdtemp(dir=settings.CRAWLER_SETTINGS.temp_directory_path)
+        reader = NestedZipReader(my_zip)
 
-                        if sha1s:
-                            out_name = "{}_{}".format(str(count).zfill(4), current_basename)
-                        else:
-                            out_name = current_basename
+        try:
+            if image_tool:
+                modified_files, error_message = self.run_image_tool_on_pages(reader, image_tool, pages, dir_path)
+            else:
+                modified_files, error_message = {}, ""
 
-                        new_zipfile.write(
-                            out_file,
-                            arcname=out_name,
-                        )
+            if not error_message:
+                # Pages that weren't modified are copied without recompressing them.
+                for count, current_file_tuple, out_name in pages:
+                    if count in modified_files:
+                        new_zipfile.write(modified_files[count], arcname=out_name)
+                    else:
+                        reader.copy(current_file_tuple[0], current_file_tuple[1], new_zipfile, out_name)
+        except zipfile.BadZipFile:
+            error_message = "Bad original zip file"
+        finally:
+            new_zipfile.close()
+            reader.close()
+            my_zip.close()
+            shutil.rmtree(dir_path, ignore_errors=True)
 
-        new_zipfile.close()
-        my_zip.close()
-        shutil.rmtree(dir_path, ignore_errors=True)
+        if error_message:
+            os.remove(new_file_path)
+            return None, error_message
 
         new_archive = self
 
@@ -2331,10 +2686,7 @@ class Archive(models.Model):
 
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
-            return None, "Bad original zip file"
-
-        if my_zip.testzip():
+        except BAD_ZIP_ERRORS:
             return None, "Bad original zip file"
 
         if not self.zipped.name:
@@ -2357,7 +2709,13 @@ class Archive(models.Model):
         else:
             split_data_to_use = split_data
 
+        if split_from_nested:
+            archive_positions = {x: x for x in images.values_list("archive_position", flat=True)}
+        else:
+            archive_positions = dict(images.values_list("position", "archive_position"))
+
         new_archives = []
+        reader = NestedZipReader(my_zip)
 
         for split_archive in split_data_to_use:
             starting_position, ending_position, file_name, force_filename = split_archive
@@ -2366,61 +2724,33 @@ class Archive(models.Model):
                 file_name += ".zip"
             new_name = file_name or current_file
             new_path = os.path.join(current_dir, new_name)
-            new_file_name = available_filename(settings.MEDIA_ROOT, new_path)
-
-            new_file_path = os.path.join(settings.MEDIA_ROOT, new_file_name)
-
-            new_zipfile = zipfile.ZipFile(new_file_path, "w")
-            dir_path = mkdtemp(dir=settings.CRAWLER_SETTINGS.temp_directory_path)
 
             for position in range(starting_position, ending_position + 1):
-
-                try:
-                    if split_from_nested:
-                        current_image = images.get(archive_position=position)
-                    else:
-                        current_image = images.get(position=position)
-                except Image.DoesNotExist:
-                    shutil.rmtree(dir_path, ignore_errors=True)
+                if position not in archive_positions:
+                    reader.close()
+                    my_zip.close()
                     return None, "Image from position: {} does not exist".format(position)
 
-                archive_position = current_image.archive_position
-                current_file_tuple = filtered_files[archive_position - 1]
-                if current_file_tuple[1] is None:
-                    my_zip.extract(current_file_tuple[0], path=dir_path)
-
-                    extracted_file = os.path.join(dir_path, current_file_tuple[0].replace("\\", "/"))
-
-                    out_file = extracted_file
-
-                    current_basename = os.path.basename(current_file_tuple[0])
-
-                    out_name = current_basename
-
-                    new_zipfile.write(
-                        out_file,
-                        arcname=out_name,
-                    )
-                else:
-                    with my_zip.open(current_file_tuple[1]) as current_zip:
-                        with zipfile.ZipFile(current_zip) as my_nested_zip:
-                            my_nested_zip.extract(current_file_tuple[0], path=dir_path)
-
-                            extracted_file = os.path.join(dir_path, current_file_tuple[0].replace("\\", "/"))
-
-                            out_file = extracted_file
-
-                            current_basename = os.path.basename(current_file_tuple[0])
-
-                            out_name = current_basename
+            new_file_name = available_filename(settings.MEDIA_ROOT, new_path)
 
-                            new_zipfile.write(
-                                out_file,
-                                arcname=out_name,
-                            )
+            new_file_path = os.path.join(settings.MEDIA_ROOT, new_file_name)
 
-            new_zipfile.close()
-            shutil.rmtree(dir_path, ignore_errors=True)
+            # Pages are copied without recompressing them.
+            try:
+                with zipfile.ZipFile(new_file_path, "w") as new_zipfile:
+                    for position in range(starting_position, ending_position + 1):
+                        current_file_tuple = filtered_files[archive_positions[position] - 1]
+                        reader.copy(
+                            current_file_tuple[0],
+                            current_file_tuple[1],
+                            new_zipfile,
+                            os.path.basename(current_file_tuple[0]),
+                        )
+            except zipfile.BadZipFile:
+                os.remove(new_file_path)
+                reader.close()
+                my_zip.close()
+                return None, "Bad original zip file"
 
             new_archive = self
 
@@ -2448,6 +2778,7 @@ class Archive(models.Model):
 
             new_archives.append(new_archive)
 
+        reader.close()
         my_zip.close()
 
         return new_archives, ""
@@ -2460,6 +2791,37 @@ class Archive(models.Model):
         else:
             return static("imgs/no_cover.png"), 290, 196
 
+    def update_image_data_from_headers(self) -> bool:
+        """Sets the dimensions, mode, format and size of each page from the image headers and recalculates the
+        statistics. Unlike calculate_sha1_and_data_for_images, the images are not read fully nor hashed."""
+        try:
+            my_zip = zipfile.ZipFile(self.zipped.path, "r")
+        except (*BAD_ZIP_ERRORS, FileNotFoundError):
+            return False
+
+        image_set = self.image_set.all().order_by("archive_position")
+        filtered_files = get_images_from_zip(my_zip)
+        reader = NestedZipReader(my_zip)
+
+        images_to_update = []
+        for (image_filename, nested_zip_filename, _), image in zip(filtered_files, image_set):
+            with reader.open(image_filename, nested_zip_filename) as current_zip_img:
+                image.set_attributes_from_image(
+                    current_zip_img,
+                    reader.getinfo(image_filename, nested_zip_filename).file_size,
+                    os.path.basename(image_filename),
+                )
+            images_to_update.append(image)
+
+        reader.close()
+        my_zip.close()
+
+        Image.objects.bulk_update(
+            images_to_update, ["image_size", "original_height", "original_width", "image_format", "image_mode", "image_name"]
+        )
+        ArchiveStatistics.objects.update_for_archives([self.pk])
+        return True
+
     def calculate_sha1_and_data_for_images(
             self, process_image_data: bool = True, process_other_data: bool = True,
             process_archive_statistics: bool = True
@@ -2467,10 +2829,10 @@ class Archive(models.Model):
 
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
+        except BAD_ZIP_ERRORS:
             return False
 
-        if my_zip.testzip():
+        if first_bad_zip_member(my_zip):
             my_zip.close()
             return False
 
@@ -2479,17 +2841,13 @@ class Archive(models.Model):
         filtered_files = get_images_from_zip(my_zip)
         image_type = ContentType.objects.get_for_model(Image)
 
-        archive_statistics = None
-        archive_stats_calc = None
-        if process_archive_statistics:
-            archive_statistics, _ = ArchiveStatistics.objects.get_or_create(archive=self)
-            archive_stats_calc = ArchiveStatisticsCalculator()
-
         # --- Phase 1: Serial Processing and Task Preparation ---
         images_to_update = []
-        phash_tasks = []
+        phash_tasks: list[tuple[str, Optional[str]]] = []
         # Map filename to image object for efficient lookup later
 
+        reader = NestedZipReader(my_zip)
+
         for filename_tuple, image in zip(filtered_files, image_set):
             image_filename, nested_zip_filename, _ = filename_tuple
 
@@ -2498,58 +2856,39 @@ class Archive(models.Model):
 
             # Prepare task for parallel processing, regardless of nesting
             if process_image_data and settings.CRAWLER_SETTINGS.auto_phash_images:
-                phash_tasks.append((self.zipped.path, image_filename, nested_zip_filename))
+                phash_tasks.append((image_filename, nested_zip_filename))
 
             # --- Perform fast, serial I/O tasks ---
-            if nested_zip_filename is None:
-                # Case 1: Top-level image
-                with my_zip.open(image_filename) as current_zip_img:
-                    if process_image_data:
-                        image.sha1 = sha1_from_file_object(current_zip_img)
-                        image.set_attributes_from_image(
-                            current_zip_img,
-                            my_zip.getinfo(image_filename).file_size,
-                            os.path.basename(image_filename),
-                        )
-            else:
-                # Case 2: Nested image
-                with my_zip.open(nested_zip_filename) as current_zip:
-                    # Read into memory to avoid issues with non-seekable streams
-                    nested_zip_data = io.BytesIO(current_zip.read())
-                    with zipfile.ZipFile(nested_zip_data) as my_nested_zip:
-                        with my_nested_zip.open(image_filename) as current_zip_img:
-                            if process_image_data:
-                                image.sha1 = sha1_from_file_object(current_zip_img)
-                                image.set_attributes_from_image(
-                                    current_zip_img,
-                                    my_nested_zip.getinfo(image_filename).file_size,
-                                    os.path.basename(image_filename),
-                                )
-
-            # This part is common to both cases
             if process_image_data:
-
+                with reader.open(image_filename, nested_zip_filename) as current_zip_img:
+                    image.sha1 = sha1_from_file_object(current_zip_img)
+                    image.set_attributes_from_image(
+                        current_zip_img,
+                        reader.getinfo(image_filename, nested_zip_filename).file_size,
+                        os.path.basename(image_filename),
+                    )
                 images_to_update.append(image)
 
-            if process_archive_statistics and archive_stats_calc is not None:
-                archive_stats_calc.set_values(
-                    filesize=image.image_size,
-                    height=image.original_height,
-                    width=image.original_width,
-                    image_mode=image.image_mode,
-                    is_horizontal=image.image_width / image.image_height > 1 if image.image_width and image.image_height else False,
-                    file_type=os.path.splitext(image_filename)[1]
-                )
+        reader.close()
 
         # --- Phase 2: Parallel p-hash Calculation ---
+
         phash_results = {}
         if phash_tasks:
-            with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count() // 2) as executor:
-                # Map the worker function over the prepared tasks
-                results_iterator = executor.map(CompareObjectsService.calculate_phash_for_zip_member, phash_tasks)
-                for filename, hash_result in results_iterator:
-                    if hash_result:
-                        phash_results[filename] = hash_result
+            workers = max(1, multiprocessing.cpu_count() // 2)
+            # One batch per worker, of consecutive pages so each nested zip file is mostly opened by a single worker.
+            batch_size = -(-len(phash_tasks) // workers)
+            phash_batches = [
+                (self.zipped.path, phash_tasks[i:i + batch_size])
+                for i in range(0, len(phash_tasks), batch_size)
+            ]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Map the worker function over the prepared batches
+                results_iterator = executor.map(CompareObjectsService.calculate_phash_for_zip_members, phash_batches)
+                for batch_results in results_iterator:
+                    for filename, hash_result in batch_results:
+                        if hash_result:
+                            phash_results[filename] = hash_result
 
         # --- Phase 3: Database Updates ---
         if images_to_update:
@@ -2601,20 +2940,14 @@ class Archive(models.Model):
             if props_to_create: ItemProperties.objects.bulk_create(props_to_create)
             if props_to_update: ItemProperties.objects.bulk_update(props_to_update, ['value'])
 
-        # Finalize and save archive statistics
-        if process_archive_statistics and archive_stats_calc is not None and archive_statistics is not None:
-            archive_statistics.filesize_average = archive_stats_calc.mean('filesize')
-            archive_statistics.height_average = archive_stats_calc.mean('height')
-            archive_statistics.width_average = archive_stats_calc.mean('width')
-            archive_statistics.height_mode = archive_stats_calc.mode('height')
-            archive_statistics.width_mode = archive_stats_calc.mode('width')
-            archive_statistics.height_stddev = archive_stats_calc.stddev('height')
-            archive_statistics.width_stddev = archive_stats_calc.stddev('width')
-            archive_statistics.is_horizontal_mode = archive_stats_calc.mode('is_horizontal') or False
-            archive_statistics.image_mode_mode = archive_stats_calc.mode('image_mode')
-            archive_statistics.file_type_mode = archive_stats_calc.mode("file_type")
-            archive_statistics.file_type_match = archive_stats_calc.eq_to_value("file_type", archive_statistics.file_type_mode)
-            archive_statistics.save()
+        # Bulk writes don't send signals, the profiles built from the previous hashes are dropped here.
+        changed_algorithms = (["sha1"] if images_to_update else []) + (["phash"] if phash_results else [])
+        if changed_algorithms:
+            ArchiveHashProfile.objects.invalidate([self.pk], changed_algorithms)
+
+        # Statistics are calculated from the page data that was just saved
+        if process_archive_statistics:
+            ArchiveStatistics.objects.update_for_archives([self.pk])
 
         # Process other non-image files
         if process_other_data and self.archivefileentry_set.exists():
@@ -2634,13 +2967,14 @@ class Archive(models.Model):
 
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
+        except BAD_ZIP_ERRORS:
             return image_result
 
-        if my_zip.testzip():
+        if first_bad_zip_member(my_zip):
             return image_result
 
         filtered_files = get_images_from_zip(my_zip)
+        reader = NestedZipReader(my_zip)
 
         for count, filename_tuple in enumerate(filtered_files, start=1):
             image = image_set.get(archive_position=count)
@@ -2648,15 +2982,10 @@ class Archive(models.Model):
                 with open(image.image.path, "rb") as current_img:
                     image_result[count] = hashing_function(current_img)
             else:
-                if filename_tuple[1] is None:
-                    with my_zip.open(filename_tuple[0]) as current_zip_img:
-                        image_result[count] = hashing_function(current_zip_img)
-                else:
-                    with my_zip.open(filename_tuple[1]) as current_zip:
-                        with zipfile.ZipFile(current_zip) as my_nested_zip:
-                            with my_nested_zip.open(filename_tuple[0]) as current_zip_img:
-                                image_result[count] = hashing_function(current_zip_img)
+                with reader.open(filename_tuple[0], filename_tuple[1]) as current_zip_img:
+                    image_result[count] = hashing_function(current_zip_img)
 
+        reader.close()
         my_zip.close()
         return image_result
 
@@ -2710,10 +3039,10 @@ class Archive(models.Model):
             return False
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
+        except BAD_ZIP_ERRORS:
             return False
 
-        if my_zip.testzip():
+        if first_bad_zip_member(my_zip):
             my_zip.close()
             return False
 
@@ -2729,6 +3058,7 @@ class Archive(models.Model):
         non_extracted_positions = non_extracted_images.values_list("archive_position", flat=True)
 
         filtered_files = get_images_from_zip(my_zip)
+        reader = NestedZipReader(my_zip)
 
         for count, filename_tuple in enumerate(filtered_files, start=1):
             if count not in non_extracted_positions:
@@ -2747,46 +3077,24 @@ class Archive(models.Model):
 
             with (
                 open(full_img_name, "wb") as current_new_img,
-                my_zip.open(filename_tuple[1] or filename_tuple[0]) as current_file,
+                reader.open(filename_tuple[0], filename_tuple[1]) as current_img,
             ):
-                if filename_tuple[1]:
-                    with zipfile.ZipFile(current_file) as my_nested_zip:
-                        with my_nested_zip.open(filename_tuple[0]) as current_img:
-                            if resized:
-                                im_resized = PImage.open(current_img)
-                                if im_resized.mode != "RGB":
-                                    im_resized = im_resized.convert("RGB")
-                                im_w, im_h = im_resized.size
-                                if im_w > im_h:
-                                    im_resized.thumbnail(
-                                        (settings.CRAWLER_SETTINGS.horizontal_image_max_width, 9999),
-                                        PImage.Resampling.LANCZOS,
-                                    )
-                                else:
-                                    im_resized.thumbnail(
-                                        (settings.CRAWLER_SETTINGS.vertical_image_max_width, 9999),
-                                        PImage.Resampling.LANCZOS,
-                                    )
-                                im_resized.save(current_new_img, "JPEG")
-                            else:
-                                shutil.copyfileobj(current_img, current_new_img)
-                else:
-                    if resized:
-                        im_resized = PImage.open(current_file)
-                        if im_resized.mode != "RGB":
-                            im_resized = im_resized.convert("RGB")
-                        im_w, im_h = im_resized.size
-                        if im_w > im_h:
-                            im_resized.thumbnail(
-                                (settings.CRAWLER_SETTINGS.horizontal_image_max_width, 9999), PImage.Resampling.LANCZOS
-                            )
-                        else:
-                            im_resized.thumbnail(
-                                (settings.CRAWLER_SETTINGS.vertical_image_max_width, 9999), PImage.Resampling.LANCZOS
-                            )
-                        im_resized.save(current_new_img, "JPEG")
+                if resized:
+                    im_resized = PImage.open(current_img)
+                    if im_resized.mode != "RGB":
+                        im_resized = im_resized.convert("RGB")
+                    im_w, im_h = im_resized.size
+                    if im_w > im_h:
+                        im_resized.thumbnail(
+                            (settings.CRAWLER_SETTINGS.horizontal_image_max_width, 9999), PImage.Resampling.LANCZOS
+                        )
                     else:
-                        shutil.copyfileobj(current_file, current_new_img)
+                        im_resized.thumbnail(
+                            (settings.CRAWLER_SETTINGS.vertical_image_max_width, 9999), PImage.Resampling.LANCZOS
+                        )
+                    im_resized.save(current_new_img, "JPEG")
+                else:
+                    shutil.copyfileobj(current_img, current_new_img)
             image.image.name = img_path
 
             # Thumbnail
@@ -2799,6 +3107,7 @@ class Archive(models.Model):
             image.save()
             im.close()
 
+        reader.close()
         my_zip.close()
         self.extracted = True
         self.simple_save()
@@ -2812,9 +3121,9 @@ class Archive(models.Model):
         if force or not bool(self.image_set.all()):
             try:
                 my_zip = zipfile.ZipFile(self.zipped.path, "r")
-            except (zipfile.BadZipFile, NotImplementedError):
+            except BAD_ZIP_ERRORS:
                 return False
-            if my_zip.testzip():
+            if first_bad_zip_member(my_zip):
                 my_zip.close()
                 return False
 
@@ -2835,6 +3144,8 @@ class Archive(models.Model):
 
             my_zip.close()
 
+            ArchiveStatistics.objects.update_for_archives([self.pk])
+
         return True
 
     def fix_image_positions(self) -> None:
@@ -2860,6 +3171,20 @@ class Archive(models.Model):
 
     def simple_save(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         is_new = self.pk
+        unit = current_unit()
+        if unit is not None:
+            # History records and the index update are done in bulk when the unit of work is dispatched.
+            self.skip_history_when_saving = True
+            try:
+                super(Archive, self).save(*args, **kwargs)
+            finally:
+                del self.skip_history_when_saving
+            if is_new is None:
+                unit.add("archive_history_created", self, Archive.objects.bulk_history_created)
+            else:
+                unit.add("archive_history_changed", self, Archive.objects.bulk_history_changed)
+            unit.add("archive_index", self, Archive.objects.bulk_update_index)
+            return
         super(Archive, self).save(*args, **kwargs)
         if settings.ES_CLIENT and settings.ES_AUTOREFRESH:
             if (settings.ES_ONLY_INDEX_PUBLIC and self.public) or not settings.ES_ONLY_INDEX_PUBLIC:
@@ -2900,19 +3225,79 @@ class Archive(models.Model):
         if self.crc32 is None or self.crc32 == "":
             self.crc32 = calc_crc32(self.zipped.path)
 
+        unit = current_unit()
+        if unit is not None:
+            # The images are created when the unit is dispatched, the file is checked now so a bad zip returns early
+            # here too.
+            valid_zip = not self.images_missing() or self.zip_is_readable()
+            if valid_zip:
+                unit.add("archive_images", self, Archive.objects.bulk_update_images_from_file, priority=-1)
+        else:
+            valid_zip = self.update_images_from_file()
+        if not valid_zip:
+            self.simple_save(force_update=True)
+            return
+
+        archive_option = ArchiveOption.objects.filter(archive=self).first()
+
+        # title
+        if self.gallery and self.gallery.title and (not archive_option or not archive_option.freeze_titles):
+            self.title = self.gallery.title
+            self.possible_matches.clear()
+        elif self.title is None and self.zipped.name:
+            self.title = re.sub("[_]", " ", os.path.splitext(os.path.basename(self.zipped.name))[0])
+
+        # tags
+        if self.gallery and self.gallery.tags.all():
+            self.set_tags_from_gallery(self.gallery)
+
+        # title_jpn
+        if self.gallery and self.gallery.title_jpn and (not archive_option or not archive_option.freeze_titles):
+            self.title_jpn = self.gallery.title_jpn
+
+        # size
+        if self.filesize is None or self.filecount is None:
+            self.filesize, self.filecount, other_file_datas = get_zip_fileinfo(self.zipped.path, get_extra_data=True)
+            self.fill_other_file_data(other_file_datas)
+
+        # original_filename
+        if (self.original_filename is None or self.original_filename == "") and self.zipped.name:
+            self.original_filename = os.path.basename(self.zipped.name)
+
+        if unit is not None:
+            unit.add("archive_marks", self, Archive.objects.bulk_create_marks, priority=-1)
+        else:
+            self.create_mark_if_parent_gallery()
+
+        self.simple_save(force_update=True)
+
+    def images_missing(self) -> bool:
+        return not self.thumbnail or not self.image_set.exists()
+
+    def zip_is_readable(self) -> bool:
+        """Whether the file is a valid zip, without bad or encrypted members."""
+        try:
+            my_zip = zipfile.ZipFile(self.zipped.path, "r")
+        except BAD_ZIP_ERRORS:
+            return False
+        with my_zip:
+            return first_bad_zip_member(my_zip) is None
+
+    def update_images_from_file(self) -> bool:
+        """Creates the image set and the thumbnail from the file, when they are missing. Returns False if the file
+        isn't a valid zip."""
         image_set_present = bool(self.image_set.all())
         # large thumbnail and image set
         if not self.thumbnail or not image_set_present:
             try:
                 my_zip = zipfile.ZipFile(self.zipped.path, "r")
-            except (zipfile.BadZipFile, NotImplementedError):
-                self.simple_save(force_update=True)
-                return
-            if my_zip.testzip():
+            except BAD_ZIP_ERRORS:
+                return False
+            if first_bad_zip_member(my_zip):
                 my_zip.close()
-                self.simple_save(force_update=True)
-                return
+                return False
             filtered_files = get_images_from_zip(my_zip)
+            reader = NestedZipReader(my_zip)
 
             nested_images = [x for x in filtered_files if x[1] is not None]
 
@@ -2942,92 +3327,35 @@ class Archive(models.Model):
             if settings.CRAWLER_SETTINGS.auto_hash_images and not self.thumbnail:
                 image_type = ContentType.objects.get_for_model(Image)
 
-                archive_statistics, _ = ArchiveStatistics.objects.get_or_create(archive=self)
-
-                archive_stats_calc = ArchiveStatisticsCalculator()
-
                 for count, filename_tuple in enumerate(filtered_files, start=1):
                     # image_name = os.path.split(filename.replace('\\', os.sep))[1]
                     image = Image.objects.get(archive=self, archive_position=count)
                     # image.image.name = upload_imgpath(self, image_name)
-                    if filename_tuple[1] is None:
-                        with my_zip.open(filename_tuple[0]) as current_zip_img:
-                            image.sha1 = sha1_from_file_object(current_zip_img)
-                            image.set_attributes_from_image(
-                                current_zip_img,
-                                my_zip.getinfo(filename_tuple[0]).file_size,
-                                os.path.basename(filename_tuple[0]),
-                            )
-
-                            archive_stats_calc.set_values(
-                                filesize=image.image_size,
-                                height=image.original_height,
-                                width=image.original_width,
-                                image_mode=image.image_mode,
-                                is_horizontal=image.image_width / image.image_height > 1
-                                if image.image_width and image.image_height else False,
-                                file_type=os.path.splitext(filename_tuple[0])[1]
-                            )
+                    with reader.open(filename_tuple[0], filename_tuple[1]) as current_zip_img:
+                        image.sha1 = sha1_from_file_object(current_zip_img)
+                        image.set_attributes_from_image(
+                            current_zip_img,
+                            reader.getinfo(filename_tuple[0], filename_tuple[1]).file_size,
+                            os.path.basename(filename_tuple[0]),
+                        )
 
-                            if settings.CRAWLER_SETTINGS.auto_phash_images:
-                                hash_result = CompareObjectsService.hash_thumbnail(current_zip_img, "phash")
-                                if hash_result:
-                                    hash_object, _ = ItemProperties.objects.update_or_create(
-                                        content_type=image_type,
-                                        object_id=image.pk,
-                                        tag="hash-compare",
-                                        name="phash",
-                                        defaults={"value": hash_result},
-                                    )
-                    else:
-                        with my_zip.open(filename_tuple[1]) as current_zip:
-                            with zipfile.ZipFile(current_zip) as my_nested_zip:
-                                with my_nested_zip.open(filename_tuple[0]) as current_zip_img:
-                                    image.sha1 = sha1_from_file_object(current_zip_img)
-                                    image.set_attributes_from_image(
-                                        current_zip_img,
-                                        my_nested_zip.getinfo(filename_tuple[0]).file_size,
-                                        os.path.basename(filename_tuple[0]),
-                                    )
-
-                                    archive_stats_calc.set_values(
-                                        filesize=image.image_size,
-                                        height=image.original_height,
-                                        width=image.original_width,
-                                        image_mode=image.image_mode,
-                                        is_horizontal=image.image_width / image.image_height > 1
-                                        if image.image_width and image.image_height else False,
-                                        file_type=os.path.splitext(filename_tuple[0])[1]
-                                    )
-
-                                    if settings.CRAWLER_SETTINGS.auto_phash_images:
-                                        hash_result = CompareObjectsService.hash_thumbnail(current_zip_img, "phash")
-                                        if hash_result:
-                                            hash_object, _ = ItemProperties.objects.update_or_create(
-                                                content_type=image_type,
-                                                object_id=image.pk,
-                                                tag="hash-compare",
-                                                name="phash",
-                                                defaults={"value": hash_result},
-                                            )
+                        if settings.CRAWLER_SETTINGS.auto_phash_images:
+                            hash_result = CompareObjectsService.hash_thumbnail(current_zip_img, "phash")
+                            if hash_result:
+                                hash_object, _ = ItemProperties.objects.update_or_create(
+                                    content_type=image_type,
+                                    object_id=image.pk,
+                                    tag="hash-compare",
+                                    name="phash",
+                                    defaults={"value": hash_result},
+                                )
 
                     image.save()
 
-                archive_statistics.filesize_average = archive_stats_calc.mean('filesize')
-                archive_statistics.height_average = archive_stats_calc.mean('height')
-                archive_statistics.width_average = archive_stats_calc.mean('width')
-                archive_statistics.height_mode = archive_stats_calc.mode('height')
-                archive_statistics.width_mode = archive_stats_calc.mode('width')
-                archive_statistics.height_stddev = archive_stats_calc.stddev('height')
-                archive_statistics.width_stddev = archive_stats_calc.stddev('width')
-                archive_statistics.is_horizontal_mode = archive_stats_calc.mode('is_horizontal') or False
-                archive_statistics.image_mode_mode = archive_stats_calc.mode('image_mode')
-                archive_statistics.file_type_mode = archive_stats_calc.mode('file_type')
-                archive_statistics.file_type_match = archive_stats_calc.eq_to_value(
-                    "file_type", archive_statistics.file_type_mode
+                ArchiveHashProfile.objects.invalidate(
+                    [self.pk], ["sha1", "phash"] if settings.CRAWLER_SETTINGS.auto_phash_images else ["sha1"]
                 )
-
-                archive_statistics.save()
+                ArchiveStatistics.objects.update_for_archives([self.pk])
 
             if not self.thumbnail and filtered_files:
                 if image_set_present:
@@ -3035,50 +3363,15 @@ class Archive(models.Model):
                 else:
                     first_file = filtered_files[0]
 
-                if first_file[1] is None:
-                    with my_zip.open(first_file[0]) as current_img:
-                        self.create_thumbnail_from_io_image(current_img)
-                        if settings.CRAWLER_SETTINGS.auto_phash_images:
-                            self.create_or_update_thumbnail_hash("phash")
-                else:
-                    with my_zip.open(first_file[1]) as current_zip:
-                        with zipfile.ZipFile(current_zip) as my_nested_zip:
-                            with my_nested_zip.open(first_file[0]) as current_img:
-                                self.create_thumbnail_from_io_image(current_img)
-                                if settings.CRAWLER_SETTINGS.auto_phash_images:
-                                    self.create_or_update_thumbnail_hash("phash")
+                with reader.open(first_file[0], first_file[1]) as current_img:
+                    self.create_thumbnail_from_io_image(current_img)
+                    if settings.CRAWLER_SETTINGS.auto_phash_images:
+                        self.create_or_update_thumbnail_hash("phash")
 
+            reader.close()
             my_zip.close()
 
-        archive_option = ArchiveOption.objects.filter(archive=self).first()
-
-        # title
-        if self.gallery and self.gallery.title and (not archive_option or not archive_option.freeze_titles):
-            self.title = self.gallery.title
-            self.possible_matches.clear()
-        elif self.title is None and self.zipped.name:
-            self.title = re.sub("[_]", " ", os.path.splitext(os.path.basename(self.zipped.name))[0])
-
-        # tags
-        if self.gallery and self.gallery.tags.all():
-            self.set_tags_from_gallery(self.gallery)
-
-        # title_jpn
-        if self.gallery and self.gallery.title_jpn and (not archive_option or not archive_option.freeze_titles):
-            self.title_jpn = self.gallery.title_jpn
-
-        # size
-        if self.filesize is None or self.filecount is None:
-            self.filesize, self.filecount, other_file_datas = get_zip_fileinfo(self.zipped.path, get_extra_data=True)
-            self.fill_other_file_data(other_file_datas)
-
-        # original_filename
-        if (self.original_filename is None or self.original_filename == "") and self.zipped.name:
-            self.original_filename = os.path.basename(self.zipped.name)
-
-        self.create_mark_if_parent_gallery()
-
-        self.simple_save(force_update=True)
+        return True
 
     def create_mark_if_parent_gallery(self):
         if (
@@ -3666,10 +3959,10 @@ class Archive(models.Model):
             raise FileNotFoundError("Zipped file not found: {}.".format(self.zipped.path))
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
+        except BAD_ZIP_ERRORS:
             raise zipfile.BadZipFile("Bad ZIP file: {}.".format(self.zipped.path))
 
-        bad_files = my_zip.testzip()
+        bad_files = first_bad_zip_member(my_zip)
 
         if bad_files:
             my_zip.close()
@@ -3686,10 +3979,10 @@ class Archive(models.Model):
             return False
         try:
             my_zip = zipfile.ZipFile(self.zipped.path, "r")
-        except (zipfile.BadZipFile, NotImplementedError):
+        except BAD_ZIP_ERRORS:
             return False
 
-        if my_zip.testzip():
+        if first_bad_zip_member(my_zip):
             my_zip.close()
             return False
 
@@ -3725,14 +4018,8 @@ class Archive(models.Model):
         else:
             first_file = filtered_files[0]
 
-        if first_file[1] is None:
-            with my_zip.open(first_file[0]) as current_img:
-                self.create_thumbnail_from_io_image(current_img)
-        else:
-            with my_zip.open(first_file[1]) as current_zip:
-                with zipfile.ZipFile(current_zip) as my_nested_zip:
-                    with my_nested_zip.open(first_file[0]) as current_img:
-                        self.create_thumbnail_from_io_image(current_img)
+        with NestedZipReader(my_zip) as reader, reader.open(first_file[0], first_file[1]) as current_img:
+            self.create_thumbnail_from_io_image(current_img)
 
         my_zip.close()
         super(Archive, self).save()
@@ -3746,7 +4033,7 @@ class Archive(models.Model):
             return None
         try:
             with zipfile.ZipFile(self.zipped.path, "r") as my_zip:
-                if my_zip.testzip():
+                if first_bad_zip_member(my_zip):
                     return None
 
                 filtered_files = get_images_from_zip(my_zip)
@@ -3765,16 +4052,10 @@ class Archive(models.Model):
                         return None
                     first_file = filtered_files[real_position]
 
-                if first_file[1] is None:
-                    with my_zip.open(first_file[0]) as current_img:
-                        return current_img.read()
-                else:
-                    with my_zip.open(first_file[1]) as current_zip:
-                        with zipfile.ZipFile(current_zip) as my_nested_zip:
-                            with my_nested_zip.open(first_file[0]) as current_img:
-                                return current_img.read()
+                with NestedZipReader(my_zip) as reader, reader.open(first_file[0], first_file[1]) as current_img:
+                    return current_img.read()
 
-        except (zipfile.BadZipFile, NotImplementedError):
+        except BAD_ZIP_ERRORS:
             return None
 
     def release_gallery(self):
@@ -4188,7 +4469,63 @@ class ArchiveFileEntry(models.Model):
         ordering = ["-position"]
 
 
+class ArchiveStatisticsManager(models.Manager["ArchiveStatistics"]):
+    PAGE_COLUMNS = ("archive_id", "image_size", "original_height", "original_width", "image_mode", "image_name")
+
+    def update_for_archives(self, archive_ids: typing.Iterable[int]) -> None:
+        """Recalculates the statistics from the page data stored on Image, without reading the archive files.
+
+        The pages of every archive are read in one query per chunk, as columns. Archives with no pages left lose
+        their statistics.
+        """
+        for archive_ids_chunk in chunks(list(archive_ids), 500):
+            pages_per_archive: dict[int, list[tuple]] = defaultdict(list)
+            for page in (
+                Image.objects.filter(archive_id__in=archive_ids_chunk)
+                .order_by("archive_id", "archive_position")
+                .values_list(*self.PAGE_COLUMNS)
+            ):
+                pages_per_archive[page[0]].append(page[1:])
+
+            existing = {x.archive_id: x for x in self.filter(archive_id__in=pages_per_archive)}
+            to_create = []
+            to_update = []
+            for archive_id, pages in pages_per_archive.items():
+                filesize, height, width, image_mode, image_name = zip(*pages)
+                calculator = ArchiveStatisticsCalculator.from_columns(
+                    filesize=filesize,
+                    height=height,
+                    width=width,
+                    image_mode=image_mode,
+                    is_horizontal=(bool(x and y and x > y) for x, y in zip(width, height)),
+                    file_type=(os.path.splitext(x)[1] for x in image_name if x),
+                )
+                archive_statistics = existing.get(archive_id) or ArchiveStatistics(archive_id=archive_id)
+                archive_statistics.set_from_calculator(calculator)
+                if archive_statistics.pk:
+                    to_update.append(archive_statistics)
+                else:
+                    to_create.append(archive_statistics)
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, ArchiveStatistics.CALCULATED_FIELDS)
+            self.filter(archive_id__in=archive_ids_chunk).exclude(archive_id__in=pages_per_archive).delete()
+
+
 class ArchiveStatistics(models.Model):
+    CALCULATED_FIELDS = [
+        "filesize_average",
+        "height_mode",
+        "width_mode",
+        "height_average",
+        "width_average",
+        "height_stddev",
+        "width_stddev",
+        "image_mode_mode",
+        "file_type_mode",
+        "file_type_match",
+        "is_horizontal_mode",
+    ]
+
     archive = models.ForeignKey(Archive, on_delete=models.CASCADE)
     filesize_average = models.FloatField(blank=True, null=True)
     height_mode = models.PositiveIntegerField(blank=True, null=True)
@@ -4206,6 +4543,21 @@ class ArchiveStatistics(models.Model):
         verbose_name_plural = "Archive file statistics"
         # ordering = ["-position"]
 
+    objects = ArchiveStatisticsManager()
+
+    def set_from_calculator(self, archive_stats_calc: ArchiveStatisticsCalculator) -> None:
+        self.filesize_average = archive_stats_calc.mean("filesize")
+        self.height_average = archive_stats_calc.mean("height")
+        self.width_average = archive_stats_calc.mean("width")
+        self.height_mode = archive_stats_calc.mode("height")
+        self.width_mode = archive_stats_calc.mode("width")
+        self.height_stddev = archive_stats_calc.stddev("height")
+        self.width_stddev = archive_stats_calc.stddev("width")
+        self.is_horizontal_mode = archive_stats_calc.mode("is_horizontal") or False
+        self.image_mode_mode = archive_stats_calc.mode("image_mode")
+        self.file_type_mode = archive_stats_calc.mode("file_type")
+        self.file_type_match = archive_stats_calc.eq_to_value("file_type", self.file_type_mode)
+
 
 def upload_imgpath(instance: "Archive", filename: str) -> str:
     file_name, file_extension = os.path.splitext(filename)
@@ -4339,6 +4691,7 @@ class Image(models.Model):
                     name=algorithm,
                     defaults={"value": hash_result},
                 )
+                ArchiveHashProfile.objects.invalidate([self.archive_id], [algorithm])
 
     def get_absolute_url(self) -> str:
         return reverse("viewer:image", args=[str(self.id)])
@@ -4350,12 +4703,11 @@ class Image(models.Model):
         self, image_object: typing.IO[bytes], image_size: Optional[int] = None, image_name: Optional[str] = None
     ) -> None:
         try:
-            im = PImage.open(image_object)
-            size = im.size
-            self.original_width = size[0]
-            self.original_height = size[1]
-            self.image_format = im.format
-            self.image_mode = im.mode
+            image_header = read_image_header(image_object)
+            self.original_width = image_header.width
+            self.original_height = image_header.height
+            self.image_format = image_header.format
+            self.image_mode = image_header.mode
             self.image_size = image_size
             self.image_name = image_name
         except PImage.UnidentifiedImageError:
@@ -4365,11 +4717,9 @@ class Image(models.Model):
 
     def save(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         if not self.image_height and self.image and os.path.isfile(self.image.path):
-            im = PImage.open(self.image.path)
-            size = im.size
-            self.image_width = size[0]
-            self.image_height = size[1]
-            im.close()
+            image_header = read_image_header(self.image.path)
+            self.image_width = image_header.width
+            self.image_height = image_header.height
         super(Image, self).save(*args, **kwargs)
 
     def simple_save(self, *args: typing.Any, **kwargs: typing.Any) -> None:
@@ -4392,6 +4742,78 @@ class ItemProperties(models.Model):
     value = models.CharField(max_length=100)
 
 
+class ArchiveHashProfileManager(models.Manager["ArchiveHashProfile"]):
+    def update_profile(self, archive_id: int, algorithm: str, live_data: bool = True) -> Optional["ArchiveHashProfile"]:
+        """Builds the profile of an archive from the hashes stored for its images, or by hashing them if there are none
+        and live_data is True. Returns None if there's nothing to build it from."""
+        archive = Archive.objects.filter(pk=archive_id).first()
+        if archive is None:
+            return None
+
+        hashes: dict[int, str] = {}
+        image_rows = list(archive.image_set.values_list("pk", "position", "archive_position", "sha1"))
+
+        if algorithm == "sha1" and image_rows and all(row[3] is not None for row in image_rows):
+            hashes = {position: str(sha1) for _, position, _, sha1 in image_rows}
+        if not hashes and image_rows:
+            archive_positions = {pk: archive_position for pk, _, archive_position, _ in image_rows}
+            stored_hashes = ItemProperties.objects.filter(
+                content_type=ContentType.objects.get_for_model(Image),
+                object_id__in=list(archive_positions),
+                tag="hash-compare",
+                name=algorithm,
+            ).values_list("object_id", "value")
+            hashes = {archive_positions[object_id]: value for object_id, value in stored_hashes}
+        if not hashes and live_data and archive.zipped and os.path.isfile(archive.zipped.path):
+            if algorithm in CompareObjectsService.image_hash_functions:
+                hash_function = CompareObjectsService.image_loader(
+                    CompareObjectsService.image_hash_functions[algorithm]
+                )
+            elif algorithm in CompareObjectsService.file_hash_functions:
+                hash_function = CompareObjectsService.file_hash_functions[algorithm]
+            else:
+                return None
+            hashes = archive.hash_images_with_function(hash_function)
+        if not hashes:
+            return None
+
+        profile, _ = self.update_or_create(
+            archive=archive, algorithm=algorithm, defaults={"crc32": archive.crc32, "hashes": hashes}
+        )
+        return profile
+
+    def invalidate(self, archive_ids: typing.Iterable[int], algorithms: typing.Iterable[str]) -> None:
+        """Deletes the profiles of the archives for the algorithms, after hashes of their images were stored. A profile
+        built before would miss or keep old hashes, it's built again on the next update_profile."""
+        self.filter(archive_id__in=list(archive_ids), algorithm__in=list(algorithms)).delete()
+
+
+class ArchiveHashProfile(models.Model):
+    """Hashes of every image of an archive for one algorithm, by position, so the compare tool can read them for many
+    archives in one query. A profile is stale once the CRC32 of the archive doesn't match the one it was built for. The
+    methods that store hashes for the images of an archive delete its profiles for the same algorithm."""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["archive", "algorithm"], name="unique_archive_hash_profile"),
+        ]
+
+    archive = models.ForeignKey(Archive, on_delete=models.CASCADE, related_name="hash_profiles")
+    algorithm = models.CharField(max_length=50)
+    crc32 = models.CharField("CRC32", max_length=10, blank=True)
+    # Keys are the positions as strings, since they are stored as JSON.
+    hashes = models.JSONField(default=dict)
+    last_modified = models.DateTimeField(auto_now=True)
+
+    objects = ArchiveHashProfileManager()
+
+    def is_current(self, archive: Archive) -> bool:
+        return self.crc32 == archive.crc32
+
+    def __str__(self) -> str:
+        return "{}: {}".format(self.archive_id, self.algorithm)
+
+
 class UserArchivePrefs(models.Model):
 
     class Meta:
@@ -4448,6 +4870,11 @@ class UserLongLivedToken(models.Model):
     key = models.CharField(max_length=256, null=False, blank=False, unique=True)
     expire_date = models.DateTimeField(null=False, blank=False, default=in_10_years)
     create_date = models.DateTimeField(auto_now_add=True)
+    rate_limit = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Requests per minute, empty to use the configured default, 0 for no limit."
+    )
+    request_count = models.PositiveBigIntegerField(default=0)
+    last_used = models.DateTimeField(blank=True, null=True)
 
 
 @receiver(post_save, sender=User)
@@ -4815,15 +5242,19 @@ class WantedGallery(models.Model):
             for unwanted_tag in self.unwanted_tags.all():
                 galleries = galleries.exclude(tags__id__exact=unwanted_tag.id)
 
+        if has_wanted_tags or has_unwanted_tags:
+            galleries = galleries.prefetch_related("tags")
+
         for gallery in galleries:
             accepted = True
+            gallery_tags = set(gallery.tag_list()) if has_wanted_tags or has_unwanted_tags else set()
             if has_wanted_tags:
-                if not set(self.wanted_tags_list()).issubset(set(gallery.tag_list())):
+                if not set(self.wanted_tags_list()).issubset(gallery_tags):
                     accepted = False
                 # Do not accept galleries that have more than 1 tag in the same wanted tag scope.
                 if accepted & self.wanted_tags_exclusive_scope:
-                    accepted_tags = set(self.wanted_tags_list()).intersection(set(gallery.tag_list()))
-                    gallery_tags_scopes = [x.split(":", maxsplit=1)[0] for x in gallery.tag_list() if len(x) > 1]
+                    accepted_tags = set(self.wanted_tags_list()).intersection(gallery_tags)
+                    gallery_tags_scopes = [x.split(":", maxsplit=1)[0] for x in gallery_tags if len(x) > 1]
                     wanted_gallery_tags_scopes = [x.split(":", maxsplit=1)[0] for x in accepted_tags if len(x) > 1]
                     scope_count: dict[str, int] = defaultdict(int)
                     for scope_name in gallery_tags_scopes:
@@ -4838,16 +5269,16 @@ class WantedGallery(models.Model):
                             accepted = False
                 # Review based on 'accept if none' scope.
                 if not accepted and self.wanted_tags_accept_if_none_scope:
-                    missing_tags = set(self.wanted_tags_list()).difference(set(gallery.tag_list()))
+                    missing_tags = set(self.wanted_tags_list()).difference(gallery_tags)
                     # If all the missing tags start with the parameter,
                     # and no other tag is in gallery with this parameter, mark as accepted
                     scope_formatted = self.wanted_tags_accept_if_none_scope + ":"
                     if all(x.startswith(scope_formatted) for x in missing_tags) and not any(
-                        x.startswith(scope_formatted) for x in gallery.tag_list()
+                        x.startswith(scope_formatted) for x in gallery_tags
                     ):
                         accepted = True
             if accepted & has_unwanted_tags:
-                if any(item in gallery.tag_list() for item in self.unwanted_tags_list()):
+                if any(item in gallery_tags for item in self.unwanted_tags_list()):
                     accepted = False
 
             if self.match_expression:
@@ -5142,11 +5573,7 @@ class MonitoredLink(models.Model):
     def force_run(self):
         for timed_link_monitor in settings.WORKERS.timed_link_monitors:
             if timed_link_monitor.monitored_link.pk == self.pk:
-                timed_link_monitor.stop_running()
-                # TODO: Fix this hacky wait.
-                time.sleep(1)
-                timed_link_monitor.force_run_once = True
-                timed_link_monitor.start_running(timer=self.frequency.total_seconds())
+                timed_link_monitor.run_now(timer=self.frequency.total_seconds())
 
     # Only works if the Link was already created when starting up.
     def stop_running(self):
@@ -5163,10 +5590,8 @@ class MonitoredLink(models.Model):
                 timed_link_monitor.monitored_link = self
                 timed_link_monitor.timer = self.frequency.total_seconds()
                 timed_link_monitor.link_name = self.name
-                # Stop and start to refresh the wait method.
+                # Stop and start to schedule it again with the new timer.
                 timed_link_monitor.stop_running()
-                # TODO: Fix this hacky wait.
-                time.sleep(1)
                 timed_link_monitor.start_running()
 
         if settings.CRAWLER_SETTINGS.monitored_links.enable and not is_present:
@@ -5257,9 +5682,9 @@ class WantedImage(models.Model):
     def save(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         super(WantedImage, self).save(*args, **kwargs)
         if self.image and os.path.isfile(self.image.path):
-            im = PImage.open(self.image.path)
-            self.image_format = im.format
-            self.image_mode = im.mode
+            image_header = read_image_header(self.image.path)
+            self.image_format = image_header.format
+            self.image_mode = image_header.mode
             self.image_size = self.image.size
             if not self.image_name:
                 self.image_name = self.image.name
@@ -5446,22 +5871,57 @@ class GalleryMatchGroup(models.Model):
             return ""
         return json.dumps(data, ensure_ascii=False)
 
-    def process_group(self):
-        first_post_gallery = self.galleries.all().first()
-        if first_post_gallery:
-            other_galleries = self.galleries.exclude(gallerymatchgroupentry__gallery=first_post_gallery)
-            for other_gallery in other_galleries:
-                for archive in other_gallery.archive_set.all():
-                    if archive.gallery != first_post_gallery:
-                        archive.gallery = first_post_gallery
-                        archive.save()
+    def first_entry(self) -> Optional["GalleryMatchGroupEntry"]:
+        return self.gallerymatchgroupentry_set.order_by("gallery_position").first()
 
-    def add_gallery(self, gallery: Gallery):
-        positions = GalleryMatchGroupEntry.objects.filter(gallery_match_group=self).values_list("gallery_position", flat=True)
-        highest_position = max(positions)
-        match_entry = GalleryMatchGroupEntry(gallery_match_group=self, gallery=gallery, gallery_position=highest_position + 1)
-        match_entry.save()
+    def next_position(self) -> int:
+        highest_position = self.gallerymatchgroupentry_set.aggregate(highest=Max("gallery_position"))["highest"]
+        return (highest_position or 0) + 1
 
+    def process_group(self, user: Optional[typing.Union[User, AnonymousUser]] = None) -> list["Archive"]:
+        """Moves the archives of every gallery in the group to the first gallery by position, in bulk."""
+        with transaction.atomic():
+            first_entry = self.first_entry()
+            if not first_entry:
+                return []
+            return Archive.objects.move_to_gallery(
+                Archive.objects.filter(gallery__gallerymatchgroupentry__gallery_match_group=self),
+                first_entry.gallery_id,
+                user=user,
+            )
+
+    def add_gallery(
+        self, gallery: Gallery, user: Optional[typing.Union[User, AnonymousUser]] = None
+    ) -> "GalleryMatchGroupEntry":
+        with transaction.atomic():
+            match_entry = GalleryMatchGroupEntry(
+                gallery_match_group=self, gallery=gallery, gallery_position=self.next_position()
+            )
+            match_entry.save(user=user)
+        return match_entry
+
+    def merge_groups(
+        self,
+        other_groups: typing.Iterable["GalleryMatchGroup"],
+        user: Optional[typing.Union[User, AnonymousUser]] = None,
+    ) -> list["Archive"]:
+        """Moves the galleries of the other groups to the end of this one, keeping their order, deletes the other
+        groups and processes this one. Positions are shifted in the database, one update per group."""
+        with transaction.atomic():
+            for other_group in other_groups:
+                if other_group.pk == self.pk:
+                    continue
+                lowest_position = other_group.gallerymatchgroupentry_set.aggregate(lowest=Min("gallery_position"))[
+                    "lowest"
+                ]
+                if lowest_position is not None:
+                    other_group.gallerymatchgroupentry_set.update(
+                        gallery_match_group=self,
+                        gallery_position=F("gallery_position") + (self.next_position() - lowest_position),
+                    )
+                other_group.delete()
+            self.save()
+            return self.process_group(user=user)
 
 
 class GalleryMatchGroupEntry(models.Model):
@@ -5476,14 +5936,15 @@ class GalleryMatchGroupEntry(models.Model):
         constraints = [models.UniqueConstraint(fields=["gallery_match_group", "gallery_position"], name="unique_position_in_group")]
         ordering = ["gallery_position"]
 
-    def save(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+    def save(
+        self, *args: typing.Any, user: Optional[typing.Union[User, AnonymousUser]] = None, **kwargs: typing.Any
+    ) -> None:
         super(GalleryMatchGroupEntry, self).save(*args, **kwargs)
-        first_post_gallery = GalleryMatchGroupEntry.objects.filter(gallery_match_group=self.gallery_match_group).first()
-        if first_post_gallery:
-            for archive in self.gallery.archive_set.all():
-                if archive.gallery != first_post_gallery.gallery:
-                    archive.gallery = first_post_gallery.gallery
-                    archive.save()
+        first_entry = self.gallery_match_group.first_entry()
+        if first_entry:
+            Archive.objects.move_to_gallery(
+                Archive.objects.filter(gallery=self.gallery_id), first_entry.gallery_id, user=user
+            )
 
 
 class GalleryGroupPossibleMatches(models.Model):
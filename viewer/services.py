@@ -1,16 +1,24 @@
-import io
+import logging
+import threading
 import typing
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Union
 
+from django.db import close_old_connections, transaction
 from PIL import Image as PImage
 from PIL import UnidentifiedImageError
 
 from core.base import hashing
+from core.base.nested_zip import NestedZipReader
 
 if typing.TYPE_CHECKING:
     from django.db.models import QuerySet
-    from viewer.models import Archive, Image, ItemProperties
+    from viewer.models import Archive, ArchiveHashProfile
+
+logger = logging.getLogger(__name__)
+
+# Worker threads that build the hash profiles of archives.
+PROFILE_WORKERS = 2
 
 
 class CompareObjectsService:
@@ -20,6 +28,11 @@ class CompareObjectsService:
 
     public_algorithms = ["sha1", "phash"]
 
+    profile_lock = threading.Lock()
+    # (archive id, algorithm) of the profiles queued or being built.
+    queued_profiles: set[tuple[int, str]] = set()
+    profile_executor: Optional[ThreadPoolExecutor] = None
+
     # code from imagehash library
     @staticmethod
     def alpha_remover(image):
@@ -47,10 +60,12 @@ class CompareObjectsService:
         algorithms: list[str],
         thumbnails: bool = True,
         images: bool = True,
-        item_model: typing.Optional["typing.Type[ItemProperties]"] = None,
-        image_model: typing.Optional["typing.Type[Image]"] = None,
+        profile_model: typing.Optional["typing.Type[ArchiveHashProfile]"] = None,
         no_live_data: bool = False,
     ) -> dict:
+        """Image hashes are read from the stored profiles of the archives, in one query for every archive and
+        algorithm. Archives without a current profile are listed as pending in the results of the algorithm, and their
+        profile is built in the background. Without a profile_model, the images are hashed in place."""
 
         results_per_algorithm: dict[str, dict] = {}
 
@@ -62,53 +77,80 @@ class CompareObjectsService:
         if no_live_data:
             available_algos = [x for x in available_algos if x[0] in cls.public_algorithms]
 
+        archive_list = list(archives)
+
+        profiles: dict[tuple[int, str], "ArchiveHashProfile"] = {}
+        if images and profile_model and archive_list and available_algos:
+            archives_by_id = {archive.pk: archive for archive in archive_list}
+            for profile in profile_model.objects.filter(
+                archive__in=archive_list, algorithm__in=[algo_name for algo_name, _ in available_algos]
+            ):
+                if profile.is_current(archives_by_id[profile.archive_id]):
+                    profiles[(profile.archive_id, profile.algorithm)] = profile
+
         for algo_name, algo_func in available_algos:
 
-            results: dict[str, dict] = {"archives": {}, "images": {}}
+            results: dict[str, typing.Any] = {"archives": {}, "images": {}}
+            pending: list[int] = []
 
-            for archive in archives:
+            for archive in archive_list:
                 if thumbnails:
                     thumbnail = archive.thumbnail
                     if thumbnail and not no_live_data:
                         with open(thumbnail.path, "rb") as thumb:
                             results["archives"][archive.pk] = algo_func(thumb)
                 if images:
-                    if algo_name == "sha1" and archive.image_set.filter(sha1__isnull=True).count() == 0:
-                        image_result: dict[int, str] = {int(x.position): str(x.sha1) for x in archive.image_set.all()}
-                        results["images"][archive.pk] = image_result
-                    else:
-
-                        if item_model and image_model:
-
-                            from django.contrib.contenttypes.models import ContentType
-
-                            image_type = ContentType.objects.get_for_model(image_model)
-
-                            images_phashes = item_model.objects.filter(
-                                content_type=image_type,
-                                object_id__in=archive.image_set.all(),
-                                tag="hash-compare",
-                                name=algo_name,
-                            )
-
-                            if images_phashes:
-                                archive_img_results = {
-                                    item.content_object.archive_position: item.value
-                                    for item in images_phashes
-                                    if item.content_object
-                                }
-                                results["images"][archive.pk] = archive_img_results
-                            elif not no_live_data:
-                                archive_img_results = archive.hash_images_with_function(algo_func)
-                                results["images"][archive.pk] = archive_img_results
-                        elif not no_live_data:
-                            archive_img_results = archive.hash_images_with_function(algo_func)
-                            results["images"][archive.pk] = archive_img_results
+                    if profile_model:
+                        current_profile = profiles.get((archive.pk, algo_name))
+                        if current_profile:
+                            results["images"][archive.pk] = current_profile.hashes
+                        else:
+                            pending.append(archive.pk)
+                            cls.queue_hash_profile(profile_model, archive.pk, algo_name, not no_live_data)
+                    elif not no_live_data:
+                        results["images"][archive.pk] = archive.hash_images_with_function(algo_func)
+
+            if pending:
+                results["pending"] = pending
 
             results_per_algorithm[algo_name] = results
 
         return results_per_algorithm
 
+    @classmethod
+    def queue_hash_profile(
+        cls, profile_model: "typing.Type[ArchiveHashProfile]", archive_id: int, algorithm: str, live_data: bool
+    ) -> None:
+        """Builds the profile in a worker thread once the current transaction commits. A profile that is already
+        queued isn't queued again."""
+
+        def submit() -> None:
+            key = (archive_id, algorithm)
+            with cls.profile_lock:
+                if key in cls.queued_profiles:
+                    return
+                cls.queued_profiles.add(key)
+                if cls.profile_executor is None:
+                    cls.profile_executor = ThreadPoolExecutor(
+                        max_workers=PROFILE_WORKERS, thread_name_prefix="hash_profile_worker"
+                    )
+                cls.profile_executor.submit(cls.build_hash_profile, profile_model, archive_id, algorithm, live_data)
+
+        transaction.on_commit(submit)
+
+    @classmethod
+    def build_hash_profile(
+        cls, profile_model: "typing.Type[ArchiveHashProfile]", archive_id: int, algorithm: str, live_data: bool
+    ) -> None:
+        try:
+            profile_model.objects.update_profile(archive_id, algorithm, live_data=live_data)
+        except Exception:
+            logger.exception("Error building the %s hash profile of archive %s", algorithm, archive_id)
+        finally:
+            with cls.profile_lock:
+                cls.queued_profiles.discard((archive_id, algorithm))
+            close_old_connections()
+
     @classmethod
     def hash_thumbnail(cls, fp: Union[typing.IO, str], algorithm: str) -> Optional[str]:
 
@@ -136,22 +178,26 @@ class CompareObjectsService:
             cls, arguments: tuple[str, str, str | None]
     ) -> tuple[str, str | None]:
         zip_path, member_name, nested_zip_name = arguments
+        return cls.calculate_phash_for_zip_members((zip_path, [(member_name, nested_zip_name)]))[0]
+
+    @classmethod
+    def calculate_phash_for_zip_members(
+            cls, arguments: tuple[str, list[tuple[str, str | None]]]
+    ) -> list[tuple[str, str | None]]:
+        """Hashes a batch of members, as (member name, nested zip name) tuples, from a single handle of the zip file,
+        so each nested zip file is opened once per batch instead of once per member."""
+        zip_path, members = arguments
+        results: list[tuple[str, str | None]] = []
         try:
-            with zipfile.ZipFile(zip_path, "r") as my_zip:
-                if nested_zip_name is None:
-                    # Case 1: Image is in the top-level archive
-                    with my_zip.open(member_name) as image_file:
-                        hash_result = cls.hash_thumbnail(image_file, "phash")
-                        return member_name, hash_result
-                else:
-                    # Case 2: Image is in a nested archive
-                    with my_zip.open(nested_zip_name) as nested_zip_file:
-                        # zipfile can read from a file-like object (BytesIO is a good choice)
-                        nested_zip_data = io.BytesIO(nested_zip_file.read())
-                        with zipfile.ZipFile(nested_zip_data) as my_nested_zip:
-                            with my_nested_zip.open(member_name) as image_file:
-                                hash_result = cls.hash_thumbnail(image_file, "phash")
-                                return member_name, hash_result
+            reader = NestedZipReader(zip_path)
         except Exception:
-            # Catching exceptions is crucial in worker processes
-            return member_name, None
+            return [(member_name, None) for member_name, _ in members]
+        with reader:
+            for member_name, nested_zip_name in members:
+                try:
+                    with reader.open(member_name, nested_zip_name) as image_file:
+                        results.append((member_name, cls.hash_thumbnail(image_file, "phash")))
+                except Exception:
+                    # Catching exceptions is crucial in worker processes
+                    results.append((member_name, None))
+        return results
@@ -3,3 +3,11 @@ from django.dispatch import Signal
 
 #  providing_args=["gallery", "wanted_gallery_list"]
 wanted_gallery_found = Signal()
+
+#  providing_args=["galleries"]
+# Sent after galleries are written in bulk, when post_save and m2m_changed are not.
+galleries_bulk_saved = Signal()
+
+#  providing_args=["archives"]
+# Sent after archives are updated in bulk, when post_save is not.
+archives_bulk_saved = Signal()
@@ -1,13 +1,74 @@
+import hashlib
+import io
+import json
+import os
+import queue
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import zipfile
 from collections import defaultdict
 from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-from django.test import TestCase
+import py7zr
+from PIL import Image as PImage
 
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.base.image_probe import ImageHeader, probe_image_header, read_image_header
+from core.base.matchers import Matcher, MatcherPipeline, search_result_cache
+from core.base import nested_zip
+from core.base.nested_zip import NestedZipReader, copy_member
 from core.base.setup import Settings
-from core.base.types import GalleryData
+from core.base.types import ArchiveStatisticsCalculator, GalleryData
+from core.base.wanted import WantedCursor, WantedGalleryLookup
 from core.base.comparison import get_list_closer_text_from_list
+from core.base.utilities import (
+    convert_7z_to_zip,
+    filecount_in_zip,
+    first_bad_zip_member,
+    get_images_from_zip,
+    get_zip_fileinfo,
+)
 from core.providers.panda.parsers import Parser as PandaParser
-from viewer.models import Gallery, WantedGallery, Tag, FoundGallery, Provider
+from core.workers.download_progress import DownloadProgressChecker
+from core.workers.schedulers import BaseScheduler, SchedulerLoop
+from viewer.management.commands.benchmark import compare_results
+from viewer.models import (
+    Archive,
+    ArchiveHashProfile,
+    ArchiveManager,
+    ArchiveMatches,
+    ArchiveOption,
+    ArchiveTag,
+    ArchiveStatistics,
+    Attribute,
+    DownloadEvent,
+    Gallery,
+    GalleryManager,
+    WantedGallery,
+    Tag,
+    FoundGallery,
+    Provider,
+    GalleryProviderData,
+    GalleryMatchGroup,
+    GalleryMatchGroupEntry,
+    TagResolver,
+    TextNgram,
+)
+from viewer.services import CompareObjectsService
+from viewer.utils import file_streaming
+from viewer.utils.ngrams import text_ngrams
+from viewer.utils.side_effects import coalesced_side_effects
 
 
 class CoreTest(TestCase):
@@ -301,3 +362,1076 @@ class WantedGalleryTest(TestCase):
                 wanted_invalidated.append(single_wanted_found)
 
         self.assertEqual(len(wanted_invalidated), 0)
+
+
+class UrlRouterTest(TestCase):
+    def test_route_matches_filter_accepted_urls(self) -> None:
+        settings = Settings(load_from_disk=True)
+        urls = [
+            "https://e-hentai.org/g/2079628/cec767079f/",
+            "https://exhentai.org/g/2079629/cec767079a/",
+            "https://nhentai.net/g/198482/",
+            "https://www.fakku.net/hentai/im-a-piece-of-junk-sexaro-english",
+            "https://hentainexus.com/view/5665",
+            "https://mega.nz/folder/abcdef",
+            "https://example.com/not-a-provider",
+        ]
+
+        # Previous dispatch: each parser in order takes the URLs it accepts from the remaining ones.
+        expected: dict[str, list[str]] = {}
+        remaining = set(urls)
+        for parser in settings.provider_context.get_parsers(settings):
+            accepted = parser.filter_accepted_urls(sorted(remaining))
+            if accepted:
+                remaining = remaining.difference(accepted)
+                expected[parser.name] = sorted(accepted)
+
+        router = settings.provider_context.get_url_router(settings)
+        routed = {parser.name: sorted(parser_urls) for parser, parser_urls in router.route(urls)}
+
+        self.assertEqual(routed, expected)
+        self.assertEqual(routed["generic"], ["https://example.com/not-a-provider"])
+
+        # Copies of the same config reuse the router instead of building it again.
+        self.assertIs(settings.provider_context.get_url_router(settings.copy_from_config()), router)
+
+
+class BulkGalleryUpsertTest(TestCase):
+    def gallery_data_list(self, count: int, prefix: str) -> list[GalleryData]:
+        return [
+            GalleryData(
+                "{}{}".format(prefix, i),
+                "panda",
+                title="bulk gallery {}".format(i),
+                tags=["language:english", "artist:artist {}".format(i), "female:tag {}".format(i % 3), "other"],
+                parent_gallery_gid="{}0".format(prefix) if i else "existing",
+                extra_provider_data=[("rating_count", "int", i)],
+            )
+            for i in range(count)
+        ]
+
+    def test_bulk_update_or_create_from_values(self):
+        existing = Gallery.objects.create(gid="existing", provider="panda", title="old title")
+        existing.tags.set([Tag.objects.create(scope="female", name="removed")])
+
+        with CaptureQueriesContext(connection) as small_batch:
+            Gallery.objects.bulk_update_or_create_from_values(self.gallery_data_list(5, "a"))
+        with CaptureQueriesContext(connection) as large_batch:
+            galleries = Gallery.objects.bulk_update_or_create_from_values(self.gallery_data_list(25, "b"))
+
+        self.assertEqual(len(small_batch), len(large_batch))
+        self.assertEqual([x.gid for x in galleries], ["b{}".format(i) for i in range(25)])
+        self.assertEqual(galleries[0].parent_gallery, existing)
+        self.assertEqual(Gallery.objects.get(gid="b3", provider="panda").parent_gallery, galleries[0])
+        self.assertEqual(
+            sorted(Gallery.objects.get(gid="b4").tag_list()),
+            ["artist:artist 4", "female:tag 1", "language:english", "other"],
+        )
+        self.assertEqual(GalleryProviderData.objects.get(gallery=galleries[4], name="rating_count").value, 4)
+        self.assertEqual(Tag.objects.filter(scope="language", name="english").count(), 1)
+
+        # Updates replace the tags and keep a history record with them.
+        update = GalleryData("existing", "panda", title="new title", tags=["language:english"])
+        (updated,) = Gallery.objects.bulk_update_or_create_from_values([update])
+        self.assertEqual(updated.pk, existing.pk)
+        existing.refresh_from_db()
+        self.assertEqual(existing.title, "new title")
+        self.assertEqual(existing.tag_list(), ["language:english"])
+        last_history = existing.history.latest()
+        self.assertEqual(last_history.history_type, "~")
+        self.assertEqual([str(x.tag) for x in last_history.tags.all()], ["language:english"])
+
+        # The single gallery path resolves tags the same way.
+        single = Gallery.objects.update_or_create_from_values(self.gallery_data_list(2, "c")[1])
+        self.assertEqual(single.parent_gallery, None)
+        self.assertEqual(len(single.tag_list()), 4)
+
+    def test_tag_resolver_rows_matched_by_collation(self):
+        existing = Tag.objects.create(scope="artist", name="collated")
+        tag_resolver = TagResolver()
+        # Like a case insensitive collation, the existing row isn't read back for the requested name.
+        tag_resolver.load = lambda scope_names: None  # type: ignore[method-assign]
+
+        self.assertEqual(
+            tag_resolver.resolve(["artist:collated", "artist:new"]),
+            [existing.pk, Tag.objects.get(scope="artist", name="new").pk],
+        )
+        self.assertEqual(Tag.objects.filter(scope="artist", name="collated").count(), 1)
+
+
+class TextNgramSearchTest(TestCase):
+    titles = [
+        ("Comic Market Special Edition", "コミックマーケット 特別編"),
+        ("Café au lait", ""),
+        ("ＦＵＬＬＷＩＤＴＨ title", None),
+        ("snake_case_title", "ひらがな だけ"),
+        ("100% done", "short"),
+    ]
+    patterns = ["comic", "edition market", "cafe", "Café", "fullwidth", "e_c", "case title", "マーケ", "ケット 特別",
+                "100%", "% d", "ti", "xyz", "ひらがな", "ヒラガナ"]
+
+    def test_title_search_matches_like_filter(self):
+        for title, title_jpn in self.titles:
+            Archive.objects.create(title=title, title_jpn=title_jpn, user_id=None)
+            Gallery.objects.create(gid=title, provider="panda", title=title, title_jpn=title_jpn)
+
+        for model in (Archive, Gallery):
+            for pattern in self.patterns:
+                q_formatted = "%" + pattern.replace(" ", "%") + "%"
+                expected = model.objects.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+                self.assertQuerySetEqual(
+                    TextNgram.objects.title_search(model.objects.all(), q_formatted),
+                    expected,
+                    ordered=False,
+                    msg="{}: {}".format(model.__name__, pattern),
+                )
+
+    def test_index_follows_changes(self):
+        archive = Archive.objects.create(title="first title", user_id=None)
+        kind = TextNgram.KindChoices.ARCHIVE
+        self.assertTrue(TextNgram.objects.filter(kind=kind, object_id=archive.pk, ngram="fir").exists())
+
+        archive.title = "second title"
+        archive.save()
+        self.assertEqual(
+            set(TextNgram.objects.filter(kind=kind, object_id=archive.pk).values_list("ngram", flat=True)),
+            text_ngrams(["second title"]),
+        )
+
+        Archive.objects.filter(pk=archive.pk).update(title="third title")
+        call_command("ngram_index", "--models", "archive", stdout=io.StringIO())
+        self.assertEqual(TextNgram.objects.title_search(Archive.objects.all(), "%third%").get(), archive)
+
+        archive.delete()
+        self.assertFalse(TextNgram.objects.filter(kind=kind).exists())
+
+    def test_tag_name_contains(self):
+        gallery = Gallery.objects.create(gid="1", provider="panda", title="tagged")
+        gallery.tags.add(
+            Tag.objects.create(scope="artist", name="some_artist"),
+            Tag.objects.create(scope="female", name="big eyes"),
+        )
+        # Tags created in bulk by the resolver are indexed as well.
+        gallery.tags.add(*TagResolver().resolve(["male:bulk_created"]))
+        Gallery.objects.create(gid="2", provider="panda", title="untagged")
+
+        for name in ("some", "artist", "me_ar", "big", "eyes", "bulk", "xyz", "ar"):
+            self.assertQuerySetEqual(
+                Gallery.objects.filter(TextNgram.objects.tag_name_contains(name)).distinct(),
+                Gallery.objects.filter(tags__name__contains=name).distinct(),
+                ordered=False,
+                msg=name,
+            )
+
+
+class FakeTransmissionHandler(BaseHTTPRequestHandler):
+    session_id = "fake-session"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.headers.get("X-Transmission-Session-Id") != self.session_id:
+            self.server.handshakes += 1  # type: ignore[attr-defined]
+            self.send_response(409)
+            self.send_header("X-Transmission-Session-Id", self.session_id)
+            self.end_headers()
+            return
+        self.server.requests.append(request)  # type: ignore[attr-defined]
+        if request["method"] == "torrent-get":
+            progress = self.server.progress  # type: ignore[attr-defined]
+            arguments = {
+                "torrents": [
+                    {"id": torrent_id, "hashString": str(torrent_id), "percentDone": progress[torrent_id]}
+                    for torrent_id in request["arguments"]["ids"]
+                    if torrent_id in progress
+                ]
+            }
+        else:
+            arguments = {"rpc-version": 17, "rpc-version-semver": "5.3.0", "version": "4.0.0"}
+        body = json.dumps({"result": "success", "arguments": arguments}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloadProgressCheckerTest(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTransmissionHandler)
+        self.server.handshakes = 0  # type: ignore[attr-defined]
+        self.server.requests = []  # type: ignore[attr-defined]
+        self.server.progress = {}  # type: ignore[attr-defined]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.download_dir = tempfile.mkdtemp()
+
+        self.settings = Settings(load_from_disk=True)
+        self.settings.torrent = {
+            "client": "transmission",
+            "address": "http://127.0.0.1/transmission/rpc",
+            "port": self.server.server_address[1],
+            "user": "",
+            "pass": "",
+            "no_certificate_check": False,
+        }
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.download_dir, ignore_errors=True)
+
+    def test_check_download_events(self):
+        torrent_events = []
+        for torrent_id in range(1, 41):
+            archive = Archive.objects.create(title="torrent {}".format(torrent_id), crc32="", user_id=None)
+            torrent_events.append(
+                DownloadEvent.objects.create(archive=archive, method="torrent", download_id=str(torrent_id))
+            )
+            self.server.progress[torrent_id] = 0.25  # type: ignore[attr-defined]
+        binned_archive = Archive.objects.create(title="binned", crc32="", binned=True, user_id=None)
+        failed_event = DownloadEvent.objects.create(archive=binned_archive, method="torrent", download_id="99")
+
+        file_path = os.path.join(self.download_dir, "direct.zip")
+        with open(file_path, "wb") as f:
+            f.write(b"0" * 100)
+        direct_event = DownloadEvent.objects.create(method="archive", download_id=file_path, total_size=400)
+
+        checker = DownloadProgressChecker(self.settings)
+        with CaptureQueriesContext(connection) as first_check:
+            checker.check_download_events()
+
+        self.assertEqual(self.server.handshakes, 1)  # type: ignore[attr-defined]
+        torrent_gets = [x for x in self.server.requests if x["method"] == "torrent-get"]  # type: ignore[attr-defined]
+        self.assertEqual(len(torrent_gets), 1)
+        self.assertEqual(sorted(torrent_gets[0]["arguments"]["ids"]), list(range(1, 41)))
+        self.assertEqual(DownloadEvent.objects.get(pk=torrent_events[0].pk).progress, 25)
+        self.assertTrue(DownloadEvent.objects.get(pk=failed_event.pk).failed)
+        self.assertEqual(DownloadEvent.objects.get(pk=direct_event.pk).progress, 25)
+        # Every change is written by a single bulk update.
+        self.assertEqual(len([x for x in first_check.captured_queries if x["sql"].startswith("UPDATE")]), 1)
+
+        # Nothing changed: no writes. The session is reused.
+        with CaptureQueriesContext(connection) as second_check:
+            self.assertEqual(checker.check_download_events(), [])
+        self.assertEqual(len(second_check), 1)
+        self.assertEqual(self.server.handshakes, 1)  # type: ignore[attr-defined]
+
+        self.server.progress[1] = 1.0  # type: ignore[attr-defined]
+        with open(file_path, "ab") as f:
+            f.write(b"0" * 300)
+        changed = checker.check_download_events()
+        self.assertEqual(sorted(x.pk for x in changed), sorted([torrent_events[0].pk, direct_event.pk]))
+        self.assertTrue(DownloadEvent.objects.get(pk=torrent_events[0].pk).completed)
+        self.assertTrue(DownloadEvent.objects.get(pk=direct_event.pk).completed)
+        self.assertEqual(DownloadEvent.objects.in_progress().count(), 39)
+
+
+class FakeTitleMatcher(Matcher):
+    name = "fake_title"
+    type = "title"
+    search_delay = 0.3
+
+    def __init__(self, settings: Settings, matches: bool) -> None:
+        super().__init__(settings)
+        self.matches = matches
+        self.searches = 0
+        self.fetches = 0
+        self.search_starts: list[float] = []
+
+    def format_to_search_title(self, file_name: str) -> str:
+        return re.sub(r"\s*\(\d+\)$", "", self.get_title_from_path(file_name)).lower()
+
+    def format_to_compare_title(self, file_name: str) -> str:
+        return self.format_to_search_title(file_name)
+
+    def search_method(self, title_to_search: str) -> bool:
+        self.search_starts.append(time.monotonic())
+        time.sleep(self.search_delay)
+        self.searches += 1
+        self.found_by = self.name
+        self.gallery_links = ["https://example.com/{}".format(title_to_search)] if self.matches else []
+        return self.matches
+
+    def get_metadata_after_matching(self) -> list[GalleryData]:
+        self.fetches += 1
+        return [GalleryData(gid="1", provider=self.provider, title=x.rsplit("/", 1)[1]) for x in self.gallery_links]
+
+    def format_match_values(self):
+        return None
+
+
+class PandaFakeMatcher(FakeTitleMatcher):
+    provider = "panda"
+
+
+class PandaOtherFakeMatcher(PandaFakeMatcher):
+    name = "fake_other_title"
+
+
+class FakkuFakeMatcher(FakeTitleMatcher):
+    provider = "fakku"
+
+
+class RecordingScheduler(BaseScheduler):
+    def __init__(self, loop: SchedulerLoop, settings: Settings, name: str, runs: "queue.Queue[str]") -> None:
+        super().__init__(settings, timer=3600)
+        self.thread_name = name
+        self.loop = loop
+        self.runs = runs
+        self.release = threading.Event()
+        self.release.set()
+
+    @staticmethod
+    def timer_to_seconds(timer: float) -> float:
+        return timer
+
+    def run(self) -> None:
+        self.release.wait(timeout=10)
+        self.last_run = datetime.now(timezone.utc)
+        self.runs.put(self.thread_name)
+
+
+class SchedulerLoopTest(TestCase):
+    def test_jobs_share_bounded_pool(self):
+        settings = Settings(load_from_disk=True)
+        loop = SchedulerLoop(max_workers=2)
+        runs: "queue.Queue[str]" = queue.Queue()
+        jobs = [RecordingScheduler(loop, settings, "recording_{}".format(x), runs) for x in range(20)]
+        threads_before = threading.active_count()
+
+        for job in jobs:
+            job.start_running()
+        self.assertEqual(sorted(runs.get(timeout=10) for _ in jobs), sorted(x.thread_name for x in jobs))
+
+        # One dispatcher and two workers, regardless of the number of jobs.
+        self.assertLessEqual(threading.active_count() - threads_before, 3)
+        self.assertTrue(all(x.last_jitter is not None and x.last_jitter >= 0 for x in jobs))
+        # Each one waits for its timer before running again.
+        self.assertTrue(all(x.is_running() for x in jobs))
+        self.assertTrue(runs.empty())
+        self.assertEqual(loop.active_names(), {x.thread_name for x in jobs})
+
+        # A run forced while the job is running doesn't overlap with it, it starts after it ends.
+        blocked = jobs[0]
+        blocked.release.clear()
+        blocked.run_now()
+        while not loop.is_executing(blocked):
+            time.sleep(0.01)
+        blocked.run_now()
+        while blocked.overlapped_runs == 0:
+            time.sleep(0.01)
+        self.assertTrue(loop.is_executing(blocked))
+        blocked.release.set()
+        self.assertEqual([runs.get(timeout=10), runs.get(timeout=10)], [blocked.thread_name] * 2)
+
+        for job in jobs:
+            job.stop_running()
+        while loop.executing:
+            time.sleep(0.01)
+        self.assertFalse(any(x.is_running() for x in jobs))
+        self.assertEqual(loop.active_names(), set())
+
+
+class MatcherPipelineTest(TestCase):
+    wait_timer = 0.5
+
+    def setUp(self):
+        search_result_cache.clear()
+        self.settings = Settings(load_from_disk=True)
+        self.settings.providers["panda"].wait_timer = self.wait_timer
+        self.settings.providers["fakku"].wait_timer = 0
+
+    def test_matchers_run_concurrently_by_priority(self):
+        first = PandaFakeMatcher(self.settings, matches=False)
+        second = PandaOtherFakeMatcher(self.settings, matches=True)
+        third = FakkuFakeMatcher(self.settings, matches=True)
+        pipeline = MatcherPipeline(self.settings, [first, second, third])
+
+        winner = pipeline.find_match("folder/some title.zip", "")
+
+        self.assertIs(winner, second)
+        self.assertEqual(second.match_title, "some title")
+        # Matchers for the same provider are spaced by its wait timer, the one for another provider runs meanwhile.
+        self.assertGreaterEqual(second.search_starts[0] - first.search_starts[0], self.wait_timer)
+        self.assertLess(abs(third.search_starts[0] - first.search_starts[0]), FakeTitleMatcher.search_delay)
+
+        # Sequential matchers are spaced as well.
+        self.settings.parallel_matchers = False
+        self.assertIs(MatcherPipeline(self.settings, [first, second]).find_match("folder/other.zip", ""), second)
+        self.assertGreaterEqual(second.search_starts[1] - first.search_starts[1], self.wait_timer)
+
+    def test_search_results_are_memoised(self):
+        matcher = FakkuFakeMatcher(self.settings, matches=True)
+        pipeline = MatcherPipeline(self.settings, [matcher])
+        for i in range(5):
+            self.assertIs(pipeline.find_match("folder/Same Title ({}).zip".format(i), ""), matcher)
+            self.assertEqual(matcher.match_title, "same title")
+        self.assertEqual((matcher.searches, matcher.fetches), (1, 1))
+
+        self.settings.matcher_cache_timeout = 0
+        search_result_cache.clear()
+        for i in range(2):
+            pipeline.find_match("folder/Same Title ({}).zip".format(i), "")
+        self.assertEqual(matcher.searches, 3)
+
+
+class GalleryMatchGroupTest(TestCase):
+    def create_group(self, prefix: str, gallery_count: int) -> GalleryMatchGroup:
+        group = GalleryMatchGroup.objects.create(title=prefix)
+        for i in range(gallery_count):
+            gallery = Gallery.objects.create(gid="{}{}".format(prefix, i), provider="panda", title=prefix)
+            GalleryMatchGroupEntry.objects.bulk_create(
+                [GalleryMatchGroupEntry(gallery_match_group=group, gallery=gallery, gallery_position=i + 1)]
+            )
+            for _ in range(2):
+                Archive.objects.create(title=prefix, gallery=gallery, user_id=None)
+        return group
+
+    def test_process_group(self):
+        small_group = self.create_group("small", 3)
+        large_group = self.create_group("large", 30)
+
+        with CaptureQueriesContext(connection) as small_queries:
+            small_group.process_group()
+        with CaptureQueriesContext(connection) as large_queries:
+            moved = large_group.process_group()
+
+        # Only the history insert can be split, by the backend's limit on query parameters.
+        self.assertLessEqual(len(large_queries), len(small_queries) + 1)
+        self.assertEqual(len(moved), 58)
+        first_gallery = large_group.first_entry().gallery  # type: ignore[union-attr]
+        self.assertEqual(Archive.objects.filter(title="large", gallery=first_gallery).count(), 60)
+        self.assertEqual(Archive.history.filter(title="large", history_type="~", gallery=first_gallery).count(), 58)
+
+    def test_positions(self):
+        group = GalleryMatchGroup.objects.create(title="group")
+        galleries = [Gallery.objects.create(gid=str(i), provider="panda", title="gallery") for i in range(3)]
+        archive = Archive.objects.create(title="archive", gallery=galleries[1], user_id=None)
+        for gallery in galleries[:2]:
+            group.add_gallery(gallery)
+        # Adding a gallery moves its archives to the first gallery of the group.
+        archive.refresh_from_db()
+        self.assertEqual(archive.gallery, galleries[0])
+
+        other_group = self.create_group("other", 3)
+        GalleryMatchGroupEntry.objects.filter(gallery_match_group=other_group).update(
+            gallery_position=F("gallery_position") + 10
+        )
+        group.add_gallery(galleries[2])
+        group.merge_groups([other_group])
+
+        self.assertFalse(GalleryMatchGroup.objects.filter(pk=other_group.pk).exists())
+        self.assertEqual(
+            list(group.gallerymatchgroupentry_set.values_list("gallery__gid", "gallery_position")),
+            [("0", 1), ("1", 2), ("2", 3), ("other0", 4), ("other1", 5), ("other2", 6)],
+        )
+        self.assertEqual(Archive.objects.filter(gallery=galleries[0]).count(), 7)
+
+    def test_move_to_gallery_syncs_archives(self):
+        user = User.objects.create_user(username="mover")
+        target = Gallery.objects.create(gid="target", provider="panda", title="target", title_jpn="ターゲット")
+        target.tags.set([Tag.objects.create(scope="artist", name="target"), Tag.objects.create(name="shared")])
+        source = Gallery.objects.create(gid="source", provider="panda", title="source")
+        archive = Archive.objects.create(title="source", gallery=source, user_id=None)
+        archive.tags.add(Tag.objects.get(name="shared"), Tag.objects.create(name="old"))
+        archive.tags.add(Tag.objects.create(name="custom"), through_defaults={"origin": ArchiveTag.ORIGIN_USER})
+        ArchiveMatches.objects.create(archive=archive, gallery=source)
+        frozen = Archive.objects.create(title="frozen", gallery=source, user_id=None)
+        frozen.tags.add(Tag.objects.get(name="old"))
+        ArchiveOption.objects.create(archive=frozen, freeze_titles=True, freeze_tags=True)
+        ArchiveMatches.objects.create(archive=frozen, gallery=source)
+
+        moved = Archive.objects.move_to_gallery(Archive.objects.filter(gallery=source), target.pk, user=user)
+
+        self.assertEqual(
+            {(x.pk, x.gallery_id, x.title) for x in moved},
+            {(archive.pk, target.pk, "target"), (frozen.pk, target.pk, "frozen")},
+        )
+        archive.refresh_from_db()
+        self.assertEqual((archive.title, archive.title_jpn), ("target", "ターゲット"))
+        self.assertEqual(sorted(archive.tag_list()), ["artist:target", "custom", "shared"])
+        self.assertEqual(list(archive.custom_tags().values_list("name", flat=True)), ["custom"])
+        self.assertEqual(frozen.tag_list(), ["old"])
+        self.assertEqual(list(ArchiveMatches.objects.values_list("archive", flat=True)), [frozen.pk])
+        self.assertEqual(archive.history.latest().history_user, user)
+
+
+class ArchiveStatisticsTest(TestCase):
+    def test_calculator_matches_statistics_module(self):
+        calculator = ArchiveStatisticsCalculator.from_columns(
+            height=[1200, None, 800, 1200, 800, 600],
+            file_type=[".png", ".jpg", ".jpg", ".png", ".gif"],
+        )
+        self.assertEqual(calculator.mean("height"), statistics.mean([1200, 800, 1200, 800, 600]))
+        self.assertAlmostEqual(calculator.stddev("height"), statistics.pstdev([1200, 800, 1200, 800, 600]))
+        # Ties are resolved by the first value seen.
+        self.assertEqual(calculator.mode("height"), 1200)
+        self.assertEqual(calculator.mode("file_type"), ".png")
+        self.assertEqual(calculator.eq_to_value("file_type", ".jpg"), 0.4)
+        self.assertIsNone(calculator.mean("width"))
+
+    def test_statistics_from_image_headers(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with zipfile.ZipFile(os.path.join(media_root, "archive.zip"), "w") as new_zip:
+                for name, size in (("01.png", (200, 300)), ("02.png", (200, 300)), ("03.jpg", (500, 300))):
+                    image_data = io.BytesIO()
+                    PImage.new("RGB", size).save(image_data, "PNG" if name.endswith(".png") else "JPEG")
+                    new_zip.writestr(name, image_data.getvalue())
+            archive = Archive.objects.create(title="archive", zipped="archive.zip", user_id=None)
+            archive.generate_image_set()
+
+            self.assertTrue(archive.update_image_data_from_headers())
+
+        archive_statistics = ArchiveStatistics.objects.get(archive=archive)
+        self.assertEqual(archive_statistics.width_mode, 200)
+        self.assertEqual(archive_statistics.height_average, 300)
+        self.assertEqual(archive_statistics.file_type_mode, ".png")
+        self.assertAlmostEqual(archive_statistics.file_type_match, 2 / 3)
+        self.assertEqual(archive_statistics.image_mode_mode, "RGB")
+        self.assertFalse(archive_statistics.is_horizontal_mode)
+
+        # Removing pages updates the statistics from the pages that are left.
+        archive.image_set.filter(archive_position__lte=2).delete()
+        ArchiveStatistics.objects.update_for_archives([archive.pk])
+        archive_statistics.refresh_from_db()
+        self.assertEqual(archive_statistics.width_mode, 500)
+        self.assertTrue(archive_statistics.is_horizontal_mode)
+
+        archive.delete_files_but_archive()
+        self.assertFalse(ArchiveStatistics.objects.filter(archive=archive).exists())
+
+
+class ArchiveHashProfileTest(TestCase):
+    def test_hashing_images_drops_profiles(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with zipfile.ZipFile(os.path.join(media_root, "archive.zip"), "w") as new_zip:
+                for name in ("01.png", "02.png"):
+                    image_data = io.BytesIO()
+                    PImage.new("RGB", (20, 30)).save(image_data, "PNG")
+                    new_zip.writestr(name, image_data.getvalue())
+            archive = Archive.objects.create(title="archive", zipped="archive.zip", user_id=None)
+            archive.generate_image_set()
+            for algorithm in ("sha1", "other"):
+                ArchiveHashProfile.objects.create(
+                    archive=archive, algorithm=algorithm, crc32=archive.crc32 or "", hashes={"1": "old"}
+                )
+
+            # The hashes are stored in bulk, without signals, the profile built from the old ones is dropped anyway.
+            self.assertTrue(archive.calculate_sha1_and_data_for_images(process_archive_statistics=False))
+            self.assertEqual(list(archive.hash_profiles.values_list("algorithm", flat=True)), ["other"])
+
+            profile = ArchiveHashProfile.objects.update_profile(archive.pk, "sha1", live_data=False)
+            self.assertIsNotNone(profile)
+            self.assertEqual(
+                profile.hashes,  # type: ignore[union-attr]
+                {x.position: x.sha1 for x in archive.image_set.all()},
+            )
+
+
+class CoalescedSideEffectsTest(TestCase):
+    def setUp(self):
+        self.indexed: list[list[int]] = []
+        self.addCleanup(setattr, ArchiveManager, "bulk_update_index", ArchiveManager.__dict__["bulk_update_index"])
+        ArchiveManager.bulk_update_index = staticmethod(
+            lambda archives: self.indexed.append(sorted(x.pk for x in archives))
+        )
+        self.indexed_galleries: list[list[int]] = []
+        self.addCleanup(setattr, GalleryManager, "bulk_update_index", GalleryManager.__dict__["bulk_update_index"])
+        GalleryManager.bulk_update_index = staticmethod(
+            lambda galleries: self.indexed_galleries.append(sorted(x.pk for x in galleries))
+        )
+
+    def test_saves_are_dispatched_once(self):
+        archives = [Archive.objects.create(title="archive {}".format(x), user_id=None) for x in range(5)]
+        self.assertEqual(Archive.history.count(), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with coalesced_side_effects():
+                for archive in archives:
+                    archive.reason = "bulk"
+                    archive.simple_save()
+                    archive.simple_save()
+                new_archive = Archive(title="new", user_id=None)
+                new_archive.save()
+                new_archive.gallery = Gallery.objects.create(gid="1", provider="panda", title="gallery")
+                new_archive.gallery.save()
+                new_archive.simple_save()
+            self.assertEqual(Archive.history.count(), 5)
+            self.assertEqual(self.indexed, [])
+
+        self.assertEqual(self.indexed, [sorted([x.pk for x in archives] + [new_archive.pk])])
+        changed = Archive.history.filter(history_type="~")
+        self.assertEqual(sorted(changed.values_list("id", flat=True)), sorted(x.pk for x in archives + [new_archive]))
+        self.assertEqual(set(changed.exclude(id=new_archive.pk).values_list("reason", flat=True)), {"bulk"})
+        self.assertEqual(Archive.history.filter(history_type="+", id=new_archive.pk).count(), 1)
+        self.assertEqual(self.indexed_galleries, [[new_archive.gallery.pk]])
+
+    def test_images_are_created_before_the_index_update(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with zipfile.ZipFile(os.path.join(media_root, "archive.zip"), "w") as new_zip:
+                for name in ("01.png", "02.png"):
+                    image_data = io.BytesIO()
+                    PImage.new("RGB", (200, 300)).save(image_data, "PNG")
+                    new_zip.writestr(name, image_data.getvalue())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                with coalesced_side_effects():
+                    archive = Archive(title="archive", zipped="archive.zip", user_id=None)
+                    archive.save()
+                    self.assertFalse(archive.image_set.exists())
+
+            self.assertEqual(archive.image_set.count(), 2)
+            self.assertTrue(archive.thumbnail)
+        # The thumbnail saved by the image effect is indexed with the rest, in the same batch.
+        self.assertEqual(self.indexed, [[archive.pk]])
+        self.assertEqual(Archive.history.filter(id=archive.pk).count(), 2)
+
+    def test_bad_zip_returns_early_in_both_modes(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with open(os.path.join(media_root, "bad.zip"), "wb") as bad_file:
+                bad_file.write(b"not a zip file")
+
+            outside = Archive(zipped="bad.zip", user_id=None)
+            outside.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                with coalesced_side_effects():
+                    inside = Archive(zipped="bad.zip", user_id=None)
+                    inside.save()
+
+            for archive in (outside, inside):
+                archive.refresh_from_db()
+                self.assertIsNotNone(archive.crc32)
+                self.assertIsNone(archive.title)
+                self.assertIsNone(archive.filesize)
+                self.assertIsNone(archive.original_filename)
+                self.assertFalse(archive.image_set.exists())
+
+    def test_rollback_discards_side_effects(self):
+        archives = [Archive.objects.create(title="archive {}".format(x), user_id=None) for x in range(2)]
+        with self.captureOnCommitCallbacks(execute=True):
+            with coalesced_side_effects():
+                for archive in archives:
+                    # Each archive commits on its own, only the failed one is rolled back.
+                    try:
+                        with transaction.atomic():
+                            archive.simple_save()
+                            if archive == archives[1]:
+                                raise ValueError
+                    except ValueError:
+                        pass
+        self.assertEqual(self.indexed, [[archives[0].pk]])
+        self.assertEqual(list(Archive.history.filter(history_type="~").values_list("id", flat=True)), [archives[0].pk])
+
+
+class ImageProbeTest(TestCase):
+    def test_headers_match_pillow(self):
+        for mode, image_format, save_options in (
+            ("RGB", "JPEG", {"progressive": True}),
+            ("CMYK", "JPEG", {}),
+            ("L", "PNG", {}),
+            ("I;16", "PNG", {}),
+            ("RGBA", "PNG", {}),
+            ("RGB", "WEBP", {}),
+            ("RGBA", "WEBP", {"lossless": True}),
+            ("RGBA", "AVIF", {}),
+        ):
+            image_data = io.BytesIO()
+            PImage.effect_noise((300, 420), 64).convert(mode).save(image_data, image_format, **save_options)
+            image_data.seek(0)
+
+            image_header = probe_image_header(image_data)
+            # Only the start of the file is read.
+            self.assertLess(image_data.tell(), 1024)
+            with PImage.open(image_data) as im:
+                self.assertEqual(image_header, ImageHeader(im.width, im.height, im.format, im.mode))
+
+    def test_fallback_to_pillow(self):
+        image_data = io.BytesIO()
+        PImage.new("L", (30, 20)).save(image_data, "BMP")
+
+        self.assertIsNone(probe_image_header(io.BytesIO(image_data.getvalue())))
+        self.assertEqual(read_image_header(image_data), ImageHeader(30, 20, "BMP", "L"))
+        with self.assertRaises(PImage.UnidentifiedImageError):
+            read_image_header(io.BytesIO(b"\x89PNG\r\n\x1a\n" + b"\x00" * 30))
+
+
+class WantedCursorTest(TestCase):
+    def test_stops_at_previous_run(self):
+        provider = Provider.objects.create(name="fakku", slug="fakku")
+        attrs = Attribute.objects.filter(provider=provider)
+        pages = [["e", "d"], ["c", "b"], ["a"]]
+
+        cursor = WantedCursor(attrs, provider, "books")
+        self.assertEqual([cursor.unseen(page) for page in pages], pages)
+        self.assertFalse(cursor.reached)
+        cursor.save()
+        self.assertEqual(attrs.fetch_value("wanted_cursor_books"), "e")
+
+        # An interrupted run doesn't move the mark.
+        cursor = WantedCursor(attrs, provider, "books")
+        self.assertEqual(cursor.unseen(["g", "f"]), ["g", "f"])
+        cursor.hold()
+        cursor.save()
+        self.assertEqual(attrs.fetch_value("wanted_cursor_books"), "e")
+
+        cursor = WantedCursor(attrs, provider, "books")
+        self.assertEqual(cursor.unseen(["g", "f"]), ["g", "f"])
+        self.assertEqual(cursor.unseen(["e", "d"]), [])
+        self.assertTrue(cursor.reached)
+        cursor.save()
+        self.assertEqual(attrs.fetch_value("wanted_cursor_books"), "g")
+
+        cursor = WantedCursor(attrs, provider, "books", enabled=False)
+        self.assertEqual(cursor.unseen(["h", "g"]), ["h", "g"])
+        cursor.save()
+        self.assertEqual(attrs.fetch_value("wanted_cursor_books"), "g")
+
+    def test_wanted_gallery_lookup(self):
+        wanted_gallery = WantedGallery.objects.create(title="Title", search_title="title")
+        WantedGallery.objects.create(title="Other", search_title="other")
+
+        with self.assertNumQueries(1):
+            wanted_lookup = WantedGalleryLookup("title", ["Title", "New", None])
+        self.assertEqual(wanted_lookup.get("Title", "title"), [wanted_gallery])
+        # Keys that weren't found are checked once in the database, that may match them by collation.
+        with self.assertNumQueries(1):
+            self.assertEqual(wanted_lookup.get("Title", "other"), [])
+            self.assertEqual(wanted_lookup.get("Title", "other"), [])
+
+        new_wanted_gallery = WantedGallery.objects.create(title="New", search_title="new")
+        wanted_lookup.add(new_wanted_gallery)
+        self.assertEqual(wanted_lookup.get("New", "new"), [new_wanted_gallery])
+
+        # Like a row matched only by a case insensitive collation, one not read by the page query is still found.
+        missed_wanted_gallery = WantedGallery.objects.create(title="Missed", search_title="missed")
+        self.assertEqual(wanted_lookup.get("Missed", "missed"), [missed_wanted_gallery])
+
+
+class ConvertToZipTest(TestCase):
+    def test_convert_7z_to_zip(self) -> None:
+        members = {
+            "folder/01.jpg": os.urandom(300000),
+            "folder/02.txt": b"text " * 1000,
+            "__MACOSX/01.jpg": b"extra",
+            "empty.png": b"",
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, "archive.zip")
+            with py7zr.SevenZipFile(filepath, "w") as new_7z:
+                for name, content in members.items():
+                    new_7z.writestr(content, name)
+
+            self.assertEqual(convert_7z_to_zip(filepath), 0)
+            self.assertEqual(os.listdir(temp_dir), ["archive.zip"])
+
+            with zipfile.ZipFile(filepath) as converted_zip:
+                self.assertEqual(sorted(converted_zip.namelist()), ["01.jpg", "02.txt", "empty.png"])
+                self.assertEqual(converted_zip.read("01.jpg"), members["folder/01.jpg"])
+                self.assertEqual(converted_zip.read("02.txt"), members["folder/02.txt"])
+                self.assertEqual(converted_zip.read("empty.png"), b"")
+                self.assertEqual(converted_zip.getinfo("01.jpg").compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(converted_zip.getinfo("02.txt").compress_type, zipfile.ZIP_DEFLATED)
+                self.assertIsNone(converted_zip.testzip())
+
+    def test_convert_encrypted_7z_to_zip(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, "archive.zip")
+            with py7zr.SevenZipFile(filepath, "w", password="secret") as new_7z:
+                new_7z.set_encrypted_header(True)
+                new_7z.writestr(b"image", "01.jpg")
+
+            self.assertEqual(convert_7z_to_zip(filepath), -1)
+            self.assertEqual(os.listdir(temp_dir), ["archive.zip"])
+            self.assertTrue(py7zr.is_7zfile(filepath))
+
+
+class BadZipMembersTest(TestCase):
+    def test_encrypted_and_corrupt_members_are_bad_zips(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = os.path.join(temp_dir, "archive.zip")
+            nested_data = io.BytesIO()
+            with zipfile.ZipFile(nested_data, "w") as nested_zip:
+                nested_zip.writestr("01.jpg", b"image")
+            with zipfile.ZipFile(zip_path, "w") as new_zip:
+                new_zip.writestr("01.zip", nested_data.getvalue())
+                new_zip.writestr("02.zip", nested_data.getvalue())
+            # Marks the second member as encrypted in its central directory entry, reading it then requires a password.
+            with open(zip_path, "r+b") as zip_file:
+                content = zip_file.read()
+                zip_file.seek(content.rindex(b"PK\x01\x02") + 8)
+                zip_file.write(b"\x01\x00")
+
+            with zipfile.ZipFile(zip_path) as my_zip:
+                self.assertEqual([x[0] for x in get_images_from_zip(my_zip)], ["01.jpg"])
+                self.assertEqual(first_bad_zip_member(my_zip), "02.zip")
+                with NestedZipReader(my_zip) as reader, self.assertRaises(zipfile.BadZipFile):
+                    reader.open("01.jpg", "02.zip")
+            self.assertEqual(filecount_in_zip(zip_path), 1)
+
+            with zipfile.ZipFile(zip_path, "w") as new_zip:
+                new_zip.writestr("01.jpg", os.urandom(1000), compress_type=zipfile.ZIP_LZMA)
+            with zipfile.ZipFile(zip_path) as my_zip:
+                header_offset = my_zip.getinfo("01.jpg").header_offset
+            with open(zip_path, "r+b") as zip_file:
+                zip_file.seek(header_offset + 60)
+                zip_file.write(b"\xff" * 20)
+
+            with zipfile.ZipFile(zip_path) as my_zip:
+                self.assertEqual(first_bad_zip_member(my_zip), "01.jpg")
+                with (
+                    NestedZipReader(my_zip) as reader,
+                    zipfile.ZipFile(io.BytesIO(), "w") as new_zip,
+                    self.assertRaises(zipfile.BadZipFile),
+                ):
+                    reader.copy("01.jpg", None, new_zip, "01.jpg")
+            self.assertEqual(get_zip_fileinfo(zip_path)[1], 1)
+
+
+class NestedZipReaderTest(TestCase):
+    def test_reads_stored_and_compressed_nested_zips(self):
+        images = {}
+        for count in range(6):
+            image_data = io.BytesIO()
+            PImage.effect_noise((40, 30), 20 + count * 10).convert("RGB").save(image_data, "PNG")
+            images["{:02d}.png".format(count)] = image_data.getvalue()
+        nested_zips = {}
+        for nested_name, names in (("stored.zip", ["01.png", "02.png"]), ("deflated.zip", ["03.png", "04.png"])):
+            nested_data = io.BytesIO()
+            with zipfile.ZipFile(nested_data, "w") as nested_zip:
+                for name in names:
+                    nested_zip.writestr(name, images[name])
+            nested_zips[nested_name] = nested_data.getvalue()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = os.path.join(temp_dir, "archive.zip")
+            with zipfile.ZipFile(zip_path, "w") as new_zip:
+                new_zip.writestr("00.png", images["00.png"])
+                new_zip.writestr("stored.zip", nested_zips["stored.zip"], compress_type=zipfile.ZIP_STORED)
+                new_zip.writestr("deflated.zip", nested_zips["deflated.zip"], compress_type=zipfile.ZIP_DEFLATED)
+                new_zip.writestr("05.png", images["05.png"])
+
+            with zipfile.ZipFile(zip_path) as my_zip:
+                members = [(x[0], x[1]) for x in get_images_from_zip(my_zip)]
+            self.assertEqual(len(members), 6)
+
+            with NestedZipReader(zip_path) as reader:
+                for member_name, nested_zip_name in members:
+                    with reader.open(member_name, nested_zip_name) as member_file:
+                        self.assertEqual(member_file.read(), images[member_name])
+                    self.assertEqual(reader.getinfo(member_name, nested_zip_name).file_size, len(images[member_name]))
+                # Each nested zip file is opened once, only the compressed one is copied.
+                self.assertEqual(set(reader.nested_zips), {"stored.zip", "deflated.zip"})
+                self.assertEqual(len(reader.temporary_files), 1)
+
+            self.assertEqual(
+                CompareObjectsService.calculate_phash_for_zip_members((zip_path, members)),
+                [
+                    (name, CompareObjectsService.hash_thumbnail(io.BytesIO(images[name]), "phash"))
+                    for name, _ in members
+                ],
+            )
+            self.assertEqual(
+                CompareObjectsService.calculate_phash_for_zip_member((zip_path, "missing.png", "stored.zip")),
+                ("missing.png", None),
+            )
+
+
+    def test_copy_member_without_recompressing(self):
+        members = {"01.jpg": os.urandom(5000), "02.txt": b"text " * 1000}
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = os.path.join(temp_dir, "archive.zip")
+            with zipfile.ZipFile(zip_path, "w") as new_zip:
+                new_zip.writestr("01.jpg", members["01.jpg"], compress_type=zipfile.ZIP_STORED)
+                new_zip.writestr("02.txt", members["02.txt"], compress_type=zipfile.ZIP_DEFLATED)
+
+            copy_path = os.path.join(temp_dir, "copy.zip")
+            with zipfile.ZipFile(zip_path) as my_zip, zipfile.ZipFile(copy_path, "w") as new_zip:
+                copy_member(my_zip, my_zip.getinfo("02.txt"), new_zip, "a/02.txt")
+                copy_member(my_zip, my_zip.getinfo("01.jpg"), new_zip, "b/01.jpg")
+                source_infos = [my_zip.getinfo("02.txt"), my_zip.getinfo("01.jpg")]
+
+            with zipfile.ZipFile(copy_path) as copied_zip:
+                self.assertIsNone(copied_zip.testzip())
+                self.assertEqual(copied_zip.namelist(), ["a/02.txt", "b/01.jpg"])
+                self.assertEqual(copied_zip.read("a/02.txt"), members["02.txt"])
+                self.assertEqual(copied_zip.read("b/01.jpg"), members["01.jpg"])
+                for copied_info, source_info in zip(copied_zip.infolist(), source_infos):
+                    self.assertEqual(copied_info.compress_type, source_info.compress_type)
+                    self.assertEqual(copied_info.compress_size, source_info.compress_size)
+
+            # Corrupted data is detected while copying.
+            with zipfile.ZipFile(zip_path) as my_zip:
+                header_offset = my_zip.getinfo("01.jpg").header_offset
+            with open(zip_path, "r+b") as zip_file:
+                zip_file.seek(header_offset + 100)
+                zip_file.write(b"corrupted")
+            with zipfile.ZipFile(zip_path) as my_zip, zipfile.ZipFile(copy_path, "w") as new_zip:
+                with self.assertRaises(zipfile.BadZipFile):
+                    copy_member(my_zip, my_zip.getinfo("01.jpg"), new_zip, "01.jpg")
+                copy_member(my_zip, my_zip.getinfo("02.txt"), new_zip, "02.txt")
+            with zipfile.ZipFile(copy_path) as copied_zip:
+                self.assertEqual(copied_zip.namelist(), ["02.txt"])
+                self.assertIsNone(copied_zip.testzip())
+
+            # Without the ZipFile internals the data is recompressed, with the same method.
+            self.addCleanup(setattr, nested_zip, "RAW_COPY_ATTRIBUTES", nested_zip.RAW_COPY_ATTRIBUTES)
+            nested_zip.RAW_COPY_ATTRIBUTES = ("_missing_attribute",)
+            with zipfile.ZipFile(zip_path) as my_zip, zipfile.ZipFile(copy_path, "w") as new_zip:
+                copy_member(my_zip, my_zip.getinfo("02.txt"), new_zip, "02.txt")
+            with zipfile.ZipFile(copy_path) as copied_zip:
+                self.assertEqual(copied_zip.read("02.txt"), members["02.txt"])
+                self.assertEqual(copied_zip.getinfo("02.txt").compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_clone_archive_with_repeated_pages(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            pages = []
+            for size in (10, 20, 10):
+                image_data = io.BytesIO()
+                PImage.new("RGB", (size, size)).save(image_data, "PNG")
+                pages.append(image_data.getvalue())
+            with zipfile.ZipFile(os.path.join(media_root, "archive.zip"), "w") as new_zip:
+                for count, page in enumerate(pages):
+                    new_zip.writestr("{:02d}.png".format(count), page)
+            archive = Archive.objects.create(title="archive", zipped="archive.zip", user_id=None)
+            archive.generate_image_set(force=True)
+            for image in archive.image_set.all():
+                image.sha1 = hashlib.sha1(pages[image.archive_position - 1]).hexdigest()
+                image.save()
+            archive.filecount = 3
+            sha1s = [hashlib.sha1(x).hexdigest() for x in pages]
+
+            # Each occurrence of a repeated page takes the next page with its content.
+            new_archive, error_message = archive.clone_archive_plus([sha1s[2], sha1s[1], sha1s[0]])
+            self.assertEqual(error_message, "")
+            assert new_archive is not None
+            with zipfile.ZipFile(new_archive.zipped.path) as cloned_zip:
+                self.assertEqual(cloned_zip.namelist(), ["0001_00.png", "0002_01.png", "0003_02.png"])
+
+            archive = Archive.objects.get(title="archive", zipped="archive.zip")
+            archive.filecount = 3
+            new_archive, error_message = archive.clone_archive_plus([sha1s[0], sha1s[0], sha1s[0]])
+            self.assertIsNone(new_archive)
+            self.assertIn("is used more times", error_message)
+
+    def test_split_archive(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with zipfile.ZipFile(os.path.join(media_root, "archive.zip"), "w") as new_zip:
+                for count in range(4):
+                    image_data = io.BytesIO()
+                    PImage.new("RGB", (10 + count, 10)).save(image_data, "PNG")
+                    new_zip.writestr("{:02d}.png".format(count), image_data.getvalue())
+            archive = Archive.objects.create(title="archive", zipped="archive.zip", user_id=None)
+            archive.generate_image_set(force=True)
+            archive.filecount = 4
+
+            new_archives, error_message = archive.split_archive([(1, 1, "first", False), (2, 4, "rest", False)])
+
+            self.assertEqual(error_message, "")
+            self.assertIsNotNone(new_archives)
+            for file_name, names in (("first.zip", ["00.png"]), ("rest.zip", ["01.png", "02.png", "03.png"])):
+                with zipfile.ZipFile(os.path.join(media_root, file_name)) as split_zip:
+                    self.assertEqual(split_zip.namelist(), names)
+                    self.assertIsNone(split_zip.testzip())
+
+
+class FileStreamingTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.data = os.urandom(100000)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "archive.zip")
+        with open(self.path, "wb") as archive_file:
+            archive_file.write(self.data)
+        self.etag = file_streaming.file_etag(self.path, "ABCD1234")
+
+    def get(self, **headers):
+        response = file_streaming.ranged_response(
+            self.factory.get("/", headers=headers), self.path, "application/zip", etag=self.etag
+        )
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, content
+
+    def test_ranges(self):
+        self.assertEqual(self.etag, '"abcd1234-186a0"')
+        response, content = self.get()
+        self.assertEqual((response.status_code, content), (200, self.data))
+        self.assertEqual(response["Content-Length"], "100000")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        for range_header, start, end in (
+            ("bytes=0-0", 0, 0),
+            ("bytes=1000-65535", 1000, 65535),
+            ("bytes=99000-", 99000, 99999),
+            ("bytes=-500", 99500, 99999),
+            ("bytes=50000-200000", 50000, 99999),
+        ):
+            response, content = self.get(Range=range_header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(content, self.data[start : end + 1])
+            self.assertEqual(response["Content-Range"], "bytes {}-{}/100000".format(start, end))
+            self.assertEqual(response["Content-Length"], str(end - start + 1))
+
+        # A resumed download of a file that changed gets the whole new file.
+        response, content = self.get(Range="bytes=1000-", If_Range=self.etag)
+        self.assertEqual((response.status_code, content), (206, self.data[1000:]))
+        response, content = self.get(Range="bytes=1000-", If_Range='"other"')
+        self.assertEqual((response.status_code, content), (200, self.data))
+
+        response, _ = self.get(Range="bytes=100000-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */100000")
+        response, _ = self.get(If_None_Match=self.etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_transfer_slots(self):
+        slots = threading.BoundedSemaphore(1)
+        self.addCleanup(setattr, file_streaming, "_slots", file_streaming._slots)
+        file_streaming._slots = slots
+
+        request = self.factory.get("/")
+        first = file_streaming.ranged_response(request, self.path, "application/zip")
+        second = file_streaming.ranged_response(request, self.path, "application/zip")
+        self.assertEqual(second.status_code, 503)
+        self.assertIn("Retry-After", second)
+        # The slot is released when the response is closed.
+        first.close()
+        third = file_streaming.ranged_response(request, self.path, "application/zip")
+        self.assertEqual(third.status_code, 200)
+        third.close()
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_benchmark_rolls_back_and_compares(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            output_file = os.path.join(output_dir, "results.json")
+            call_command(
+                "benchmark",
+                cases=["zip_scan", "wanted_matching", "queries"],
+                archives=2,
+                images=1,
+                tags=8,
+                wanted=3,
+                repeat=1,
+                output=output_file,
+                stdout=io.StringIO(),
+            )
+
+            with open(output_file, "r", encoding="utf8") as results_file:
+                results = json.load(results_file)["results"]
+
+            self.assertEqual(results["zip_scan"]["items"], 2)
+            self.assertIn("queries_api_gallery_search", results)
+            self.assertGreater(results["queries_gallery_list"]["queries"], 0)
+            self.assertFalse(Archive.objects.exists())
+            self.assertFalse(Gallery.objects.exists())
+            self.assertFalse(WantedGallery.objects.exists())
+
+            # Doing more queries than the baseline is a regression, independently of the time taken.
+            baseline = {"queries_gallery_list": dict(results["queries_gallery_list"])}
+            baseline["queries_gallery_list"]["queries"] -= 1
+            self.assertEqual(len(compare_results(baseline, results, 10.0)), 1)
+            self.assertEqual(compare_results(results, results, 0.0), [])
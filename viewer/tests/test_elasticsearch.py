@@ -1,11 +1,16 @@
 from collections import defaultdict
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
+from core.base.embedded_search import EmbeddedSearchClient
 from core.base.setup import Settings
 from core.base.types import GalleryData
 from core.providers.panda.parsers import Parser as PandaParser
-from viewer.models import Gallery, WantedGallery, Tag
+from viewer.models import Archive, Gallery, WantedGallery, Tag
 
 class WantedGalleryElasticSearchTest(TestCase):
     def setUp(self):
@@ -113,3 +118,89 @@ class WantedGalleryElasticSearchTest(TestCase):
         # Make sure compare_gallery_with_wanted_filters gives the same result as match_against_wanted_galleries
         self.assertEqual(rematch_result_1, gallery_wanted_lists[incoming_gallery1.gid])
         self.assertEqual(rematch_result_4, gallery_wanted_lists[incoming_gallery4.gid])
+
+
+class EmbeddedSearchTest(TestCase):
+    def setUp(self):
+        self.search_client = EmbeddedSearchClient(":memory:")
+        self.addCleanup(self.search_client.close)
+        search_settings = override_settings(
+            ES_CLIENT=self.search_client,
+            ES_ENABLED=True,
+            ES_MATCH_ENABLED=True,
+            ES_AUTOREFRESH=True,
+            ES_AUTOREFRESH_GALLERY=True,
+        )
+        search_settings.enable()
+        self.addCleanup(search_settings.disable)
+        call_command("push-to-index", recreate_index=True, recreate_index_gallery=True, recreate_match_index=True)
+
+        user = User.objects.create_user(username="testuser1", password="12345")
+        english_tag = Tag.objects.create(scope="language", name="english")
+        artist_tag = Tag.objects.create(scope="artist", name="suzunomoku")
+
+        self.gallery1 = Gallery.objects.create(
+            title="Dopyu-Dopyu Of The Dead", gid="1", provider="panda", category="Manga", public=True
+        )
+        self.gallery1.tags.set([english_tag, artist_tag])
+        self.gallery1.update_index()
+        self.gallery2 = Gallery.objects.create(
+            title="Dead Night Story", gid="2", provider="panda", category="Doujinshi", public=True
+        )
+        self.gallery2.tags.set([english_tag])
+        self.gallery2.update_index()
+        self.gallery3 = Gallery.objects.create(
+            title="Private Dead Gallery", gid="3", provider="fakku", category="Manga", public=False
+        )
+
+        self.archive1 = Archive.objects.create(title="Dopyu-Dopyu Of The Dead", public=True, user=user)
+        self.archive2 = Archive.objects.create(title="Another Archive", public=True, user=user)
+
+    def test_gallery_search(self):
+        response = self.client.get(reverse("viewer:es-gallery-json"), {"q": "dead"})
+        data = response.json()
+        # Only public galleries for anonymous users.
+        self.assertEqual({x["title"] for x in data["hits"]}, {"Dopyu-Dopyu Of The Dead", "Dead Night Story"})
+        self.assertEqual(
+            {x["name"]: x["count"] for x in data["aggregations"]["tags__full"]},
+            {"language:english": 2, "artist:suzunomoku": 1},
+        )
+
+        response = self.client.get(
+            reverse("viewer:es-gallery-json"), {"q": 'dead AND tags.full:"artist:suzunomoku"', "category": "Manga"}
+        )
+        self.assertEqual([x["title"] for x in response.json()["hits"]], ["Dopyu-Dopyu Of The Dead"])
+
+        response = self.client.get(reverse("viewer:es-gallery-json"), {"q": "dead", "category": "-Manga"})
+        self.assertEqual([x["title"] for x in response.json()["hits"]], ["Dead Night Story"])
+
+        response = self.client.get(reverse("viewer:es-gallery-json"), {"q": "dead AND (night"})
+        self.assertNotIn("hits", response.json())
+        self.assertIsNotNone(response.json()["message"])
+
+        self.gallery2.delete()
+        response = self.client.get(reverse("viewer:es-gallery-json"), {"q": "dead"})
+        self.assertEqual([x["title"] for x in response.json()["hits"]], ["Dopyu-Dopyu Of The Dead"])
+
+    def test_archive_suggestions(self):
+        response = self.client.get(reverse("viewer:es-suggest-view"), {"q": "dopyu deda"})
+        self.assertEqual([x["id"] for x in response.json()], [str(self.archive1.pk)])
+
+        response = self.client.get(reverse("viewer:es-title-text-suggest-view"), {"q": "anothr arch"})
+        self.assertEqual(response.json()["suggestions"], ["another archive"])
+
+        response = self.client.get(
+            reverse("viewer:es-archives-simple"), {"q": [str(self.archive1.pk), str(self.archive2.pk)]}
+        )
+        self.assertEqual(
+            {x["title"] for x in response.json()}, {"Dopyu-Dopyu Of The Dead", "Another Archive"}
+        )
+
+    def test_match_expression(self):
+        wanted_gallery = WantedGallery.objects.create(
+            title="wanted", match_expression='provider:panda AND tags.full:"artist:suzunomoku"'
+        )
+        self.assertTrue(wanted_gallery.evaluate_match_expression(self.gallery1))
+        self.assertFalse(wanted_gallery.evaluate_match_expression(self.gallery2))
+        # The galleries are removed from the match index after each evaluation.
+        self.assertEqual(self.search_client.count(index=settings.ES_MATCH_INDEX_NAME)["count"], 0)
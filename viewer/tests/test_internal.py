@@ -5,11 +5,32 @@ unittest). These will both pass when you run "manage.py test".
 Replace these with more appropriate tests for your application.
 """
 
-from django.test import TestCase, Client
+import json
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
-
-from viewer.models import Tag, Archive, Gallery, WantedGallery, ArchiveTag
+from django.utils.timezone import now
+
+from viewer.middleware import QueryBudgetMiddleware
+from viewer.models import (
+    Tag,
+    Archive,
+    Gallery,
+    WantedGallery,
+    ArchiveTag,
+    ArchiveHashProfile,
+    Image,
+    ItemProperties,
+    UserLongLivedToken,
+)
+from viewer.utils import completion, image_metadata
+from viewer.utils.cache import clear_cache, get_cache_stats
+from viewer.utils.query_budget import QueryBudgetExceeded, query_budget
+from viewer.utils.requests import TokenCache, TokenRateLimitExceeded, authenticate_by_token, token_cache
 
 
 class TagTestCase(TestCase):
@@ -307,6 +328,39 @@ class GeneralPagesTest(TestCase):
         response = c.get(reverse("viewer:tools"))
         self.assertEqual(response.status_code, 200)
 
+    def test_archives_similar_by_fields(self):
+        User.objects.create_superuser(username="superuser1", password="12345")
+        c = Client()
+        c.login(username="superuser1", password="12345")
+
+        Archive.objects.create(title="[Group] archive 6", crc32="abcd1234", filesize=10, filecount=2, user=None)
+        Archive.objects.create(title="archive 6 (English)", crc32="abcd1234", filesize=10, filecount=2, user=None)
+        Archive.objects.create(title="archive 6", crc32="ffff0000", filesize=10, filecount=3, user=None)
+
+        response = c.get(reverse("viewer:archives-by-field"), {"filter-fileinfo": "1", "filter-crc32": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_groups"], [1, 1])
+        self.assertEqual([len(x) for x in response.context["by_size_count"].values()], [2])
+        self.assertEqual([len(x) for x in response.context["by_crc32"].values()], [2])
+
+        response = c.get(reverse("viewer:archives-by-field"), {"filter-title": "1", "clear-title": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(x) for x in response.context["by_title"].values()], [3])
+
+        # Group-level filter: at least one member must match.
+        response = c.get(
+            reverse("viewer:archives-by-field"),
+            {"filter-crc32": "1", "filter-after": "1", "reason": "not present"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_groups"], [0])
+
+        Gallery.objects.create(title="SAMPLE non public gallery 1", gid="345", provider="panda")
+        response = c.get(reverse("viewer:galleries-by-field"), {"by-title": "1", "ignore-case": "1", "page": "3"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["page"], 1)
+        self.assertEqual(list(response.context["by_title"].keys()), ["sample non public gallery 1"])
+
     def test_main_pages_anonymous(self):
         c = Client()
         # c.login(username='admin1', password='12345')
@@ -333,6 +387,45 @@ class GeneralPagesTest(TestCase):
         response = c.get(reverse("viewer:about"))
         self.assertEqual(response.status_code, 200)
 
+    @override_settings(CACHE_PUBLIC_VIEWS=True)
+    def test_cached_public_views(self):
+        clear_cache()
+        c = Client()
+
+        response = c.get(reverse("viewer:archive-rss"), {"title": "archive", "tags": ""})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"archive 1b", response.content)
+        stored_headers = dict(response.items())
+        # Same query with different parameter order and empty values.
+        response = c.get(reverse("viewer:archive-rss"), {"tags": "", "title": "archive"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_cache_stats()["feed"], {"hits": 1, "misses": 1})
+        # Hits keep the headers of the stored response.
+        self.assertEqual(dict(response.items()), stored_headers)
+
+        # Private archives are not served from the public entry.
+        c.login(username="admin1", password="12345")
+        response = c.get(reverse("viewer:archive-rss"), {"title": "archive"})
+        self.assertIn(b"archive 1b", response.content)
+        self.assertEqual(get_cache_stats()["feed"], {"hits": 1, "misses": 2})
+        c.logout()
+
+        # Saving an Archive invalidates the entries.
+        self.test_book3.title = "archive 3 renamed"
+        self.test_book3.save()
+        response = c.get(reverse("viewer:archive-rss"), {"title": "archive"})
+        self.assertIn(b"archive 3 renamed", response.content)
+        self.assertEqual(get_cache_stats()["feed"], {"hits": 1, "misses": 3})
+
+        # Session state the view depends on is restored on hits.
+        response = c.get(reverse("viewer:archive-search"), {"sort": "title"})
+        self.assertEqual(response.status_code, 200)
+        c2 = Client()
+        response = c2.get(reverse("viewer:archive-search"), {"sort": "title"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_cache_stats()["archive-search"], {"hits": 1, "misses": 1})
+        self.assertEqual(c2.session["parameters"]["sort"], "title")
+
     def test_element_pages_anonymous(self):
         c = Client()
         # c.login(username='admin1', password='12345')
@@ -355,3 +448,389 @@ class GeneralPagesTest(TestCase):
         self.assertEqual(response.status_code, 404)
         response = c_normal.get(reverse("viewer:wanted-gallery", args=[self.test_wanted_gallery2.pk]))
         self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        tags = [
+            Tag.objects.create(scope=scope, name="budget-{}".format(x))
+            for x, scope in enumerate(["artist", "female", "male", "language", "parody", "group", "other", "misc"])
+        ]
+        self.galleries = []
+        self.archives = []
+        for x in range(12):
+            gallery = Gallery.objects.create(
+                title="budget gallery {}".format(x),
+                gid=str(x),
+                token="token",
+                provider="panda",
+                category=["Manga", "Doujinshi", "Artist CG"][x % 3],
+                public=True,
+                filesize=1000 * x,
+                filecount=x,
+            )
+            gallery.tags.set(tags)
+            archive = Archive.objects.create(
+                title="budget archive {}".format(x), gallery=gallery, public=True, filesize=1000 * x, user=None
+            )
+            archive.tags.set(tags)
+            self.galleries.append(gallery)
+            self.archives.append(archive)
+        User.objects.create_superuser(username="budget", password="12345")
+
+    def test_views_within_budget(self):
+        # Budgets are enforced while testing, a view over its budget raises QueryBudgetExceeded here.
+        self.assertTrue(settings.QUERY_BUDGET_ENFORCE)
+        public_stats_enabled = settings.CRAWLER_SETTINGS.urls.enable_public_stats
+        settings.CRAWLER_SETTINGS.urls.enable_public_stats = True
+        self.addCleanup(setattr, settings.CRAWLER_SETTINGS.urls, "enable_public_stats", public_stats_enabled)
+
+        archive_ids = ",".join(str(x.pk) for x in self.archives)
+        public_urls = [
+            reverse("viewer:public-stats"),
+            reverse("viewer:archive", args=[self.archives[0].pk]),
+            reverse("viewer:gallery", args=[self.galleries[0].pk]),
+            reverse("viewer:api") + "?archive={}".format(self.archives[0].pk),
+            reverse("viewer:api") + "?archives={}".format(archive_ids),
+            reverse("viewer:api") + "?gallery={}".format(self.galleries[0].pk),
+            reverse("viewer:api") + "?gd={}".format(self.galleries[0].pk),
+            reverse("viewer:api") + "?q=budget",
+        ]
+        collaborator_urls = [
+            reverse("viewer:archive-edit", args=[self.archives[0].pk, "edit"]),
+            reverse("viewer:archive", args=[self.archives[0].pk]) + "?view=full",
+            reverse("viewer:api-stats"),
+            reverse("viewer:submit-queue"),
+            reverse("viewer:manage-archives"),
+            reverse("viewer:manage-galleries"),
+            reverse("viewer:match-archives"),
+            reverse("viewer:col-missing-archives"),
+        ]
+
+        anonymous = Client()
+        superuser = Client()
+        superuser.login(username="budget", password="12345")
+        with override_settings(QUERY_BUDGET_HEADERS=True):
+            for url in public_urls:
+                for client in (anonymous, superuser):
+                    response = client.get(url)
+                    self.assertEqual(response.status_code, 200, url)
+                    self.assertEqual(response["X-Query-Duplicates"], "0", url)
+            for url in collaborator_urls:
+                response = superuser.get(url)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertGreater(int(response["X-Query-Count"]), 0, url)
+
+    def test_budget_exceeded(self):
+        @query_budget(queries=2, duplicates=0)
+        def view(request):
+            for _ in range(3):
+                Tag.objects.filter(scope="artist").count()
+            return HttpResponse("")
+
+        def get_response(request):
+            # Django resolves the view and calls process_view inside the middleware chain.
+            middleware.process_view(request, current_view, (), {})
+            return current_view(request)
+
+        middleware = QueryBudgetMiddleware(get_response)
+        current_view = view
+        request = RequestFactory().get("/budget/")
+        with self.assertRaisesMessage(QueryBudgetExceeded, "3 queries, budget is 2, 2 duplicate queries, budget is 0"):
+            middleware(request)
+
+        with override_settings(QUERY_BUDGET_ENFORCE=False), self.assertLogs("viewer.middleware", "WARNING"):
+            middleware(request)
+
+        # Only requests that read are checked by default, and queries aren't recorded for the others.
+        request = RequestFactory().post("/budget/")
+        middleware(request)
+        self.assertIsNone(request.query_recorder)
+
+        # Nor for views without a budget, unless the headers are enabled.
+        def view_without_budget(request):
+            Tag.objects.count()
+            return HttpResponse("")
+
+        current_view = view_without_budget
+        request = RequestFactory().get("/no-budget/")
+        self.assertNotIn("X-Query-Count", middleware(request))
+        self.assertIsNone(request.query_recorder)
+        with override_settings(QUERY_BUDGET_HEADERS=True):
+            self.assertEqual(middleware(RequestFactory().get("/no-budget/"))["X-Query-Count"], "1")
+
+
+class CompareArchivesTest(TestCase):
+    def setUp(self):
+        self.archives = []
+        for x in range(20):
+            archive = Archive.objects.create(title="compare archive {}".format(x), crc32="abcd", public=True, user=None)
+            for position in range(1, 4):
+                Image.objects.create(
+                    archive=archive, position=position, archive_position=position, sha1="{}-{}".format(x, position)
+                )
+            self.archives.append(archive)
+
+    def compare(self, archives):
+        response = self.client.get(reverse("viewer:compare-archives"), {"pk": [x.pk for x in archives], "algos": "sha1"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]["sha1"]
+
+    def test_stored_profiles(self):
+        # Missing profiles are built after the response, it doesn't wait for them.
+        results = self.compare(self.archives)
+        self.assertEqual(results["images"], {})
+        self.assertEqual(sorted(results["pending"]), sorted(x.pk for x in self.archives))
+
+        for archive in self.archives:
+            ArchiveHashProfile.objects.update_profile(archive.pk, "sha1", live_data=False)
+
+        with self.assertNumQueries(2):
+            self.compare(self.archives[:2])
+        with self.assertNumQueries(2):
+            results = self.compare(self.archives)
+        self.assertNotIn("pending", results)
+        self.assertEqual(results["images"][str(self.archives[3].pk)], {"1": "3-1", "2": "3-2", "3": "3-3"})
+
+        # A profile built for a different file isn't used.
+        Archive.objects.filter(pk=self.archives[0].pk).update(crc32="ef01")
+        results = self.compare(self.archives[:2])
+        self.assertEqual(results["pending"], [self.archives[0].pk])
+        self.assertEqual(list(results["images"]), [str(self.archives[1].pk)])
+
+
+class ImageMetadataTest(TestCase):
+    def setUp(self):
+        self.archives = []
+        for x in range(5):
+            archive = Archive.objects.create(title="metadata {}".format(x), crc32="abcd", public=x != 4, user=None)
+            for position in range(1, 3):
+                Image.objects.create(
+                    archive=archive,
+                    position=position,
+                    archive_position=position,
+                    sha1="{}-{}".format(x, position),
+                    image_width=100,
+                    image_height=200,
+                )
+            self.archives.append(archive)
+        ItemProperties.objects.create(
+            content_object=self.archives[0].image_set.get(position=2), tag="hash-compare", name="phash", value="stored"
+        )
+        ArchiveHashProfile.objects.create(
+            archive=self.archives[0], algorithm="phash", crc32="abcd", hashes={"1": "profile-1", "2": "profile-2"}
+        )
+        ArchiveHashProfile.objects.create(archive=self.archives[1], algorithm="phash", crc32="old", hashes={"1": "x"})
+        self.addCleanup(setattr, image_metadata, "ARCHIVE_BATCH_SIZE", image_metadata.ARCHIVE_BATCH_SIZE)
+        image_metadata.ARCHIVE_BATCH_SIZE = 2
+
+    def get_lines(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+    def test_library_stream(self):
+        # Four queries for each batch of two archives, and the one that finds no more archives.
+        with self.assertNumQueries(2 * 4 + 1):
+            lines = self.get_lines(reverse("viewer:image-metadata"))
+        self.assertEqual(
+            [(x["archive"], x["position"]) for x in lines],
+            [(archive.pk, position) for archive in self.archives[:4] for position in (1, 2)],
+        )
+        self.assertEqual(lines[0]["sha1"], "0-1")
+        self.assertEqual((lines[0]["image_width"], lines[0]["image_height"]), (100, 200))
+        self.assertEqual(lines[0]["hashes"], {"phash": "profile-1"})
+        self.assertEqual(lines[1]["hashes"], {"phash": "stored"})
+        self.assertEqual(lines[2]["hashes"], {})
+
+        lines = self.get_lines(reverse("viewer:image-metadata"), after=self.archives[2].pk)
+        self.assertEqual({x["archive"] for x in lines}, {self.archives[3].pk})
+
+        lines = self.get_lines(reverse("viewer:archive-image-metadata", args=[self.archives[1].pk]))
+        self.assertEqual([x["sha1"] for x in lines], ["1-1", "1-2"])
+        response = self.client.get(reverse("viewer:archive-image-metadata", args=[self.archives[4].pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CompletionIndexTest(TestCase):
+    def setUp(self):
+        completion._indexes.clear()
+        self.addCleanup(completion._indexes.clear)
+        self.addCleanup(setattr, completion, "REBUILD_INTERVAL", completion.REBUILD_INTERVAL)
+        completion.REBUILD_INTERVAL = 0
+        self.addCleanup(setattr, completion, "BACKGROUND_REBUILD", completion.BACKGROUND_REBUILD)
+        completion.BACKGROUND_REBUILD = False
+        clear_cache()
+        for x, (source_type, public) in enumerate(
+            [("panda", True), ("panda", True), ("web_panda", False), ("fakku", True), ("mypanda", False)]
+        ):
+            Archive.objects.create(title="completion {}".format(x), source_type=source_type, public=public, user=None)
+        self.tags = [
+            Tag.objects.create(scope=scope, name=name)
+            for scope, name in [("artist", "pandaman"), ("female", "panda_ears"), ("male", "bear")]
+        ]
+        for x, tag_positions in enumerate([[1], [1, 0], [1, 2]]):
+            gallery = Gallery.objects.create(title="completion gallery {}".format(x), gid=str(x), provider="panda")
+            gallery.tags.set([self.tags[y] for y in tag_positions])
+        User.objects.create_user(username="completion", password="12345")
+
+    def test_field_completion(self):
+        # Values starting with the query first, each group by usage. Private values only for logged users.
+        self.assertEqual(completion.complete_field("archive_source_type", "PAN", public_only=True), ["panda"])
+        self.assertEqual(
+            completion.complete_field("archive_source_type", "pan", public_only=False),
+            ["panda", "mypanda", "web_panda"],
+        )
+        self.assertEqual(
+            completion.complete_field("archive_source_type", "a", public_only=False, limit=2), ["panda", "fakku"]
+        )
+
+        # Saves bump the generation, the index is rebuilt on the next lookup.
+        Archive.objects.create(title="completion new", source_type="pandora", public=True, user=None)
+        self.assertEqual(completion.complete_field("archive_source_type", "pan", public_only=True), ["panda", "pandora"])
+
+        # In the background, the stale index answers until the new one is built.
+        completion.BACKGROUND_REBUILD = True
+        Archive.objects.create(title="completion newer", source_type="pandas", public=True, user=None)
+        stale_index = completion._indexes["archive_source_type"]
+        # The worker thread has its own connection, which doesn't see the data of the test transaction.
+        built = []
+        build_completion_index = completion.build_completion_index
+        self.addCleanup(setattr, completion, "build_completion_index", build_completion_index)
+        completion.build_completion_index = lambda name: built.append(name) or stale_index
+        self.assertIs(completion.get_completion_index("archive_source_type"), stale_index)
+        for thread in threading.enumerate():
+            if thread.name == "completion_index_archive_source_type":
+                thread.join()
+        self.assertEqual(built, ["archive_source_type"])
+        self.assertNotIn("archive_source_type", completion._rebuilding)
+        completion.build_completion_index = build_completion_index
+        completion._indexes.clear()
+        completion.BACKGROUND_REBUILD = False
+
+        response = self.client.get(reverse("source-autocomplete"), {"q": "web"})
+        self.assertNotContains(response, "web_panda")
+        self.client.login(username="completion", password="12345")
+        response = self.client.get(reverse("source-autocomplete"), {"q": "web"})
+        self.assertContains(response, 'data-value="web_panda"')
+
+    def test_tag_completion(self):
+        self.assertEqual([str(x) for x in completion.complete_tags("panda")], ["female:panda_ears", "artist:pandaman"])
+        self.assertEqual(
+            [str(x) for x in completion.complete_tags("ma")], ["male:bear", "female:panda_ears", "artist:pandaman"]
+        )
+        self.assertEqual([str(x) for x in completion.complete_tags("art:pan")], ["artist:pandaman"])
+
+        response = self.client.get(reverse("tag-json-autocomplete"), {"q": "-bea"})
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": self.tags[2].pk, "modifier": "-", "scope": "male", "name": "bear"}],
+        )
+
+
+class TokenAuthTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="tokenuser", password="12345")
+        self.token = UserLongLivedToken.objects.create(
+            user=self.user, name="client", key=UserLongLivedToken.create_salted_key_from_key("secret")
+        )
+        self.factory = RequestFactory()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+
+    def authenticate(self, key="secret"):
+        return authenticate_by_token(self.factory.get("/", HTTP_AUTHORIZATION="Bearer {}".format(key)))
+
+    def test_cached_tokens(self):
+        self.assertEqual(self.authenticate(), (True, self.user))
+        with self.assertNumQueries(0):
+            for _ in range(20):
+                self.assertEqual(self.authenticate(), (True, self.user))
+        self.assertEqual(self.authenticate("wrong"), (False, None))
+
+        # Pending requests are counted when the entry is dropped.
+        token_cache.clear()
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.request_count, 21)
+        self.assertIsNotNone(self.token.last_used)
+
+        self.authenticate()
+        self.token.delete()
+        self.assertEqual(self.authenticate(), (False, None))
+
+    def test_revoked_by_other_process(self):
+        self.assertEqual(self.authenticate(), (True, self.user))
+        # Another process sharing the Django cache revokes the token: only the revocation marker is changed here.
+        UserLongLivedToken.objects.filter(pk=self.token.pk).update(expire_date=now())
+        self.assertEqual(self.authenticate(), (True, self.user))
+        TokenCache().invalidate(token_ids={self.token.pk})
+        self.assertEqual(self.authenticate(), (False, None))
+
+    def test_rate_limit(self):
+        self.token.rate_limit = 2
+        self.token.save()
+        self.authenticate()
+        self.authenticate()
+        with self.assertRaises(TokenRateLimitExceeded):
+            self.authenticate()
+
+        response = self.client.get(reverse("viewer:api"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+        # Saving the token drops its entry, the new limit applies right away.
+        self.token.rate_limit = 0
+        self.token.save()
+        self.assertEqual(self.authenticate(), (True, self.user))
+
+
+class StatsApiTest(TestCase):
+    def setUp(self):
+        self.tags = [
+            Tag.objects.create(scope=scope, name=name)
+            for scope, name in [("artist", "a"), ("female", "b"), ("female", "c"), ("", "d")]
+        ]
+        self.galleries = []
+        for x, tag_positions in enumerate([[0, 1, 2], [1, 2], [1, 3], [0]]):
+            gallery = Gallery.objects.create(
+                title="stats gallery {}".format(x), gid=str(x), provider="panda", category="Manga" if x else "Misc"
+            )
+            gallery.tags.set([self.tags[y] for y in tag_positions])
+            self.galleries.append(gallery)
+        User.objects.create_superuser(username="stats", password="12345")
+        self.client.login(username="stats", password="12345")
+
+    def get_charts(self, **params):
+        response = self.client.get(reverse("viewer:api-stats"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_tag_charts(self):
+        data = self.get_charts()
+        treemap = {x["name"]: {y["name"]: y["value"] for y in x["children"]} for x in data["treemap"]["children"]}
+        self.assertEqual(treemap, {"artist": {"a": 2}, "female": {"b": 3, "c": 2}, "uncategorized": {"d": 1}})
+        self.assertEqual(data["sunburst"]["children"], data["treemap"]["children"])
+        self.assertEqual(data["heatmap"]["tags"], ["b", "a", "c", "d"])
+        heatmap = {(x["x"], x["y"]): x["value"] for x in data["heatmap"]["data"]}
+        self.assertEqual(heatmap[("b", "c")], 2)
+        self.assertEqual(heatmap[("c", "b")], 2)
+        self.assertEqual(heatmap[("a", "a")], 2)
+        self.assertNotIn(("a", "d"), heatmap)
+
+        # Only the filtered galleries, and only tags from the scope.
+        data = self.get_charts(category="Manga", chart_tag_scope="female", chart="treemap")
+        self.assertEqual(
+            data["treemap"]["children"],
+            [{"name": "female", "children": [{"name": "b", "value": 2}, {"name": "c", "value": 1}]}],
+        )
+        self.assertNotIn("heatmap", data)
+
+        # The index follows added and removed tags.
+        self.galleries[3].tags.add(self.tags[3])
+        sunburst = self.get_charts(chart="sunburst")["sunburst"]
+        self.assertEqual(sunburst["children"][-1], {"name": "uncategorized", "children": [{"name": "d", "value": 2}]})
+        self.galleries[2].tags.remove(self.tags[3])
+        self.galleries[3].tags.remove(self.tags[0])
+        data = self.get_charts(chart="treemap")
+        treemap = {x["name"]: {y["name"]: y["value"] for y in x["children"]} for x in data["treemap"]["children"]}
+        self.assertEqual(treemap, {"artist": {"a": 1}, "female": {"b": 3, "c": 2}, "uncategorized": {"d": 1}})
@@ -23,6 +23,7 @@ from viewer.views import (
 )
 
 from viewer.feeds import LatestArchivesFeed
+from viewer.utils.cache import cache_response
 from viewer.views.elasticsearch import (
     ESHomePageView,
     ESHomeGalleryPageView,
@@ -60,6 +61,7 @@ urlpatterns = [
     re_path(r"^archive/(\d+)/delete/$", archive.delete_archive, name="archive-delete"),
     re_path(r"^archive/(\d+)/thumb/$", archive.archive_thumb, name="archive-thumb"),
     re_path(r"^archive/(\d+)/image-data-list/$", archive.image_data_list, name="image-data-list"),
+    re_path(r"^archive/(\d+)/image-metadata/$", archive.image_metadata, name="archive-image-metadata"),
     re_path(r"^archive/(\d+)/change-log/$", archive.change_log, name="archive-change-log"),
     re_path(r"^archive-manage/(\d+)/delete/$", archive.delete_manage_archive, name="archive-manage-delete"),
     re_path(r"^archive-manage/(\d+)/remove-from-index/$", archive.remove_from_index_manage_archive, name="archive-manage-remove-from-index"),
@@ -159,6 +161,7 @@ urlpatterns += [
     re_path(r"^tools-api/([\w-]+)/([\w-]+)/$", admin_api.tools, name="tools-api-id-arg"),
     re_path(r"^stats/$", stats.stats_view, name="stats-visualizations"),
     re_path(r"^api/stats/$", stats.stats_api, name="api-stats"),
+    re_path(r"^api/image-metadata/$", archive.image_metadata, name="image-metadata"),
 ]
 
 # Collaborators.
@@ -221,7 +224,7 @@ urlpatterns += [
 ]
 
 urlpatterns += [
-    re_path(r"^feed/$", LatestArchivesFeed(), name="archive-rss"),
+    re_path(r"^feed/$", cache_response("feed")(LatestArchivesFeed()), name="archive-rss"),
 ]
 
 urlpatterns += [
@@ -0,0 +1,199 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable
+from functools import wraps
+from typing import Any, Optional, TypeVar
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, HttpResponseBase, QueryDict
+
+from viewer.utils.requests import get_long_token
+
+T = TypeVar("T")
+
+# Saving any of these models bumps its generation, which changes every cache key built from it.
+GENERATION_MODELS = ("archive", "gallery")
+
+GENERATION_KEY = "generation:{}"
+
+# Response headers that are set again for each response instead of being restored from the cache.
+UNCACHED_HEADERS = ("content-length", "set-cookie")
+
+_missing = object()
+
+_stats_lock = threading.Lock()
+cache_hits: Counter[str] = Counter()
+cache_misses: Counter[str] = Counter()
+
+
+def bump_generation(model_name: str) -> None:
+    key = GENERATION_KEY.format(model_name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def get_generations(models: Iterable[str]) -> tuple[int, ...]:
+    keys = [GENERATION_KEY.format(x) for x in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Generations can be evicted, restarting from the current time avoids reusing an old value.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key, 0)
+    return tuple(found[key] for key in keys)
+
+
+def visibility_scope(request: HttpRequest) -> Optional[str]:
+    """Part of the key that separates what each user can see. None means the request must not be cached."""
+    if get_long_token(request) is not None:
+        return None
+    if not request.user.is_authenticated:
+        return "public"
+    return "user-{}".format(request.user.pk)
+
+
+def normalised_query(query: QueryDict, ignored: Iterable[str] = ()) -> str:
+    """Query string with sorted keys and without empty values, so equivalent URLs share a key."""
+    return urlencode(
+        [(key, value) for key, values in sorted(query.lists()) if key not in ignored for value in values if value != ""]
+    )
+
+
+def build_cache_key(namespace: str, models: Iterable[str], key_parts: Iterable[Any]) -> str:
+    digest = hashlib.md5(repr(tuple(key_parts)).encode("utf-8")).hexdigest()
+    return "{}:{}:{}".format(namespace, ".".join(str(x) for x in get_generations(models)), digest)
+
+
+def record_cache_access(namespace: str, hit: bool) -> None:
+    with _stats_lock:
+        if hit:
+            cache_hits[namespace] += 1
+        else:
+            cache_misses[namespace] += 1
+
+
+def get_cache_stats() -> dict[str, dict[str, int]]:
+    with _stats_lock:
+        return {
+            namespace: {"hits": cache_hits[namespace], "misses": cache_misses[namespace]}
+            for namespace in sorted(set(cache_hits) | set(cache_misses))
+        }
+
+
+def clear_cache() -> None:
+    cache.clear()
+    with _stats_lock:
+        cache_hits.clear()
+        cache_misses.clear()
+
+
+def cached_value(
+    namespace: str,
+    key_parts: Iterable[Any],
+    builder: Callable[[], T],
+    models: Iterable[str] = GENERATION_MODELS,
+    timeout: Optional[int] = None,
+) -> T:
+    """Fragment cache: returns the value built by builder, which must be picklable (evaluate querysets first)."""
+    if not settings.CACHE_PUBLIC_VIEWS:
+        return builder()
+    key = build_cache_key(namespace, models, key_parts)
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        record_cache_access(namespace, True)
+        return value  # type: ignore[return-value]
+    record_cache_access(namespace, False)
+    value = builder()
+    cache.set(key, value, timeout if timeout is not None else settings.CRAWLER_SETTINGS.cache.timeout)
+    return value
+
+
+def cache_response(
+    namespace: str,
+    models: Iterable[str] = GENERATION_MODELS,
+    timeout: Optional[int] = None,
+    session_keys: Iterable[str] = (),
+    skip_parameters: Iterable[str] = (),
+) -> Callable[[Callable[..., HttpResponseBase]], Callable[..., HttpResponseBase]]:
+    """Caches GET responses from a view, keyed by path, normalised query and visibility scope.
+
+    session_keys are session values the view reads and writes: they are part of the key, and the values the view
+    left in the session are restored on cache hits. Requests with any of skip_parameters are not cached.
+    Responses that set cookies, need a CSRF token or have pending messages are not stored. Cached responses keep
+    their headers.
+    """
+    models = tuple(models)
+    session_keys = tuple(session_keys)
+    skip_parameters = tuple(skip_parameters)
+
+    def decorator(view_func: Callable[..., HttpResponseBase]) -> Callable[..., HttpResponseBase]:
+        @wraps(view_func)
+        def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+            if not settings.CACHE_PUBLIC_VIEWS or request.method not in ("GET", "HEAD"):
+                return view_func(request, *args, **kwargs)
+            if any(x in request.GET for x in skip_parameters):
+                return view_func(request, *args, **kwargs)
+            scope = visibility_scope(request)
+            if scope is None:
+                return view_func(request, *args, **kwargs)
+
+            key = build_cache_key(
+                namespace,
+                models,
+                (
+                    scope,
+                    request.path,
+                    normalised_query(request.GET),
+                    args,
+                    sorted(kwargs.items()),
+                    [request.session.get(x) for x in session_keys],
+                ),
+            )
+
+            cached = cache.get(key)
+            # Entries stored before headers were kept are tuples, they are replaced.
+            if isinstance(cached, dict):
+                record_cache_access(namespace, True)
+                for session_key, value in zip(session_keys, cached["session"]):
+                    if request.session.get(session_key) != value:
+                        request.session[session_key] = value
+                cached_response = HttpResponse(cached["content"], status=cached["status"])
+                for header, value in cached["headers"]:
+                    cached_response[header] = value
+                return cached_response
+
+            record_cache_access(namespace, False)
+            response = view_func(request, *args, **kwargs)
+            render = getattr(response, "render", None)
+            if callable(render):
+                response = render()
+
+            if (
+                isinstance(response, HttpResponse)
+                and response.status_code == 200
+                and not response.cookies
+                and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+                and not len(get_messages(request))
+            ):
+                cache.set(
+                    key,
+                    {
+                        "content": response.content,
+                        "status": response.status_code,
+                        "headers": [x for x in response.items() if x[0].lower() not in UNCACHED_HEADERS],
+                        "session": [request.session.get(x) for x in session_keys],
+                    },
+                    timeout if timeout is not None else settings.CRAWLER_SETTINGS.cache.timeout,
+                )
+            return response
+
+        return wrapper
+
+    return decorator
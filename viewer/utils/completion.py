@@ -0,0 +1,241 @@
+import logging
+import threading
+import time
+from array import array
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from django.db import close_old_connections, models
+from django.db.models import Count, Q
+
+from viewer.models import Archive, Gallery, Tag
+from viewer.utils.cache import get_generations
+from viewer.utils.tag_index import get_tag_gallery_index
+
+logger = logging.getLogger(__name__)
+
+# Seconds an index is kept after its source changed, so a burst of saves doesn't rebuild it on every keystroke.
+REBUILD_INTERVAL = 30
+
+# Values of the fields used by the autocompletes: model, field path and the cache generations that change them.
+FIELD_SOURCES: dict[str, tuple[type[models.Model], str, tuple[str, ...]]] = {
+    "archive_source_type": (Archive, "source_type", ("archive",)),
+    "archive_reason": (Archive, "reason", ("archive",)),
+    "archive_provider": (Archive, "gallery__provider", ("archive", "gallery")),
+    "archive_uploader": (Archive, "gallery__uploader", ("archive", "gallery")),
+    "archive_category": (Archive, "gallery__category", ("archive", "gallery")),
+    "gallery_provider": (Gallery, "provider", ("gallery",)),
+    "gallery_category": (Gallery, "category", ("gallery",)),
+    "gallery_uploader": (Gallery, "uploader", ("gallery",)),
+    "gallery_reason": (Gallery, "reason", ("gallery",)),
+}
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[x : x + 3] for x in range(len(text) - 2)}
+
+
+@dataclass
+class CompletionEntry:
+    value: str
+    count: int
+    public_count: int
+    # Tags keep their id, scope and name, to be matched separately.
+    tag: Optional[tuple[int, str, str]] = None
+
+
+class CompletionIndex:
+    """Distinct values of a field with the number of rows that use them, in all rows and in public ones.
+
+    Entries are sorted by count, so a lookup walks them in the order they are suggested. Queries of three or more
+    characters only look at the entries that contain all of their trigrams. Values that start with the query come
+    before the ones that only contain it. Instances are not modified after they are created.
+    """
+
+    def __init__(self, entries: list[CompletionEntry], generation: tuple[int, ...]) -> None:
+        entries.sort(key=lambda x: (-x.count, x.value))
+        self.entries = entries
+        self.folded = [x.value.casefold() for x in entries]
+        self.generation = generation
+        self.built = time.monotonic()
+        postings: dict[str, list[int]] = defaultdict(list)
+        for position, text in enumerate(self.folded):
+            for trigram in trigrams(text):
+                postings[trigram].append(position)
+        self.postings = {trigram: array("I", positions) for trigram, positions in postings.items()}
+
+    def candidates(self, query: str) -> Iterable[int]:
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return range(len(self.entries))
+        lists = sorted((self.postings.get(x, array("I")) for x in query_trigrams), key=len)
+        if not lists[0]:
+            return []
+        common = set(lists[0])
+        for positions in lists[1:]:
+            common.intersection_update(positions)
+        return sorted(common)
+
+    def matches(self, position: int, query: str) -> Optional[bool]:
+        """None if the entry doesn't match, otherwise if it starts with the query."""
+        text = self.folded[position]
+        if query in text:
+            return text.startswith(query)
+        return None
+
+    def lookup(self, query: str, public_only: bool = False, limit: int = 10) -> list[CompletionEntry]:
+        query = query.casefold()
+        starting: list[CompletionEntry] = []
+        containing: list[CompletionEntry] = []
+        for position in self.candidates(query):
+            entry = self.entries[position]
+            if public_only and not entry.public_count:
+                continue
+            prefix = self.matches(position, query)
+            if prefix is None:
+                continue
+            if prefix:
+                starting.append(entry)
+                if len(starting) >= limit:
+                    break
+            elif len(containing) < limit:
+                containing.append(entry)
+        return (starting + containing)[:limit]
+
+
+class TagCompletionIndex(CompletionIndex):
+    """Tags by number of galleries that use them. Queries with a colon match the scope and the name separately,
+    otherwise either of them."""
+
+    def __init__(self, entries: list[CompletionEntry], generation: tuple[int, ...]) -> None:
+        super().__init__(entries, generation)
+        self.folded_tags = [(x.tag[1].casefold(), x.tag[2].casefold()) if x.tag else ("", "") for x in self.entries]
+
+    def candidates(self, query: str) -> Iterable[int]:
+        scope_name = query.split(":", maxsplit=1)
+        # Trigrams of the scope and the name are also trigrams of the full tag, except the ones with the colon.
+        return super().candidates(max(scope_name, key=len))
+
+    def matches(self, position: int, query: str) -> Optional[bool]:
+        scope, name = self.folded_tags[position]
+        scope_name = query.split(":", maxsplit=1)
+        if len(scope_name) > 1:
+            if scope_name[0] in scope and scope_name[1] in name:
+                return scope.startswith(scope_name[0])
+            return None
+        if query in name:
+            return name.startswith(query)
+        if query in scope:
+            return scope.startswith(query)
+        return None
+
+
+def field_entries(model: type[models.Model], field: str) -> list[CompletionEntry]:
+    rows = (
+        model._default_manager.exclude(Q(**{"{}__isnull".format(field): True}) | Q(**{field: ""}))
+        .values_list(field)
+        .annotate(count=Count("pk"), public_count=Count("pk", filter=Q(public=True)))
+        .order_by()
+    )
+    return [CompletionEntry(value, count, public_count) for value, count, public_count in rows.iterator()]
+
+
+def tag_entries() -> list[CompletionEntry]:
+    tag_index = get_tag_gallery_index()
+    counts = tag_index.tag_counts(np.ones(tag_index.gallery_ids.size, dtype=bool))
+    count_by_id = dict(zip(tag_index.tag_ids.tolist(), counts.tolist()))
+    return [
+        CompletionEntry(
+            "{}:{}".format(scope, name) if scope else name,
+            count_by_id.get(pk, 0),
+            count_by_id.get(pk, 0),
+            tag=(pk, scope, name),
+        )
+        for pk, scope, name in Tag.objects.values_list("pk", "scope", "name").iterator(chunk_size=5000)
+    ]
+
+
+# Stale indexes are rebuilt in a worker thread while lookups keep using the previous one. When False, they are rebuilt
+# by the lookup that finds them stale.
+BACKGROUND_REBUILD = True
+
+_locks_lock = threading.Lock()
+# One lock per index, so building one doesn't block lookups on the others.
+_locks: dict[str, threading.Lock] = {}
+_indexes: dict[str, CompletionIndex] = {}
+_rebuilding: set[str] = set()
+
+
+def index_lock(name: str) -> threading.Lock:
+    with _locks_lock:
+        if name not in _locks:
+            _locks[name] = threading.Lock()
+        return _locks[name]
+
+
+def index_generation_models(name: str) -> Sequence[str]:
+    if name == "tag":
+        return "tag", "gallery"
+    return FIELD_SOURCES[name][2]
+
+
+def build_completion_index(name: str) -> CompletionIndex:
+    generation = get_generations(index_generation_models(name))
+    if name == "tag":
+        return TagCompletionIndex(tag_entries(), generation)
+    model, field, _ = FIELD_SOURCES[name]
+    return CompletionIndex(field_entries(model, field), generation)
+
+
+def rebuild_in_background(name: str) -> None:
+    try:
+        index = build_completion_index(name)
+        with index_lock(name):
+            _indexes[name] = index
+    except Exception:
+        logger.exception("Error rebuilding the %s completion index", name)
+    finally:
+        with _locks_lock:
+            _rebuilding.discard(name)
+        close_old_connections()
+
+
+def get_completion_index(name: str) -> CompletionIndex:
+    """Index for one of FIELD_SOURCES, or for "tag". Rebuilt when the cache generations of its source changed, at
+    most every REBUILD_INTERVAL seconds. Only the first lookup of an index waits for it to be built."""
+    generation = get_generations(index_generation_models(name))
+    lock = index_lock(name)
+    with lock:
+        index = _indexes.get(name)
+        if index is None:
+            index = build_completion_index(name)
+            _indexes[name] = index
+            return index
+        if index.generation == generation or time.monotonic() - index.built < REBUILD_INTERVAL:
+            return index
+        if not BACKGROUND_REBUILD:
+            index = build_completion_index(name)
+            _indexes[name] = index
+            return index
+    with _locks_lock:
+        if name in _rebuilding:
+            return index
+        _rebuilding.add(name)
+    threading.Thread(
+        name="completion_index_{}".format(name), target=rebuild_in_background, args=(name,), daemon=True
+    ).start()
+    return index
+
+
+def complete_field(name: str, query: str, public_only: bool, limit: int = 10) -> list[str]:
+    return [x.value for x in get_completion_index(name).lookup(query, public_only=public_only, limit=limit)]
+
+
+def complete_tags(query: str, limit: int = 10) -> list[Tag]:
+    """Tags matching the query, most used first, fetched in one query."""
+    tag_ids = [x.tag[0] for x in get_completion_index("tag").lookup(query, limit=limit) if x.tag]
+    tags = Tag.objects.in_bulk(tag_ids)
+    return [tags[x] for x in tag_ids if x in tags]
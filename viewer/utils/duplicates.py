@@ -0,0 +1,106 @@
+import operator
+from collections import defaultdict
+from collections.abc import Callable, Hashable, Iterable, Sequence
+from functools import reduce
+from typing import Any, Optional, TypeVar, Union
+
+from django.core.paginator import Paginator, Page, InvalidPage, EmptyPage
+from django.db.models import QuerySet, Model, Count, Q, F, Expression
+
+M = TypeVar("M", bound=Model)
+
+GroupKey = tuple[Any, ...]
+
+
+def get_page(paginator: Paginator, page_number: int) -> Page:
+    try:
+        return paginator.page(page_number)
+    except (InvalidPage, EmptyPage):
+        return paginator.page(paginator.num_pages)
+
+
+def _base_queryset(queryset: QuerySet[M]) -> QuerySet[M]:
+    # The filtered queryset can have joins (tags) or aggregate annotations (custom tags count), that would
+    # break the GROUP BY. Grouping is done over the matching primary keys instead.
+    return queryset.model._default_manager.filter(pk__in=queryset.order_by().values("pk"))
+
+
+def duplicate_groups_by_fields(
+    queryset: QuerySet[M],
+    fields: Sequence[Union[str, Expression]],
+    page_number: int,
+    groups_per_page: int = 100,
+    min_count: int = 2,
+    any_member_filters: Optional[Iterable[Q]] = None,
+    member_order: Sequence[str] = ("pk",),
+) -> tuple[Page, dict[GroupKey, list[M]]]:
+    """Groups queryset by the given fields or expressions using GROUP BY/HAVING in the database.
+
+    Only the groups for the requested page are loaded as model instances. any_member_filters are group-level filters:
+    each one must be matched by at least one member of the group.
+    """
+    aliases = ["group_key_{}".format(i) for i in range(len(fields))]
+    key_annotations = {alias: F(field) if isinstance(field, str) else field for alias, field in zip(aliases, fields)}
+
+    base = _base_queryset(queryset).annotate(**key_annotations)
+
+    groups = base.order_by().values(*aliases).annotate(group_count=Count("pk")).filter(group_count__gte=min_count)
+
+    for count, member_filter in enumerate(any_member_filters or []):
+        filter_alias = "group_matches_{}".format(count)
+        groups = groups.annotate(**{filter_alias: Count("pk", filter=member_filter)}).filter(
+            **{"{}__gt".format(filter_alias): 0}
+        )
+
+    paginator = Paginator(groups.values_list(*aliases).order_by(*aliases), groups_per_page)
+    page = get_page(paginator, page_number)
+
+    page_keys: list[GroupKey] = [tuple(key) for key in page.object_list]
+    results: dict[GroupKey, list[M]] = {key: [] for key in page_keys}
+
+    if page_keys:
+        keys_query = reduce(operator.or_, (Q(**dict(zip(aliases, key))) for key in page_keys))
+        for member in base.filter(keys_query).order_by(*aliases, *member_order):
+            results[tuple(getattr(member, alias) for alias in aliases)].append(member)
+
+    return page, results
+
+
+def duplicate_groups_by_function(
+    queryset: QuerySet[M],
+    fields: Sequence[str],
+    key_function: Callable[..., Hashable],
+    page_number: int,
+    groups_per_page: int = 100,
+    min_count: int = 2,
+    any_member_filters: Optional[Iterable[Q]] = None,
+    member_order: Sequence[str] = ("pk",),
+) -> tuple[Page, dict[Hashable, list[M]]]:
+    """Same as duplicate_groups_by_fields, for keys that can't be computed by the database (regex cleanups).
+
+    Only primary keys and the fields needed by key_function are read, model instances are loaded for the
+    requested page only.
+    """
+    base = _base_queryset(queryset)
+
+    pks_by_key: dict[Hashable, list[int]] = defaultdict(list)
+    for values in base.order_by().values_list("pk", *fields).iterator(chunk_size=5000):
+        pks_by_key[key_function(*values[1:])].append(values[0])
+
+    for member_filter in any_member_filters or []:
+        matching_pks = set(base.filter(member_filter).values_list("pk", flat=True))
+        pks_by_key = defaultdict(list, {k: v for k, v in pks_by_key.items() if not matching_pks.isdisjoint(v)})
+
+    group_keys = sorted((key for key, pks in pks_by_key.items() if len(pks) >= min_count), key=str)
+
+    paginator = Paginator(group_keys, groups_per_page)
+    page = get_page(paginator, page_number)
+
+    results: dict[Hashable, list[M]] = {key: [] for key in page.object_list}
+    key_by_pk = {pk: key for key in page.object_list for pk in pks_by_key[key]}
+
+    if key_by_pk:
+        for member in base.filter(pk__in=key_by_pk.keys()).order_by(*member_order):
+            results[key_by_pk[member.pk]].append(member)
+
+    return page, results
@@ -5,20 +5,17 @@ from datetime import timezone
 
 import elasticsearch
 from django.conf import settings
+from elasticsearch.dsl import Search
 
 from core.base.types import GalleryData
 if typing.TYPE_CHECKING:
     from viewer.models import Gallery
 
 
-es_client = settings.ES_CLIENT
 es_match_index_name = settings.ES_MATCH_INDEX_NAME
 
 logger = logging.getLogger(__name__)
 
-if es_client:
-    from elasticsearch.dsl import Search
-
 ES_MATCH_MAPPING = {
     "properties": {
         "gid": {"type": "keyword"},
@@ -87,6 +84,7 @@ def gallery_data_to_es_repr(gallery_data: 'GalleryData') -> dict:
     return data
 
 def add_gallery_data_to_match_index(gallery: 'Gallery | GalleryData') -> str | None:
+    es_client = settings.ES_CLIENT
     if not settings.ES_MATCH_ENABLED or not es_client:
         return None
     if not es_client.indices.exists(index=es_match_index_name):
@@ -113,6 +111,7 @@ def add_gallery_data_to_match_index(gallery: 'Gallery | GalleryData') -> str | N
 
 
 def remove_gallery_from_match_index(index_uuid: str) -> bool:
+    es_client = settings.ES_CLIENT
     if not settings.ES_MATCH_ENABLED or not es_client:
         return False
     if not es_client.indices.exists(index=es_match_index_name):
@@ -130,6 +129,7 @@ def remove_gallery_from_match_index(index_uuid: str) -> bool:
 
 
 def match_expression_to_wanted_index(q_string: str, index_uuid: str) -> list[dict[str, typing.Any]] | None:
+    es_client = settings.ES_CLIENT
     if not settings.ES_MATCH_ENABLED or not es_client:
         return None
     if not es_client.indices.exists(index=es_match_index_name):
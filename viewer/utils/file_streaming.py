@@ -0,0 +1,195 @@
+import io
+import os
+import re
+import threading
+import typing
+from typing import Optional, Union
+
+from django.conf import settings
+from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseBase, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+crawler_settings = settings.CRAWLER_SETTINGS
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Bytes read from the file at a time, when the WSGI server doesn't use sendfile.
+STREAM_BLOCK_SIZE = 256 * 1024
+
+# Seconds a client is asked to wait when every transfer slot is in use.
+SLOTS_RETRY_AFTER = 5
+
+_slots_lock = threading.Lock()
+_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def transfer_slots() -> threading.BoundedSemaphore:
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(max(crawler_settings.webserver.transfer_slots, 1))
+        return _slots
+
+
+class RangeFile(io.RawIOBase):
+    """Reads length bytes of a file object, from its current position. Keeps fileno, so WSGI servers that implement
+    wsgi.file_wrapper with sendfile send the range directly from the file, sized by the Content-Length of the
+    response. Closing it closes the file and calls on_close once."""
+
+    def __init__(self, fp: typing.IO[bytes], length: int, on_close: Optional[typing.Callable[[], None]] = None) -> None:
+        super().__init__()
+        self.fp = fp
+        self.remaining = length
+        self.on_close = on_close
+
+    def readable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self.fp.fileno()
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if size <= 0:
+            return b""
+        data = self.fp.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        if not self.closed:
+            self.fp.close()
+            if self.on_close is not None:
+                self.on_close()
+                self.on_close = None
+        super().close()
+
+
+def file_etag(path: str, stored_hash: Optional[str] = None) -> str:
+    """Strong ETag from a hash stored for the file and its size, or from its modification time and size when there's
+    no stored hash."""
+    stat = os.stat(path)
+    if stored_hash:
+        return quote_etag("{}-{:x}".format(stored_hash.lower(), stat.st_size))
+    return quote_etag("{:x}-{:x}".format(stat.st_mtime_ns, stat.st_size))
+
+
+def requested_range(
+    request: HttpRequest, size: int, etag: Optional[str], last_modified: Optional[int]
+) -> Optional[tuple[int, int]]:
+    """Start and end (inclusive) of the range asked for in the Range header. None to send the whole content, when
+    there's no Range header, it isn't a single byte range, or If-Range doesn't match the current content. Raises
+    ValueError when the range can't be satisfied."""
+    range_header = request.META.get("HTTP_RANGE", "").strip()
+    match = RANGE_RE.match(range_header)
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+
+    if_range = request.META.get("HTTP_IF_RANGE", "").strip()
+    if if_range:
+        if if_range.startswith(('"', "W/")):
+            # Only strong validators can be used with ranges.
+            if etag is None or if_range != etag:
+                return None
+        elif last_modified is None or parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    first, last = match.groups()
+    if not first:
+        suffix_length = int(last)
+        if suffix_length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - suffix_length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def not_modified(request: HttpRequest, etag: Optional[str]) -> bool:
+    if etag is None:
+        return False
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    # Weak comparison, as If-None-Match uses.
+    etags = [x.removeprefix("W/") for x in parse_etags(if_none_match)]
+    return "*" in etags or etag in etags
+
+
+def ranged_response(
+    request: HttpRequest,
+    content: Union[str, bytes],
+    content_type: str,
+    etag: Optional[str] = None,
+    content_disposition: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> HttpResponseBase:
+    """Response with a file, given by its path, or with bytes, honoring If-None-Match, Range and If-Range.
+
+    Files are read while the response is sent, each response to a file holding one of webserver.transfer_slots until
+    it's closed. When they are all in use, the response is a 503 with Retry-After.
+    """
+    if isinstance(content, bytes):
+        size = len(content)
+        last_modified = None
+    else:
+        stat = os.stat(content)
+        size = stat.st_size
+        last_modified = int(stat.st_mtime)
+
+    headers = {"Accept-Ranges": "bytes"}
+    if etag is not None:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if cache_control is not None:
+        headers["Cache-Control"] = cache_control
+
+    if not_modified(request, etag):
+        response: HttpResponse = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    try:
+        byte_range = requested_range(request, size, etag, last_modified)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = "bytes */{}".format(size)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    start, end = byte_range if byte_range is not None else (0, size - 1)
+    length = end - start + 1 if size else 0
+
+    if isinstance(content, bytes):
+        body = RangeFile(io.BytesIO(content), length)
+        body.fp.seek(start)
+    else:
+        slots = transfer_slots()
+        if not slots.acquire(blocking=False):
+            response = HttpResponse("All transfer slots are in use, retry later.", status=503)
+            response["Retry-After"] = str(SLOTS_RETRY_AFTER)
+            return response
+        try:
+            fp = open(content, "rb")
+        except OSError:
+            slots.release()
+            raise
+        fp.seek(start)
+        body = RangeFile(fp, length, on_close=slots.release)
+
+    file_response = FileResponse(body, content_type=content_type, status=206 if byte_range is not None else 200)
+    file_response.block_size = STREAM_BLOCK_SIZE
+    file_response["Content-Length"] = str(length)
+    if byte_range is not None:
+        file_response["Content-Range"] = "bytes {}-{}/{}".format(start, end, size)
+    if content_disposition is not None:
+        file_response["Content-Disposition"] = content_disposition
+    for header, value in headers.items():
+        file_response[header] = value
+    return file_response
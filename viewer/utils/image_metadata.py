@@ -0,0 +1,94 @@
+import json
+from collections import defaultdict
+from collections.abc import Iterator
+from typing import Any, Optional
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import QuerySet
+
+from viewer.models import Archive, ArchiveHashProfile, Image, ItemProperties
+
+# Archives whose pages are read per batch of queries. Only the hashes of the current batch are kept in memory.
+ARCHIVE_BATCH_SIZE = 100
+
+IMAGE_FIELDS = (
+    "pk",
+    "archive_id",
+    "position",
+    "archive_position",
+    "sha1",
+    "image_width",
+    "image_height",
+    "original_width",
+    "original_height",
+    "image_format",
+    "image_mode",
+    "image_size",
+)
+
+
+def profile_hashes(archives: dict[int, str]) -> dict[tuple[int, int], dict[str, str]]:
+    """Hashes by archive and archive position, from the hash profiles built for the current file of each archive."""
+    hashes: dict[tuple[int, int], dict[str, str]] = defaultdict(dict)
+    profiles = ArchiveHashProfile.objects.filter(archive_id__in=list(archives)).values_list(
+        "archive_id", "algorithm", "crc32", "hashes"
+    )
+    for archive_id, algorithm, crc32, stored_hashes in profiles.iterator():
+        if crc32 == archives[archive_id]:
+            for position, value in stored_hashes.items():
+                hashes[(archive_id, int(position))][algorithm] = value
+    return hashes
+
+
+def property_hashes(archive_ids: list[int]) -> dict[int, dict[str, str]]:
+    """Hashes by image id, from the hash-compare properties of the images."""
+    hashes: dict[int, dict[str, str]] = defaultdict(dict)
+    properties = ItemProperties.objects.filter(
+        content_type=ContentType.objects.get_for_model(Image),
+        object_id__in=Image.objects.filter(archive_id__in=archive_ids).values("pk"),
+        tag="hash-compare",
+    ).values_list("object_id", "name", "value")
+    for object_id, name, value in properties.iterator():
+        hashes[object_id][name] = value
+    return hashes
+
+
+def iter_image_metadata(archives: "QuerySet[Archive]", after: Optional[int] = None) -> Iterator[dict[str, Any]]:
+    """Stored data of every page of the archives, ordered by archive id and position, without creating model
+    instances. Archives are read in batches by id, so memory use doesn't depend on the number of archives. Hashes of
+    the images take precedence over the ones from hash profiles."""
+    archives = archives.order_by("pk")
+    while True:
+        batch_query = archives if after is None else archives.filter(pk__gt=after)
+        batch = dict(batch_query.values_list("pk", "crc32")[:ARCHIVE_BATCH_SIZE])
+        if not batch:
+            return
+        archive_ids = list(batch)
+        from_profiles = profile_hashes(batch)
+        from_properties = property_hashes(archive_ids)
+        images = (
+            Image.objects.filter(archive_id__in=archive_ids)
+            .order_by("archive_id", "position")
+            .values_list(*IMAGE_FIELDS)
+        )
+        for row in images.iterator(chunk_size=2000):
+            image = dict(zip(IMAGE_FIELDS, row))
+            image_id = image.pop("pk")
+            archive_id = image.pop("archive_id")
+            yield {
+                "archive": archive_id,
+                **image,
+                "hashes": {
+                    **from_profiles.get((archive_id, image["archive_position"]), {}),
+                    **from_properties.get(image_id, {}),
+                },
+            }
+        if len(batch) < ARCHIVE_BATCH_SIZE:
+            return
+        after = archive_ids[-1]
+
+
+def image_metadata_lines(archives: "QuerySet[Archive]", after: Optional[int] = None) -> Iterator[bytes]:
+    """The pages of iter_image_metadata as NDJSON, one object per line."""
+    for image in iter_image_metadata(archives, after=after):
+        yield json.dumps(image, separators=(",", ":")).encode("utf-8") + b"\n"
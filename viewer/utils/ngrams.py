@@ -0,0 +1,46 @@
+import re
+import unicodedata
+from collections.abc import Iterable
+from typing import Optional
+
+NGRAM_SIZE = 3
+
+# Characters that can't be part of a word in a LIKE pattern: wildcards, the escape character and spaces.
+LIKE_SEPARATORS = re.compile(r"[%_\\\s]+")
+
+
+def normalise_text(text: str) -> str:
+    """Folds the differences that case and accent insensitive collations ignore, so that anything LIKE, ILIKE
+    or icontains would match on the database also matches on the normalised text: compatibility forms,
+    diacritics, case and katakana/hiragana."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_marks = "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in without_marks)
+
+
+def word_ngrams(word: str) -> set[str]:
+    return {word[i : i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1)}
+
+
+def text_ngrams(texts: Iterable[Optional[str]]) -> set[str]:
+    """N-grams to index for the given texts. N-grams never cross whitespace, since searches can't contain it."""
+    ngrams: set[str] = set()
+    for text in texts:
+        if not text:
+            continue
+        for word in normalise_text(text).split():
+            ngrams.update(word_ngrams(word))
+    return ngrams
+
+
+def pattern_ngrams(pattern: str) -> set[str]:
+    """N-grams every value matching the LIKE pattern must contain. Empty if the pattern is too short to use them."""
+    ngrams: set[str] = set()
+    for word in LIKE_SEPARATORS.split(normalise_text(pattern)):
+        ngrams.update(word_ngrams(word))
+    return ngrams
+
+
+def substring_ngrams(value: str) -> set[str]:
+    """Same as pattern_ngrams, for a literal substring as used by contains lookups."""
+    return text_ngrams([value])
@@ -0,0 +1,98 @@
+import contextlib
+import logging
+import time
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any, Optional, TypeVar
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+ViewFunc = TypeVar("ViewFunc", bound=Callable[..., Any])
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    # Queries with the same SQL and parameters as a previous one in the same request.
+    duplicates: int = 0
+    query_seconds: float = 0.0
+    seconds: float = 0.0
+    seen: Counter[tuple[str, str]] = field(default_factory=Counter, repr=False)
+
+
+@dataclass
+class QueryBudget:
+    """Limits for a single request to a view. None means no limit. Only requests with the given methods are checked,
+    by default the ones that only read."""
+
+    queries: Optional[int] = None
+    duplicates: Optional[int] = None
+    seconds: Optional[float] = None
+    methods: tuple[str, ...] = ("GET", "HEAD")
+
+    def violations(self, stats: QueryStats) -> list[str]:
+        violations = []
+        if self.queries is not None and stats.queries > self.queries:
+            violations.append("{} queries, budget is {}".format(stats.queries, self.queries))
+        if self.duplicates is not None and stats.duplicates > self.duplicates:
+            violations.append("{} duplicate queries, budget is {}".format(stats.duplicates, self.duplicates))
+        if self.seconds is not None and stats.seconds > self.seconds:
+            violations.append("{:.3f}s, budget is {:.3f}s".format(stats.seconds, self.seconds))
+        return violations
+
+
+def query_budget(
+    queries: Optional[int] = None,
+    duplicates: Optional[int] = None,
+    seconds: Optional[float] = None,
+    methods: tuple[str, ...] = ("GET", "HEAD"),
+) -> Callable[[ViewFunc], ViewFunc]:
+    """Declares the budget of a view, checked by QueryBudgetMiddleware on each request.
+    Decorators that use functools.wraps keep it, so it can be placed anywhere in the decorator stack."""
+
+    def decorator(view_func: ViewFunc) -> ViewFunc:
+        view_func.query_budget = QueryBudget(queries, duplicates, seconds, methods)  # type: ignore[attr-defined]
+        return view_func
+
+    return decorator
+
+
+class QueryRecorder:
+    """Counts the queries run on every database connection of the current thread while it's active."""
+
+    def __init__(self) -> None:
+        self.stats = QueryStats()
+        self.exit_stack = contextlib.ExitStack()
+        self.started = 0.0
+
+    def __enter__(self) -> "QueryRecorder":
+        self.started = time.perf_counter()
+        for connection in connections.all():
+            self.exit_stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.exit_stack.close()
+        self.stats.seconds = time.perf_counter() - self.started
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.query_seconds += time.perf_counter() - started
+            self.stats.queries += 1
+            key = (sql, repr(params))
+            if self.stats.seen[key]:
+                self.stats.duplicates += 1
+            self.stats.seen[key] += 1
+
+    def most_repeated(self, count: int = 3) -> list[tuple[str, int]]:
+        return [(sql, times) for (sql, _), times in self.stats.seen.most_common(count) if times > 1]
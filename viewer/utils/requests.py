@@ -1,10 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Optional
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F
 from django.utils.timezone import now
 
 from viewer.models import UserLongLivedToken
 
+crawler_settings = settings.CRAWLER_SETTINGS
+
+# Revocation markers of a token and of the tokens of a user, in the Django cache so every process sees them when it's
+# shared (cache.backend: file).
+TOKEN_GENERATION_KEY = "token-generation:{}-{}"
+
+
+class TokenRateLimitExceeded(Exception):
+    """Raised when a long-lived token is used more often than its rate limit, answered with a 429 response by
+    viewer.middleware.TokenRateLimitMiddleware."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Token rate limit exceeded, retry after {} seconds".format(retry_after))
+        self.retry_after = retry_after
+
+
+@dataclass
+class CachedToken:
+    token_id: int
+    user: User
+    # Requests per minute, 0 for no limit.
+    rate_limit: int
+    # Time (from time.monotonic) until the token is used without checking the database again.
+    valid_until: float
+    expire_date: datetime
+    # Revocation markers of the token and its user when the entry was added.
+    generations: tuple[int, ...] = ()
+    window_start: float = 0.0
+    window_requests: int = 0
+    # Requests not yet added to the request count of the token.
+    unsaved_requests: int = 0
+    last_flush: float = field(default_factory=time.monotonic)
+
+
+class TokenCache:
+    """Validated long-lived tokens, by salted key, so requests made with a known token don't query the database.
+
+    Entries are dropped when the token expires, after tokens.cache_seconds so changes made by other processes are
+    seen, when the token or its user is saved or deleted (see viewer.handlers), and the least recently used ones when
+    there are more than tokens.cache_size. Saving or deleting them also changes their revocation markers in the Django
+    cache, so other processes sharing it drop their entries on the next request instead of after cache_seconds. Requests are counted per minute for the rate limit, and added to the request
+    count of the token every tokens.count_flush_seconds, and when its entry is dropped.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, CachedToken] = OrderedDict()
+
+    @staticmethod
+    def generation_keys(token_id: int, user_id: int) -> list[str]:
+        return [TOKEN_GENERATION_KEY.format("token", token_id), TOKEN_GENERATION_KEY.format("user", user_id)]
+
+    def get_generations(self, token_id: int, user_id: int) -> tuple[int, ...]:
+        keys = self.generation_keys(token_id, user_id)
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # Markers can be evicted, restarting from the current time drops the entries added before.
+                cache.add(key, time.time_ns(), timeout=None)
+                found[key] = cache.get(key, 0)
+        return tuple(found[key] for key in keys)
+
+    def bump_generations(self, token_ids: set[int], user_id: Optional[int]) -> None:
+        keys = [TOKEN_GENERATION_KEY.format("token", x) for x in token_ids]
+        if user_id is not None:
+            keys.append(TOKEN_GENERATION_KEY.format("user", user_id))
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+
+    def get(self, salted_key: str) -> Optional[CachedToken]:
+        with self.lock:
+            entry = self.entries.get(salted_key)
+        if entry is None:
+            return None
+        valid = (
+            entry.valid_until > time.monotonic()
+            and entry.expire_date > now()
+            and self.get_generations(entry.token_id, entry.user.pk) == entry.generations
+        )
+        with self.lock:
+            if self.entries.get(salted_key) is not entry:
+                return None
+            if valid:
+                self.entries.move_to_end(salted_key)
+                return entry
+            del self.entries[salted_key]
+        self.flush(entry)
+        return None
+
+    def add(self, salted_key: str, token: UserLongLivedToken) -> CachedToken:
+        entry = CachedToken(
+            token_id=token.pk,
+            user=token.user,
+            rate_limit=crawler_settings.tokens.rate_limit if token.rate_limit is None else token.rate_limit,
+            valid_until=time.monotonic() + crawler_settings.tokens.cache_seconds,
+            expire_date=token.expire_date,
+            generations=self.get_generations(token.pk, token.user_id),
+        )
+        evicted = []
+        with self.lock:
+            self.entries[salted_key] = entry
+            while len(self.entries) > max(crawler_settings.tokens.cache_size, 0):
+                evicted.append(self.entries.popitem(last=False)[1])
+        for evicted_entry in evicted:
+            self.flush(evicted_entry)
+        return entry
+
+    def count_request(self, entry: CachedToken) -> None:
+        """Counts a request made with the token, raising TokenRateLimitExceeded if it's over its limit."""
+        current_time = time.monotonic()
+        with self.lock:
+            if current_time - entry.window_start >= 60:
+                entry.window_start = current_time
+                entry.window_requests = 0
+            if entry.rate_limit and entry.window_requests >= entry.rate_limit:
+                raise TokenRateLimitExceeded(max(1, int(entry.window_start + 60 - current_time)))
+            entry.window_requests += 1
+            entry.unsaved_requests += 1
+            flush = current_time - entry.last_flush >= crawler_settings.tokens.count_flush_seconds
+        if flush:
+            self.flush(entry)
+
+    def flush(self, entry: CachedToken) -> None:
+        with self.lock:
+            requests, entry.unsaved_requests = entry.unsaved_requests, 0
+            entry.last_flush = time.monotonic()
+        if requests:
+            UserLongLivedToken.objects.filter(pk=entry.token_id).update(
+                request_count=F("request_count") + requests, last_used=now()
+            )
+
+    def invalidate(self, token_ids: Optional[set[int]] = None, user_id: Optional[int] = None) -> None:
+        self.bump_generations(token_ids or set(), user_id)
+        removed = []
+        with self.lock:
+            for salted_key, entry in list(self.entries.items()):
+                if (token_ids is not None and entry.token_id in token_ids) or entry.user.pk == user_id:
+                    removed.append(self.entries.pop(salted_key))
+        for entry in removed:
+            self.flush(entry)
+
+    def clear(self) -> None:
+        with self.lock:
+            removed = list(self.entries.values())
+            self.entries.clear()
+        for entry in removed:
+            self.flush(entry)
+
+
+token_cache = TokenCache()
+
 
 def get_long_token(request) -> Optional[str]:
     header_value = request.META.get("HTTP_AUTHORIZATION")
@@ -17,20 +179,30 @@ def get_long_token(request) -> Optional[str]:
 
 
 def authenticate_by_token(request) -> tuple[bool, Optional[User]]:
-    try:
+    # Kept in the request, so a request is only counted once against the rate limit of its token.
+    if hasattr(request, "token_auth"):
+        return request.token_auth
 
-        long_token = get_long_token(request)
+    long_token = get_long_token(request)
 
-        if long_token is None:
-            return False, None
-
-        token = UserLongLivedToken.objects.get(
-            key=UserLongLivedToken.create_salted_key_from_key(long_token), expire_date__gt=now()
-        )
-        return True, token.user
-    except UserLongLivedToken.DoesNotExist:
+    if long_token is None:
         return False, None
 
+    salted_key = UserLongLivedToken.create_salted_key_from_key(long_token)
+
+    entry = token_cache.get(salted_key)
+    if entry is None:
+        try:
+            token = UserLongLivedToken.objects.select_related("user").get(key=salted_key, expire_date__gt=now())
+        except UserLongLivedToken.DoesNotExist:
+            request.token_auth = (False, None)
+            return request.token_auth
+        entry = token_cache.add(salted_key, token)
+
+    token_cache.count_request(entry)
+    request.token_auth = (True, entry.user)
+    return request.token_auth
+
 
 def double_check_auth(request) -> tuple[bool, Optional[User]]:
 
@@ -0,0 +1,89 @@
+import logging
+import threading
+import typing
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import partial
+from typing import Optional
+
+from django.db import models, transaction
+
+logger = logging.getLogger(__name__)
+
+Dispatcher = Callable[[list[typing.Any]], None]
+
+
+class UnitOfWork:
+    """Side effects of saves, collected by effect and object, to be dispatched together.
+
+    Adding an effect again for the same object keeps only the last instance, so each effect is done once per object,
+    with its last state. Effects of saves made in an atomic block are only collected once it commits, so the ones of
+    a rolled back save are dropped. Effects are dispatched by priority, lower first. The ones added while dispatching,
+    like the index update of an archive saved by an earlier effect, are collected in the same unit and dispatched after.
+    """
+
+    def __init__(self) -> None:
+        self.dispatching = False
+        self.pending: dict[str, dict[tuple[type, typing.Any], models.Model]] = {}
+        self.dispatchers: dict[str, tuple[int, Dispatcher]] = {}
+
+    def add(self, effect: str, instance: models.Model, dispatch: Dispatcher, priority: int = 0) -> None:
+        if self.dispatching:
+            self.collect(effect, instance, dispatch, priority)
+        else:
+            transaction.on_commit(partial(self.collect, effect, instance, dispatch, priority))
+
+    def collect(self, effect: str, instance: models.Model, dispatch: Dispatcher, priority: int) -> None:
+        if effect not in self.pending:
+            self.pending[effect] = {}
+            self.dispatchers.setdefault(effect, (priority, dispatch))
+        self.pending[effect][(type(instance), instance.pk)] = instance
+
+    def dispatch(self) -> None:
+        self.dispatching = True
+        try:
+            while self.pending:
+                effect = min(self.pending, key=lambda x: self.dispatchers[x][0])
+                instances = list(self.pending.pop(effect).values())
+                try:
+                    self.dispatchers[effect][1](instances)
+                except Exception:
+                    logger.exception("Error dispatching the %s side effect of %s objects", effect, len(instances))
+        finally:
+            self.dispatching = False
+
+
+_local = threading.local()
+
+
+def current_unit() -> Optional[UnitOfWork]:
+    """The unit of work collecting the side effects of the saves in this thread, None to do them right away."""
+    return getattr(_local, "unit", None)
+
+
+def run_unit(unit: UnitOfWork) -> None:
+    previous = current_unit()
+    _local.unit = unit
+    try:
+        unit.dispatch()
+    finally:
+        _local.unit = previous
+
+
+@contextmanager
+def coalesced_side_effects() -> Iterator[UnitOfWork]:
+    """Collects the model side effects of the saves made in the block, to dispatch them once when it ends, or when the
+    transaction it's in commits. The block isn't atomic, each save commits as it would outside of it. Nested blocks use
+    the unit of work of the outermost one."""
+    outer = current_unit()
+    if outer is not None:
+        yield outer
+        return
+    unit = UnitOfWork()
+    _local.unit = unit
+    try:
+        yield unit
+    finally:
+        _local.unit = None
+        # Registered after the effects collected on commit, so it runs after them.
+        transaction.on_commit(partial(run_unit, unit))
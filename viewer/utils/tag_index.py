@@ -0,0 +1,179 @@
+import threading
+from collections.abc import Iterable
+from typing import Optional
+
+import numpy as np
+from django.db.models import Count, QuerySet, Sum
+
+from viewer.models import Gallery, Tag
+from viewer.utils.cache import get_generations
+
+# Rows of the gallery tags table read per query when building the index.
+BUILD_CHUNK_SIZE = 100000
+
+# Above this many tags, their names are read with a single scan of the tag table instead of an IN clause.
+TAG_DETAILS_IN_LIMIT = 500
+
+
+class TagGalleryIndex:
+    """In-memory index of the tags of every gallery, for the stats charts.
+
+    Galleries and tags are numbered by their position in gallery_ids and tag_ids, sorted arrays of their ids. The
+    links between them are kept as two parallel arrays of positions, so counting the tags of a set of galleries, given
+    as a boolean mask over the gallery positions, is a single bincount over every link. Only the tags compared in the
+    co-occurrence matrix are turned into bitmaps over the galleries, since a bitmap for every tag would use tags times
+    galleries bits.
+
+    Instances are not modified after they are created, so requests can keep using one while it's being replaced.
+    """
+
+    def __init__(
+        self,
+        gallery_ids: np.ndarray,
+        tag_ids: np.ndarray,
+        link_galleries: np.ndarray,
+        link_tags: np.ndarray,
+        last_link_id: int,
+        totals: tuple[int, int, int],
+        generation: Optional[tuple[int, ...]],
+    ) -> None:
+        self.gallery_ids = gallery_ids
+        self.tag_ids = tag_ids
+        self.link_galleries = link_galleries
+        self.link_tags = link_tags
+        self.last_link_id = last_link_id
+        # Number of links and sums of their gallery and tag ids, compared with the table to detect changes.
+        self.totals = totals
+        self.generation = generation
+
+    @classmethod
+    def from_links(cls, links: np.ndarray, generation: Optional[tuple[int, ...]]) -> "TagGalleryIndex":
+        gallery_ids = np.unique(links[:, 1])
+        tag_ids = np.unique(links[:, 2])
+        return cls(
+            gallery_ids,
+            tag_ids,
+            np.searchsorted(gallery_ids, links[:, 1]).astype(np.int32),
+            np.searchsorted(tag_ids, links[:, 2]).astype(np.int32),
+            int(links[:, 0].max()) if len(links) else 0,
+            link_totals(links),
+            generation,
+        )
+
+    def with_links(self, links: np.ndarray, generation: tuple[int, ...]) -> Optional["TagGalleryIndex"]:
+        """Index with new links added. Galleries and tags not in the index must have higher ids than the ones in it,
+        so positions don't change. Returns None if that's not the case."""
+        new_gallery_ids = np.setdiff1d(links[:, 1], self.gallery_ids)
+        new_tag_ids = np.setdiff1d(links[:, 2], self.tag_ids)
+        if (self.gallery_ids.size and new_gallery_ids.size and new_gallery_ids[0] < self.gallery_ids[-1]) or (
+            self.tag_ids.size and new_tag_ids.size and new_tag_ids[0] < self.tag_ids[-1]
+        ):
+            return None
+        gallery_ids = np.concatenate([self.gallery_ids, new_gallery_ids])
+        tag_ids = np.concatenate([self.tag_ids, new_tag_ids])
+        return TagGalleryIndex(
+            gallery_ids,
+            tag_ids,
+            np.concatenate([self.link_galleries, np.searchsorted(gallery_ids, links[:, 1]).astype(np.int32)]),
+            np.concatenate([self.link_tags, np.searchsorted(tag_ids, links[:, 2]).astype(np.int32)]),
+            int(links[:, 0].max()) if len(links) else self.last_link_id,
+            added_totals(self.totals, link_totals(links)),
+            generation,
+        )
+
+    def gallery_mask(self, galleries: QuerySet[Gallery]) -> np.ndarray:
+        """Boolean mask over the gallery positions of the galleries in the queryset, evaluated in one query."""
+        ids = np.fromiter(galleries.order_by().values_list("pk", flat=True).iterator(), dtype=np.int64)
+        mask = np.zeros(self.gallery_ids.size, dtype=bool)
+        positions = np.searchsorted(self.gallery_ids, ids)
+        found = positions < self.gallery_ids.size
+        found[found] = self.gallery_ids[positions[found]] == ids[found]
+        mask[positions[found]] = True
+        return mask
+
+    def tag_mask(self, tag_ids: Iterable[int]) -> np.ndarray:
+        ids = np.fromiter(tag_ids, dtype=np.int64)
+        return np.isin(self.tag_ids, ids)
+
+    def tag_counts(self, gallery_mask: np.ndarray) -> np.ndarray:
+        """Number of galleries in the mask that have each tag, by tag position."""
+        return np.bincount(self.link_tags[gallery_mask[self.link_galleries]], minlength=self.tag_ids.size)
+
+    def co_occurrence(self, tag_positions: np.ndarray, gallery_mask: np.ndarray) -> np.ndarray:
+        """Matrix with the number of galleries in the mask that have both tags, for each pair of the given tags."""
+        rows = np.full(self.tag_ids.size, -1, dtype=np.int64)
+        rows[tag_positions] = np.arange(tag_positions.size)
+        link_rows = rows[self.link_tags]
+        selected = link_rows >= 0
+        bitmaps = np.zeros((tag_positions.size, self.gallery_ids.size), dtype=bool)
+        bitmaps[link_rows[selected], self.link_galleries[selected]] = True
+        packed = np.packbits(bitmaps & gallery_mask, axis=1)
+        matrix = np.zeros((tag_positions.size, tag_positions.size), dtype=np.int64)
+        for row in range(tag_positions.size):
+            matrix[row] = np.bitwise_count(packed & packed[row]).sum(axis=1)
+        return matrix
+
+
+def link_totals(links: np.ndarray) -> tuple[int, int, int]:
+    return len(links), int(links[:, 1].sum()), int(links[:, 2].sum())
+
+
+def added_totals(first: tuple[int, int, int], second: tuple[int, int, int]) -> tuple[int, int, int]:
+    return first[0] + second[0], first[1] + second[1], first[2] + second[2]
+
+
+def read_links(after_id: int) -> np.ndarray:
+    """Links between galleries and tags with an id higher than after_id, as rows of (id, gallery id, tag id)."""
+    through_model = Gallery.tags.through
+    chunks = []
+    while True:
+        chunk = np.array(
+            through_model._default_manager.filter(pk__gt=after_id)
+            .order_by("pk")
+            .values_list("pk", "gallery_id", "tag_id")[:BUILD_CHUNK_SIZE],
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        chunks.append(chunk)
+        if len(chunk) < BUILD_CHUNK_SIZE:
+            break
+        after_id = int(chunk[-1, 0])
+    return np.concatenate(chunks)
+
+
+_index_lock = threading.Lock()
+_index = TagGalleryIndex.from_links(np.zeros((0, 3), dtype=np.int64), None)
+
+
+def get_tag_gallery_index() -> TagGalleryIndex:
+    """The index, refreshed if the gallery cache generation changed since it was built.
+
+    Links are only ever inserted or deleted. If the totals of the table match the links that were indexed plus the ones
+    with a higher id, those are added to the index. Otherwise some link was deleted and the index is built again.
+    """
+    global _index
+    generation = get_generations(["gallery"])
+    with _index_lock:
+        if _index.generation != generation:
+            table_totals = Gallery.tags.through._default_manager.aggregate(
+                links=Count("pk"), galleries=Sum("gallery_id"), tags=Sum("tag_id")
+            )
+            new_links = read_links(_index.last_link_id)
+            index = None
+            if added_totals(_index.totals, link_totals(new_links)) == (
+                table_totals["links"],
+                table_totals["galleries"] or 0,
+                table_totals["tags"] or 0,
+            ):
+                index = _index.with_links(new_links, generation)
+            _index = index or TagGalleryIndex.from_links(read_links(0), generation)
+        return _index
+
+
+def tag_details(tag_ids: Iterable[int]) -> dict[int, tuple[str, Optional[str]]]:
+    """Name and scope of each tag, tags that were deleted are missing."""
+    wanted = set(tag_ids)
+    if len(wanted) <= TAG_DETAILS_IN_LIMIT:
+        tags = Tag.objects.filter(pk__in=wanted).values_list("pk", "name", "scope")
+    else:
+        tags = Tag.objects.values_list("pk", "name", "scope")
+    return {pk: (name, scope) for pk, name, scope in tags.iterator() if pk in wanted}
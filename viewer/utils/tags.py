@@ -1,4 +1,5 @@
 import typing
+from collections import defaultdict
 from collections.abc import Iterable
 
 from django.db.models import QuerySet
@@ -22,34 +23,25 @@ scope_priorities = [
     "publisher",
 ]
 
+scope_priority_set = set(scope_priorities)
+
 
 def sort_tags(tag_list: Iterable) -> list[tuple[str, list["Tag"]]]:
 
-    prioritized_tag_list = list()
+    # Grouped in a single pass, tag_list can be a QuerySet that would be evaluated again for each scope.
+    tags_per_scope: dict[str, list["Tag"]] = defaultdict(list)
+    for tag in tag_list:
+        tags_per_scope[tag.scope if tag.scope in scope_priority_set else ""].append(tag)
 
-    for scope in scope_priorities:
-        matched_tags = sorted([x for x in tag_list if x.scope == scope], key=str)
-        if matched_tags:
-            prioritized_tag_list.append((scope, matched_tags))
+    prioritized_tag_list = list()
 
-    remaining_tags = sorted([x for x in tag_list if x.scope not in scope_priorities], key=str)
-    if remaining_tags:
-        prioritized_tag_list.append(("", remaining_tags))
+    for scope in scope_priorities + [""]:
+        if tags_per_scope[scope]:
+            prioritized_tag_list.append((scope, sorted(tags_per_scope[scope], key=str)))
 
     return prioritized_tag_list
 
 
 def sort_tags_str(tag_list: "Iterable[Tag]") -> list[str]:
 
-    prioritized_tag_list = list()
-
-    for scope in scope_priorities:
-        matched_tags = sorted([str(x) for x in tag_list if x.scope == scope], key=str)
-        if matched_tags:
-            prioritized_tag_list.extend(matched_tags)
-
-    remaining_tags = sorted([str(x) for x in tag_list if x.scope not in scope_priorities], key=str)
-    if remaining_tags:
-        prioritized_tag_list.extend(remaining_tags)
-
-    return prioritized_tag_list
+    return [str(tag) for _, tags in sort_tags(tag_list) for tag in tags]
@@ -25,6 +25,7 @@ from core.web.crawlerthread import CrawlerThread
 from core.workers.archive_work import ArchiveWorker
 
 from viewer.models import Archive, Tag, Gallery, ArchiveMatches, WantedGallery, FoundGallery, DownloadEvent
+from viewer.utils.cache import get_cache_stats, clear_cache
 from viewer.utils.general import clean_up_referer
 from viewer.utils.matching import (
     create_matches_wanted_galleries_from_providers,
@@ -454,9 +455,7 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
         return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
     elif tool == "force_run_timed_dl":
         if crawler_settings.workers.timed_downloader:
-            crawler_settings.workers.timed_downloader.stop_running()
-            crawler_settings.workers.timed_downloader.force_run_once = True
-            crawler_settings.workers.timed_downloader.start_running(timer=crawler_settings.timed_downloader_cycle_timer)
+            crawler_settings.workers.timed_downloader.run_now(timer=crawler_settings.timed_downloader_cycle_timer)
         return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
     elif tool == "start_timed_updater":
         if tool_arg:
@@ -486,17 +485,13 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
         if tool_arg:
             for provider_auto_updater in crawler_settings.workers.timed_auto_updaters:
                 if provider_auto_updater.provider_name == tool_arg:
-                    provider_auto_updater.stop_running()
-                    provider_auto_updater.force_run_once = True
-                    provider_auto_updater.start_running(
+                    provider_auto_updater.run_now(
                         timer=crawler_settings.providers[provider_auto_updater.provider_name].autoupdater_timer
                     )
                     break
         else:
             for provider_auto_updater in crawler_settings.workers.timed_auto_updaters:
-                provider_auto_updater.stop_running()
-                provider_auto_updater.force_run_once = True
-                provider_auto_updater.start_running(
+                provider_auto_updater.run_now(
                     timer=crawler_settings.providers[provider_auto_updater.provider_name].autoupdater_timer
                 )
         return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
@@ -510,14 +505,17 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
         return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
     elif tool == "force_run_timed_auto_wanted":
         if crawler_settings.workers.timed_auto_wanted:
-            crawler_settings.workers.timed_auto_wanted.stop_running()
-            crawler_settings.workers.timed_auto_wanted.force_run_once = True
-            crawler_settings.workers.timed_auto_wanted.start_running(timer=crawler_settings.auto_wanted.cycle_timer)
+            crawler_settings.workers.timed_auto_wanted.run_now(timer=crawler_settings.auto_wanted.cycle_timer)
         return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
     elif tool == "start_web_queue":
         if crawler_settings.workers.web_queue:
             crawler_settings.workers.web_queue.start_running()
         return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
+    elif tool == "clear_cache":
+        clear_cache()
+        logger.info("Cleared views cache")
+        messages.success(request, "Cleared views cache")
+        return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
 
     threads_status = get_thread_status_bool()
 
@@ -532,6 +530,7 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
         "settings_text": settings_text,
         "threads_status": threads_status,
         "autoupdater_providers": autoupdater_providers,
+        "cache_stats": get_cache_stats(),
     }
 
     return render(request, "viewer/tools.html", d)
@@ -619,7 +618,7 @@ def crawler(request: HttpRequest) -> HttpResponse:
         if "keep_this_settings" in p:
             current_settings = crawler_settings
         else:
-            current_settings = Settings(load_from_config=crawler_settings.config)
+            current_settings = crawler_settings.copy_from_config()
         url_set = set()
         # create dictionary of properties for each archive
         current_settings.replace_metadata = False
@@ -694,7 +693,7 @@ def foldercrawler(request: HttpRequest) -> HttpResponse:
         if "keep_this_settings" in p:
             current_settings = crawler_settings
         else:
-            current_settings = Settings(load_from_config=crawler_settings.config)
+            current_settings = crawler_settings.copy_from_config()
         commands = set()
         # create dictionary of properties for each command
         for k, v in p.items():
@@ -15,6 +15,7 @@ from core.web.crawlerthread import CrawlerThread
 from core.workers.archive_work import ArchiveWorker
 
 from viewer.models import Archive, ArchiveMatches, WantedGallery
+from viewer.utils.cache import get_cache_stats
 from viewer.utils.matching import (
     create_matches_wanted_galleries_from_providers,
     create_matches_wanted_galleries_from_providers_internal,
@@ -278,9 +279,7 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
         return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
     elif tool == "force_run_timed_dl":
         if crawler_settings.workers.timed_downloader:
-            crawler_settings.workers.timed_downloader.stop_running()
-            crawler_settings.workers.timed_downloader.force_run_once = True
-            crawler_settings.workers.timed_downloader.start_running(timer=crawler_settings.timed_downloader_cycle_timer)
+            crawler_settings.workers.timed_downloader.run_now(timer=crawler_settings.timed_downloader_cycle_timer)
         return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
     elif tool == "start_timed_updater":
         if tool_arg:
@@ -310,17 +309,13 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
         if tool_arg:
             for provider_auto_updater in crawler_settings.workers.timed_auto_updaters:
                 if provider_auto_updater.provider_name == tool_arg:
-                    provider_auto_updater.stop_running()
-                    provider_auto_updater.force_run_once = True
-                    provider_auto_updater.start_running(
+                    provider_auto_updater.run_now(
                         timer=crawler_settings.providers[provider_auto_updater.provider_name].autoupdater_timer
                     )
                     break
         else:
             for provider_auto_updater in crawler_settings.workers.timed_auto_updaters:
-                provider_auto_updater.stop_running()
-                provider_auto_updater.force_run_once = True
-                provider_auto_updater.start_running(
+                provider_auto_updater.run_now(
                     timer=crawler_settings.providers[provider_auto_updater.provider_name].autoupdater_timer
                 )
         return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
@@ -334,9 +329,7 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
         return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
     elif tool == "force_run_timed_auto_wanted":
         if crawler_settings.workers.timed_auto_wanted:
-            crawler_settings.workers.timed_auto_wanted.stop_running()
-            crawler_settings.workers.timed_auto_wanted.force_run_once = True
-            crawler_settings.workers.timed_auto_wanted.start_running(timer=crawler_settings.auto_wanted.cycle_timer)
+            crawler_settings.workers.timed_auto_wanted.run_now(timer=crawler_settings.auto_wanted.cycle_timer)
         return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
     elif tool == "start_web_queue":
         if crawler_settings.workers.web_queue:
@@ -345,6 +338,8 @@ def tools(request: HttpRequest, tool: str = "main", tool_arg: str = "") -> HttpR
     elif tool == "threads_status":
         threads_status = get_thread_status_bool()
         return HttpResponse(json.dumps({"data": threads_status}), content_type="application/json; charset=utf-8")
+    elif tool == "cache_stats":
+        return HttpResponse(json.dumps({"data": get_cache_stats()}), content_type="application/json; charset=utf-8")
 
     response["error"] = "Missing parameters"
     return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
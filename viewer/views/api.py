@@ -29,9 +29,11 @@ from django.conf import settings
 from core.base.setup import Settings
 from core.base.utilities import str_to_int, timestamp_or_zero
 from viewer.models import Archive, Gallery, UserArchivePrefs, ArchiveGroup, ArchiveGroupEntry, WantedGallery, Tag, \
-    Category, Provider
+    Category, Provider, TextNgram
 from viewer.utils.matching import generate_possible_matches_for_archives
 from viewer.utils.requests import authenticate_by_token, double_check_auth
+from viewer.utils.cache import cache_response
+from viewer.utils.query_budget import query_budget
 from viewer.views.head import gallery_filter_keys, gallery_order_fields, filter_archives_simple, archive_filter_keys
 from viewer.utils.functions import (
     gallery_search_results_to_json,
@@ -1335,6 +1337,11 @@ def json_api_handle_delete(request: HttpRequest, user: Optional[User | Anonymous
 # NOTE: This is used by 3rd parties, do not modify, at most create a new function if something needs changing
 # Public API, does not check for any token, but filters if the user is authenticated or not.
 @csrf_exempt
+@cache_response(
+    "json-api",
+    skip_parameters=("sha1", "archive-group", "archive-group-entry", "archive-group-entry-archive", "archive-wanted-image"),
+)
+@query_budget(queries=8, duplicates=0)
 def json_api(request: HttpRequest) -> HttpResponse:
 
     token_valid, token_user = authenticate_by_token(request)
@@ -1399,13 +1406,13 @@ def json_parser(request: HttpRequest) -> HttpResponse:
                 if not crawler_settings.workers.web_queue:
                     response["error"] = "The webqueue is not running"
                 elif "downloader" in args:
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
                     if not current_settings.workers.web_queue:
                         response["error"] = "The webqueue is not running"
                     else:
                         current_settings.allow_downloaders_only([args["downloader"]], True, True, True)
                         archive = None
-                        parsers = current_settings.provider_context.get_parsers(current_settings)
+                        parsers = current_settings.provider_context.get_shared_parsers(current_settings)
                         current_settings.archive_user = actual_user
                         current_settings.archive_origin = Archive.ORIGIN_ADD_URL
                         for parser in parsers:
@@ -1427,7 +1434,7 @@ def json_parser(request: HttpRequest) -> HttpResponse:
                         else:
                             response["message"] = "Crawling: " + args["link"]
                 else:
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
                     current_settings.archive_user = actual_user
                     current_settings.archive_origin = Archive.ORIGIN_ADD_URL
                     extra_args = []
@@ -1439,7 +1446,7 @@ def json_parser(request: HttpRequest) -> HttpResponse:
                         if not current_settings.workers.web_queue:
                             response["error"] = "The webqueue is not running"
                             return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
-                        parsers = current_settings.provider_context.get_parsers(current_settings)
+                        parsers = current_settings.provider_context.get_shared_parsers(current_settings)
                         for parser in parsers:
                             if parser.id_from_url_implemented():
                                 urls_filtered = parser.filter_accepted_urls((args["parentLink"],))
@@ -1499,7 +1506,7 @@ def json_parser(request: HttpRequest) -> HttpResponse:
                                 response["action"] = "confirmDeletion"
                         else:
                             archive = None
-                            parsers = current_settings.provider_context.get_parsers(current_settings)
+                            parsers = current_settings.provider_context.get_shared_parsers(current_settings)
                             for parser in parsers:
                                 if parser.id_from_url_implemented():
                                     urls_filtered = parser.filter_accepted_urls((args["link"],))
@@ -1526,7 +1533,7 @@ def json_parser(request: HttpRequest) -> HttpResponse:
                         if not current_settings.workers.web_queue:
                             response["error"] = "The webqueue is not running"
                             return HttpResponse(json.dumps(response), content_type="application/json; charset=utf-8")
-                        parsers = current_settings.provider_context.get_parsers(current_settings)
+                        parsers = current_settings.provider_context.get_shared_parsers(current_settings)
                         for parser in parsers:
                             if parser.id_from_url_implemented():
                                 urls_filtered = parser.filter_accepted_urls((args["link"],))
@@ -1576,7 +1583,7 @@ def json_parser(request: HttpRequest) -> HttpResponse:
             elif data["operation"] == "force_queue_archives":
                 pages_links = args
                 if len(pages_links) > 0:
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
                     if "archive_reason" in data:
                         current_settings.archive_reason = data["archive_reason"]
                     if "archive_details" in data:
@@ -1601,7 +1608,7 @@ def json_parser(request: HttpRequest) -> HttpResponse:
                 new_urls_set = set()
                 gids_set = set()
 
-                parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+                parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
                 for parser in parsers:
                     if parser.id_from_url_implemented():
                         urls_filtered = parser.filter_accepted_urls(urls)
@@ -1639,7 +1646,7 @@ def json_parser(request: HttpRequest) -> HttpResponse:
 
                 pages_links = list(new_urls_set)
                 if len(pages_links) > 0:
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
                     if data["operation"] == "queue_galleries":
                         current_settings.allow_type_downloaders_only("info")
                     elif data["operation"] == "queue_archives":
@@ -1785,7 +1792,7 @@ def simple_archive_filter(args: str, public: bool = True) -> "QuerySet[Archive]"
         results = Archive.objects.order_by(order)
 
     q_formatted = "%" + args.replace(" ", "%") + "%"
-    results_title = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+    results_title = TextNgram.objects.title_search(results, q_formatted)
 
     tags = args.split(",")
     for tag in tags:
@@ -1827,9 +1834,9 @@ def simple_archive_filter(args: str, public: bool = True) -> "QuerySet[Archive]"
             results = results.filter(tag_query)
         else:
             if tag_name != "" and tag_scope != "":
-                tag_query = Q(tags__name__contains=tag_name) & Q(tags__scope__contains=tag_scope)
+                tag_query = TextNgram.objects.tag_name_contains(tag_name) & Q(tags__scope__contains=tag_scope)
             elif tag_name != "":
-                tag_query = Q(tags__name__contains=tag_name)
+                tag_query = TextNgram.objects.tag_name_contains(tag_name)
             else:
                 tag_query = Q(tags__scope__contains=tag_scope)
 
@@ -1860,7 +1867,7 @@ def filter_galleries_no_request(filter_args: Union[dict[str, Any], QueryDict]) -
     title = filter_args["title"]
     if title and isinstance(title, str):
         q_formatted = "%" + title.replace(" ", "%") + "%"
-        results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+        results = TextNgram.objects.title_search(results, q_formatted)
     rating_from = filter_args["rating_from"]
     if rating_from and isinstance(rating_from, str):
         results = results.filter(rating__gte=float(rating_from))
@@ -1959,9 +1966,9 @@ def filter_galleries_no_request(filter_args: Union[dict[str, Any], QueryDict]) -
                 results = results.filter(tag_query)
             else:
                 if tag_name != "" and tag_scope != "":
-                    tag_query = Q(tags__name__contains=tag_name) & Q(tags__scope__contains=tag_scope)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name) & Q(tags__scope__contains=tag_scope)
                 elif tag_name != "":
-                    tag_query = Q(tags__name__contains=tag_name)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name)
                 else:
                     tag_query = Q(tags__scope__contains=tag_scope)
 
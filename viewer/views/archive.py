@@ -1,4 +1,5 @@
 import logging
+import os
 import re
 import time
 import zipfile
@@ -14,7 +15,9 @@ from django.core.paginator import Paginator, InvalidPage, EmptyPage, Page
 from django.urls import reverse
 from django.db import transaction
 from django.http import Http404, HttpRequest
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, HttpResponseBase, HttpResponseNotModified
+from django.http import StreamingHttpResponse
+from django.utils.http import quote_etag
 from django.shortcuts import render
 from django.conf import settings
 
@@ -37,7 +40,10 @@ from viewer.models import (
     ArchiveOption,
     ArchiveStatistics,
 )
+from viewer.utils.file_streaming import file_etag, not_modified, ranged_response
 from viewer.utils.general import clean_up_referer
+from viewer.utils.image_metadata import image_metadata_lines
+from viewer.utils.query_budget import query_budget
 from viewer.utils.requests import double_check_auth, authenticate_by_token
 from viewer.views.head import render_error
 
@@ -51,6 +57,8 @@ archive_download_regex = re.compile(r"/archive/(\d+)/download/$", re.IGNORECASE)
 VALID_ARCHIVE_VIEW_MODES = ("cover", "thumbnails", "full", "single")
 
 
+# The edit mode has two forms that read the alternative sources.
+@query_budget(queries=28, duplicates=1)
 def archive_details(request: HttpRequest, pk: int, mode: str = "view") -> HttpResponse:
     """Archive listing."""
 
@@ -118,7 +126,7 @@ def archive_details(request: HttpRequest, pk: int, mode: str = "view") -> HttpRe
         except (InvalidPage, EmptyPage):
             all_images = paginator.page(paginator.num_pages)
 
-        form = ArchiveModForm(instance=archive, initial={"archive_groups": archive.archive_groups.all()})
+        form = ArchiveModForm(instance=archive)
         image_formset = ImageFormSet(queryset=all_images.object_list, prefix="images")  # type: ignore
         d.update(
             {
@@ -483,7 +491,7 @@ def archive_enter_reason(request: HttpRequest, pk: int, tool: Optional[str] = No
         return render(request, "viewer/archive_display_tool.html", d)
 
 
-def archive_download(request: HttpRequest, pk: int) -> HttpResponse:
+def archive_download(request: HttpRequest, pk: int) -> HttpResponseBase:
     try:
         archive = Archive.objects.get(pk=pk)
     except Archive.DoesNotExist:
@@ -508,6 +516,20 @@ def archive_download(request: HttpRequest, pk: int) -> HttpResponse:
             response["Content-Disposition"] = "attachment; filename*=UTF-8''{0}".format(archive.pretty_name)
         response["X-Accel-Redirect"] = "/download/{0}".format(quote(archive.zipped.name)).encode("utf-8")
         return response
+    elif crawler_settings.webserver.stream_files:
+        if not os.path.isfile(archive.zipped.path):
+            raise Http404("Archive does not exist")
+        if "original" in request.GET:
+            filename = quote(basename(archive.zipped.name))
+        else:
+            filename = archive.pretty_name
+        return ranged_response(
+            request,
+            archive.zipped.path,
+            "application/vnd.comicbook+zip",
+            etag=file_etag(archive.zipped.path, archive.crc32),
+            content_disposition="attachment; filename*=UTF-8''{0}".format(filename),
+        )
     else:
         return HttpResponseRedirect(archive.zipped.url)
 
@@ -534,7 +556,7 @@ def archive_ext_download(request: HttpRequest, pk: int) -> HttpResponse:
     return HttpResponseRedirect(redirect_url)
 
 
-def archive_thumb(request: HttpRequest, pk: int) -> HttpResponse:
+def archive_thumb(request: HttpRequest, pk: int) -> HttpResponseBase:
     try:
         archive = Archive.objects.get(pk=pk)
     except Archive.DoesNotExist:
@@ -548,6 +570,12 @@ def archive_thumb(request: HttpRequest, pk: int) -> HttpResponse:
         #         archive.pretty_name)
         response["X-Accel-Redirect"] = "/image/{0}".format(archive.thumbnail.name)
         return response
+    elif crawler_settings.webserver.stream_files:
+        if not archive.thumbnail or not os.path.isfile(archive.thumbnail.path):
+            raise Http404("Archive does not exist")
+        return ranged_response(
+            request, archive.thumbnail.path, "image/jpeg", etag=file_etag(archive.thumbnail.path)
+        )
     else:
         return HttpResponseRedirect(archive.thumbnail.url)
 
@@ -578,6 +606,30 @@ def image_data_list(request: HttpRequest, pk: int) -> HttpResponse:
     return render(request, "viewer/archive_image_data_list.html", d)
 
 
+def image_metadata(request: HttpRequest, pk: Optional[int] = None) -> HttpResponseBase:
+    """Stored data of the pages of an archive, of the archives given as pk parameters, or of every archive, as NDJSON
+    with one page per line, ordered by archive id. A long transfer can be resumed with the after parameter, set to
+    the id of the last archive that was fully received."""
+    authenticated, _ = double_check_auth(request)
+
+    archives = Archive.objects.all() if authenticated else Archive.objects.filter(public=True)
+
+    try:
+        if pk is not None:
+            archives = archives.filter(pk=pk)
+            if not archives.exists():
+                raise Http404("Archive does not exist")
+        elif "pk" in request.GET:
+            archives = archives.filter(pk__in=[int(x) for x in request.GET.getlist("pk")])
+        after = int(request.GET["after"]) if request.GET.get("after") else None
+    except ValueError:
+        return HttpResponse("Invalid parameter", status=400)
+
+    response = StreamingHttpResponse(image_metadata_lines(archives, after=after), content_type="application/x-ndjson")
+    response["Cache-Control"] = "no-store"
+    return response
+
+
 @permission_required("viewer.read_archive_change_log")
 def change_log(request: HttpRequest, pk: int) -> HttpResponse:
     try:
@@ -605,7 +657,7 @@ def change_log(request: HttpRequest, pk: int) -> HttpResponse:
     return render(request, "viewer/archive_change_log.html", d)
 
 
-def image_live_thumb(request: HttpRequest, archive_pk: int, position: int) -> HttpResponse:
+def image_live_thumb(request: HttpRequest, archive_pk: int, position: int) -> HttpResponseBase:
     try:
         image = Image.objects.get(archive=archive_pk, position=position)
     except Image.DoesNotExist:
@@ -614,20 +666,31 @@ def image_live_thumb(request: HttpRequest, archive_pk: int, position: int) -> Ht
         raise Http404("Archive does not exist")
 
     full_image = bool(request.GET.get("full", ""))
+    base64_data = bool(request.GET.get("base64", ""))
+
+    # The data only depends on the image and on the form asked for.
+    etag = None
+    if image.sha1:
+        etag = quote_etag("{}-{}{}".format(image.sha1, "full" if full_image else "thumb", "-base64" if base64_data else ""))
+    if etag is not None and not_modified(request, etag):
+        not_modified_response = HttpResponseNotModified()
+        not_modified_response["ETag"] = etag
+        not_modified_response["Cache-Control"] = "max-age=86400"
+        return not_modified_response
 
     image_data = image.fetch_image_data(use_original_image=full_image)
     if not image_data:
         return HttpResponse("")
 
-    if request.GET.get("base64", ""):
+    if base64_data:
         image_data_enconded = "data:image/jpeg;base64," + base64.b64encode(image_data).decode("utf-8")
         response = HttpResponse(image_data_enconded)
         response["Cache-Control"] = "max-age=86400"
+        if etag is not None:
+            response["ETag"] = etag
+        return response
     else:
-        response = HttpResponse(image_data)
-        response["Content-Type"] = "image/jpeg"
-        response["Cache-Control"] = "max-age=86400"
-    return response
+        return ranged_response(request, image_data, "image/jpeg", etag=etag, cache_control="max-age=86400")
 
 
 @login_required
@@ -1231,7 +1294,7 @@ def recall_api(request: HttpRequest, pk: int) -> HttpResponse:
 
     gallery = Gallery.objects.get(pk=archive.gallery_id)
 
-    current_settings = Settings(load_from_config=crawler_settings.config)
+    current_settings = crawler_settings.copy_from_config()
 
     if current_settings.workers.web_queue and gallery.provider:
 
@@ -12,7 +12,8 @@ from django.contrib.auth.decorators import permission_required, login_required
 from django.contrib.contenttypes.models import ContentType
 from django.core import management
 from django.core.paginator import Paginator, InvalidPage, EmptyPage
-from django.db.models import Prefetch, Count, Case, When, QuerySet, Q, F
+from django.db.models import Prefetch, Count, Case, When, QuerySet, Q, F, Value
+from django.db.models.functions import Coalesce, Lower
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, Http404, QueryDict
 from django.shortcuts import render
 from django.urls import reverse
@@ -26,7 +27,10 @@ from viewer.utils.functions import (
     galleries_update_metadata,
     gallery_search_results_to_json,
 )
+from viewer.utils.duplicates import duplicate_groups_by_fields, duplicate_groups_by_function
 from viewer.utils.general import clean_up_referer
+from viewer.utils.query_budget import query_budget
+from viewer.utils.side_effects import coalesced_side_effects
 from viewer.utils.matching import generate_possible_matches_for_archives, \
     generate_possible_matches_for_gallery_match_groups
 from viewer.utils.actions import event_log
@@ -88,6 +92,7 @@ logger = logging.getLogger(__name__)
 
 
 @permission_required("viewer.view_submitted_gallery")
+@query_budget(queries=8, duplicates=0)
 def submit_queue(request: HttpRequest) -> HttpResponse:
     p = request.POST
     get = request.GET
@@ -227,7 +232,7 @@ def submit_queue(request: HttpRequest) -> HttpResponse:
                     gallery_entry.mark_as_approved(reason=entry_reason, comment=entry_comment)
 
                     # Force replace_metadata when queueing from this list, since it's mostly used to download non used.
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
 
                     if current_settings.workers.web_queue:
 
@@ -286,7 +291,7 @@ def submit_queue(request: HttpRequest) -> HttpResponse:
 
                     gallery_entry.mark_as_approved(reason=entry_reason, comment=entry_comment)
 
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
 
                     if current_settings.workers.web_queue:
 
@@ -494,6 +499,7 @@ def filter_by_extra_files(archives: QuerySet[Archive], params: QueryDict) -> tup
     return archives, extra_file_filters
 
 
+@query_budget(queries=10, duplicates=0)
 def manage_archives(request: HttpRequest) -> HttpResponse:
     authenticated, actual_user = double_check_auth(request)
 
@@ -566,82 +572,87 @@ def manage_archives(request: HttpRequest) -> HttpResponse:
             preserved = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(pks)])
             archives = Archive.objects.filter(id__in=pks).order_by(preserved)
         if "publish_archives" in p and request.user.has_perm("viewer.publish_archive"):
-            for archive in archives:
-                message = "Publishing archive: {}, link: {}".format(archive.title, archive.get_absolute_url())
-                if "reason" in p and p["reason"] != "":
-                    message += ", reason: {}".format(p["reason"])
-                logger.info("User {}: {}".format(request.user.username, message))
-                if not json_request:
-                    messages.success(request, message)
-                archive.set_public(reason=user_reason)
-                event_log(
-                    request.user, "PUBLISH_ARCHIVE", reason=user_reason, content_object=archive, result="published"
-                )
-        elif "unpublish_archives" in p and request.user.has_perm("viewer.publish_archive"):
-            for archive in archives:
-                message = "Unpublishing archive: {}, link: {}".format(archive.title, archive.get_absolute_url())
-                if "reason" in p and p["reason"] != "":
-                    message += ", reason: {}".format(p["reason"])
-                logger.info("User {}: {}".format(request.user.username, message))
-                if not json_request:
-                    messages.success(request, message)
-                archive.set_private(reason=user_reason)
-                event_log(
-                    request.user, "UNPUBLISH_ARCHIVE", reason=user_reason, content_object=archive, result="unpublished"
-                )
-        elif "change_archive_reason" in p and request.user.has_perm("viewer.change_archive"):
-            for archive in archives:
-                archive_reason = p.get("archive_reason", "")
-                message = "Changing archive reason: {}, link: {}, new reason: {}".format(archive.title, archive.get_absolute_url(), archive_reason)
-                if "reason" in p and p["reason"] != "":
-                    message += ", reason: {}".format(p["reason"])
-                logger.info("User {}: {}".format(request.user.username, message))
-                if not json_request:
-                    messages.success(request, message)
-                archive.set_reason(archive_reason)
-                event_log(
-                    request.user, "CHANGE_ARCHIVE_REASON", reason=user_reason, content_object=archive, result="changed"
-                )
-        elif "release_gallery" in p:
-            for archive in archives:
-                if archive.gallery:
-                    message = "Releasing associated gallery: {} for archive: {}, link: {}".format(
-                        archive.gallery.get_absolute_url(), archive.title, archive.get_absolute_url()
-                    )
+            with coalesced_side_effects():
+                for archive in archives:
+                    message = "Publishing archive: {}, link: {}".format(archive.title, archive.get_absolute_url())
                     if "reason" in p and p["reason"] != "":
                         message += ", reason: {}".format(p["reason"])
                     logger.info("User {}: {}".format(request.user.username, message))
                     if not json_request:
                         messages.success(request, message)
-                    archive.release_gallery()
+                    archive.set_public(reason=user_reason)
                     event_log(
-                        request.user,
-                        "RELEASE_GALLERY_FROM_ARCHIVE",
-                        reason=user_reason,
-                        content_object=archive,
-                        result="success",
+                        request.user, "PUBLISH_ARCHIVE", reason=user_reason, content_object=archive, result="published"
                     )
-        elif "gallery_to_alternative" in p:
-            for archive in archives:
-                if archive.gallery:
-
-                    message = "Moving associated gallery to alternative source: {} for archive: {}, link: {}".format(
-                        archive.gallery.get_absolute_url(), archive.title, archive.get_absolute_url()
+        elif "unpublish_archives" in p and request.user.has_perm("viewer.publish_archive"):
+            with coalesced_side_effects():
+                for archive in archives:
+                    message = "Unpublishing archive: {}, link: {}".format(archive.title, archive.get_absolute_url())
+                    if "reason" in p and p["reason"] != "":
+                        message += ", reason: {}".format(p["reason"])
+                    logger.info("User {}: {}".format(request.user.username, message))
+                    if not json_request:
+                        messages.success(request, message)
+                    archive.set_private(reason=user_reason)
+                    event_log(
+                        request.user, "UNPUBLISH_ARCHIVE", reason=user_reason, content_object=archive, result="unpublished"
                     )
+        elif "change_archive_reason" in p and request.user.has_perm("viewer.change_archive"):
+            with coalesced_side_effects():
+                for archive in archives:
+                    archive_reason = p.get("archive_reason", "")
+                    message = "Changing archive reason: {}, link: {}, new reason: {}".format(archive.title, archive.get_absolute_url(), archive_reason)
                     if "reason" in p and p["reason"] != "":
                         message += ", reason: {}".format(p["reason"])
                     logger.info("User {}: {}".format(request.user.username, message))
                     if not json_request:
                         messages.success(request, message)
-
-                    archive.move_gallery_to_alternative()
+                    archive.set_reason(archive_reason)
                     event_log(
-                        request.user,
-                        "GALLERY_TO_ALTERNATIVE",
-                        reason=user_reason,
-                        content_object=archive,
-                        result="success",
+                        request.user, "CHANGE_ARCHIVE_REASON", reason=user_reason, content_object=archive, result="changed"
                     )
+        elif "release_gallery" in p:
+            with coalesced_side_effects():
+                for archive in archives:
+                    if archive.gallery:
+                        message = "Releasing associated gallery: {} for archive: {}, link: {}".format(
+                            archive.gallery.get_absolute_url(), archive.title, archive.get_absolute_url()
+                        )
+                        if "reason" in p and p["reason"] != "":
+                            message += ", reason: {}".format(p["reason"])
+                        logger.info("User {}: {}".format(request.user.username, message))
+                        if not json_request:
+                            messages.success(request, message)
+                        archive.release_gallery()
+                        event_log(
+                            request.user,
+                            "RELEASE_GALLERY_FROM_ARCHIVE",
+                            reason=user_reason,
+                            content_object=archive,
+                            result="success",
+                        )
+        elif "gallery_to_alternative" in p:
+            with coalesced_side_effects():
+                for archive in archives:
+                    if archive.gallery:
+
+                        message = "Moving associated gallery to alternative source: {} for archive: {}, link: {}".format(
+                            archive.gallery.get_absolute_url(), archive.title, archive.get_absolute_url()
+                        )
+                        if "reason" in p and p["reason"] != "":
+                            message += ", reason: {}".format(p["reason"])
+                        logger.info("User {}: {}".format(request.user.username, message))
+                        if not json_request:
+                            messages.success(request, message)
+
+                        archive.move_gallery_to_alternative()
+                        event_log(
+                            request.user,
+                            "GALLERY_TO_ALTERNATIVE",
+                            reason=user_reason,
+                            content_object=archive,
+                            result="success",
+                        )
         elif "delete_archives" in p and request.user.has_perm("viewer.delete_archive"):
             for archive in archives:
                 message = "Deleting archive: {}, link: {}, with its file: {}".format(
@@ -732,7 +743,7 @@ def manage_archives(request: HttpRequest) -> HttpResponse:
             if not json_request:
                 messages.success(request, message)
 
-            current_settings = Settings(load_from_config=crawler_settings.config)
+            current_settings = crawler_settings.copy_from_config()
 
             if current_settings.workers.web_queue:
                 current_settings.set_update_metadata_options(providers=providers_filtered)
@@ -988,6 +999,7 @@ def manage_archives(request: HttpRequest) -> HttpResponse:
 
 
 @permission_required("viewer.manage_gallery")
+@query_budget(queries=10, duplicates=0)
 def manage_galleries(request: HttpRequest) -> HttpResponse:
     p = request.POST
     get = request.GET
@@ -1108,7 +1120,7 @@ def manage_galleries(request: HttpRequest) -> HttpResponse:
                 messages.success(request, message)
 
                 # Force replace_metadata when queueing from this list, since it's mostly used to download non used.
-                current_settings = Settings(load_from_config=crawler_settings.config)
+                current_settings = crawler_settings.copy_from_config()
 
                 if current_settings.workers.web_queue:
 
@@ -1219,7 +1231,7 @@ def manage_galleries(request: HttpRequest) -> HttpResponse:
                     if gallery_match_group_first:
                         gallery_match = gallery_match_group_first.possible_matches.first()
                         if gallery_match:
-                            gallery_match_group_first.add_gallery(gallery_match)
+                            gallery_match_group_first.add_gallery(gallery_match, user=request.user)
                             gallery_match_group_first.save()
                             GalleryGroupPossibleMatches.objects.filter(
                                 gallery_match_group=gallery_match_group_first
@@ -1420,7 +1432,7 @@ def gallery_match_groups_possibles(request: HttpRequest) -> HttpResponse:
                     if gallery_match_group_first:
                         gallery_match = gallery_match_group_first.possible_matches.first()
                         if gallery_match:
-                            gallery_match_group_first.add_gallery(gallery_match)
+                            gallery_match_group_first.add_gallery(gallery_match, user=request.user)
                             gallery_match_group_first.save()
                             GalleryGroupPossibleMatches.objects.filter(
                                 gallery_match_group=gallery_match_group_first
@@ -1748,7 +1760,7 @@ def user_crawler(request: AuthenticatedHttpRequest) -> HttpResponse:
     user_reason = p.get("reason", "")
 
     if p:
-        current_settings = Settings(load_from_config=crawler_settings.config)
+        current_settings = crawler_settings.copy_from_config()
         if not current_settings.workers.web_queue:
             messages.error(request, "Cannot submit links currently. Please contact an admin.")
             return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
@@ -1825,7 +1837,7 @@ def user_crawler(request: AuthenticatedHttpRequest) -> HttpResponse:
                 current_settings.providers["panda"].auto_process_parent = True
                 current_settings.providers["panda"].auto_process_first = True
 
-        parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+        parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
 
         def archive_callback(x: Optional["Archive"], crawled_url: Optional[str], result: str) -> None:
             event_log(
@@ -1932,6 +1944,7 @@ def user_crawler(request: AuthenticatedHttpRequest) -> HttpResponse:
 
 
 @permission_required("viewer.match_archive")
+@query_budget(queries=8, duplicates=0)
 def archives_not_matched_with_gallery(request: HttpRequest) -> HttpResponse:
     p = request.POST
     get = request.GET
@@ -2020,31 +2033,32 @@ def archives_not_matched_with_gallery(request: HttpRequest) -> HttpResponse:
             logger.info("User {}: Clearing possible matches for archives".format(request.user.username))
             messages.success(request, "Clearing possible matches.")
         elif "auto_select_first_match" in p:
-            for archive in archives:
-                try:
-                    possible_gallery = archive.possible_matches.first()
-                    if possible_gallery:
-                        archive.select_as_match(possible_gallery.id)
-                        if archive.gallery:
-                            logger.info(
-                                "User: {}: Archive {} ({}) was matched with gallery {} ({}).".format(
-                                    request.user.username,
-                                    archive,
-                                    reverse("viewer:archive", args=(archive.pk,)),
-                                    archive.gallery,
-                                    reverse("viewer:gallery", args=(archive.gallery.pk,)),
+            with coalesced_side_effects():
+                for archive in archives:
+                    try:
+                        possible_gallery = archive.possible_matches.first()
+                        if possible_gallery:
+                            archive.select_as_match(possible_gallery.id)
+                            if archive.gallery:
+                                logger.info(
+                                    "User: {}: Archive {} ({}) was matched with gallery {} ({}).".format(
+                                        request.user.username,
+                                        archive,
+                                        reverse("viewer:archive", args=(archive.pk,)),
+                                        archive.gallery,
+                                        reverse("viewer:gallery", args=(archive.gallery.pk,)),
+                                    )
                                 )
-                            )
-                            event_log(
-                                request.user,
-                                "MATCH_ARCHIVE",
-                                # reason=user_reason,
-                                data=reverse("viewer:gallery", args=(archive.gallery.pk,)),
-                                content_object=archive,
-                                result="matched",
-                            )
-                except ValueError:
-                    return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
+                                event_log(
+                                    request.user,
+                                    "MATCH_ARCHIVE",
+                                    # reason=user_reason,
+                                    data=reverse("viewer:gallery", args=(archive.gallery.pk,)),
+                                    content_object=archive,
+                                    result="matched",
+                                )
+                    except ValueError:
+                        return HttpResponseRedirect(clean_up_referer(request.META["HTTP_REFERER"]))
 
             messages.success(request, "Matching with first possible match.")
 
@@ -2172,7 +2186,7 @@ def gallery_update(
             gallery_match_group, created = GalleryMatchGroup.objects.get_or_create(galleries__in=(gallery,))
             if created:
                 gallery_match_group.galleries.add(gallery)
-            gallery_match_group.add_gallery(gallery_match)
+            gallery_match_group.add_gallery(gallery_match, user=request.user)
             gallery_match_group.save()
             GalleryGroupPossibleMatches.objects.filter(
                 gallery_match_group=gallery_match_group
@@ -2405,7 +2419,7 @@ def upload_gallery(request: HttpRequest) -> HttpResponse:
         # check whether it's valid:
         if edit_form.is_valid():
             new_gallery = edit_form.save(commit=False)
-            parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+            parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
             # for parser in parsers:
             # urls = parser.filter_accepted_urls(list(to_use_urls))
 
@@ -2547,6 +2561,7 @@ def create_wanted_galleries_from_command(request: HttpRequest) -> HttpResponse:
 
 
 @permission_required("viewer.manage_missing_archives")
+@query_budget(queries=8, duplicates=0)
 def missing_archives_for_galleries(request: HttpRequest) -> HttpResponse:
     p = request.POST
     get = request.GET
@@ -2641,7 +2656,7 @@ def missing_archives_for_galleries(request: HttpRequest) -> HttpResponse:
                 messages.success(request, message)
 
                 # Force replace_metadata when queueing from this list, since it's mostly used to download non used.
-                current_settings = Settings(load_from_config=crawler_settings.config)
+                current_settings = crawler_settings.copy_from_config()
 
                 if current_settings.workers.web_queue:
 
@@ -2853,28 +2868,21 @@ def archives_similar_by_fields(request: HttpRequest) -> HttpResponse:
         if k not in params:
             params[k] = ""
 
+    try:
+        page = int(get.get("page", "1"))
+    except ValueError:
+        page = 1
+
     after_source_type = params["source_type"]
     after_reason = params["reason"]
 
-    def source_lambda(x):
-        return x.source_type == after_source_type
-
-    def reason_lambda(x):
-        return x.reason == after_reason
-
-    if "clear-title" in get:
-
-        def clear_archive_title(x: Archive):
-            return (
-                re.sub(r"[^A-Za-z0-9 ]+", "", re.sub(r"\s+\(.+?\)", r"", re.sub(r"\[.+?\]\s*", r"", x.best_title)))
-                .lower()
-                .strip()
-            )
-
-    else:
-
-        def clear_archive_title(x: Archive):
-            return x.best_title
+    # Group-level filters: at least 1 Archive in the group must match.
+    after_filters = []
+    if "filter-after" in get:
+        if after_source_type:
+            after_filters.append(Q(source_type=after_source_type))
+        if after_reason:
+            after_filters.append(Q(reason=after_reason))
 
     if "filter-after" in get:
         params["source_type"] = ""
@@ -2891,61 +2899,80 @@ def archives_similar_by_fields(request: HttpRequest) -> HttpResponse:
     by_crc32 = {}
     by_title = {}
     group_count = 1
-    hard_limit_groups = 400
+    groups_per_page = 100
+    pages = []
 
     if "filter-fileinfo" in get:
-        for k_filesize, v_filesize in groupby(
-            results.exclude(filesize__isnull=True)
-            .exclude(filecount__isnull=True)
-            .order_by("filesize", "filecount")
-            .distinct(),
-            lambda x: (x.filesize, x.filecount),
-        ):
-            objects = list(v_filesize)
-            if len(objects) > 1:
-                if "filter-after" in get:
-                    if after_source_type and len(list(filter(source_lambda, objects))) < 1:
-                        continue
-                    if after_reason and len(list(filter(reason_lambda, objects))) < 1:
-                        continue
-
-                by_size_count[group_count] = objects
-                group_count += 1
-                if "limit-groups" in get and len(by_size_count.keys()) >= hard_limit_groups:
-                    break
+        size_page, size_groups = duplicate_groups_by_fields(
+            results.exclude(filesize__isnull=True).exclude(filecount__isnull=True),
+            ("filesize", "filecount"),
+            page,
+            groups_per_page=groups_per_page,
+            any_member_filters=after_filters,
+        )
+        pages.append(size_page)
+        for objects in size_groups.values():
+            by_size_count[group_count] = objects
+            group_count += 1
 
     if "filter-crc32" in get:
-        for k_crc32, v_crc32 in groupby(
-            results.exclude(crc32__isnull=True).exclude(crc32="").order_by("crc32").distinct(), lambda x: x.crc32
-        ):
-            objects = list(v_crc32)
-            if len(objects) > 1:
-                if "filter-after" in get:
-                    if after_source_type and len(list(filter(source_lambda, objects))) < 1:
-                        continue
-                    if after_reason and len(list(filter(reason_lambda, objects))) < 1:
-                        continue
-                by_crc32[group_count] = objects
-                group_count += 1
-                if "limit-groups" in get and len(by_crc32.keys()) >= hard_limit_groups:
-                    break
+        crc32_page, crc32_groups = duplicate_groups_by_fields(
+            results.exclude(crc32__isnull=True).exclude(crc32=""),
+            ("crc32",),
+            page,
+            groups_per_page=groups_per_page,
+            any_member_filters=after_filters,
+        )
+        pages.append(crc32_page)
+        for objects in crc32_groups.values():
+            by_crc32[group_count] = objects
+            group_count += 1
 
     if "filter-title" in get:
-        query_result = results.exclude(title__isnull=True).exclude(title="").order_by("title").distinct()
-        for k_title, v_title in groupby(sorted(query_result, key=clear_archive_title), clear_archive_title):
-            objects = list(v_title)
-            if len(objects) > 1:
-                if "filter-after" in get:
-                    if after_source_type and len(list(filter(source_lambda, objects))) < 1:
-                        continue
-                    if after_reason and len(list(filter(reason_lambda, objects))) < 1:
-                        continue
-                by_title[group_count] = objects
-                group_count += 1
-                if "limit-groups" in get and len(by_title.keys()) >= hard_limit_groups:
-                    break
+        title_results = results.exclude(title__isnull=True).exclude(title="")
+        title_groups: dict[Any, list[Archive]]
+        if "clear-title" in get:
+
+            def clear_archive_title(x: str):
+                return (
+                    re.sub(r"[^A-Za-z0-9 ]+", "", re.sub(r"\s+\(.+?\)", r"", re.sub(r"\[.+?\]\s*", r"", x)))
+                    .lower()
+                    .strip()
+                )
+
+            title_page, title_groups = duplicate_groups_by_function(
+                title_results,
+                ("title",),
+                clear_archive_title,
+                page,
+                groups_per_page=groups_per_page,
+                any_member_filters=after_filters,
+                member_order=("title",),
+            )
+        else:
+            title_page, title_groups = duplicate_groups_by_fields(
+                title_results,
+                ("title",),
+                page,
+                groups_per_page=groups_per_page,
+                any_member_filters=after_filters,
+            )
+        pages.append(title_page)
+        for objects in title_groups.values():
+            by_title[group_count] = objects
+            group_count += 1
+
+    num_pages = max([x.paginator.num_pages for x in pages], default=1)
 
-    d = {"by_size_count": by_size_count, "by_crc32": by_crc32, "by_title": by_title, "form": form}
+    d = {
+        "by_size_count": by_size_count,
+        "by_crc32": by_crc32,
+        "by_title": by_title,
+        "form": form,
+        "page": min(page, num_pages),
+        "num_pages": num_pages,
+        "total_groups": [x.paginator.count for x in pages],
+    }
     return render(request, "viewer/archives_similar_by_fields.html", d)
 
 
@@ -3060,15 +3087,15 @@ def repeated_galleries_by_field(request: HttpRequest) -> HttpResponse:
     if "has-size" in get:
         results = results.filter(filesize__gt=0)
 
+    try:
+        page = int(get.get("page", "1"))
+    except ValueError:
+        page = 1
+
     by_title = {}
     by_filesize = {}
-
-    if "ignore-case" in get:
-        clear_function = lambda x: x.lower()
-    if "clear-fields" in get:
-        clear_function = lambda x: re.sub(r"[^A-Za-z0-9 ]+", "", re.sub(r"\s+\(.+?\)", r"", re.sub(r"\[.+?]\s*", r"", x))).lower().strip()
-    if "clear-fields" not in get and "ignore-case" not in get:
-        clear_function = lambda x: x
+    groups_per_page = 100
+    pages = []
 
     max_diff_filecount = None
 
@@ -3080,31 +3107,48 @@ def repeated_galleries_by_field(request: HttpRequest) -> HttpResponse:
         else:
             max_diff_filecount = 0
 
+    def filter_filecount(objects: list[Gallery]) -> list[Gallery]:
+        if max_diff_filecount is not None:
+            objects = [x for x in objects if abs((x.filecount or 0) - (objects[0].filecount or 0)) <= max_diff_filecount]
+        return objects
+
+    # Keys are computed in the database when possible, regex cleanups fall back to computing them in Python.
+    def groups_by_cleared_fields(queryset, fields: tuple[str, ...]):
+        if "clear-fields" in get:
+
+            def clear_fields(*values: Optional[str]) -> tuple[str, ...]:
+                return tuple(
+                    re.sub(r"[^A-Za-z0-9 ]+", "", re.sub(r"\s+\(.+?\)", r"", re.sub(r"\[.+?]\s*", r"", x or ""))).lower().strip()
+                    for x in values
+                )
+
+            return duplicate_groups_by_function(
+                queryset, fields, clear_fields, page, groups_per_page=groups_per_page, member_order=("title",)
+            )
+        elif "ignore-case" in get:
+            return duplicate_groups_by_fields(
+                queryset, [Lower(Coalesce(x, Value(""))) for x in fields], page, groups_per_page=groups_per_page
+            )
+        else:
+            return duplicate_groups_by_fields(
+                queryset, [Coalesce(x, Value("")) for x in fields], page, groups_per_page=groups_per_page
+            )
+
     if "by-title" in get:
+        grouped_fields: list[tuple[QuerySet[Gallery], tuple[str, ...]]] = []
         if "same-uploader" in get:
-            for k_tu, v_tu in groupby(results.order_by("title", "uploader"), lambda x: (clear_function(x.title or ""), clear_function(x.uploader or ""))):
-                objects = list(v_tu)
-                if len(objects) > 1:
-                    if max_diff_filecount is not None:
-                        objects = [x for x in objects if abs(x.filecount - objects[0].filecount) <= max_diff_filecount]
-                    if len(objects) > 1:
-                        by_title[str(k_tu)] = objects
+            grouped_fields.append((results, ("title", "uploader")))
         if "same-description" in get:
-            for k_tu, v_tu in groupby(results.exclude(comment="").order_by("title", "comment"), lambda x: (clear_function(x.title or ""), clear_function(x.comment or ""))):
-                objects = list(v_tu)
-                if len(objects) > 1:
-                    if max_diff_filecount is not None:
-                        objects = [x for x in objects if abs(x.filecount - objects[0].filecount) <= max_diff_filecount]
-                    if len(objects) > 1:
-                        by_title[str(k_tu)] = objects
+            grouped_fields.append((results.exclude(comment=""), ("title", "comment")))
         else:
-            for k_title, v_title in groupby(results.order_by("title"), lambda x: clear_function(x.title or "")):
-                objects = list(v_title)
+            grouped_fields.append((results, ("title",)))
+        for queryset, fields in grouped_fields:
+            title_page, title_groups = groups_by_cleared_fields(queryset, fields)
+            pages.append(title_page)
+            for key, objects in title_groups.items():
+                objects = filter_filecount(objects)
                 if len(objects) > 1:
-                    if max_diff_filecount is not None:
-                        objects = [x for x in objects if abs(x.filecount - objects[0].filecount) <= max_diff_filecount]
-                    if len(objects) > 1:
-                        by_title[k_title] = objects
+                    by_title[str(key) if len(fields) > 1 else key[0]] = objects
 
     if 'range-per-group-provider' in get:
         if 'min-group' in get and get['min-group']:
@@ -3123,13 +3167,16 @@ def repeated_galleries_by_field(request: HttpRequest) -> HttpResponse:
         # by_title = {x[0]: x[1] for x in by_title.items() if max_group >= len(x[1]) >= min_group}
 
     if "by-filesize" in get:
-        for k_filesize, v_filesize in groupby(results.order_by("filesize"), lambda x: str(x.filesize or "")):
-            objects = list(v_filesize)
+        filesize_page, filesize_groups = duplicate_groups_by_fields(
+            results, (Coalesce("filesize", Value(0)),), page, groups_per_page=groups_per_page
+        )
+        pages.append(filesize_page)
+        for key, objects in filesize_groups.items():
+            objects = filter_filecount(objects)
             if len(objects) > 1:
-                if max_diff_filecount is not None:
-                    objects = [x for x in objects if abs(x.filecount - objects[0].filecount) <= max_diff_filecount]
-                if len(objects) > 1:
-                    by_filesize[k_filesize] = objects
+                by_filesize[str(key[0] or "")] = objects
+
+    num_pages = max([x.paginator.num_pages for x in pages], default=1)
 
     try:
         inline_thumbnails = bool(get.get("inline-thumbnails", ""))
@@ -3139,7 +3186,10 @@ def repeated_galleries_by_field(request: HttpRequest) -> HttpResponse:
     d = {
         "by_title": by_title, "by_filesize": by_filesize, "form": form,
         "fields_form": fields_form,
-        "inline_thumbnails": inline_thumbnails
+        "inline_thumbnails": inline_thumbnails,
+        "page": min(page, num_pages),
+        "num_pages": num_pages,
+        "total_groups": [x.paginator.count for x in pages],
     }
 
     return render(request, "viewer/galleries_repeated_by_fields.html", d)
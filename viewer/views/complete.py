@@ -13,10 +13,7 @@ from django.views.generic import ListView
 
 from viewer.models import Archive, Tag, Gallery, WantedGallery, ArchiveGroup, Provider, ArchiveManageEntry, Category, \
     GalleryMatchGroup
-
-if typing.TYPE_CHECKING:
-    from django_stubs_ext import ValuesQuerySet
-
+from viewer.utils.completion import complete_field, complete_tags
 
 crawler_settings = settings.CRAWLER_SETTINGS
 
@@ -296,6 +293,8 @@ class ArchiveManageEntryMarkReasonAutocomplete(ArchiveManageEntryFieldAutocomple
 class ArchiveFieldAutocomplete(ListView):
 
     model = Archive
+    # Name of the index in viewer.utils.completion.FIELD_SOURCES.
+    completion_index = ""
 
     choice_html_format = """
         <a class="block choice" data-value="%s">%s</a>
@@ -330,13 +329,20 @@ class ArchiveFieldAutocomplete(ListView):
         else:
             return ""
 
-    def choices_for_request(self) -> "ValuesQuerySet[Archive, Optional[str]]":
-        raise NotImplementedError
+    def choices_for_request(self) -> list[str]:
+        return complete_field(
+            self.completion_index,
+            self.request.GET.get("q", ""),
+            public_only=not self.request.user.is_authenticated,
+            limit=self.limit_choices,
+        )
 
 
 class GalleryFieldAutocomplete(ListView):
 
     model = Gallery
+    # Name of the index in viewer.utils.completion.FIELD_SOURCES.
+    completion_index = ""
 
     choice_html_format = """
         <a class="block choice" data-value="%s">%s</a>
@@ -371,8 +377,13 @@ class GalleryFieldAutocomplete(ListView):
         else:
             return ""
 
-    def choices_for_request(self) -> "ValuesQuerySet[Gallery, Optional[str]]":
-        raise NotImplementedError
+    def choices_for_request(self) -> list[str]:
+        return complete_field(
+            self.completion_index,
+            self.request.GET.get("q", ""),
+            public_only=not self.request.user.is_authenticated,
+            limit=self.limit_choices,
+        )
 
 
 class GalleryFieldJSONAutocompleteMixin:
@@ -402,220 +413,40 @@ class GalleryFieldJSONAutocompleteMixin:
 
 
 class SourceAutocomplete(ArchiveFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Archive, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            sources = (
-                Archive.objects.filter(source_type__contains=q)
-                .order_by("source_type")
-                .values_list("source_type", flat=True)
-                .distinct()
-            )
-        else:
-            sources = (
-                Archive.objects.filter(source_type__contains=q, public=True)
-                .order_by("source_type")
-                .values_list("source_type", flat=True)
-                .distinct()
-            )
-
-        return sources[0 : self.limit_choices]
+    completion_index = "archive_source_type"
 
 
 class ProviderAutocomplete(ArchiveFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Archive, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            sources = (
-                Archive.objects.filter(gallery__provider__icontains=q)
-                .order_by("gallery__provider")
-                .values_list("gallery__provider", flat=True)
-                .distinct()
-            )
-        else:
-            sources = (
-                Archive.objects.filter(gallery__provider__icontains=q, public=True)
-                .order_by("gallery__provider")
-                .values_list("gallery__provider", flat=True)
-                .distinct()
-            )
-
-        return sources[0 : self.limit_choices]
+    completion_index = "archive_provider"
 
 
 class ReasonAutocomplete(ArchiveFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Archive, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            sources = (
-                Archive.objects.filter(reason__contains=q)
-                .order_by("reason")
-                .values_list("reason", flat=True)
-                .distinct()
-            )
-        else:
-            sources = (
-                Archive.objects.filter(reason__contains=q, public=True)
-                .order_by("reason")
-                .values_list("reason", flat=True)
-                .distinct()
-            )
-
-        return sources[0 : self.limit_choices]
+    completion_index = "archive_reason"
 
 
 class UploaderAutocomplete(ArchiveFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Archive, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            sources = (
-                Archive.objects.filter(gallery__uploader__icontains=q)
-                .order_by("gallery__uploader")
-                .values_list("gallery__uploader", flat=True)
-                .distinct()
-            )
-        else:
-            sources = (
-                Archive.objects.filter(gallery__uploader__icontains=q, public=True)
-                .order_by("gallery__uploader")
-                .values_list("gallery__uploader", flat=True)
-                .distinct()
-            )
-
-        return sources[0 : self.limit_choices]
+    completion_index = "archive_uploader"
 
 
 class CategoryAutocomplete(ArchiveFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Archive, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            sources = (
-                Archive.objects.filter(gallery__category__icontains=q)
-                .order_by("gallery__category")
-                .values_list("gallery__category", flat=True)
-                .distinct()
-            )
-        else:
-            sources = (
-                Archive.objects.filter(gallery__category__icontains=q, public=True)
-                .order_by("gallery__category")
-                .values_list("gallery__category", flat=True)
-                .distinct()
-            )
-
-        return sources[0 : self.limit_choices]
+    completion_index = "archive_category"
 
 
 # Gallery-based autocompletes
 class GalleryProviderAutocomplete(GalleryFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Gallery, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            providers = (
-                Gallery.objects.filter(provider__icontains=q)
-                .order_by("provider")
-                .distinct()
-                .values_list("provider", flat=True)
-            )
-        else:
-            providers = (
-                Gallery.objects.filter(provider__icontains=q, public=True)
-                .order_by("provider")
-                .distinct()
-                .values_list("provider", flat=True)
-            )
-
-        return providers[0 : self.limit_choices]
+    completion_index = "gallery_provider"
 
 
 class GalleryCategoryAutocomplete(GalleryFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Gallery, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            categories = (
-                Gallery.objects.filter(category__icontains=q)
-                .order_by("category")
-                .distinct()
-                .values_list("category", flat=True)
-            )
-        else:
-            categories = (
-                Gallery.objects.filter(category__icontains=q, public=True)
-                .order_by("category")
-                .distinct()
-                .values_list("category", flat=True)
-            )
-
-        return categories[0 : self.limit_choices]
+    completion_index = "gallery_category"
 
 
 class GalleryUploaderAutocomplete(GalleryFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Gallery, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            uploaders = (
-                Gallery.objects.filter(uploader__icontains=q)
-                .order_by("uploader")
-                .distinct()
-                .values_list("uploader", flat=True)
-            )
-        else:
-            uploaders = (
-                Gallery.objects.filter(uploader__icontains=q, public=True)
-                .order_by("uploader")
-                .distinct()
-                .values_list("uploader", flat=True)
-            )
-
-        return uploaders[0 : self.limit_choices]
+    completion_index = "gallery_uploader"
 
 
 class GalleryReasonAutocomplete(GalleryFieldAutocomplete):
-
-    def choices_for_request(self) -> "ValuesQuerySet[Gallery, Optional[str]]":
-
-        q = self.request.GET.get("q", "")
-
-        if self.request.user.is_authenticated:
-            reasons = (
-                Gallery.objects.filter(reason__icontains=q)
-                .order_by("reason")
-                .distinct()
-                .values_list("reason", flat=True)
-            )
-        else:
-            reasons = (
-                Gallery.objects.filter(reason__icontains=q, public=True)
-                .order_by("reason")
-                .distinct()
-                .values_list("reason", flat=True)
-            )
-
-        return reasons[0 : self.limit_choices]
+    completion_index = "gallery_reason"
 
 
 class GalleryCategoryJSONAutocomplete(GalleryFieldJSONAutocompleteMixin, GalleryCategoryAutocomplete):
@@ -667,14 +498,8 @@ class TagAutocomplete(ListView):
             tag_clean = tag_clean.replace(self.modifier, "")
         else:
             self.modifier = ""
-        scope_name = tag_clean.split(":", maxsplit=1)
-
-        if len(scope_name) > 1:
-            results = Tag.objects.filter(Q(name__contains=scope_name[1]), Q(scope__contains=scope_name[0]))
-        else:
-            results = Tag.objects.filter(Q(name__contains=tag_clean) | Q(scope__contains=tag_clean))
 
-        return results.order_by("pk")[0 : self.limit_choices]
+        return complete_tags(tag_clean, limit=self.limit_choices)
 
 
 class TagAutocompleteJson(ListView):
@@ -711,14 +536,8 @@ class TagAutocompleteJson(ListView):
             tag_clean = tag_clean.replace(self.modifier, "")
         else:
             self.modifier = ""
-        scope_name = tag_clean.split(":", maxsplit=1)
-
-        if len(scope_name) > 1:
-            results = Tag.objects.filter(Q(name__contains=scope_name[1]), Q(scope__contains=scope_name[0]))
-        else:
-            results = Tag.objects.filter(Q(name__contains=tag_clean) | Q(scope__contains=tag_clean))
 
-        return results.order_by("pk")[0 : self.limit_choices]
+        return complete_tags(tag_clean, limit=self.limit_choices)
 
 
 class TagPkAutocomplete(autocomplete.Select2QuerySetView):
@@ -828,7 +647,7 @@ class GallerySelectAutocomplete(autocomplete.Select2QuerySetView):
 
         gallery_id_provider = None
 
-        parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+        parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
 
         for parser in parsers:
             if parser.id_from_url_implemented():
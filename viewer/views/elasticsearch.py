@@ -15,20 +15,18 @@ from django.views import View
 
 from math import ceil
 
+import elasticsearch
+from elasticsearch.dsl import Search, Q
+from elasticsearch.dsl.response import AggResponse
+
 from core.base.types import DataDict
 from viewer.utils.functions import galleries_update_metadata
 
-es_client = settings.ES_CLIENT
 max_result_window = settings.MAX_RESULT_WINDOW
 es_index_name = settings.ES_INDEX_NAME
 
 logger = logging.getLogger(__name__)
 
-if es_client:
-    import elasticsearch
-    from elasticsearch.dsl import Search, Q
-    from elasticsearch.dsl.response import AggResponse
-
 
 ES_SKIP_FIELDS = ("page", "q", "order", "sort", "metrics", "show_url", "count", "no_agg", "view")
 
@@ -62,6 +60,7 @@ class ESHomePageView(TemplateView):
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
 
+        es_client = settings.ES_CLIENT
         if not settings.ES_ENABLED or not es_client:
             return {"message": "Elasticsearch is disabled for this instance.", "page_title": self.page_title}
 
@@ -235,7 +234,7 @@ class ESHomePageView(TemplateView):
             url_args[field_name] = field_value
         return url_args, is_active
 
-    def prepare_facet_data(self, aggregations: "AggResponse", get_args: QueryDict) -> dict[str, list[dict[str, str]]]:
+    def prepare_facet_data(self, aggregations: AggResponse, get_args: QueryDict) -> dict[str, list[dict[str, str]]]:
         resp: DataDict = {}
         for area, agg in aggregations.to_dict().items():
             resp[area] = []
@@ -384,9 +383,9 @@ class ESHomeGalleryPageView(ESHomePageView):
         return self.render_to_response(context)
 
 
-# TODO: This method doesn't seem to be returning (response object)
 # Not being used client-side
 def autocomplete_view(request: HttpRequest) -> HttpResponse:
+    es_client = settings.ES_CLIENT
     if not settings.ES_ENABLED or not es_client:
         return HttpResponse({})
     if not es_client.indices.exists(index=es_index_name):
@@ -404,7 +403,7 @@ def autocomplete_view(request: HttpRequest) -> HttpResponse:
         },
     ).execute()
 
-    options = response["title_complete"][0]["options"]
+    options = response["suggest"]["title_complete"][0]["options"]
     data = json.dumps([{"id": i["_id"], "title": i["text"]} for i in options])
     mime_type = "application/json; charset=utf-8"
     http_response = HttpResponse(data, mime_type)
@@ -412,6 +411,7 @@ def autocomplete_view(request: HttpRequest) -> HttpResponse:
 
 
 def title_suggest_view(request: HttpRequest) -> HttpResponse:
+    es_client = settings.ES_CLIENT
     if not settings.ES_ENABLED or not es_client:
         return HttpResponse({})
     if not es_client.indices.exists(index=es_index_name):
@@ -446,6 +446,7 @@ def title_suggest_view(request: HttpRequest) -> HttpResponse:
 
 
 def title_suggest_archive_view(request: HttpRequest) -> HttpResponse:
+    es_client = settings.ES_CLIENT
     if not settings.ES_ENABLED or not es_client:
         return HttpResponse({})
     if not es_client.indices.exists(index=es_index_name):
@@ -466,6 +467,7 @@ def title_suggest_archive_view(request: HttpRequest) -> HttpResponse:
 
 
 def title_pk_suggest_archive_view(request: HttpRequest) -> HttpResponse:
+    es_client = settings.ES_CLIENT
     if not settings.ES_ENABLED or not es_client:
         return HttpResponse({})
     if not es_client.indices.exists(index=es_index_name):
@@ -492,6 +494,7 @@ def title_pk_suggest_archive_view(request: HttpRequest) -> HttpResponse:
 
 
 def archive_simple(request: HttpRequest) -> HttpResponse:
+    es_client = settings.ES_CLIENT
     if not settings.ES_ENABLED or not es_client:
         return HttpResponse({})
     if not es_client.indices.exists(index=es_index_name):
@@ -512,6 +515,7 @@ def archive_simple(request: HttpRequest) -> HttpResponse:
 
 
 def archives_simple(request: HttpRequest) -> HttpResponse:
+    es_client = settings.ES_CLIENT
     if not settings.ES_ENABLED or not es_client:
         return HttpResponse({})
     if not es_client.indices.exists(index=es_index_name):
@@ -551,6 +555,7 @@ class ESArchiveJSONView(View):
 
     def get_context_data(self, **kwargs: Any) -> dict[str, Any]:
 
+        es_client = settings.ES_CLIENT
         if not settings.ES_ENABLED or not es_client:
             return {"message": "Elasticsearch is disabled for this instance."}
 
@@ -681,7 +686,7 @@ class ESArchiveJSONView(View):
             url_args[field_name] = field_value
         return url_args, is_active
 
-    def prepare_facet_data(self, aggregations: "AggResponse", get_args: QueryDict) -> dict[str, list[dict[str, str]]]:
+    def prepare_facet_data(self, aggregations: AggResponse, get_args: QueryDict) -> dict[str, list[dict[str, str]]]:
         resp: DataDict = {}
         for area, agg in aggregations.to_dict().items():
             resp[area] = []
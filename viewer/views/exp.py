@@ -18,7 +18,7 @@ from django.conf import settings
 
 from core.base.types import DataDict
 from core.base.utilities import timestamp_or_zero, str_to_int
-from viewer.models import Archive, Image, UserArchivePrefs
+from viewer.models import Archive, Image, UserArchivePrefs, TextNgram
 from viewer.utils.requests import double_check_auth
 from viewer.views.head import archive_filter_keys, filter_archives
 from viewer.views.api import simple_archive_filter
@@ -47,7 +47,7 @@ def get_archive_data(data: QueryDict) -> "QuerySet[Archive]":
 
     if title is not None:
         q_formatted = "%" + title.replace(" ", "%") + "%"
-        results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+        results = TextNgram.objects.title_search(results, q_formatted)
 
     if "filename" in data and isinstance(data["filename"], str):
         results = results.filter(zipped__icontains=data["filename"])
@@ -207,8 +207,7 @@ def gallery_match_group_edit(request: HttpRequest, pk: Optional[int] = None) ->
         for gallery in galleries:
             if not GalleryMatchGroupEntry.objects.filter(gallery=gallery, gallery_match_group=gallery_match_group_instance).exists():
 
-                gallery_match_group_entry = GalleryMatchGroupEntry(gallery=gallery, gallery_match_group=gallery_match_group_instance)
-                gallery_match_group_entry.save()
+                gallery_match_group_instance.add_gallery(gallery, user=request.user)
 
                 gallery_match_group_instance.save()
 
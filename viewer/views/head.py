@@ -27,6 +27,8 @@ from django.utils.html import urlize, linebreaks
 from core.base.setup import Settings
 from core.base.types import DataDict
 from viewer.utils.actions import event_log
+from viewer.utils.cache import cache_response, cached_value
+from viewer.utils.query_budget import query_budget
 
 from viewer.forms import (
     ArchiveSearchForm,
@@ -41,6 +43,7 @@ from viewer.models import (
     Archive,
     Image,
     Tag,
+    TextNgram,
     Gallery,
     UserArchivePrefs,
     WantedGallery,
@@ -353,7 +356,7 @@ def process_gallery_page(request: HttpRequest, gallery: Gallery, tool: Optional[
 
     if request.user.has_perm("viewer.download_gallery") and tool == "download":
         if "downloader" in request.GET and request.user.is_staff:
-            current_settings = Settings(load_from_config=crawler_settings.config)
+            current_settings = crawler_settings.copy_from_config()
             current_settings.allow_downloaders_only([request.GET["downloader"]], True, True, True)
             if current_settings.workers.web_queue:
                 current_settings.workers.web_queue.enqueue_args_list(
@@ -362,7 +365,7 @@ def process_gallery_page(request: HttpRequest, gallery: Gallery, tool: Optional[
         else:
             # Since this is used from the gallery page mainly to download an already added gallery using
             # downloader settings, force replace_metadata and retry_failed
-            current_settings = Settings(load_from_config=crawler_settings.config)
+            current_settings = crawler_settings.copy_from_config()
             current_settings.replace_metadata = True
             current_settings.retry_failed = True
             if current_settings.workers.web_queue:
@@ -402,7 +405,7 @@ def process_gallery_page(request: HttpRequest, gallery: Gallery, tool: Optional[
 
     if request.user.has_perm("viewer.update_metadata") and tool == "recall-api":
 
-        current_settings = Settings(load_from_config=crawler_settings.config)
+        current_settings = crawler_settings.copy_from_config()
 
         if current_settings.workers.web_queue and gallery.provider:
 
@@ -493,6 +496,7 @@ def gallery_details_gid_provider(request: HttpRequest, tool: Optional[str] = Non
     return process_gallery_page(request, gallery, tool)
 
 
+@query_budget(queries=14, duplicates=0)
 def gallery_details(request: HttpRequest, pk: int, tool: Optional[str] = None) -> HttpResponse:
     try:
         gallery = Gallery.objects.get(pk=pk)
@@ -521,7 +525,7 @@ def gallery_enter_reason(request: HttpRequest, pk: int, tool: Optional[str] = No
 
             if request.user.has_perm("viewer.download_gallery") and tool == "download":
                 if "downloader" in request.GET and request.user.is_staff:
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
                     current_settings.allow_downloaders_only([request.GET["downloader"]], True, True, True)
                     if current_settings.workers.web_queue:
                         current_settings.workers.web_queue.enqueue_args_list(
@@ -530,7 +534,7 @@ def gallery_enter_reason(request: HttpRequest, pk: int, tool: Optional[str] = No
                 else:
                     # Since this is used from the gallery page mainly to download an already added gallery using
                     # downloader settings, force replace_metadata and retry_failed
-                    current_settings = Settings(load_from_config=crawler_settings.config)
+                    current_settings = crawler_settings.copy_from_config()
                     current_settings.replace_metadata = True
                     current_settings.retry_failed = True
                     if current_settings.workers.web_queue:
@@ -608,7 +612,7 @@ def gallery_enter_reason(request: HttpRequest, pk: int, tool: Optional[str] = No
 
             if request.user.has_perm("viewer.update_metadata") and tool == "recall-api":
 
-                current_settings = Settings(load_from_config=crawler_settings.config)
+                current_settings = crawler_settings.copy_from_config()
 
                 if current_settings.workers.web_queue and gallery.provider:
 
@@ -867,7 +871,7 @@ def filter_galleries(
 
     if request_filters["title"]:
         q_formatted = "%" + request_filters["title"].replace(" ", "%") + "%"
-        results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+        results = TextNgram.objects.title_search(results, q_formatted)
     if request_filters["rating_from"]:
         results = results.filter(rating__gte=float(request_filters["rating_from"]))
     if request_filters["rating_to"]:
@@ -994,9 +998,9 @@ def filter_galleries(
                     results = results.filter(tag_query)
             else:
                 if tag_name != "" and tag_scope != "":
-                    tag_query = Q(Q(tags__name__contains=tag_name) & Q(tags__scope__contains=tag_scope))
+                    tag_query = Q(TextNgram.objects.tag_name_contains(tag_name) & Q(tags__scope__contains=tag_scope))
                 elif tag_name != "":
-                    tag_query = Q(tags__name__contains=tag_name)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name)
                 else:
                     tag_query = Q(tags__scope__contains=tag_scope)
 
@@ -1022,6 +1026,7 @@ def filter_galleries(
     return results
 
 
+@cache_response("archive-search", session_keys=("parameters",))
 def search(request: HttpRequest, mode: str = "none", tag: Optional[str] = None) -> HttpResponse:
     """Search, filter, sort archives."""
     try:
@@ -1208,7 +1213,7 @@ def filter_archives(
 
     if request_filters["title"]:
         q_formatted = "%" + request_filters["title"].replace(" ", "%") + "%"
-        results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+        results = TextNgram.objects.title_search(results, q_formatted)
     if request_filters["filename"]:
         results = results.filter(zipped__icontains=request_filters["filename"])
     if request_filters["rating_from"]:
@@ -1279,9 +1284,9 @@ def filter_archives(
                 results = results.filter(tag_query)
             else:
                 if tag_name != "" and tag_scope != "":
-                    tag_query = Q(tags__name__contains=tag_name) & Q(tags__scope__contains=tag_scope)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name) & Q(tags__scope__contains=tag_scope)
                 elif tag_name != "":
-                    tag_query = Q(tags__name__contains=tag_name)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name)
                 else:
                     tag_query = Q(tags__scope__contains=tag_scope)
 
@@ -1362,7 +1367,7 @@ def quick_search(request: HttpRequest, parameters: DataDict, display_parameters:
     q_search = display_parameters["qsearch"]
 
     # URL search
-    parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+    parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
     gallery_ids_providers = list()
     for parser in parsers:
         if parser.id_from_url_implemented():
@@ -1389,7 +1394,7 @@ def quick_search(request: HttpRequest, parameters: DataDict, display_parameters:
         clean_up_qsearch = display_parameters["qsearch"].replace("	", " ")
 
         q_formatted = "%" + clean_up_qsearch.replace(" ", "%") + "%"
-        results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+        results = TextNgram.objects.title_search(results, q_formatted)
 
     if gallery_ids_providers:
         results = results_url or Archive.objects.none()
@@ -1430,7 +1435,7 @@ def quick_gallery_search(request: HttpRequest) -> QuerySet[Gallery]:
     # URL search
     url = qsearch
 
-    parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+    parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
     gallery_ids_providers = list()
     for parser in parsers:
         if parser.id_from_url_implemented():
@@ -1445,7 +1450,7 @@ def quick_gallery_search(request: HttpRequest) -> QuerySet[Gallery]:
         results_url = None
 
     q_formatted = "%" + qsearch.replace(" ", "%") + "%"
-    results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+    results = TextNgram.objects.title_search(results, q_formatted)
 
     if results_url:
         results = results | results_url
@@ -1473,7 +1478,7 @@ def url_submit(request: HttpRequest) -> HttpResponse:
     d = {}
 
     if p and "submit" in p:
-        current_settings = Settings(load_from_config=crawler_settings.config)
+        current_settings = crawler_settings.copy_from_config()
         if not current_settings.workers.web_queue:
             messages.error(request, "Cannot submit link currently. Please contact an admin.")
             return HttpResponseRedirect(reverse("viewer:url-submit"))
@@ -1508,7 +1513,7 @@ def url_submit(request: HttpRequest) -> HttpResponse:
             # current_settings.gallery_reason = reason[:200]
 
         # As a security check, only finally set urls that pass the accepted_urls
-        parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+        parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
 
         url_messages = []
         admin_messages = []
@@ -1707,7 +1712,7 @@ def url_submit(request: HttpRequest) -> HttpResponse:
                     url_dict[item.rstrip("\r")] = 1
 
         url_list = list(url_dict.keys())
-        parsers = crawler_settings.provider_context.get_parsers(crawler_settings)
+        parsers = crawler_settings.provider_context.get_shared_parsers(crawler_settings)
 
         url_gallery_tuple = []
 
@@ -1730,6 +1735,7 @@ def url_submit(request: HttpRequest) -> HttpResponse:
     return render(request, "viewer/url_submit.html", d)
 
 
+@query_budget(queries=16, duplicates=0)
 def public_stats(request: HttpRequest) -> HttpResponse:
     """Display public galleries and archives stats."""
     if not crawler_settings.urls.enable_public_stats:
@@ -1738,82 +1744,101 @@ def public_stats(request: HttpRequest) -> HttpResponse:
         else:
             return render_error(request, "Page disabled by settings (urls: enable_public_stats).")
 
-    stats_dict = {
-        "n_archives": Archive.objects.filter(public=True).count(),
-        "n_galleries": Gallery.objects.filter(public=True).count(),
-        "archive": Archive.objects.filter(public=True)
-        .filter(filesize__gt=0)
-        .aggregate(
-            Avg("filesize"), Max("filesize"), Min("filesize"), Sum("filesize"), Avg("filecount"), Sum("filecount")
-        ),
-        "gallery": Gallery.objects.filter(public=True)
-        .filter(filesize__gt=0)
-        .aggregate(
-            Avg("filesize"), Max("filesize"), Min("filesize"), Sum("filesize"), Avg("filecount"), Sum("filecount")
-        ),
-        "n_tags": Tag.objects.filter(archive_tags__public=True).distinct().count(),
-        "top_10_tags": Tag.objects.filter(archive_tags__public=True)
-        .distinct()
-        .annotate(num_archive=Count("archive_tags"))
-        .order_by("-num_archive")[:10],
-        "top_10_artist_tags": Tag.objects.filter(scope="artist", archive_tags__public=True)
-        .distinct()
-        .annotate(num_archive=Count("archive_tags"))
-        .order_by("-num_archive")[:10],
-    }
-
-    # Per category
-    categories = Gallery.objects.filter(public=True).values_list("category", flat=True).distinct()
-
-    categories_dict = {}
-
-    for category in categories:
-        categories_dict[category] = {
-            "n_galleries": Gallery.objects.filter(public=True, category=category).count(),
+    # Same content for every user, only public objects are counted.
+    def build_public_stats() -> dict[str, Any]:
+        stats_dict = {
+            "n_archives": Archive.objects.filter(public=True).count(),
+            "n_galleries": Gallery.objects.filter(public=True).count(),
+            "archive": Archive.objects.filter(public=True)
+            .filter(filesize__gt=0)
+            .aggregate(
+                Avg("filesize"), Max("filesize"), Min("filesize"), Sum("filesize"), Avg("filecount"), Sum("filecount")
+            ),
             "gallery": Gallery.objects.filter(public=True)
-            .filter(filesize__gt=0, category=category)
+            .filter(filesize__gt=0)
             .aggregate(
                 Avg("filesize"), Max("filesize"), Min("filesize"), Sum("filesize"), Avg("filecount"), Sum("filecount")
             ),
+            "n_tags": Tag.objects.filter(archive_tags__public=True).distinct().count(),
+            "top_10_tags": list(
+                Tag.objects.filter(archive_tags__public=True)
+                .distinct()
+                .annotate(num_archive=Count("archive_tags"))
+                .order_by("-num_archive")[:10]
+            ),
+            "top_10_artist_tags": list(
+                Tag.objects.filter(scope="artist", archive_tags__public=True)
+                .distinct()
+                .annotate(num_archive=Count("archive_tags"))
+                .order_by("-num_archive")[:10]
+            ),
         }
 
-    # Per language tag
-    languages = (
-        Tag.objects.filter(scope="language")
-        .exclude(scope="language", name="translated")
-        .annotate(num_gallery=Count("gallery"))
-        .order_by("-num_gallery")
-        .values_list("name", flat=True)
-        .distinct()
-    )
+        # Per category and per language, each grouped in a single query. Averages and totals only count galleries
+        # with a known size, like the general stats.
+        sized = Q(filesize__gt=0)
+        size_aggregates = {
+            "filesize__avg": Avg("filesize", filter=sized),
+            "filesize__max": Max("filesize", filter=sized),
+            "filesize__min": Min("filesize", filter=sized),
+            "filesize__sum": Sum("filesize", filter=sized),
+            "filecount__avg": Avg("filecount", filter=sized),
+            "filecount__sum": Sum("filecount", filter=sized),
+        }
 
-    languages_dict = {}
+        def grouped_stats(values: dict[str, Any]) -> dict[str, Any]:
+            return {
+                "n_galleries": values["n_galleries"],
+                "gallery": {name: values[name] for name in size_aggregates},
+            }
+
+        categories_dict = {}
+
+        for category_values in (
+            Gallery.objects.filter(public=True)
+            .values("category")
+            .annotate(n_galleries=Count("id"), **size_aggregates)
+            .order_by()
+        ):
+            categories_dict[category_values["category"]] = grouped_stats(category_values)
+
+        languages = (
+            Tag.objects.filter(scope="language")
+            .exclude(scope="language", name="translated")
+            .annotate(num_gallery=Count("gallery"))
+            .order_by("-num_gallery")
+            .values_list("name", flat=True)
+            .distinct()
+        )
 
-    languages_dict["untranslated"] = {
-        "n_galleries": Gallery.objects.filter(public=True).exclude(tags__scope="language").distinct().count(),
-        "gallery": Gallery.objects.filter(public=True)
-        .filter(filesize__gt=0, tags__scope="language")
-        .distinct()
-        .aggregate(
-            Avg("filesize"), Max("filesize"), Min("filesize"), Sum("filesize"), Avg("filecount"), Sum("filecount")
-        ),
-    }
+        languages_dict = {}
 
-    for language in languages:
-        languages_dict[str(language)] = {
-            "n_galleries": Gallery.objects.filter(public=True)
-            .filter(tags__scope="language", tags__name=language)
-            .distinct()
-            .count(),
+        languages_dict["untranslated"] = {
+            "n_galleries": Gallery.objects.filter(public=True).exclude(tags__scope="language").distinct().count(),
             "gallery": Gallery.objects.filter(public=True)
-            .filter(filesize__gt=0, tags__scope="language", tags__name=language)
+            .filter(filesize__gt=0, tags__scope="language")
             .distinct()
             .aggregate(
                 Avg("filesize"), Max("filesize"), Min("filesize"), Sum("filesize"), Avg("filecount"), Sum("filecount")
             ),
         }
 
-    d = {"stats": stats_dict, "gallery_categories": categories_dict, "gallery_languages": languages_dict}
+        # Tag names are unique in a scope, so each gallery is counted once per language.
+        stats_per_language = {
+            language_values["tags__name"]: grouped_stats(language_values)
+            for language_values in Gallery.objects.filter(public=True, tags__scope="language")
+            .values("tags__name")
+            .annotate(n_galleries=Count("id"), **size_aggregates)
+            .order_by()
+        }
+        for language in languages:
+            languages_dict[str(language)] = stats_per_language.get(
+                language, {"n_galleries": 0, "gallery": {name: None for name in size_aggregates}}
+            )
+
+        return {"stats": stats_dict, "gallery_categories": categories_dict, "gallery_languages": languages_dict}
+
+    d = cached_value("public-stats", (), build_public_stats)
 
     return render(request, "viewer/public_stats.html", d)
 
@@ -1906,7 +1931,7 @@ def filter_archives_simple(params: dict[str, Any], authenticated=False, show_bin
 
     if params["title"]:
         q_formatted = "%" + params["title"].replace(" ", "%") + "%"
-        results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+        results = TextNgram.objects.title_search(results, q_formatted)
     if params["filename"]:
         results = results.filter(zipped__icontains=params["filename"])
     if params["rating_from"]:
@@ -2015,9 +2040,9 @@ def filter_archives_simple(params: dict[str, Any], authenticated=False, show_bin
                 results = results.filter(tag_query)
             else:
                 if tag_name != "" and tag_scope != "":
-                    tag_query = Q(tags__name__contains=tag_name) & Q(tags__scope__contains=tag_scope)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name) & Q(tags__scope__contains=tag_scope)
                 elif tag_name != "":
-                    tag_query = Q(tags__name__contains=tag_name)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name)
                 else:
                     tag_query = Q(tags__scope__contains=tag_scope)
 
@@ -2064,7 +2089,7 @@ def filter_galleries_simple(params: dict[str, Any]) -> QuerySet[Gallery]:
 
     if params["title"]:
         q_formatted = "%" + params["title"].replace(" ", "%") + "%"
-        results = results.filter(Q(title__ss=q_formatted) | Q(title_jpn__ss=q_formatted))
+        results = TextNgram.objects.title_search(results, q_formatted)
     if params["rating_from"]:
         results = results.filter(rating__gte=float(params["rating_from"]))
     if params["rating_to"]:
@@ -2168,9 +2193,9 @@ def filter_galleries_simple(params: dict[str, Any]) -> QuerySet[Gallery]:
                     results = results.filter(tag_query)
             else:
                 if tag_name != "" and tag_scope != "":
-                    tag_query = Q(tags__name__contains=tag_name) & Q(tags__scope__contains=tag_scope)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name) & Q(tags__scope__contains=tag_scope)
                 elif tag_name != "":
-                    tag_query = Q(tags__name__contains=tag_name)
+                    tag_query = TextNgram.objects.tag_name_contains(tag_name)
                 else:
                     tag_query = Q(tags__scope__contains=tag_scope)
 
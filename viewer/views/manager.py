@@ -1,11 +1,11 @@
 import logging
 import threading
-from itertools import groupby
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator, InvalidPage, EmptyPage
-from django.db.models import Prefetch, Count, Q, Case, When
+from django.db.models import Prefetch, Count, Q, Case, When, Value
+from django.db.models.functions import Coalesce
 from django.http import HttpRequest, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.conf import settings
@@ -26,6 +26,7 @@ from viewer.models import (
     GalleryMatchGroupEntry,
 )
 from viewer.utils.actions import event_log
+from viewer.utils.duplicates import duplicate_groups_by_fields
 from viewer.utils.general import clean_up_referer
 from viewer.utils.matching import (
     generate_possible_matches_for_archives,
@@ -219,26 +220,34 @@ def repeated_galleries_by_field(request: HttpRequest) -> HttpResponse:
     if "has-size" in get:
         results = results.filter(filesize__gt=0)
 
+    try:
+        page = int(get.get("page", "1"))
+    except ValueError:
+        page = 1
+
     by_title = {}
     by_filesize = {}
+    pages = []
 
     if "by-title" in get:
         if "same-uploader" in get:
-            for k_tu, v_tu in groupby(results.order_by("title", "uploader"), lambda x: (x.title, x.uploader)):
-                objects = list(v_tu)
-                if len(objects) > 1:
-                    by_title[str(k_tu)] = objects
+            title_page, title_groups = duplicate_groups_by_fields(results, ("title", "uploader"), page)
+            pages.append(title_page)
+            for key, objects in title_groups.items():
+                by_title[str(key)] = objects
         else:
-            for k_title, v_title in groupby(results.order_by("title"), lambda x: x.title or ""):
-                objects = list(v_title)
-                if len(objects) > 1:
-                    by_title[k_title] = objects
+            title_page, title_groups = duplicate_groups_by_fields(results, (Coalesce("title", Value("")),), page)
+            pages.append(title_page)
+            for key, objects in title_groups.items():
+                by_title[key[0]] = objects
 
     if "by-filesize" in get:
-        for k_filesize, v_filesize in groupby(results.order_by("filesize"), lambda x: str(x.filesize or "")):
-            objects = list(v_filesize)
-            if len(objects) > 1:
-                by_filesize[k_filesize] = objects
+        filesize_page, filesize_groups = duplicate_groups_by_fields(results, (Coalesce("filesize", Value(0)),), page)
+        pages.append(filesize_page)
+        for key, objects in filesize_groups.items():
+            by_filesize[str(key[0] or "")] = objects
+
+    num_pages = max([x.paginator.num_pages for x in pages], default=1)
 
     try:
         inline_thumbnails = bool(get.get("inline-thumbnails", ""))
@@ -248,7 +257,10 @@ def repeated_galleries_by_field(request: HttpRequest) -> HttpResponse:
     d = {
         "by_title": by_title, "by_filesize": by_filesize, "form": form,
         "fields_form": fields_form,
-        "inline_thumbnails": inline_thumbnails
+        "inline_thumbnails": inline_thumbnails,
+        "page": min(page, num_pages),
+        "num_pages": num_pages,
+        "total_groups": [x.paginator.count for x in pages],
     }
 
     return render(request, "viewer/galleries_repeated_by_fields.html", d)
@@ -361,7 +373,7 @@ def archives_not_present_in_filesystem(request: HttpRequest) -> HttpResponse:
                 messages.success(request, message)
 
                 # Force replace_metadata when queueing from this list, since it's mostly used to download non-used.
-                current_settings = Settings(load_from_config=crawler_settings.config)
+                current_settings = crawler_settings.copy_from_config()
 
                 if current_settings.workers.web_queue:
 
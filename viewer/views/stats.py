@@ -1,5 +1,6 @@
 import datetime
 
+import numpy as np
 import pytz
 from django.shortcuts import render
 from django.http import JsonResponse
@@ -8,6 +9,8 @@ from django.db.models.functions import TruncMonth
 
 from viewer.forms import GallerySearchForm
 from viewer.models import Tag, Gallery
+from viewer.utils.query_budget import query_budget
+from viewer.utils.tag_index import get_tag_gallery_index, tag_details
 from django.contrib.auth.decorators import login_required
 
 @login_required
@@ -25,6 +28,7 @@ DEFAULT_TIMELINE_ORDER = 'posted'
 CUTOFF_DATE = datetime.datetime(1970, 1, 1, tzinfo=pytz.UTC)
 
 @login_required
+@query_budget(queries=10, duplicates=0)
 def stats_api(request):
     chart_type = request.GET.get('chart')
     chart_order = request.GET.get('timeline_order', DEFAULT_TIMELINE_ORDER)
@@ -52,37 +56,6 @@ def stats_api(request):
     
     data = {}
 
-    if chart_type == 'treemap' or chart_type is None:
-        # 1. Tag Treemap Data
-        # Filter tags based on filtered galleries AND scope if provided
-        tag_filter = Q(gallery__in=filtered_galleries)
-        if chart_tag_scope:
-            tag_filter &= Q(scope=chart_tag_scope)
-
-        top_tags = Tag.objects.filter(tag_filter).annotate(count=Count('gallery', filter=Q(gallery__in=filtered_galleries))).order_by('-count')[:100]
-        treemap_data = []
-        scope_dict = {}
-        for tag in top_tags:
-            if tag.count == 0:
-                continue
-            scope = tag.scope if tag.scope else "uncategorized"
-            if scope not in scope_dict:
-                scope_dict[scope] = []
-            scope_dict[scope].append({
-                "name": tag.name,
-                "value": tag.count
-            })
-        
-        for scope, children in scope_dict.items():
-            treemap_data.append({
-                "name": scope,
-                "children": children
-            })
-        data["treemap"] = {
-            "name": "Tags",
-            "children": treemap_data
-        }
-
     if chart_type == 'timeline' or chart_type is None:
         # 2. Upload Timeline
         # Filter archives based on filtered galleries
@@ -97,108 +70,68 @@ def stats_api(request):
                 })
         data["timeline"] = timeline_data
 
-    if chart_type == 'heatmap' or chart_type is None:
-        # 3. Tag Co-occurrence Heatmap
-        # Filter tags based on filtered galleries AND scope if provided
-        tag_filter = Q(gallery__in=filtered_galleries)
+    tag_charts = [x for x in ('treemap', 'heatmap', 'sunburst') if chart_type in (x, None)]
+    if tag_charts:
+        # All the tag charts come from a single evaluation of the filter against the tag index.
+        tag_index = get_tag_gallery_index()
+        gallery_mask = tag_index.gallery_mask(filtered_galleries)
+        tag_counts = tag_index.tag_counts(gallery_mask)
         if chart_tag_scope:
-            tag_filter &= Q(scope=chart_tag_scope)
-
-        # Get top tags (limit to 40 for a readable matrix)
-        top_tags = list(Tag.objects.filter(tag_filter).annotate(count=Count('gallery', filter=Q(gallery__in=filtered_galleries))).order_by('-count')[:40])
-        
-        heatmap_data = []
-        tag_names = [t.name for t in top_tags]
-        top_tag_ids = [t.id for t in top_tags]
-        tag_names_map = {t.id: t.name for t in top_tags}
-        # tag_order_map = {val: i for i, val in enumerate(top_tag_ids)}
-
-        gallery_ids = [g.id for g in filtered_galleries]
-
-        ThroughModel = Gallery.tags.through
-
-        relationships = ThroughModel.objects.filter(
-            tag_id__in=top_tag_ids,
-            gallery_id__in=gallery_ids,
-        ).values_list('gallery_id', 'tag_id')
-
-        # 2. Group tags by gallery in memory
-        # Format: { gallery_id: {tag_id_1, tag_id_2, ...} }
-        gallery_tags = defaultdict(set)
-        for gallery_id, tag_id in relationships:
-            gallery_tags[gallery_id].add(tag_id)
-
-        # 3. Calculate Co-occurrence
-        # Initialize a 40x40 matrix (or a dictionary of counters)
-        co_occurrence = defaultdict(int)
-
-        # Iterate over the galleries and update counts for pairs
-        for tags in gallery_tags.values():
-            # Convert to list to iterate
-            tags_list = list(tags)
-            # tags_list = sorted(list(tags), key=lambda x: tag_order_map[x])
-            # Double loop over the tags present in this specific gallery
-            for i in range(len(tags_list)):
-                for j in range(i, len(tags_list)):
-                    t1 = tags_list[i]
-                    t2 = tags_list[j]
-
-                    # Create a sorted key so (A, B) is same as (B, A)
-                    key = tuple(sorted((t1, t2)))
-                    co_occurrence[key] += 1
-
-        for (id1, id2), count in co_occurrence.items():
-            heatmap_data.append({
-                'x': tag_names_map[id1],
-                'y': tag_names_map[id2],
-                'value': count
-            })
-
-            if id1 != id2:
-                heatmap_data.append({
-                    'x': tag_names_map[id2],
-                    'y': tag_names_map[id1],
-                    'value': count
-                })
-
-        data["heatmap"] = {
-            "tags": tag_names,
-            "data": heatmap_data
-        }
-
-    if chart_type == 'sunburst' or chart_type is None:
-        # 4. Sunburst Chart (Hierarchy)
-        # Root -> Scope -> Tag
-        
-        tag_filter = Q(gallery__in=filtered_galleries)
-        # Note: Sunburst usually shows ALL scopes, so we might ignore chart_tag_scope or use it to filter the "outer" ring?
-        # Let's respect the scope filter if present, otherwise show all.
-        if chart_tag_scope:
-            tag_filter &= Q(scope=chart_tag_scope)
-
-        # Get tags with counts
-        tags = Tag.objects.filter(tag_filter).annotate(count=Count('gallery', filter=Q(gallery__in=filtered_galleries))).filter(count__gt=0)
-        
-        # Build hierarchy
-        hierarchy = {"name": "All", "children": []}
-        scopes = {} # scope_name -> list of children
-
-        for tag in tags:
-            scope_name = tag.scope if tag.scope else "uncategorized"
-            if scope_name not in scopes:
-                scopes[scope_name] = []
-            
-            scopes[scope_name].append({
-                "name": tag.name,
-                "value": tag.count
-            })
-        
-        for scope_name, children in scopes.items():
-            hierarchy["children"].append({
-                "name": scope_name,
-                "children": children
-            })
-            
-        data["sunburst"] = hierarchy
+            tag_counts[~tag_index.tag_mask(Tag.objects.filter(scope=chart_tag_scope).values_list('pk', flat=True))] = 0
+
+        # Positions in the index of the tags with galleries, most used first.
+        ranked_tags = np.argsort(-tag_counts, kind='stable')
+        ranked_tags = ranked_tags[tag_counts[ranked_tags] > 0]
+        shown_tags = ranked_tags if 'sunburst' in tag_charts else ranked_tags[:100]
+        details = tag_details(tag_index.tag_ids[shown_tags].tolist())
+
+        def tag_entries(positions):
+            for position in positions:
+                tag_id = int(tag_index.tag_ids[position])
+                if tag_id in details:
+                    yield tag_id, details[tag_id][0], details[tag_id][1], int(tag_counts[position])
+
+        def children_by_scope(positions):
+            scope_dict = defaultdict(list)
+            for _, name, scope, count in tag_entries(positions):
+                scope_dict[scope or "uncategorized"].append({"name": name, "value": count})
+            return [{"name": scope, "children": children} for scope, children in scope_dict.items()]
+
+        if 'treemap' in tag_charts:
+            # 1. Tag Treemap Data
+            data["treemap"] = {
+                "name": "Tags",
+                "children": children_by_scope(ranked_tags[:100])
+            }
+
+        if 'heatmap' in tag_charts:
+            # 3. Tag Co-occurrence Heatmap
+            # Top tags, limited to 40 for a readable matrix
+            top_tags = list(tag_entries(ranked_tags[:40]))
+            top_positions = np.searchsorted(tag_index.tag_ids, [x[0] for x in top_tags])
+            co_occurrence = tag_index.co_occurrence(top_positions, gallery_mask)
+
+            heatmap_data = []
+            for i, (id1, name1, _, _) in enumerate(top_tags):
+                for j, (id2, name2, _, _) in enumerate(top_tags):
+                    # Each pair once, ordered by id, and its mirror.
+                    if id1 > id2 or not co_occurrence[i, j]:
+                        continue
+                    heatmap_data.append({'x': name1, 'y': name2, 'value': int(co_occurrence[i, j])})
+                    if id1 != id2:
+                        heatmap_data.append({'x': name2, 'y': name1, 'value': int(co_occurrence[i, j])})
+
+            data["heatmap"] = {
+                "tags": [x[1] for x in top_tags],
+                "data": heatmap_data
+            }
+
+        if 'sunburst' in tag_charts:
+            # 4. Sunburst Chart (Hierarchy)
+            # Root -> Scope -> Tag
+            data["sunburst"] = {
+                "name": "All",
+                "children": children_by_scope(ranked_tags)
+            }
 
     return JsonResponse(data)
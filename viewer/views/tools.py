@@ -6,14 +6,16 @@ from django.contrib.auth.decorators import permission_required
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 
-from viewer.models import Archive, ItemProperties, Image
+from viewer.models import Archive, ArchiveHashProfile
 from viewer.services import CompareObjectsService
+from viewer.utils.query_budget import query_budget
 from viewer.utils.requests import double_check_auth
 
 crawler_settings = settings.CRAWLER_SETTINGS
 logger = logging.getLogger(__name__)
 
 
+@query_budget(queries=6, duplicates=0)
 def compare_archives(request: HttpRequest) -> HttpResponse:
 
     authenticated, actual_user = double_check_auth(request)
@@ -40,8 +42,7 @@ def compare_archives(request: HttpRequest) -> HttpResponse:
         algos,
         thumbnails=thumbs,
         images=not no_images,
-        item_model=ItemProperties,
-        image_model=Image,
+        profile_model=ArchiveHashProfile,
         no_live_data=no_live_data,
     )
 
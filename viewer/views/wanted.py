@@ -132,7 +132,7 @@ def wanted_gallery(request: HttpRequest, pk: int) -> HttpResponse:
             urls_to_match = request.GET.getlist("urls-to-match", [])
             url_query = wanted_gallery_instance.backlog_url_query
 
-            current_settings = Settings(load_from_config=crawler_settings.config)
+            current_settings = crawler_settings.copy_from_config()
 
             if urls_to_match and url_query and current_settings.workers.web_queue:
                 